@@ -1,11 +1,56 @@
-from django.contrib import admin
+from django.conf import settings
+from django.contrib import admin, messages
+from django.core.exceptions import PermissionDenied
 from .models import Producto, Cliente, Venta, VentaItem, Vendedor
+from django.http import StreamingHttpResponse
+from django.shortcuts import redirect
+from django.template.response import TemplateResponse
+from django.urls import path
+from django.utils import timezone
+from ventas import facturas_lote, resumenes
+from . import importacion
+from .forms import ImportarProductosForm
+
+ERRORES_MOSTRADOS = 20
 
 @admin.register(Producto)
 class ProductoAdmin(admin.ModelAdmin):
     list_display = ('nombre', 'precio', 'stock', 'codigo_barras')   # ← línea limpia
     list_editable = ('precio', 'stock')
     search_fields = ('nombre', 'codigo_barras')
+    change_list_template = 'admin/tienda/producto/change_list.html'
+
+    def get_urls(self):
+        return [
+            path('importar/', self.admin_site.admin_view(self.importar_view), name='tienda_producto_importar'),
+        ] + super().get_urls()
+
+    def importar_view(self, request):
+        """Carga masiva de un catálogo de proveedor (ver importacion.py)"""
+        if not (self.has_add_permission(request) and self.has_change_permission(request)):
+            raise PermissionDenied
+        form = ImportarProductosForm(request.POST or None, request.FILES or None)
+        if request.method == 'POST' and form.is_valid():
+            archivo = form.cleaned_data['archivo']
+            try:
+                resultado = importacion.importar(archivo.file, archivo.name)
+            except importacion.ImportacionError as e:
+                form.add_error('archivo', e.mensaje)
+            else:
+                nivel = messages.WARNING if resultado.errores else messages.SUCCESS
+                self.message_user(request, f"Importación terminada: {resultado}.", nivel)
+                for fila, mensaje in resultado.errores[:ERRORES_MOSTRADOS]:
+                    self.message_user(request, f"Fila {fila}: {mensaje}", messages.ERROR)
+                if len(resultado.errores) > ERRORES_MOSTRADOS:
+                    self.message_user(request, f"... y {len(resultado.errores) - ERRORES_MOSTRADOS} filas más con errores",
+                                      messages.ERROR)
+                return redirect('admin:tienda_producto_changelist')
+        return TemplateResponse(request, 'admin/tienda/producto/importar.html', {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': "Importar productos",
+            'form': form,
+        })
 
 @admin.register(Cliente)
 class ClienteAdmin(admin.ModelAdmin):
@@ -21,7 +66,26 @@ class VentaAdmin(admin.ModelAdmin):
     list_display = ('factura_num', 'cliente', 'fecha', 'total')
     list_filter = ('fecha', 'metodo_pago')
     inlines = [VentaItemInline]
-    readonly_fields = ('total', 'fecha', 'factura_num')
+    readonly_fields = ('total', 'cantidad_items', 'fecha', 'factura_num')
+    actions = ['descargar_facturas']
+
+    @admin.action(description="Descargar facturas seleccionadas (ZIP)")
+    def descargar_facturas(self, request, queryset):
+        # El ZIP se envía a medida que se arma; sin pool de procesos dentro del worker web (ver facturas_lote)
+        procesos = getattr(settings, 'FACTURAS_ZIP_PROCESOS_WEB', 0)
+        response = StreamingHttpResponse(facturas_lote.generar_zip(queryset, procesos=procesos),
+                                         content_type='application/zip')
+        response['Content-Disposition'] = f'attachment; filename="facturas_{timezone.localdate()}.zip"'
+        return response
+
+    # Las ediciones en el admin recalculan los resúmenes diarios una sola vez por guardado
+    def changeform_view(self, *args, **kwargs):
+        with resumenes.agrupar():
+            return super().changeform_view(*args, **kwargs)
+
+    def delete_view(self, *args, **kwargs):
+        with resumenes.agrupar():
+            return super().delete_view(*args, **kwargs)
 
 @admin.register(Vendedor)
 class VendedorAdmin(admin.ModelAdmin):
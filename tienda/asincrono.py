@@ -0,0 +1,89 @@
+"""
+Piezas para las vistas async del POS y del tablero (servidas por ASGI).
+
+En Django 4.2 login_required y csrf_exempt no aceptan vistas async (envuelven
+la corrutina en una función sync), y request.user es un objeto perezoso que
+carga sesión y usuario con el ORM sync, lo que falla dentro del event loop.
+login_requerido() y sin_csrf() cumplen ese papel para las vistas async.
+
+Las consultas async del ORM de 4.2 siguen corriendo en el hilo sync de la
+petición, una detrás de otra: asyncio.gather() sobre ellas no las solapa.
+Para consultas independientes que sí deben ir en paralelo, en_paralelo() las
+reparte en un pool de hilos, cada uno con su propia conexión.
+"""
+import asyncio
+import contextvars
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.views import redirect_to_login
+from django.db import close_old_connections
+
+from . import perfilado
+
+
+async def usuario(request):
+    """Resuelve request.user fuera del event loop; después se usa sin consultas"""
+    await sync_to_async(lambda: request.user.is_authenticated)()
+    return request.user
+
+
+def login_requerido(vista):
+    """login_required para vistas async"""
+    @wraps(vista)
+    async def envoltorio(request, *args, **kwargs):
+        if not (await usuario(request)).is_authenticated:
+            return redirect_to_login(request.get_full_path())
+        return await vista(request, *args, **kwargs)
+    return envoltorio
+
+
+def sin_csrf(vista):
+    """csrf_exempt para vistas async (marca la vista sin envolverla)"""
+    vista.csrf_exempt = True
+    return vista
+
+
+# ----------------------------
+# Consultas en paralelo
+# ----------------------------
+_ejecutor = None
+_ejecutor_lock = threading.Lock()
+
+
+def _como_peticion(funcion):
+    # Estos hilos no pasan por request_started/request_finished: se aplica la
+    # misma política de conexiones (CONN_MAX_AGE, pool, conexiones rotas)
+    close_old_connections()
+    perfilado.unir_hilo()
+    try:
+        return funcion()
+    finally:
+        close_old_connections()
+
+
+def _pool(hilos):
+    """El pool del proceso; el lock evita que dos primeras peticiones simultáneas creen uno cada una"""
+    global _ejecutor
+    if _ejecutor is None:
+        with _ejecutor_lock:
+            if _ejecutor is None:
+                _ejecutor = ThreadPoolExecutor(max_workers=hilos, thread_name_prefix='consultas')
+    return _ejecutor
+
+
+async def en_paralelo(*funciones):
+    """Ejecuta funciones sync independientes a la vez y devuelve sus resultados en orden"""
+    hilos = getattr(settings, 'CONSULTAS_PARALELAS', 4)
+    if hilos < 1:
+        # Sin pool: una tras otra en el hilo sync de la petición, con su conexión (tests en una transacción)
+        return await sync_to_async(lambda: [f() for f in funciones])()
+    pool = _pool(hilos)
+    loop = asyncio.get_running_loop()
+    # Cada tarea con una copia del contexto, como sync_to_async (la instrumentación lo usa)
+    return await asyncio.gather(*(
+        loop.run_in_executor(pool, contextvars.copy_context().run, _como_peticion, f) for f in funciones
+    ))
@@ -0,0 +1,356 @@
+"""
+Búsqueda de productos por nombre, descripción y código de barras.
+
+Dos backends, elegidos con settings.BUSQUEDA_PRODUCTOS_BACKEND:
+
+- 'memoria': índice en memoria del proceso (prefijos de palabras + trigramas
+  del nombre), mantenido incrementalmente por las señales de Producto. Es el
+  más rápido, pero cada proceso sólo ve los cambios hechos por él mismo.
+- 'postgres': similitud de trigramas con pg_trgm sobre índices GIN (ver la
+  migración 0008). Pensado para despliegues con varios workers.
+
+Ambos ignoran mayúsculas y tildes, ordenan por relevancia y limitan los
+resultados a settings.BUSQUEDA_PRODUCTOS_LIMITE.
+"""
+import heapq
+import itertools
+import threading
+import unicodedata
+from bisect import bisect_left, insort
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import connection
+
+from .models import Producto
+
+# Campos indexados y su peso en el puntaje
+CODIGO, NOMBRE, DESCRIPCION, PRIMERA = 0, 1, 2, 3
+PESOS = {CODIGO: 8, NOMBRE: 4, DESCRIPCION: 1, PRIMERA: 6}
+
+
+def normalizar(texto):
+    """Minúsculas y sin tildes: 'Collar Pequeño' -> 'collar pequeno'"""
+    if not texto:
+        return ''
+    descompuesto = unicodedata.normalize('NFKD', texto.lower())
+    return ''.join(c for c in descompuesto if not unicodedata.combining(c))
+
+
+def trigramas(palabra):
+    palabra = f"  {palabra} "
+    return {palabra[i:i + 3] for i in range(len(palabra) - 2)}
+
+
+class IndiceMemoria:
+    """
+    Índice invertido en memoria.
+
+    Un vocabulario ordenado permite encontrar por bisección todas las palabras
+    que empiezan con lo escrito; cada palabra apunta a los conjuntos de productos
+    que la tienen en el código, el nombre, la descripción o como primera palabra
+    del nombre. Los trigramas del nombre cubren errores de tipeo.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._cargado = False
+        self._docs = {}                  # id -> [(palabra, campo), ...]
+        self._nombres = {}               # id -> nombre normalizado (desempate por orden alfabético)
+        self._orden = []                 # (nombre normalizado, id) ordenados, para grupos muy grandes
+        self._vocabulario = []           # palabras distintas, ordenadas
+        self._postings = {}              # palabra -> [ids por CODIGO, NOMBRE, DESCRIPCION, PRIMERA]
+        self._trigramas = defaultdict(set)   # trigrama -> palabras del nombre o la descripción
+
+    # --- mantenimiento ---
+    def cargar(self):
+        with self._lock:
+            self._docs, self._nombres, self._postings, self._trigramas = {}, {}, {}, defaultdict(set)
+            filas = Producto.objects.values_list('id', 'nombre', 'descripcion', 'codigo_barras').iterator(chunk_size=5000)
+            for fila in filas:
+                self._agregar(*fila, ordenar=False)
+            self._vocabulario = sorted(self._postings)
+            self._orden = sorted((nombre, pid) for pid, nombre in self._nombres.items())
+            self._cargado = True
+
+    def actualizar(self, producto):
+        with self._lock:
+            if not self._cargado:
+                return
+            self._quitar(producto.pk)
+            self._agregar(producto.pk, producto.nombre, producto.descripcion, producto.codigo_barras)
+
+    def actualizar_varios(self, ids):
+        """Después de una importación masiva: de a uno si son pocos, si no se recarga todo"""
+        with self._lock:
+            if not self._cargado:
+                return
+            if len(ids) > max(1000, len(self._docs) // 10):
+                self.cargar()
+                return
+            filas = Producto.objects.filter(pk__in=ids).values_list('id', 'nombre', 'descripcion', 'codigo_barras')
+            for fila in filas:
+                self._quitar(fila[0])
+                self._agregar(*fila)
+
+    def quitar(self, producto_id):
+        with self._lock:
+            if self._cargado:
+                self._quitar(producto_id)
+
+    def _agregar(self, producto_id, nombre, descripcion, codigo, ordenar=True):
+        nombre_n = normalizar(nombre)
+        palabras_nombre = nombre_n.split()
+        claves = [(p, NOMBRE) for p in set(palabras_nombre)]
+        claves += [(p, DESCRIPCION) for p in set(normalizar(descripcion).split())]
+        if palabras_nombre:
+            claves.append((palabras_nombre[0], PRIMERA))
+        if codigo:
+            claves.append((codigo.lower(), CODIGO))
+
+        self._docs[producto_id] = claves
+        self._nombres[producto_id] = nombre_n
+        if ordenar:
+            insort(self._orden, (nombre_n, producto_id))
+        for palabra, campo in claves:
+            conjuntos = self._postings.get(palabra)
+            if conjuntos is None:
+                conjuntos = self._postings[palabra] = [set(), set(), set(), set()]
+                if ordenar:
+                    insort(self._vocabulario, palabra)
+            if campo in (NOMBRE, DESCRIPCION) and not (conjuntos[NOMBRE] or conjuntos[DESCRIPCION]):
+                # Los códigos de barras no entran a la búsqueda aproximada
+                for t in trigramas(palabra):
+                    self._trigramas[t].add(palabra)
+            conjuntos[campo].add(producto_id)
+
+    def _quitar(self, producto_id):
+        claves = self._docs.pop(producto_id, None)
+        if claves is None:
+            return
+        nombre_n = self._nombres.pop(producto_id)
+        i = bisect_left(self._orden, (nombre_n, producto_id))
+        if i < len(self._orden) and self._orden[i] == (nombre_n, producto_id):
+            del self._orden[i]
+        for palabra, campo in claves:
+            conjuntos = self._postings[palabra]
+            conjuntos[campo].discard(producto_id)
+            if campo in (NOMBRE, DESCRIPCION) and not (conjuntos[NOMBRE] or conjuntos[DESCRIPCION]):
+                for t in trigramas(palabra):
+                    self._trigramas[t].discard(palabra)
+            if not any(conjuntos):
+                del self._postings[palabra]
+                del self._vocabulario[bisect_left(self._vocabulario, palabra)]
+
+    # --- consulta ---
+    def buscar(self, query, limite):
+        if not self._cargado:
+            with self._lock:
+                if not self._cargado:
+                    self.cargar()
+
+        tokens = normalizar(query).split()
+        if not tokens:
+            return []
+
+        with self._lock:
+            if len(tokens) == 1:
+                rapido = self._por_inicio_nombre(tokens[0], limite)
+                if rapido is not None:
+                    return rapido
+
+            # Primero sólo nombre y código; la descripción y la búsqueda aproximada
+            # quedan siempre por debajo, así que sólo se consultan si faltan resultados
+            resultado = self._buscar(tokens, limite, completo=False)
+            if len(resultado) < limite:
+                resultado = self._buscar(tokens, limite, completo=True)
+            return resultado
+
+    def _buscar(self, tokens, limite, completo):
+        niveles_por_token = []
+        primeras = None
+        for token in tokens:
+            por_peso, primeras_token = self._por_prefijo(token, completo)
+            if completo and len(token) >= 3 and sum(len(ids) for ids in por_peso.values()) < limite:
+                for peso, ids in self._por_trigramas(token).items():
+                    por_peso[peso] |= ids
+            niveles_por_token.append(self._mejor_peso(por_peso))
+            if primeras is None:
+                primeras = primeras_token
+
+        # Bonificación si el nombre empieza con lo buscado
+        if len(tokens) == 1:
+            grupos = []
+            for peso, ids in niveles_por_token[0]:
+                grupos.append((peso + PESOS[PRIMERA], ids & primeras))
+                grupos.append((peso, ids - primeras))
+        else:
+            grupos = self._combinar(niveles_por_token, primeras)
+
+        return self._mejores(grupos, limite)
+
+    def _por_inicio_nombre(self, token, limite):
+        """
+        Atajo para el tipeo incremental de una sola palabra: si hay al menos `limite`
+        nombres que empiezan con `token`, esos ganan a cualquier otra coincidencia
+        (salvo un código exacto) y ya están contiguos en orden alfabético.
+        """
+        inicio = bisect_left(self._orden, (token,))
+        fin = bisect_left(self._orden, (token + '\uffff',), inicio)
+        if fin - inicio < limite:
+            return None
+        conjuntos = self._postings.get(token)
+        codigos = set(conjuntos[CODIGO]) if conjuntos else set()
+        nombres = (pid for _, pid in self._orden[inicio:fin] if pid not in codigos)
+        resultado = sorted(codigos, key=self._nombres.__getitem__)
+        return (resultado + list(itertools.islice(nombres, limite)))[:limite]
+
+    def _por_prefijo(self, token, completo):
+        """Productos por peso para las palabras que empiezan con `token`"""
+        inicio = bisect_left(self._vocabulario, token)
+        fin = bisect_left(self._vocabulario, token + '\uffff', inicio)
+        # Palabra completa vale más que un prefijo
+        palabras = [(p, 2 if p == token else 1) for p in self._vocabulario[inicio:fin]]
+        campos = (CODIGO, NOMBRE, DESCRIPCION) if completo and len(token) >= 3 else (CODIGO, NOMBRE)
+        return self._agrupar(palabras, campos)
+
+    def _por_trigramas(self, token):
+        """Coincidencia aproximada (errores de tipeo) contra las palabras del vocabulario"""
+        buscados = trigramas(token)
+        conteo = defaultdict(int)
+        for t in buscados:
+            for palabra in self._trigramas.get(t, ()):
+                conteo[palabra] += 1
+        palabras = []
+        for palabra, comunes in conteo.items():
+            similitud = comunes / (len(buscados) + len(trigramas(palabra)) - comunes)
+            if similitud >= 0.4:
+                palabras.append((palabra, round(similitud / 2, 2)))
+        return self._agrupar(palabras, (NOMBRE,))[0]
+
+    def _agrupar(self, palabras, campos):
+        """{peso: ids} para cada (palabra, factor), más los ids cuyo nombre empieza con esas palabras"""
+        por_peso = defaultdict(set)
+        primeras = set()
+        for palabra, factor in palabras:
+            conjuntos = self._postings[palabra]
+            for campo in campos:
+                if conjuntos[campo]:
+                    por_peso[PESOS[campo] * factor] |= conjuntos[campo]
+            primeras |= conjuntos[PRIMERA]
+        return por_peso, primeras
+
+    @staticmethod
+    def _mejor_peso(por_peso):
+        """[(peso, ids)] de mayor a menor, dejando cada producto sólo en su mejor peso"""
+        niveles, vistos = [], set()
+        for peso in sorted(por_peso, reverse=True):
+            ids = por_peso[peso] - vistos
+            if ids:
+                niveles.append((peso, ids))
+                vistos |= ids
+        return niveles
+
+    @staticmethod
+    def _combinar(niveles_por_token, primeras):
+        """Suma los pesos de cada palabra; todas las palabras de la búsqueda deben coincidir"""
+        puntajes = None
+        for niveles in niveles_por_token:
+            propios = {}
+            for peso, ids in niveles:
+                propios.update(dict.fromkeys(ids, peso))
+            if puntajes is None:
+                puntajes = propios
+            else:
+                puntajes = {pid: puntajes[pid] + propios[pid] for pid in puntajes.keys() & propios.keys()}
+            if not puntajes:
+                return []
+        for producto_id in primeras & puntajes.keys():
+            puntajes[producto_id] += PESOS[PRIMERA]
+
+        grupos = defaultdict(set)
+        for producto_id, puntaje in puntajes.items():
+            grupos[puntaje].add(producto_id)
+        return list(grupos.items())
+
+    def _mejores(self, grupos, limite):
+        """Los `limite` mejores por puntaje y luego por nombre, ordenando sólo los grupos necesarios"""
+        nombre = self._nombres.__getitem__
+        resultado = []
+        for _, ids in sorted(grupos, key=lambda grupo: grupo[0], reverse=True):
+            faltan = limite - len(resultado)
+            if len(ids) * 8 > len(self._orden):
+                # Grupo que cubre buena parte del catálogo: recorrer el orden alfabético termina antes
+                resultado += itertools.islice((pid for _, pid in self._orden if pid in ids), faltan)
+            else:
+                resultado += heapq.nsmallest(faltan, ids, key=nombre)
+            if len(resultado) >= limite:
+                break
+        return resultado
+
+
+class BusquedaPostgres:
+    """Similitud de trigramas (pg_trgm) sobre nombre y descripción sin tildes"""
+
+    SQL = """
+        SELECT p.id,
+               GREATEST(
+                   2 * word_similarity(%(q)s, tienda_unaccent(lower(p.nombre))),
+                   word_similarity(%(q)s, tienda_unaccent(lower(p.descripcion))),
+                   CASE WHEN lower(p.codigo_barras) = %(codigo)s THEN 10
+                        WHEN lower(p.codigo_barras) LIKE %(prefijo)s THEN 5
+                        ELSE 0 END,
+                   CASE WHEN tienda_unaccent(lower(p.nombre)) LIKE %(prefijo_q)s THEN 3 ELSE 0 END
+               ) AS puntaje
+        FROM {tabla} p
+        WHERE %(q)s <%% tienda_unaccent(lower(p.nombre))
+           OR %(q)s <%% tienda_unaccent(lower(p.descripcion))
+           OR tienda_unaccent(lower(p.nombre)) LIKE %(prefijo_q)s
+           OR lower(p.codigo_barras) LIKE %(prefijo)s
+        ORDER BY puntaje DESC, p.nombre
+        LIMIT %(limite)s
+    """
+
+    def buscar(self, query, limite):
+        q = normalizar(query).strip()
+        if not q:
+            return []
+        codigo = query.strip().lower()
+        sql = self.SQL.format(tabla=connection.ops.quote_name(Producto._meta.db_table))
+        with connection.cursor() as cursor:
+            cursor.execute(sql, {
+                'q': q,
+                'codigo': codigo,
+                'prefijo': codigo.replace('%', r'\%').replace('_', r'\_') + '%',
+                'prefijo_q': q.replace('%', r'\%').replace('_', r'\_') + '%',
+                'limite': limite,
+            })
+            return [fila[0] for fila in cursor.fetchall()]
+
+    def actualizar(self, producto):
+        pass  # los índices GIN se mantienen solos
+
+    def actualizar_varios(self, ids):
+        pass
+
+    def quitar(self, producto_id):
+        pass
+
+
+_backends = {'memoria': IndiceMemoria, 'postgres': BusquedaPostgres}
+_backend = None
+
+
+def backend():
+    global _backend
+    if _backend is None:
+        _backend = _backends[getattr(settings, 'BUSQUEDA_PRODUCTOS_BACKEND', 'memoria')]()
+    return _backend
+
+
+def buscar_productos(query, limite=None):
+    """Devuelve los productos que coinciden con `query`, ordenados por relevancia"""
+    limite = limite or getattr(settings, 'BUSQUEDA_PRODUCTOS_LIMITE', 50)
+    ids = backend().buscar(query, limite)
+    productos = Producto.objects.in_bulk(ids)
+    return [productos[pk] for pk in ids if pk in productos]
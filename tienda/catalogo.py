@@ -0,0 +1,57 @@
+"""
+Sincronización incremental del catálogo de productos para los terminales del POS.
+
+Cada Producto.save() que cambia un campo del catálogo (CAMPOS) toma la
+siguiente versión de ContadorCatalogo y la guarda en Producto.version; los
+cambios de stock no la tocan. Cada borrado deja un ProductoEliminado con su
+versión. Un terminal que tiene el catálogo hasta la versión V pide sólo lo
+que cambió después:
+
+    GET ventas/pos/catalogo/?desde=V
+
+    {"v": 128, "completo": false,
+     "campos": ["id", "codigo_barras", "nombre", "precio"],
+     "productos": [[7, "7791234", "Croquetas 3 kg", "12.50"], ...],
+     "eliminados": [31, 40]}
+
+Sin `desde` (o con 0) se envía el catálogo completo. El stock no viaja: cambia
+con cada venta y el checkout lo valida en el servidor.
+"""
+from .models import CAMPOS_CATALOGO, ContadorCatalogo, Producto, ProductoEliminado, reservar_version
+
+CAMPOS = ('id', *CAMPOS_CATALOGO)
+
+
+def version_actual():
+    return ContadorCatalogo.objects.filter(pk=1).values_list('ultima_version', flat=True).first() or 0
+
+
+def registrar_eliminado(producto_id):
+    """Llamar dentro de la transacción del borrado (post_delete)"""
+    ProductoEliminado.objects.update_or_create(
+        producto_id=producto_id, defaults={'version': reservar_version()},
+    )
+
+
+def cambios(desde, version=None):
+    """
+    Diccionario con los productos cambiados y los ids eliminados después de
+    `desde`. La versión se lee antes que los cambios: lo que se confirme en el
+    medio llega ahora y otra vez en la próxima sincronización, nunca se pierde.
+    """
+    version = version_actual() if version is None else version
+    completo = not desde
+    productos = Producto.objects.all() if completo else Producto.objects.filter(version__gt=desde)
+    eliminados = [] if completo else list(
+        ProductoEliminado.objects.filter(version__gt=desde).values_list('producto_id', flat=True)
+    )
+    return {
+        'v': version,
+        'completo': completo,
+        'campos': CAMPOS,
+        'productos': [
+            [pk, codigo, nombre, str(precio)]
+            for pk, codigo, nombre, precio in productos.order_by('id').values_list(*CAMPOS)
+        ],
+        'eliminados': eliminados,
+    }
@@ -0,0 +1,185 @@
+"""
+Caché de códigos de barras para el escáner del POS.
+
+Dos niveles:
+
+- LRU por proceso (settings.CODIGOS_CACHE_TAMANO entradas). Las entradas
+  caducan a los settings.CODIGOS_CACHE_TTL_LOCAL segundos para que un worker
+  no arrastre datos que otro worker ya invalidó.
+- Opcional, compartido entre workers: el alias de settings.CACHES indicado en
+  settings.CODIGOS_CACHE_COMPARTIDO (None lo desactiva).
+
+Las señales de Producto invalidan el código actual y el anterior al guardar o
+eliminar. También se guardan los códigos inexistentes, para que un código mal
+leído repetido no vuelva a consultar la base.
+
+El precio que se devuelve es sólo para mostrar: registrar_venta() vuelve a
+leer precio y stock bajo bloqueo al cobrar.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+
+from .models import Producto
+
+PREFIJO = 'pos:codigo:'
+NO_EXISTE = {}  # marcador de código sin producto
+MAX_LOTE = 200
+
+
+class LRU:
+    """Diccionario acotado con expiración, seguro entre hilos"""
+
+    def __init__(self, tamano, ttl):
+        self.tamano = tamano
+        self.ttl = ttl
+        self._datos = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, clave):
+        with self._lock:
+            item = self._datos.get(clave)
+            if item is None:
+                return None
+            valor, vence = item
+            if vence < time.monotonic():
+                del self._datos[clave]
+                return None
+            self._datos.move_to_end(clave)
+            return valor
+
+    def set(self, clave, valor):
+        with self._lock:
+            self._datos[clave] = (valor, time.monotonic() + self.ttl)
+            self._datos.move_to_end(clave)
+            while len(self._datos) > self.tamano:
+                self._datos.popitem(last=False)
+
+    def delete(self, clave):
+        with self._lock:
+            self._datos.pop(clave, None)
+
+    def clear(self):
+        with self._lock:
+            self._datos.clear()
+
+
+local = LRU(
+    getattr(settings, 'CODIGOS_CACHE_TAMANO', 4096),
+    getattr(settings, 'CODIGOS_CACHE_TTL_LOCAL', 60),
+)
+
+
+def _compartido():
+    alias = getattr(settings, 'CODIGOS_CACHE_COMPARTIDO', None)
+    return caches[alias] if alias else None
+
+
+def _entrada(producto):
+    # El precio va como texto para no perder decimales en cachés que serializan a JSON
+    return {'id': producto['id'], 'nombre': producto['nombre'], 'precio': str(producto['precio'])}
+
+
+def limpiar_codigo(codigo):
+    return (codigo or '').strip()
+
+
+def _ttl_compartido():
+    return getattr(settings, 'CODIGOS_CACHE_TTL_COMPARTIDO', 3600)
+
+
+def _desde_local(codigos):
+    """(códigos limpios sin repetir, {codigo: valor} hallados en el LRU, códigos que faltan)"""
+    codigos = list(dict.fromkeys(c for c in map(limpiar_codigo, codigos) if c))
+    encontrados = {}
+    faltan = []
+    for codigo in codigos:
+        valor = local.get(codigo)
+        if valor is None:
+            faltan.append(codigo)
+        else:
+            encontrados[codigo] = valor
+    return codigos, encontrados, faltan
+
+
+def _desde_compartido(faltan, desde_compartido, encontrados):
+    for codigo in faltan:
+        valor = desde_compartido.get(PREFIJO + codigo)
+        if valor is not None:
+            encontrados[codigo] = valor
+            local.set(codigo, valor)
+    return [c for c in faltan if c not in encontrados]
+
+
+def _consulta(faltan):
+    return Producto.objects.filter(codigo_barras__in=faltan).values('id', 'nombre', 'precio', 'codigo_barras')
+
+
+def _desde_filas(faltan, filas):
+    nuevos = {fila['codigo_barras']: _entrada(fila) for fila in filas}
+    for codigo in faltan:
+        nuevos.setdefault(codigo, NO_EXISTE)
+    for codigo, valor in nuevos.items():
+        local.set(codigo, valor)
+    return nuevos
+
+
+def buscar_codigos(codigos):
+    """
+    Resuelve varios códigos a la vez: {codigo: {'id', 'nombre', 'precio'} o None}.
+    Lo que no esté en caché se busca con una sola consulta.
+    """
+    codigos, encontrados, faltan = _desde_local(codigos)
+
+    compartido = _compartido()
+    if faltan and compartido is not None:
+        faltan = _desde_compartido(faltan, compartido.get_many([PREFIJO + c for c in faltan]), encontrados)
+
+    if faltan:
+        nuevos = _desde_filas(faltan, _consulta(faltan))
+        if compartido is not None:
+            compartido.set_many({PREFIJO + c: v for c, v in nuevos.items()}, _ttl_compartido())
+        encontrados.update(nuevos)
+
+    return {codigo: (encontrados[codigo] or None) for codigo in codigos}
+
+
+async def abuscar_codigos(codigos):
+    """buscar_codigos() para vistas async: caché compartida y consulta con las API async"""
+    codigos, encontrados, faltan = _desde_local(codigos)
+
+    compartido = _compartido()
+    if faltan and compartido is not None:
+        faltan = _desde_compartido(faltan, await compartido.aget_many([PREFIJO + c for c in faltan]), encontrados)
+
+    if faltan:
+        nuevos = _desde_filas(faltan, [fila async for fila in _consulta(faltan)])
+        if compartido is not None:
+            await compartido.aset_many({PREFIJO + c: v for c, v in nuevos.items()}, _ttl_compartido())
+        encontrados.update(nuevos)
+
+    return {codigo: (encontrados[codigo] or None) for codigo in codigos}
+
+
+def buscar_codigo(codigo):
+    codigo = limpiar_codigo(codigo)
+    return buscar_codigos([codigo]).get(codigo) if codigo else None
+
+
+async def abuscar_codigo(codigo):
+    codigo = limpiar_codigo(codigo)
+    return (await abuscar_codigos([codigo])).get(codigo) if codigo else None
+
+
+def invalidar(*codigos):
+    codigos = [c for c in map(limpiar_codigo, codigos) if c]
+    if not codigos:
+        return
+    for codigo in codigos:
+        local.delete(codigo)
+    compartido = _compartido()
+    if compartido is not None:
+        compartido.delete_many([PREFIJO + c for c in codigos])
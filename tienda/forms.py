@@ -2,6 +2,8 @@ from django import forms
 from .models import Producto, Cliente, Venta, VentaItem, Vendedor
 from django.contrib.auth.forms import UserCreationForm
 
+from . import importacion
+
 
 class ProductoForm(forms.ModelForm):
     class Meta:
@@ -16,6 +18,21 @@ class ProductoForm(forms.ModelForm):
             'imagen': forms.ClearableFileInput(attrs={'class': 'form-control form-control-sm'}),
         }
 
+class ImportarProductosForm(forms.Form):
+    archivo = forms.FileField(
+        label="Archivo CSV o XLSX",
+        help_text="Encabezado: codigo_barras, nombre, precio y, opcionales, stock y descripcion. "
+                  "Los productos con un código existente se actualizan.",
+    )
+
+    def clean_archivo(self):
+        archivo = self.cleaned_data['archivo']
+        try:
+            importacion.formato(archivo.name)
+        except importacion.ImportacionError as e:
+            raise forms.ValidationError(e.mensaje)
+        return archivo
+
 class ClienteForm(forms.ModelForm):
     class Meta:
         model = Cliente
@@ -0,0 +1,187 @@
+"""
+Miniaturas en WebP y JPEG de las imágenes subidas.
+
+De cada imagen (ver CAMPOS) se generan varios anchos en WebP y JPEG y se
+guardan en MEDIA_ROOT/derivados/<clave>/<ancho>.<ext>. La clave es un hash del
+contenido del original, de los anchos y de VERSION: si la imagen cambia, cambia
+el nombre, así que el servidor web puede servir derivados/ con caché
+permanente (Cache-Control: max-age=31536000, immutable). Las imágenes no se
+agrandan: los anchos mayores que el original se reemplazan por el del
+original, que va al final de la clave (w<ancho>) para que el srcset anuncie
+sólo los anchos que existen.
+
+La clave se guarda en el campo <campo>_clave del modelo; mientras esté vacía
+las plantillas muestran el original. Nada se genera dentro de la petición:
+las señales encolan la imagen nueva en un hilo aparte al confirmar la
+transacción y el comando `imagenes_derivadas` procesa las ya existentes con
+un pool de procesos.
+
+generar() no toca Django ni la base de datos, para poder ejecutarse en los
+procesos hijos del comando.
+"""
+import hashlib
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection
+from django.utils.html import format_html
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+# Súbela al cambiar cómo se generan: todas las claves cambian
+VERSION = 2
+CARPETA = 'derivados'
+
+# Modelo -> campo de imagen; la clave de los derivados va en '<campo>_clave'
+CAMPOS = {
+    'tienda.Producto': 'imagen',
+    'tienda.Vendedor': 'foto_perfil',
+    'tienda.Venta': 'comprobante_pago',
+}
+
+# (extensión, formato de Pillow)
+FORMATOS = (('webp', 'WEBP'), ('jpg', 'JPEG'))
+
+
+def anchos():
+    return tuple(getattr(settings, 'IMAGENES_ANCHOS', (160, 320, 640)))
+
+
+def calidad():
+    return getattr(settings, 'IMAGENES_CALIDAD', 80)
+
+
+def campo_clave(campo):
+    return f'{campo}_clave'
+
+
+def ruta(clave, ancho, extension):
+    return f'{CARPETA}/{clave}/{ancho}.{extension}'
+
+
+def anchos_generados(clave, lista_anchos=None):
+    """Anchos que existen para `clave`: los configurados, sin pasar el ancho del original"""
+    lista_anchos = lista_anchos or anchos()
+    _, _, tope = clave.partition('w')
+    if not tope.isdigit():
+        return tuple(lista_anchos)   # clave anterior a VERSION 2, sin el tope
+    return tuple(sorted({min(ancho, int(tope)) for ancho in lista_anchos}))
+
+
+def calcular_clave(contenido, lista_anchos):
+    resumen = hashlib.sha256(f'{VERSION}:{",".join(map(str, lista_anchos))}:'.encode())
+    resumen.update(contenido)
+    return resumen.hexdigest()[:20]
+
+
+def _sin_transparencia(imagen):
+    """JPEG no admite canal alfa: se compone sobre fondo blanco"""
+    if imagen.mode != 'RGBA':
+        return imagen
+    fondo = Image.new('RGB', imagen.size, (255, 255, 255))
+    fondo.paste(imagen, mask=imagen.getchannel('A'))
+    return fondo
+
+
+def generar(contenido, lista_anchos, calidad_jpeg=80):
+    """
+    Devuelve (clave, {ruta: bytes}) con cada ancho en cada formato.
+    Las imágenes más angostas que un ancho no se agrandan: ese ancho se
+    genera una sola vez, con el ancho del original.
+    """
+    with Image.open(BytesIO(contenido)) as original:
+        original = ImageOps.exif_transpose(original)
+        if original.mode not in ('RGB', 'RGBA'):
+            transparente = original.mode in ('LA', 'PA') or 'transparency' in original.info
+            original = original.convert('RGBA' if transparente else 'RGB')
+        clave = f'{calcular_clave(contenido, lista_anchos)}w{min(original.width, max(lista_anchos))}'
+
+        archivos = {}
+        for ancho in anchos_generados(clave, lista_anchos):
+            imagen = original
+            if original.width > ancho:
+                alto = max(1, round(original.height * ancho / original.width))
+                imagen = original.resize((ancho, alto), Image.LANCZOS)
+            for extension, formato in FORMATOS:
+                buffer = BytesIO()
+                if formato == 'JPEG':
+                    _sin_transparencia(imagen).save(buffer, formato, quality=calidad_jpeg, optimize=True, progressive=True)
+                else:
+                    imagen.save(buffer, formato, quality=calidad_jpeg, method=4)
+                archivos[ruta(clave, ancho, extension)] = buffer.getvalue()
+    return clave, archivos
+
+
+def guardar(archivos):
+    """Guarda los derivados que falten (el nombre depende del contenido: si existe, es igual)"""
+    for nombre, datos in archivos.items():
+        if not default_storage.exists(nombre):
+            default_storage.save(nombre, ContentFile(datos))
+
+
+def asignar_clave(modelo, pk, campo, nombre, clave):
+    """Guarda la clave sólo si la imagen no cambió mientras se generaban los derivados"""
+    return modelo.objects.filter(pk=pk, **{campo: nombre}).update(**{campo_clave(campo): clave})
+
+
+def procesar(modelo, pk, campo, nombre):
+    with default_storage.open(nombre, 'rb') as archivo:
+        contenido = archivo.read()
+    clave, archivos = generar(contenido, anchos(), calidad())
+    guardar(archivos)
+    asignar_clave(modelo, pk, campo, nombre, clave)
+    return clave
+
+
+_ejecutor = None
+_ejecutor_lock = threading.Lock()
+
+
+def _procesar_en_hilo(etiqueta, pk, campo, nombre):
+    try:
+        procesar(apps.get_model(etiqueta), pk, campo, nombre)
+    except Exception:
+        logger.exception('No se pudieron generar los derivados de %s (%s %s)', nombre, etiqueta, pk)
+    finally:
+        # La conexión es de este hilo; no la dejamos abierta
+        connection.close()
+
+
+def encolar(instancia, campo):
+    """Genera los derivados en un hilo aparte (llamar dentro de transaction.on_commit)"""
+    global _ejecutor
+    with _ejecutor_lock:
+        if _ejecutor is None:
+            _ejecutor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='imagenes')
+    etiqueta = instancia._meta.label
+    _ejecutor.submit(_procesar_en_hilo, etiqueta, instancia.pk, campo, getattr(instancia, campo).name)
+
+
+# ----------------------------
+# HTML
+# ----------------------------
+def _srcset(clave, extension):
+    return ', '.join(f'{default_storage.url(ruta(clave, ancho, extension))} {ancho}w' for ancho in anchos_generados(clave))
+
+
+def etiqueta_img(archivo, clave, alt='', sizes='100vw', clase='', estilo=''):
+    """<picture> con WebP y JPEG en varios anchos; sin clave, <img> del original"""
+    if not clave:
+        return format_html(
+            '<img src="{}" alt="{}" class="{}" style="{}" loading="lazy" decoding="async">',
+            archivo.url, alt, clase, estilo,
+        )
+    lista_anchos = anchos_generados(clave)
+    respaldo = default_storage.url(ruta(clave, lista_anchos[len(lista_anchos) // 2], 'jpg'))
+    return format_html(
+        '<picture><source type="image/webp" srcset="{}" sizes="{}">'
+        '<img src="{}" srcset="{}" sizes="{}" alt="{}" class="{}" style="{}" loading="lazy" decoding="async"></picture>',
+        _srcset(clave, 'webp'), sizes, respaldo, _srcset(clave, 'jpg'), sizes, alt, clase, estilo,
+    )
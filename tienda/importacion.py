@@ -0,0 +1,408 @@
+"""
+Importación masiva de productos (catálogos de proveedores) desde CSV o XLSX.
+
+El archivo se lee en streaming y se procesa en lotes de TAMANO_LOTE filas:
+cada lote se valida fila por fila y las filas válidas se guardan con un único
+INSERT ... ON CONFLICT (codigo_barras) DO UPDATE, en su propia transacción.
+En PostgreSQL las filas llegan con COPY a una tabla temporal y el INSERT las
+toma de ahí (armar un INSERT de miles de filas con el ORM cuesta más que
+escribirlas); en otros motores, bulk_create con update_conflicts. Una fila
+inválida no detiene la importación: queda en Resultado.errores con su número
+de fila del archivo.
+
+Columnas (la primera fila es el encabezado; mayúsculas y tildes no importan):
+codigo_barras, nombre y precio son obligatorias; stock y descripcion son
+opcionales. Un producto que ya existe sólo cambia en las columnas presentes
+en el archivo: sin columna stock, conserva su stock.
+
+Como el upsert no pasa por Producto.save() ni por las señales, se hace lo
+mismo a mano: cada fila toma su versión del catálogo (reservada en bloque,
+dentro de la transacción del lote) y, al confirmar, se invalida la caché de
+códigos, se actualiza el índice de búsqueda y se sube la versión 'productos'
+del tablero.
+
+El CSV puede venir en UTF-8 o en cp1252 (lo que guarda Excel en Windows en
+español): si el comienzo del archivo no es UTF-8 válido se lee como cp1252.
+Un byte que no se puede decodificar más adelante invalida sólo su fila, y si
+el archivo se corta o está dañado a mitad de camino, la lectura termina ahí
+con un error en esa fila: los lotes anteriores ya quedaron guardados (y con
+sus cachés al día, que se actualizan al confirmar cada lote).
+
+El XLSX se lee sin librerías, como lo escribe exportacion.py: el ZIP se abre
+y la primera hoja se recorre con iterparse, liberando cada fila leída.
+"""
+import codecs
+import csv
+import io
+import itertools
+import posixpath
+import re
+import zipfile
+import zlib
+from decimal import Decimal, InvalidOperation
+from functools import partial
+from xml.etree.ElementTree import ParseError, iterparse
+
+from django.db import DatabaseError, connection, transaction
+
+from . import busqueda, codigos, tablero
+from .models import Producto, reservar_version
+
+TAMANO_LOTE = 2000
+FORMATOS = ('csv', 'xlsx')
+# Bytes del comienzo del CSV con los que se decide la codificación
+MUESTRA_CODIFICACION = 64 * 1024
+# Lo que puede fallar al leer un archivo dañado (decodificación, csv, ZIP o XML del XLSX)
+ERRORES_LECTURA = (ValueError, csv.Error, ParseError, zipfile.BadZipFile, zlib.error, EOFError, IndexError, KeyError)
+
+OBLIGATORIAS = ('codigo_barras', 'nombre', 'precio')
+OPCIONALES = ('stock', 'descripcion')
+SINONIMOS = {
+    'codigo': 'codigo_barras', 'codigo_de_barras': 'codigo_barras', 'ean': 'codigo_barras',
+    'producto': 'nombre', 'precio_unitario': 'precio', 'cantidad': 'stock',
+}
+
+
+class ImportacionError(Exception):
+    """El archivo no se puede importar (formato o encabezado inválidos), o se cortó en la fila `fila`"""
+
+    def __init__(self, mensaje, fila=None):
+        super().__init__(mensaje)
+        self.mensaje = mensaje
+        self.fila = fila
+
+
+class Resultado:
+    def __init__(self):
+        self.filas = 0
+        self.creados = 0
+        self.actualizados = 0
+        self.errores = []        # [(número de fila, mensaje)]
+
+    def __str__(self):
+        return (f"{self.filas} filas: {self.creados} productos creados, {self.actualizados} actualizados, "
+                f"{len(self.errores)} con errores")
+
+
+# ----------------------------
+# Lectura
+# ----------------------------
+def formato(nombre):
+    extension = posixpath.splitext(nombre or '')[1].lower().lstrip('.')
+    if extension not in FORMATOS:
+        raise ImportacionError("El archivo debe ser .csv o .xlsx")
+    return extension
+
+
+def _codificacion(muestra):
+    try:
+        codecs.getincrementaldecoder('utf-8')().decode(muestra, final=False)
+    except UnicodeDecodeError:
+        return 'cp1252'
+    return 'utf-8-sig'
+
+
+def _filas_csv(archivo):
+    codificacion = _codificacion(archivo.read(MUESTRA_CODIFICACION))
+    archivo.seek(0)
+    # Lo que no se puede decodificar queda como U+FFFD y validar() rechaza esa fila
+    texto = io.TextIOWrapper(archivo, encoding=codificacion, errors='replace', newline='')
+    primera = texto.readline()
+    # Excel en español separa con ';'
+    separador = ';' if primera.count(';') > primera.count(',') else ','
+    return csv.reader(itertools.chain([primera], texto), delimiter=separador)
+
+
+_NS = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+_NS_REL = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}'
+_REF = re.compile(r'([A-Z]+)')
+
+
+def _indice_columna(ref):
+    indice = 0
+    for letra in _REF.match(ref).group(1):
+        indice = indice * 26 + ord(letra) - 64
+    return indice - 1
+
+
+def _texto(elemento):
+    return ''.join(t.text or '' for t in elemento.iter(f'{_NS}t'))
+
+
+def _primera_hoja(libro):
+    """Ruta dentro del ZIP de la primera hoja del libro"""
+    hoja = None
+    with libro.open('xl/workbook.xml') as workbook:
+        for _, elemento in iterparse(workbook):
+            if elemento.tag == f'{_NS}sheet':
+                hoja = elemento.get(f'{_NS_REL}id')
+                break
+    with libro.open('xl/_rels/workbook.xml.rels') as rels:
+        for _, elemento in iterparse(rels):
+            if elemento.get('Id') == hoja:
+                destino = elemento.get('Target')
+                return destino.lstrip('/') if destino.startswith('/') else posixpath.join('xl', destino)
+    raise ImportacionError("El libro no tiene hojas")
+
+
+def _filas_xlsx(archivo):
+    try:
+        libro = zipfile.ZipFile(archivo)
+        compartidos = []
+        if 'xl/sharedStrings.xml' in libro.namelist():
+            with libro.open('xl/sharedStrings.xml') as xml:
+                for _, elemento in iterparse(xml):
+                    if elemento.tag == f'{_NS}si':
+                        compartidos.append(_texto(elemento))
+                        elemento.clear()
+        hoja = _primera_hoja(libro)
+    except (zipfile.BadZipFile, KeyError):
+        raise ImportacionError("El archivo no es un XLSX válido")
+
+    with libro.open(hoja) as xml:
+        numero = 0
+        for _, elemento in iterparse(xml):
+            if elemento.tag != f'{_NS}row':
+                continue
+            # Excel no guarda las filas vacías: se devuelven igual para no correr la numeración
+            siguiente = int(elemento.get('r') or numero + 1)
+            for _ in range(numero + 1, siguiente):
+                yield []
+            numero = siguiente
+            fila = []
+            for celda in elemento.iter(f'{_NS}c'):
+                tipo = celda.get('t')
+                if tipo == 'inlineStr':
+                    valor = _texto(celda)
+                else:
+                    v = celda.find(f'{_NS}v')
+                    valor = v.text if v is not None else None
+                    if tipo == 's' and valor is not None:
+                        valor = compartidos[int(valor)]
+                ref = celda.get('r')
+                if ref:
+                    fila.extend([None] * (_indice_columna(ref) - len(fila)))
+                fila.append(valor)
+            elemento.clear()
+            yield fila
+
+
+def leer_filas(archivo, nombre):
+    """(columnas normalizadas, iterador de (número de fila, {columna: valor}))"""
+    filas = _filas_xlsx(archivo) if formato(nombre) == 'xlsx' else _filas_csv(archivo)
+    try:
+        encabezado = next(iter(filas))
+    except StopIteration:
+        raise ImportacionError("El archivo está vacío")
+    except ERRORES_LECTURA as e:
+        raise ImportacionError(f"No se pudo leer el archivo: {e}")
+    columnas = []
+    for titulo in encabezado:
+        clave = re.sub(r'\W+', '_', busqueda.normalizar(titulo or '').strip()).strip('_')
+        columnas.append(SINONIMOS.get(clave, clave))
+    faltan = [c for c in OBLIGATORIAS if c not in columnas]
+    if faltan:
+        raise ImportacionError(f"Faltan columnas obligatorias: {', '.join(faltan)}")
+
+    def registros():
+        numero = 1
+        try:
+            for numero, fila in enumerate(filas, start=2):
+                if any(v not in (None, '') for v in fila):
+                    # Las celdas vacías del final de la fila no vienen en el archivo
+                    fila = itertools.chain(fila, itertools.repeat(None))
+                    yield numero, {c: v for c, v in zip(columnas, fila) if c in OBLIGATORIAS + OPCIONALES}
+        except ERRORES_LECTURA as e:
+            raise ImportacionError(f"no se pudo seguir leyendo el archivo desde esta fila: {e}", fila=numero + 1)
+    return [c for c in OBLIGATORIAS + OPCIONALES if c in columnas], registros()
+
+
+# ----------------------------
+# Validación
+# ----------------------------
+def _decimal(valor):
+    texto = str(valor).strip().replace(' ', '')
+    if ',' in texto:
+        # 1.234,50 o 12,50 (coma decimal) / 1,234.50 (coma de miles)
+        texto = texto.replace('.', '').replace(',', '.') if texto.rfind(',') > texto.rfind('.') else texto.replace(',', '')
+    return Decimal(texto)
+
+
+def _codigo(valor):
+    texto = str(valor).strip()
+    # Excel guarda los códigos numéricos como número: 7791234567890 puede llegar como 7.79123456789E+12
+    if re.fullmatch(r'\d+\.0+|\d(\.\d+)?E\+\d+', texto, re.IGNORECASE):
+        texto = str(int(Decimal(texto)))
+    return texto
+
+
+def validar(registro):
+    """Dict con los campos del producto, o ValueError con el motivo"""
+    if any('\ufffd' in v for v in registro.values() if isinstance(v, str)):
+        raise ValueError("tiene caracteres que no se pudieron leer: guardar el CSV como UTF-8")
+    codigo = _codigo(registro.get('codigo_barras') or '')
+    if not codigo:
+        raise ValueError("falta el código de barras")
+    if len(codigo) > 50:
+        raise ValueError("el código de barras tiene más de 50 caracteres")
+    nombre = str(registro.get('nombre') or '').strip()
+    if not nombre:
+        raise ValueError("falta el nombre")
+    if len(nombre) > 100:
+        raise ValueError("el nombre tiene más de 100 caracteres")
+    try:
+        precio = _decimal(registro.get('precio') or '')
+    except InvalidOperation:
+        raise ValueError(f"precio inválido: {registro.get('precio')!r}")
+    if not precio.is_finite() or precio < 0 or precio != precio.quantize(Decimal('0.01')) or precio >= 10 ** 8:
+        raise ValueError(f"precio inválido: {registro.get('precio')!r}")
+    campos = {'codigo_barras': codigo, 'nombre': nombre, 'precio': precio.quantize(Decimal('0.01'))}
+
+    if 'stock' in registro:
+        try:
+            stock = _decimal(registro['stock'] or '0')
+        except InvalidOperation:
+            raise ValueError(f"stock inválido: {registro['stock']!r}")
+        if not stock.is_finite() or stock < 0 or stock != stock.to_integral_value() or stock > 2147483647:
+            raise ValueError(f"stock inválido: {registro['stock']!r}")
+        campos['stock'] = int(stock)
+    if 'descripcion' in registro:
+        campos['descripcion'] = str(registro['descripcion'] or '').strip()
+    return campos
+
+
+# ----------------------------
+# Escritura
+# ----------------------------
+_TEMPORAL = 'importacion_productos'
+
+
+def _copiar(filas, columnas):
+    """PostgreSQL: COPY a una tabla temporal y de ahí un INSERT ... ON CONFLICT; devuelve los ids"""
+    qn = connection.ops.quote_name
+    tabla = qn(Producto._meta.db_table)
+    copiadas = [*columnas, 'version']
+    # Las columnas que no vienen en el archivo toman el valor por defecto del modelo en los productos nuevos
+    insertadas, valores, parametros = [], [], []
+    for campo in Producto._meta.concrete_fields:
+        if campo.primary_key:
+            continue
+        insertadas.append(qn(campo.column))
+        if campo.column in copiadas:
+            valores.append(qn(campo.column))
+        else:
+            valores.append('%s')
+            parametros.append(campo.get_db_prep_save(campo.get_default(), connection))
+    actualizar = ', '.join(f"{qn(c)} = EXCLUDED.{qn(c)}" for c in copiadas if c != 'codigo_barras')
+
+    with connection.cursor() as cursor:
+        cursor.execute(f"CREATE TEMP TABLE IF NOT EXISTS {_TEMPORAL} ON COMMIT DROP AS "
+                       f"SELECT * FROM {tabla} WITH NO DATA")
+        cursor.execute(f"TRUNCATE {_TEMPORAL}")
+        with cursor.copy(f"COPY {_TEMPORAL} ({', '.join(map(qn, copiadas))}) FROM STDIN") as copia:
+            for campos in filas:
+                copia.write_row([campos[c] for c in copiadas])
+        cursor.execute(
+            f"INSERT INTO {tabla} ({', '.join(insertadas)}) SELECT {', '.join(valores)} FROM {_TEMPORAL} "
+            f"ON CONFLICT (codigo_barras) DO UPDATE SET {actualizar} RETURNING id",
+            parametros,
+        )
+        return [fila[0] for fila in cursor.fetchall()]
+
+
+def _insertar(filas, columnas):
+    """Otros motores (SQLite en desarrollo): bulk_create con update_conflicts; devuelve los ids"""
+    Producto.objects.bulk_create(
+        [Producto(**campos) for campos in filas],
+        update_conflicts=True,
+        unique_fields=['codigo_barras'],
+        update_fields=[c for c in columnas if c != 'codigo_barras'] + ['version'],
+    )
+    codigos_lote = [campos['codigo_barras'] for campos in filas]
+    return list(Producto.objects.filter(codigo_barras__in=codigos_lote).values_list('id', flat=True))
+
+
+def _guardar(validos, columnas):
+    """Upsert de un lote de {número de fila: campos}; devuelve (creados, ids)"""
+    with transaction.atomic():
+        existentes = Producto.objects.filter(codigo_barras__in=[c['codigo_barras'] for c in validos.values()]).count()
+        primera = reservar_version(len(validos)) - len(validos) + 1
+        filas = [{**campos, 'version': version} for version, campos in enumerate(validos.values(), start=primera)]
+        ids = (_copiar if connection.vendor == 'postgresql' else _insertar)(filas, columnas)
+    return len(filas) - existentes, ids
+
+
+def _guardar_lote(validos, columnas, resultado):
+    try:
+        creados, ids = _guardar(validos, columnas)
+    except DatabaseError:
+        # Alguna fila que la validación dejó pasar: se guardan de a una para saber cuál
+        creados, ids = 0, []
+        for numero, campos in validos.items():
+            try:
+                creados_fila, ids_fila = _guardar({numero: campos}, columnas)
+            except DatabaseError as e:
+                resultado.errores.append((numero, f"no se pudo guardar: {e}"))
+                continue
+            creados += creados_fila
+            ids += ids_fila
+    resultado.creados += creados
+    resultado.actualizados += len(ids) - creados
+    return ids
+
+
+def _lotes(registros, tamano_lote, resultado):
+    """Lotes de registros; si la lectura se corta, el error queda en `resultado` y se termina ahí"""
+    lote = []
+    try:
+        for registro in registros:
+            lote.append(registro)
+            if len(lote) == tamano_lote:
+                yield lote
+                lote = []
+    except ImportacionError as e:
+        resultado.errores.append((e.fila, e.mensaje))
+    if lote:
+        yield lote
+
+
+def _actualizar(codigos_lote, ids):
+    codigos.invalidar(*codigos_lote)
+    busqueda.backend().actualizar_varios(ids)
+    tablero.subir('productos')
+
+
+def importar(archivo, nombre, tamano_lote=TAMANO_LOTE, progreso=None):
+    """
+    Importa los productos de `archivo` (binario; `nombre` decide CSV o XLSX)
+    y devuelve el Resultado. Cada lote se confirma por separado y, al
+    confirmarse, actualiza cachés e índice de búsqueda. `progreso`, si se
+    pasa, recibe el Resultado parcial después de cada lote.
+    """
+    columnas, registros = leer_filas(archivo, nombre)
+    resultado = Resultado()
+
+    for lote in _lotes(registros, tamano_lote, resultado):
+        validos, por_codigo = {}, {}
+        for numero, registro in lote:
+            resultado.filas += 1
+            try:
+                campos = validar(registro)
+            except ValueError as e:
+                resultado.errores.append((numero, str(e)))
+                continue
+            # Un mismo código dos veces en el lote: vale la última fila, como entre lotes
+            anterior = por_codigo.get(campos['codigo_barras'])
+            if anterior is not None:
+                del validos[anterior]
+                resultado.errores.append((anterior, f"código repetido, se usa la fila {numero}"))
+            por_codigo[campos['codigo_barras']] = numero
+            validos[numero] = campos
+        if validos:
+            ids = _guardar_lote(validos, columnas, resultado)
+            transaction.on_commit(partial(_actualizar, list(por_codigo), ids))
+        if progreso:
+            progreso(resultado)
+
+    resultado.errores.sort()
+    return resultado
@@ -0,0 +1,246 @@
+"""
+Instrumentación por petición: consultas SQL, tiempo de SQL, de plantillas y
+total, por nombre de vista, expuestos en /metrics en formato Prometheus.
+
+- instrumentacion_middleware (el primero de MIDDLEWARE) abre una Medicion
+  en una contextvar; sync_to_async la lleva a los hilos de las vistas async.
+- Cada conexión nueva recibe un execute_wrapper (señal connection_created)
+  que, si hay medición en curso, cuenta la consulta, su tiempo y su SQL.
+- El backend de plantillas DjangoTemplatesMedidas suma el tiempo de render.
+  Incluye las consultas perezosas que se ejecutan al renderizar.
+
+Patrones: una misma SQL (con sus %s) repetida INSTRUMENTACION_REPETIDAS
+veces o más en una petición es un N+1 probable; la misma SQL con los mismos
+parámetros, una consulta duplicada.
+
+Presupuestos: una petición que supera las consultas de su vista en
+presupuestos.CONSULTAS (INSTRUMENTACION_MAX_CONSULTAS si no figura) o
+INSTRUMENTACION_MAX_MS, o lo indicado para su vista en
+INSTRUMENTACION_PRESUPUESTOS, se registra en el logger 'tienda.instrumentacion'
+con sus consultas más repetidas.
+
+Las mediciones se anidan: medir() abre una fuera de las peticiones
+(benchmarks, tests) y recibe también lo que miden las peticiones de dentro.
+
+Con varios workers, PROMETHEUS_MULTIPROC_DIR debe apuntar a un directorio
+vacío al arrancar: cada proceso escribe ahí y /metrics suma todos.
+"""
+import asyncio
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import HttpResponse, HttpResponseForbidden
+from django.template.backends.django import DjangoTemplates, Template, reraise
+from django.template.exceptions import TemplateDoesNotExist
+from django.utils.crypto import constant_time_compare
+from django.utils.decorators import sync_and_async_middleware
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest
+from prometheus_client import multiprocess
+
+from . import presupuestos
+
+logger = logging.getLogger(__name__)
+
+_actual = ContextVar('medicion', default=None)
+
+SEGUNDOS = (.005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10)
+CANTIDADES = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+PETICION = Histogram('tienda_peticion_segundos', 'Duración de la petición', ['vista'], buckets=SEGUNDOS)
+SQL = Histogram('tienda_sql_segundos', 'Tiempo en SQL por petición', ['vista'], buckets=SEGUNDOS)
+PLANTILLAS = Histogram('tienda_plantillas_segundos', 'Tiempo de render de plantillas por petición', ['vista'],
+                       buckets=SEGUNDOS)
+CONSULTAS = Histogram('tienda_consultas', 'Consultas SQL por petición', ['vista'], buckets=CANTIDADES)
+REPETIDAS = Counter('tienda_consultas_repetidas', 'Consultas de SQL repetidas en la petición (N+1 probables)',
+                    ['vista'])
+DUPLICADAS = Counter('tienda_consultas_duplicadas', 'Consultas idénticas, con los mismos parámetros', ['vista'])
+FUERA_DE_PRESUPUESTO = Counter('tienda_fuera_de_presupuesto', 'Peticiones que superaron su presupuesto',
+                               ['vista', 'motivo'])
+
+
+def activa():
+    return getattr(settings, 'INSTRUMENTACION_ACTIVA', True)
+
+
+class Medicion:
+    """Lo que se acumula durante una petición (puede sumarse desde varios hilos)"""
+
+    def __init__(self, padre=None):
+        self.padre = padre
+        self.consultas = 0
+        self.sql = 0.0
+        self.plantillas = 0.0
+        self.por_sql = {}          # sql -> veces
+        self.firmas = set()        # (sql, parámetros) ya vistos
+        self.duplicadas = 0
+        self._lock = threading.Lock()
+
+    def registrar(self, sql, params, duracion):
+        firma = (sql, repr(params))
+        with self._lock:
+            self.consultas += 1
+            self.sql += duracion
+            self.por_sql[sql] = self.por_sql.get(sql, 0) + 1
+            if firma in self.firmas:
+                self.duplicadas += 1
+            else:
+                self.firmas.add(firma)
+        if self.padre is not None:
+            self.padre.registrar(sql, params, duracion)
+
+    def registrar_plantilla(self, duracion):
+        with self._lock:
+            self.plantillas += duracion
+        if self.padre is not None:
+            self.padre.registrar_plantilla(duracion)
+
+    def repetidas(self, minimo):
+        """[(veces, sql)] de las SQL ejecutadas `minimo` veces o más, de más a menos"""
+        return sorted(((n, sql) for sql, n in self.por_sql.items() if n >= minimo), reverse=True)
+
+
+def _ejecutar(execute, sql, params, many, context):
+    medicion = _actual.get()
+    if medicion is None:
+        return execute(sql, params, many, context)
+    inicio = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        medicion.registrar(sql, params, time.perf_counter() - inicio)
+
+
+@contextmanager
+def medir():
+    """Mide lo que se ejecute dentro del bloque (con INSTRUMENTACION_ACTIVA)"""
+    medicion = Medicion(padre=_actual.get())
+    token = _actual.set(medicion)
+    try:
+        yield medicion
+    finally:
+        _actual.reset(token)
+
+
+def instrumentar_conexion(connection):
+    """Receptor de connection_created; la lista de wrappers sobrevive a reconexiones"""
+    if _ejecutar not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_ejecutar)
+
+
+# ----------------------------
+# Plantillas
+# ----------------------------
+class PlantillaMedida(Template):
+    def render(self, context=None, request=None):
+        medicion = _actual.get()
+        if medicion is None:
+            return super().render(context, request)
+        inicio = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            medicion.registrar_plantilla(time.perf_counter() - inicio)
+
+
+class DjangoTemplatesMedidas(DjangoTemplates):
+    """Backend DjangoTemplates que mide el tiempo de render de la petición en curso"""
+
+    def from_string(self, template_code):
+        return PlantillaMedida(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return PlantillaMedida(self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            reraise(exc, self)
+
+
+# ----------------------------
+# Middleware
+# ----------------------------
+def _presupuesto(vista):
+    por_vista = getattr(settings, 'INSTRUMENTACION_PRESUPUESTOS', {}).get(vista, {})
+    consultas = presupuestos.CONSULTAS.get(vista, getattr(settings, 'INSTRUMENTACION_MAX_CONSULTAS', 50))
+    return (
+        por_vista.get('consultas', consultas),
+        por_vista.get('ms', getattr(settings, 'INSTRUMENTACION_MAX_MS', 1000)),
+    )
+
+
+def _terminar(request, medicion, duracion):
+    match = getattr(request, 'resolver_match', None)
+    vista = match.view_name if match else 'sin_ruta'
+    minimo = getattr(settings, 'INSTRUMENTACION_REPETIDAS', 5)
+    repetidas = medicion.repetidas(minimo)
+
+    PETICION.labels(vista).observe(duracion)
+    SQL.labels(vista).observe(medicion.sql)
+    PLANTILLAS.labels(vista).observe(medicion.plantillas)
+    CONSULTAS.labels(vista).observe(medicion.consultas)
+    if repetidas:
+        REPETIDAS.labels(vista).inc(sum(n for n, _ in repetidas))
+    if medicion.duplicadas:
+        DUPLICADAS.labels(vista).inc(medicion.duplicadas)
+
+    max_consultas, max_ms = _presupuesto(vista)
+    motivos = [m for m, excedido in (('consultas', medicion.consultas > max_consultas),
+                                     ('tiempo', duracion * 1000 > max_ms)) if excedido]
+    for motivo in motivos:
+        FUERA_DE_PRESUPUESTO.labels(vista, motivo).inc()
+    if motivos:
+        logger.warning(
+            '%s %s (%s) fuera de presupuesto: %d consultas (máx. %d), %.0f ms (máx. %d), '
+            'SQL %.0f ms, plantillas %.0f ms, %d duplicadas%s',
+            request.method, request.path, vista, medicion.consultas, max_consultas, duracion * 1000, max_ms,
+            medicion.sql * 1000, medicion.plantillas * 1000, medicion.duplicadas,
+            ''.join(f'\n  {n} x {sql[:300]}' for n, sql in repetidas[:5]),
+        )
+
+
+@sync_and_async_middleware
+def instrumentacion_middleware(get_response):
+    if not activa():
+        raise MiddlewareNotUsed
+
+    if asyncio.iscoroutinefunction(get_response):
+        async def middleware(request):
+            medicion = Medicion(padre=_actual.get())
+            token = _actual.set(medicion)
+            inicio = time.perf_counter()
+            try:
+                return await get_response(request)
+            finally:
+                _actual.reset(token)
+                _terminar(request, medicion, time.perf_counter() - inicio)
+    else:
+        def middleware(request):
+            medicion = Medicion(padre=_actual.get())
+            token = _actual.set(medicion)
+            inicio = time.perf_counter()
+            try:
+                return get_response(request)
+            finally:
+                _actual.reset(token)
+                _terminar(request, medicion, time.perf_counter() - inicio)
+    return middleware
+
+
+# ----------------------------
+# /metrics
+# ----------------------------
+def metrics(request):
+    """Métricas en formato Prometheus; con METRICAS_TOKEN exige 'Authorization: Bearer <token>'"""
+    token = getattr(settings, 'METRICAS_TOKEN', None)
+    if token and not constant_time_compare(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return HttpResponseForbidden()
+    registro = REGISTRY
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registro = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registro)
+    return HttpResponse(generate_latest(registro), content_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,208 @@
+"""
+Conteo físico de inventario por sesiones (ConteoInventario).
+
+Mientras el conteo está abierto, los escáneres envían lo contado en ráfagas
+(registrar_lecturas) y se acumula en ConteoLinea con un INSERT ... ON
+CONFLICT: no se toca Producto ni se bloquea ningún producto. La primera
+lectura de cada producto guarda su stock en ese momento (stock_sistema).
+
+cerrar() aplica todo en una transacción con una cantidad fija de consultas,
+cuenten diez productos o diez mil:
+
+- bloquea los productos con diferencia, en orden de id como el checkout,
+- un UPDATE ... FROM conteo_linea ajusta el stock de todos a la vez,
+- un INSERT ... SELECT escribe el libro de ajustes (AjusteInventario),
+- una agregación deja el resumen en el conteo.
+
+El ajuste es contado - stock_sistema y se suma al stock vigente, no lo
+reemplaza: las ventas hechas después de contar un producto no se pierden.
+Sólo se ajustan los productos contados, así que sirve también para conteos
+parciales por góndola.
+
+La merma son las diferencias negativas del libro, valorizadas al precio del
+producto al cerrar el conteo (reporte_merma).
+"""
+from django.db import connection, transaction
+from django.db.models import Count, F, Q, Sum
+from django.utils import timezone
+
+from . import codigos, tablero
+from .models import AjusteInventario, ConteoInventario, ConteoLinea, Producto
+
+MAX_LECTURAS = codigos.MAX_LOTE
+
+
+class InventarioError(Exception):
+    """Error al registrar lecturas o cerrar un conteo; lleva el status HTTP sugerido"""
+
+    def __init__(self, mensaje, status=400):
+        super().__init__(mensaje)
+        self.mensaje = mensaje
+        self.status = status
+
+
+def _abierto(conteo_id):
+    """Bloquea el conteo: una ráfaga no se cuela mientras se cierra"""
+    conteo = ConteoInventario.objects.select_for_update().filter(pk=conteo_id).first()
+    if conteo is None:
+        raise InventarioError('El conteo no existe', status=404)
+    if conteo.estado != ConteoInventario.ABIERTO:
+        raise InventarioError(f'El conteo está {conteo.estado.lower()}', status=409)
+    return conteo
+
+
+# ----------------------------
+# Lecturas de los escáneres
+# ----------------------------
+def normalizar_lecturas(lecturas):
+    """[{codigo, cantidad}, ...] o [codigo, ...] (una unidad cada uno) -> {codigo: cantidad}"""
+    if not isinstance(lecturas, list) or len(lecturas) > MAX_LECTURAS:
+        raise InventarioError(f'Máximo {MAX_LECTURAS} lecturas por petición')
+    cantidades = {}
+    for lectura in lecturas:
+        if not isinstance(lectura, dict):
+            lectura = {'codigo': lectura}
+        codigo = codigos.limpiar_codigo(str(lectura.get('codigo') or ''))
+        try:
+            cantidad = int(lectura.get('cantidad', 1))
+        except (TypeError, ValueError):
+            raise InventarioError(f'Cantidad inválida para {codigo}')
+        if not codigo:
+            raise InventarioError('Falta el código')
+        if cantidad < 0:
+            raise InventarioError(f'Cantidad inválida para {codigo}')
+        cantidades[codigo] = cantidades.get(codigo, 0) + cantidad
+    return cantidades
+
+
+def registrar_lecturas(conteo_id, lecturas, reemplazar=False):
+    """
+    Suma las lecturas al conteo (o, con `reemplazar`, las toma como el total
+    recontado de cada producto). Devuelve ({codigo: {id, nombre, contado}},
+    códigos no encontrados).
+    """
+    cantidades = normalizar_lecturas(lecturas)
+    with transaction.atomic():
+        _abierto(conteo_id)
+        productos = {
+            codigo: (pk, nombre, stock)
+            for codigo, pk, nombre, stock in Producto.objects.filter(codigo_barras__in=list(cantidades))
+                                                     .values_list('codigo_barras', 'id', 'nombre', 'stock')
+        }
+        no_encontrados = [codigo for codigo in cantidades if codigo not in productos]
+        if not productos:
+            return {}, no_encontrados
+
+        ahora = timezone.now()
+        tabla = connection.ops.quote_name(ConteoLinea._meta.db_table)
+        filas = [(conteo_id, pk, cantidades[codigo], stock, ahora) for codigo, (pk, _, stock) in productos.items()]
+        # Un recuento vuelve a tomar el stock del momento; una suma conserva el de la primera lectura
+        actualizar = ('contado = EXCLUDED.contado, stock_sistema = EXCLUDED.stock_sistema' if reemplazar
+                      else f'contado = {tabla}.contado + EXCLUDED.contado')
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {tabla} (conteo_id, producto_id, contado, stock_sistema, actualizado) "
+                f"VALUES {', '.join(['(%s, %s, %s, %s, %s)'] * len(filas))} "
+                f"ON CONFLICT (conteo_id, producto_id) DO UPDATE SET {actualizar}, actualizado = EXCLUDED.actualizado "
+                f"RETURNING producto_id, contado",
+                [valor for fila in filas for valor in fila],
+            )
+            contados = dict(cursor.fetchall())
+
+    return {
+        codigo: {'id': pk, 'nombre': nombre, 'contado': contados[pk]}
+        for codigo, (pk, nombre, _) in productos.items()
+    }, no_encontrados
+
+
+# ----------------------------
+# Cierre
+# ----------------------------
+def cerrar(conteo_id):
+    """Aplica los ajustes del conteo al stock y deja su resumen; devuelve el conteo cerrado"""
+    producto = connection.ops.quote_name(Producto._meta.db_table)
+    linea = connection.ops.quote_name(ConteoLinea._meta.db_table)
+    ajuste = connection.ops.quote_name(AjusteInventario._meta.db_table)
+
+    with transaction.atomic():
+        conteo = _abierto(conteo_id)
+        ahora = timezone.now()
+        con_diferencia = conteo.lineas.exclude(contado=F('stock_sistema'))
+
+        # Mismo orden de bloqueo que el checkout: un cierre y una venta no se traban
+        list(Producto.objects.select_for_update().filter(pk__in=con_diferencia.values('producto_id'))
+             .order_by('pk').values_list('pk', flat=True))
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"UPDATE {producto} SET stock = CASE "
+                f"WHEN {producto}.stock + l.contado - l.stock_sistema < 0 THEN 0 "
+                f"ELSE {producto}.stock + l.contado - l.stock_sistema END "
+                f"FROM {linea} AS l "
+                f"WHERE l.producto_id = {producto}.id AND l.conteo_id = %s AND l.contado <> l.stock_sistema",
+                [conteo.pk],
+            )
+            cursor.execute(
+                f"INSERT INTO {ajuste} (producto_id, conteo_id, fecha, stock_sistema, contado, diferencia, "
+                f"stock_resultante, precio_unitario) "
+                f"SELECT l.producto_id, l.conteo_id, %s, l.stock_sistema, l.contado, l.contado - l.stock_sistema, "
+                f"p.stock, p.precio "
+                f"FROM {linea} AS l JOIN {producto} AS p ON p.id = l.producto_id "
+                f"WHERE l.conteo_id = %s AND l.contado <> l.stock_sistema",
+                [ahora, conteo.pk],
+            )
+
+        faltan = Q(contado__lt=F('stock_sistema'))
+        resumen = conteo.lineas.aggregate(
+            contados=Count('id'),
+            ajustados=Count('id', filter=~Q(contado=F('stock_sistema'))),
+            faltantes=Sum(F('stock_sistema') - F('contado'), filter=faltan),
+            sobrantes=Sum(F('contado') - F('stock_sistema'), filter=Q(contado__gt=F('stock_sistema'))),
+            valor_faltante=Sum((F('stock_sistema') - F('contado')) * F('producto__precio'), filter=faltan),
+        )
+        conteo.estado = ConteoInventario.CERRADO
+        conteo.cerrado = ahora
+        conteo.productos_contados = resumen['contados']
+        conteo.productos_ajustados = resumen['ajustados']
+        conteo.unidades_faltantes = resumen['faltantes'] or 0
+        conteo.unidades_sobrantes = resumen['sobrantes'] or 0
+        conteo.valor_faltante = resumen['valor_faltante'] or 0
+        conteo.save(update_fields=['estado', 'cerrado', 'productos_contados', 'productos_ajustados',
+                                   'unidades_faltantes', 'unidades_sobrantes', 'valor_faltante'])
+        if conteo.productos_ajustados:
+            transaction.on_commit(lambda: tablero.subir('productos'))
+    return conteo
+
+
+def cancelar(conteo_id):
+    with transaction.atomic():
+        conteo = _abierto(conteo_id)
+        conteo.estado = ConteoInventario.CANCELADO
+        conteo.cerrado = timezone.now()
+        conteo.save(update_fields=['estado', 'cerrado'])
+    return conteo
+
+
+# ----------------------------
+# Reporte de merma
+# ----------------------------
+def reporte_merma(desde, hasta, limite=50):
+    """Totales y productos con más merma (en valor) de los ajustes entre `desde` y `hasta` (datetimes)"""
+    ajustes = AjusteInventario.objects.filter(fecha__gte=desde, fecha__lt=hasta)
+    faltante = Q(diferencia__lt=0)
+    valor = -F('diferencia') * F('precio_unitario')
+    totales = ajustes.aggregate(
+        unidades_faltantes=Sum(-F('diferencia'), filter=faltante),
+        valor_faltante=Sum(valor, filter=faltante),
+        unidades_sobrantes=Sum('diferencia', filter=Q(diferencia__gt=0)),
+        valor_sobrante=Sum(F('diferencia') * F('precio_unitario'), filter=Q(diferencia__gt=0)),
+        productos=Count('producto', distinct=True, filter=faltante),
+        conteos=Count('conteo', distinct=True),
+    )
+    productos = (
+        ajustes.filter(faltante)
+        .values('producto_id', 'producto__nombre', 'producto__codigo_barras')
+        .annotate(unidades=Sum(-F('diferencia')), valor=Sum(valor), veces=Count('id'))
+        .order_by('-valor', 'producto_id')[:limite]
+    )
+    return {'totales': totales, 'productos': list(productos)}
@@ -0,0 +1,282 @@
+"""
+Benchmark de las vistas reales con el cliente de pruebas de Django, contra
+la base configurada (p. ej. una tienda grande de generar_datos).
+
+Por escenario (vista, rol y parámetros): percentiles de latencia, consultas
+SQL y tiempo en SQL por petición (instrumentacion.medir(), así que cuenta
+también las consultas de los hilos de en_paralelo) y el pico de memoria de
+Python de una petición (tracemalloc, en una pasada aparte para no inflar los
+tiempos).
+
+Los escenarios que escriben (checkout del POS, sincronización offline)
+corren dentro de una transacción que se revierte: la base queda igual.
+
+    python manage.py benchmark_vistas --salida actual.json --base base.json --umbral 0.2
+
+Con --base compara contra un resultado guardado y termina con error si
+algún escenario empeora más que --umbral (p50 y p95 con un margen absoluto
+de --margen-ms, memoria) o hace más consultas. Los tiempos dependen de la
+máquina: la base debe salir del mismo entorno.
+"""
+import json
+import logging
+import platform
+import statistics
+import time
+import tracemalloc
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Count
+from django.test import Client, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from tienda import catalogo, codigos, instrumentacion
+from tienda.models import Cliente, Producto, Venta
+
+# Percentiles de latencia que se comparan con la base
+COMPARADOS = ('p50', 'p95')
+
+
+def _percentil(tiempos, p):
+    return tiempos[min(len(tiempos) - 1, int(len(tiempos) * p))]
+
+
+class _Revertir(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = ("Mide latencia, consultas y memoria de las vistas principales con el cliente de pruebas "
+            "y compara contra una base guardada")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--admin', help="Superusuario de los escenarios de admin (por defecto, el primero)")
+        parser.add_argument('--vendedor', help="Vendedor de los escenarios de vendedor (por defecto, el de más ventas)")
+        parser.add_argument('--repeticiones', type=int, default=30, help="Peticiones medidas por escenario")
+        parser.add_argument('--calentamiento', type=int, default=3, help="Peticiones previas sin medir")
+        parser.add_argument('--frio', action='store_true',
+                            help="Vacía las cachés de Django antes de cada petición (tablero, códigos)")
+        parser.add_argument('--solo', nargs='+', metavar='ESCENARIO', help="Sólo estos escenarios")
+        parser.add_argument('--salida', help="Archivo JSON donde guardar los resultados")
+        parser.add_argument('--base', help="Resultados JSON anteriores contra los que comparar")
+        parser.add_argument('--umbral', type=float, default=0.2, help="Empeoramiento tolerado (0.2 = 20 %%)")
+        parser.add_argument('--margen-ms', type=float, default=2.0,
+                            help="Diferencia mínima en ms para contar un empeoramiento de latencia")
+
+    def handle(self, *args, **options):
+        if not instrumentacion.activa():
+            raise CommandError("La instrumentación está apagada (INSTRUMENTACION_ACTIVA): no se pueden contar consultas.")
+        self.frio = options['frio']
+        self.clientes_http = {rol: self.cliente_http(usuario) for rol, usuario in self.usuarios(options).items()}
+
+        escenarios = self.escenarios()
+        if options['solo']:
+            desconocidos = set(options['solo']) - set(escenarios)
+            if desconocidos:
+                raise CommandError(f"Escenarios desconocidos: {', '.join(sorted(desconocidos))}. "
+                                   f"Disponibles: {', '.join(escenarios)}")
+            escenarios = {nombre: escenarios[nombre] for nombre in options['solo']}
+
+        resultados = {
+            'fecha': timezone.now().isoformat(timespec='seconds'),
+            'entorno': {
+                'python': platform.python_version(), 'maquina': platform.node(),
+                'base_de_datos': settings.DATABASES['default']['ENGINE'],
+                'repeticiones': options['repeticiones'], 'frio': self.frio,
+            },
+            'datos': {
+                'productos': Producto.objects.count(), 'clientes': Cliente.objects.count(),
+                'ventas': Venta.objects.count(),
+            },
+            'escenarios': {},
+        }
+        base = self.cargar_base(options['base'])
+
+        self.stdout.write(f"{'escenario':<34} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'SQL':>5} "
+                          f"{'SQL ms':>7} {'mem KB':>8}")
+        # Los avisos de presupuesto de cada petición ensuciarían la tabla (se vuelven a activar al terminar)
+        registro = logging.getLogger(instrumentacion.__name__)
+        deshabilitado, registro.disabled = registro.disabled, True
+        try:
+            with override_settings(ALLOWED_HOSTS=['*'], DEBUG=False):
+                for nombre, escenario in escenarios.items():
+                    resultado = self.medir(escenario, options['repeticiones'], options['calentamiento'])
+                    resultados['escenarios'][nombre] = resultado
+                    self.stdout.write(self.fila(nombre, resultado))
+        finally:
+            registro.disabled = deshabilitado
+
+        if options['salida']:
+            with open(options['salida'], 'w', encoding='utf-8') as archivo:
+                json.dump(resultados, archivo, indent=2, ensure_ascii=False)
+            self.stdout.write(f"Resultados guardados en {options['salida']}")
+
+        if base is not None:
+            regresiones = self.comparar(base, resultados, options['umbral'], options['margen_ms'])
+            if regresiones:
+                raise CommandError(f"{len(regresiones)} regresiones respecto de {options['base']}.")
+            self.stdout.write(self.style.SUCCESS("Sin regresiones respecto de la base."))
+
+    # ----------------------------
+    # Preparación
+    # ----------------------------
+    def usuarios(self, options):
+        Vendedor = get_user_model()
+        admin = (Vendedor.objects.filter(username=options['admin']) if options['admin'] else
+                 Vendedor.objects.filter(is_superuser=True, is_active=True).order_by('pk')).first()
+        vendedor = (Vendedor.objects.filter(username=options['vendedor']) if options['vendedor'] else
+                    Vendedor.objects.filter(is_superuser=False, is_active=True)
+                    .annotate(n=Count('venta')).order_by('-n', 'pk')).first()
+        if admin is None or vendedor is None:
+            raise CommandError("Hacen falta un superusuario y un vendedor activos (ver generar_datos).")
+        return {'admin': admin, 'vendedor': vendedor}
+
+    def cliente_http(self, usuario):
+        cliente = Client()
+        cliente.force_login(usuario)
+        return cliente
+
+    def escenarios(self):
+        """{nombre: (rol, método, url, datos, content_type, escribe)}"""
+        producto = Producto.objects.filter(stock__gt=10).order_by('-stock').first()
+        venta = Venta.objects.order_by('-fecha', '-id').first()
+        barras = list(Producto.objects.exclude(codigo_barras__isnull=True).order_by('pk')
+                      .values_list('codigo_barras', flat=True)[:codigos.MAX_LOTE])
+        if producto is None or venta is None or not barras:
+            raise CommandError("La base no tiene datos suficientes; cárgala antes con generar_datos.")
+        hoy = timezone.localdate()
+        carrito = json.dumps([{'id': producto.pk, 'cantidad': 1}])
+
+        escenarios = {
+            'inicio[admin]': ('admin', 'get', reverse('inicio'), None, None, False),
+            'inicio[vendedor]': ('vendedor', 'get', reverse('inicio'), None, None, False),
+            'productos_list': ('admin', 'get', reverse('productos_list'), None, None, False),
+            'ventas_list[admin]': ('admin', 'get', reverse('ventas_list'), None, None, False),
+            'ventas_list[vendedor]': ('vendedor', 'get', reverse('ventas_list'), None, None, False),
+            'ventas_historial': ('admin', 'get', reverse('ventas_historial'), None, None, False),
+            'ventas_historial[30 días]': ('admin', 'get', reverse('ventas_historial'), {
+                'fecha_inicio': (hoy - timedelta(days=30)).isoformat(), 'fecha_fin': hoy.isoformat(),
+            }, None, False),
+            'graficos': ('admin', 'get', reverse('graficos'), None, None, False),
+            'perfil': ('vendedor', 'get', reverse('perfil'), None, None, False),
+            'ventas_factura_pdf_rl': ('admin', 'get', reverse('ventas_factura_pdf_rl', args=[venta.pk]), None, None, False),
+            'buscar_productos_htmx': ('admin', 'get', reverse('buscar_productos_htmx'), {'buscar': 'croq'}, None, False),
+            'buscar_productos_htmx[vacío]': ('admin', 'get', reverse('buscar_productos_htmx'), None, None, False),
+            'ventas_pos_producto_codigo': ('vendedor', 'post', reverse('ventas_pos_producto_codigo'),
+                                           {'codigo': barras[0]}, None, False),
+            'ventas_pos_productos_codigos': ('vendedor', 'post', reverse('ventas_pos_productos_codigos'),
+                                             json.dumps({'codigos': barras}), 'application/json', False),
+            'ventas_pos_catalogo': ('vendedor', 'get', reverse('ventas_pos_catalogo'),
+                                    {'desde': max(0, catalogo.version_actual() - 100)}, None, False),
+            'ventas_pos_register': ('vendedor', 'post', reverse('ventas_pos_register'),
+                                    lambda: {'carrito': carrito, 'clave': str(uuid.uuid4()), 'recibo': 'texto'},
+                                    None, True),
+            'ventas_pos_sincronizar': ('vendedor', 'post', reverse('ventas_pos_sincronizar'), lambda: json.dumps({
+                'ventas': [{'clave': str(uuid.uuid4()), 'carrito': json.loads(carrito), 'metodo_pago': 'Tarjeta'}
+                           for _ in range(5)],
+            }), 'application/json', True),
+        }
+        return escenarios
+
+    def cargar_base(self, ruta):
+        if not ruta:
+            return None
+        try:
+            with open(ruta, encoding='utf-8') as archivo:
+                return json.load(archivo)
+        except (OSError, ValueError) as e:
+            raise CommandError(f"No se pudo leer la base {ruta}: {e}")
+
+    # ----------------------------
+    # Medición
+    # ----------------------------
+    def peticion(self, escenario):
+        """(segundos, medicion, código de estado) de una petición del escenario"""
+        rol, metodo, url, datos, tipo, escribe = escenario
+        if callable(datos):
+            datos = datos()
+        extra = {'content_type': tipo} if tipo else {}
+        if self.frio:
+            for alias in settings.CACHES:
+                caches[alias].clear()
+            codigos.local.clear()
+
+        with instrumentacion.medir() as medicion:
+            inicio = time.perf_counter()
+            try:
+                with transaction.atomic():
+                    respuesta = getattr(self.clientes_http[rol], metodo)(url, datos, **extra)
+                    if escribe:
+                        raise _Revertir
+            except _Revertir:
+                pass
+            duracion = time.perf_counter() - inicio
+        return duracion, medicion, respuesta.status_code
+
+    def medir(self, escenario, repeticiones, calentamiento):
+        for _ in range(calentamiento):
+            self.peticion(escenario)
+
+        tiempos, consultas, sql, estados = [], [], [], set()
+        for _ in range(repeticiones):
+            duracion, medicion, estado = self.peticion(escenario)
+            tiempos.append(duracion * 1000)
+            consultas.append(medicion.consultas)
+            sql.append(medicion.sql * 1000)
+            estados.add(estado)
+
+        tracemalloc.start()
+        try:
+            tracemalloc.reset_peak()
+            self.peticion(escenario)
+            _, pico = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        tiempos.sort()
+        return {
+            'p50': round(statistics.median(tiempos), 2),
+            'p95': round(_percentil(tiempos, 0.95), 2),
+            'p99': round(_percentil(tiempos, 0.99), 2),
+            'media': round(statistics.fmean(tiempos), 2),
+            'consultas': max(consultas),
+            'sql_ms': round(statistics.median(sql), 2),
+            'memoria_kb': round(pico / 1024),
+            'estados': sorted(estados),
+        }
+
+    def fila(self, nombre, r):
+        linea = (f"{nombre:<34} {r['p50']:>8.1f} {r['p95']:>8.1f} {r['p99']:>8.1f} {r['consultas']:>5} "
+                 f"{r['sql_ms']:>7.1f} {r['memoria_kb']:>8}")
+        if any(estado >= 400 for estado in r['estados']):
+            linea += self.style.WARNING(f"  estados {r['estados']}")
+        return linea
+
+    def comparar(self, base, actual, umbral, margen_ms):
+        """Lista de regresiones (y las escribe) de los escenarios presentes en ambos"""
+        regresiones = []
+        self.stdout.write(f"\nComparación con la base del {base.get('fecha', '?')} "
+                          f"(umbral {umbral:.0%}, margen {margen_ms} ms):")
+        for nombre, r in actual['escenarios'].items():
+            anterior = base.get('escenarios', {}).get(nombre)
+            if anterior is None:
+                continue
+            motivos = []
+            for clave in COMPARADOS:
+                if r[clave] > anterior[clave] * (1 + umbral) and r[clave] - anterior[clave] > margen_ms:
+                    motivos.append(f"{clave} {anterior[clave]:.1f} → {r[clave]:.1f} ms")
+            if r['consultas'] > anterior['consultas']:
+                motivos.append(f"consultas {anterior['consultas']} → {r['consultas']}")
+            if r['memoria_kb'] > anterior['memoria_kb'] * (1 + umbral):
+                motivos.append(f"memoria {anterior['memoria_kb']} → {r['memoria_kb']} KB")
+            if motivos:
+                regresiones.append((nombre, motivos))
+                self.stdout.write(self.style.ERROR(f"  {nombre}: {'; '.join(motivos)}"))
+        return regresiones
@@ -0,0 +1,168 @@
+import asyncio
+import json
+import random
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.asgi import get_asgi_application
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.middleware.csrf import get_token
+from django.test import Client, RequestFactory, override_settings
+from django.urls import include, path, reverse
+
+from tienda import urls as tienda_urls
+from tienda.models import Producto
+
+LECTURAS = ('inicio', 'ventas_pos_producto_codigo', 'ventas_pos_productos_codigos')
+ESCRITURAS = ('cliente_add_ajax', 'ventas_pos_register')
+
+
+class _Rutas:
+    """URLConf del benchmark: las versiones sync bajo /sync/, el resto como siempre"""
+    urlpatterns = [
+        path(f'sync/{nombre}/', tienda_urls.vista(nombre, usar_async=False)) for nombre in tienda_urls.ASYNC
+    ] + [path('', include(settings.ROOT_URLCONF))]
+
+
+class Command(BaseCommand):
+    help = ("Compara bajo carga concurrente las versiones sync y async de las vistas del POS y del tablero: "
+            "sync servida por WSGI (pool de hilos) y por ASGI, y async por ASGI (un event loop), dentro del proceso")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--usuario', help="Vendedor con el que se hacen las peticiones (por defecto, el primer superusuario)")
+        parser.add_argument('--concurrencia', type=int, default=50, help="Peticiones simultáneas")
+        parser.add_argument('--peticiones', type=int, default=500, help="Peticiones por vista y versión")
+        parser.add_argument('--escrituras', action='store_true',
+                            help="Incluye el alta de clientes y el registro de ventas (crea filas reales y descuenta stock)")
+
+    def handle(self, *args, **options):
+        usuario = self.usuario(options['usuario'])
+        codigos = list(Producto.objects.exclude(codigo_barras__isnull=True).exclude(codigo_barras='')
+                       .values_list('codigo_barras', flat=True)[:1000])
+        if not codigos:
+            raise CommandError("No hay productos con código de barras.")
+
+        # Sesión y token CSRF compartidos por todas las peticiones
+        cliente = Client()
+        cliente.force_login(usuario)
+        peticion = RequestFactory().get('/')
+        token = get_token(peticion)
+        cookies = f"{settings.SESSION_COOKIE_NAME}={cliente.cookies[settings.SESSION_COOKIE_NAME].value}; " \
+                  f"{settings.CSRF_COOKIE_NAME}={peticion.META['CSRF_COOKIE']}"
+        self.cabeceras = {'cookie': cookies, 'x-csrftoken': token}
+
+        self.codigos = codigos
+        self.producto = Producto.objects.order_by('-stock').first()
+        nombres = LECTURAS + (ESCRITURAS if options['escrituras'] else ())
+        concurrencia, total = options['concurrencia'], options['peticiones']
+
+        self.stdout.write(f"{total} peticiones por vista, {concurrencia} a la vez, como {usuario.username}\n")
+        self.stdout.write(f"{'vista':<30} {'versión':<7} {'servidor':<8} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errores':>8}")
+        with override_settings(ROOT_URLCONF=_Rutas, ALLOWED_HOSTS=['*'], DEBUG=False):
+            wsgi, asgi = WSGIHandler(), get_asgi_application()
+            for nombre in nombres:
+                resultados = (
+                    ('sync', 'WSGI', self.medir_sync(wsgi, f'/sync/{nombre}/', nombre, concurrencia, total)),
+                    ('sync', 'ASGI', asyncio.run(self.medir_async(asgi, f'/sync/{nombre}/', nombre, concurrencia, total))),
+                    ('async', 'ASGI', asyncio.run(self.medir_async(asgi, reverse(nombre), nombre, concurrencia, total))),
+                )
+                for version, servidor, resultado in resultados:
+                    self.stdout.write(self.fila(nombre, version, servidor, *resultado))
+
+    def usuario(self, nombre):
+        Vendedor = get_user_model()
+        usuario = (Vendedor.objects.filter(username=nombre) if nombre else
+                   Vendedor.objects.filter(is_superuser=True, is_active=True).order_by('pk')).first()
+        if usuario is None:
+            raise CommandError("No se encontró el usuario.")
+        return usuario
+
+    def cuerpo(self, nombre, n):
+        """(método, content-type, cuerpo) de la n-ésima petición a la vista"""
+        if nombre == 'inicio':
+            return 'GET', '', b''
+        if nombre == 'ventas_pos_producto_codigo':
+            return 'POST', 'application/x-www-form-urlencoded', urlencode({'codigo': random.choice(self.codigos)}).encode()
+        if nombre == 'ventas_pos_productos_codigos':
+            lote = random.sample(self.codigos, min(20, len(self.codigos)))
+            return 'POST', 'application/json', json.dumps({'codigos': lote}).encode()
+        if nombre == 'cliente_add_ajax':
+            return 'POST', 'application/x-www-form-urlencoded', urlencode({'nombre': f'Benchmark {n}'}).encode()
+        carrito = json.dumps([{'id': self.producto.pk, 'cantidad': 1}])
+        return 'POST', 'application/x-www-form-urlencoded', urlencode({'carrito': carrito}).encode()
+
+    # ----------------------------
+    # Sync: WSGIHandler en un pool de hilos, como un servidor WSGI con hilos
+    # ----------------------------
+    def medir_sync(self, handler, ruta, nombre, concurrencia, total):
+        def una(n):
+            metodo, tipo, cuerpo = self.cuerpo(nombre, n)
+            environ = {
+                'REQUEST_METHOD': metodo, 'PATH_INFO': ruta, 'SCRIPT_NAME': '', 'QUERY_STRING': '',
+                'CONTENT_TYPE': tipo, 'CONTENT_LENGTH': str(len(cuerpo)), 'SERVER_NAME': 'localhost',
+                'SERVER_PORT': '80', 'SERVER_PROTOCOL': 'HTTP/1.1', 'wsgi.url_scheme': 'http',
+                'wsgi.input': BytesIO(cuerpo), 'wsgi.errors': BytesIO(),
+                'HTTP_COOKIE': self.cabeceras['cookie'], 'HTTP_X_CSRFTOKEN': self.cabeceras['x-csrftoken'],
+            }
+            estado = []
+            inicio = time.perf_counter()
+            respuesta = handler(environ, lambda status, headers, exc_info=None: estado.append(int(status[:3])))
+            b''.join(respuesta)
+            respuesta.close()
+            return time.perf_counter() - inicio, estado[0]
+
+        with ThreadPoolExecutor(max_workers=concurrencia) as pool:
+            inicio = time.perf_counter()
+            resultados = list(pool.map(una, range(total)))
+            return resultados, time.perf_counter() - inicio
+
+    # ----------------------------
+    # Async: ASGIHandler en un solo event loop, como uvicorn
+    # ----------------------------
+    async def medir_async(self, app, ruta, nombre, concurrencia, total):
+        semaforo = asyncio.Semaphore(concurrencia)
+
+        async def una(n):
+            metodo, tipo, cuerpo = self.cuerpo(nombre, n)
+            cabeceras = [(b'host', b'localhost'), (b'content-length', str(len(cuerpo)).encode())]
+            cabeceras += [(clave.encode(), valor.encode()) for clave, valor in self.cabeceras.items()]
+            if tipo:
+                cabeceras.append((b'content-type', tipo.encode()))
+            scope = {
+                'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': metodo,
+                'scheme': 'http', 'path': ruta, 'raw_path': ruta.encode(), 'query_string': b'', 'root_path': '',
+                'headers': cabeceras, 'client': ('127.0.0.1', 0), 'server': ('localhost', 80),
+            }
+            mensajes = [{'type': 'http.request', 'body': cuerpo, 'more_body': False}]
+            estado = []
+
+            async def receive():
+                if mensajes:
+                    return mensajes.pop()
+                await asyncio.Event().wait()
+
+            async def send(mensaje):
+                if mensaje['type'] == 'http.response.start':
+                    estado.append(mensaje['status'])
+
+            async with semaforo:
+                inicio = time.perf_counter()
+                await app(scope, receive, send)
+                return time.perf_counter() - inicio, estado[0]
+
+        inicio = time.perf_counter()
+        resultados = await asyncio.gather(*(una(n) for n in range(total)))
+        return resultados, time.perf_counter() - inicio
+
+    def fila(self, nombre, version, servidor, resultados, duracion):
+        tiempos = sorted(t * 1000 for t, _ in resultados)
+        errores = sum(1 for _, estado in resultados if estado >= 400)
+        percentil = lambda p: tiempos[min(len(tiempos) - 1, int(len(tiempos) * p))]
+        return (f"{nombre:<30} {version:<7} {servidor:<8} {len(resultados) / duracion:>8.0f} {statistics.median(tiempos):>8.1f} "
+                f"{percentil(0.95):>8.1f} {percentil(0.99):>8.1f} {errores:>8}")
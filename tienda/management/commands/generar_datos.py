@@ -0,0 +1,352 @@
+"""
+Genera una tienda sintética para pruebas de carga: productos con código de
+barras, clientes, vendedores con comisión y meta, y ventas con sus items
+repartidas en el tiempo con estacionalidad (meses, días de la semana, horas
+del día y crecimiento anual).
+
+Todo sale de --semilla y --hasta: con los mismos argumentos y la misma base
+de partida se generan las mismas filas. Las ventas se reparten por días en
+lotes de --lote ventas; cada lote usa su propio generador (semilla:lote), así
+el resultado no depende de --procesos ni del orden en que terminan.
+
+Escritura:
+- Productos, clientes y vendedores con bulk_create (son pocos).
+- Ventas e items con COPY en PostgreSQL, un lote por transacción y varios
+  procesos a la vez; los ids de las ventas se toman de la secuencia de la
+  tabla. En otros motores (SQLite en desarrollo) con executemany, en este
+  proceso.
+
+Como no pasa por save() ni por las señales, el comando hace a mano lo que
+ellas harían: reserva las versiones del catálogo y los números de factura
+en bloque, invalida la caché de códigos, sube las versiones del tablero y
+recalcula los resúmenes diarios del período. Las ventas generadas son
+históricas: no descuentan stock.
+"""
+import multiprocessing
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date, datetime, time as hora, timedelta
+from decimal import Decimal
+from itertools import accumulate
+
+import django
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from tienda import codigos, tablero
+from tienda.busqueda import normalizar
+from tienda.models import Cliente, Producto, Vendedor, Venta, VentaItem, reservar_version
+from ventas.facturacion import asignador, reservar
+
+# ----------------------------
+# Estacionalidad
+# ----------------------------
+MESES = (0.85, 0.8, 0.95, 0.95, 1.0, 0.95, 1.05, 1.0, 0.95, 1.0, 1.15, 1.5)
+DIAS_SEMANA = (0.85, 0.85, 0.9, 0.95, 1.15, 1.35, 0.7)   # lunes a domingo
+HORAS = {9: 3, 10: 5, 11: 7, 12: 9, 13: 8, 14: 5, 15: 5, 16: 6, 17: 8, 18: 10, 19: 9, 20: 5}
+
+ITEMS_POR_VENTA = (35, 25, 17, 11, 7, 5)                  # pesos de 1 a 6 productos distintos
+CANTIDADES = ((1, 2, 3, 4, 6, 12), (60, 20, 8, 5, 4, 3))
+PROPORCION_TARJETA = 0.55
+PROPORCION_CON_CLIENTE = 0.7
+PROPORCION_CANCELADAS = 0.02
+
+# ----------------------------
+# Catálogo
+# ----------------------------
+TIPOS = {
+    # tipo: (precio mínimo, precio máximo), en centavos
+    'Croquetas': (800, 9000), 'Alimento húmedo': (150, 600), 'Arena sanitaria': (500, 2500),
+    'Collar': (300, 2500), 'Correa': (500, 3500), 'Juguete': (200, 2000), 'Snack': (150, 1200),
+    'Shampoo': (400, 1800), 'Cama': (2000, 12000), 'Comedero': (300, 3000), 'Rascador': (2500, 15000),
+    'Pipeta antipulgas': (600, 3000), 'Transportadora': (3000, 18000), 'Vitaminas': (500, 4000),
+}
+ANIMALES = ('perro', 'gato', 'cachorro', 'gatito', 'ave', 'conejo', 'pez', 'hámster')
+MARCAS = ('PetMax', 'Nutrican', 'FelinoPlus', 'Dogui', 'Michi', 'Patitas', 'Huellitas', 'Colitas')
+PRESENTACIONES = ('500 g', '1 kg', '3 kg', '15 kg', 'talla S', 'talla M', 'talla L', 'pack x3')
+NOMBRES = ('Ana', 'Carlos', 'María', 'José', 'Lucía', 'Jorge', 'Sofía', 'Diego', 'Valentina', 'Andrés',
+           'Camila', 'Luis', 'Paula', 'Miguel', 'Fernanda', 'Pedro', 'Daniela', 'Javier', 'Gabriela', 'Raúl')
+APELLIDOS = ('García', 'Rodríguez', 'González', 'Fernández', 'López', 'Martínez', 'Sánchez', 'Pérez',
+             'Gómez', 'Díaz', 'Torres', 'Ramírez', 'Flores', 'Rojas', 'Vargas', 'Castro', 'Morales', 'Herrera')
+CALLES = ('Av. Central', 'Calle Los Pinos', 'Jr. Las Flores', 'Av. Libertad', 'Calle Real', 'Pasaje Sol')
+
+COLUMNAS_VENTA = ('id', 'fecha', 'metodo_pago', 'efectivo_recibido', 'vuelto', 'factura_num', 'cliente_id',
+                  'vendedor_id', 'estado', 'comision_monto', 'notas', 'comprobante_pago', 'comprobante_pago_clave',
+                  'clave_idempotencia', 'total', 'cantidad_items')
+COLUMNAS_ITEM = ('venta_id', 'producto_id', 'cantidad', 'precio_unitario')
+
+
+def _monto(centavos):
+    return f"{centavos // 100}.{centavos % 100:02d}"
+
+
+def _ean13(cuerpo):
+    """Código EAN-13 con su dígito de control a partir de 12 dígitos"""
+    suma = sum(int(d) * (3 if i % 2 else 1) for i, d in enumerate(cuerpo))
+    return cuerpo + str((10 - suma % 10) % 10)
+
+
+# ----------------------------
+# Ventas: un lote por tarea, en este proceso o en los hijos
+# ----------------------------
+def _generar_lote(tarea):
+    """Genera y escribe las ventas de los días del lote; devuelve (ventas, items)"""
+    rng = random.Random(f"{tarea['semilla']}:{tarea['indice']}")
+    zona = timezone.get_default_timezone()
+    productos, precios, pesos_productos = tarea['productos']
+    vendedores, comisiones, pesos_vendedores = tarea['vendedores']
+    clientes = tarea['clientes']
+    horas, pesos_horas = tuple(HORAS), tuple(accumulate(HORAS.values()))
+    numero = tarea['primer_numero']
+
+    ventas, items = [], []
+    for dia, cantidad in tarea['dias']:
+        dia = date.fromordinal(dia)
+        segundos = sorted(
+            h * 3600 + rng.randrange(3600) for h in rng.choices(horas, cum_weights=pesos_horas, k=cantidad)
+        )
+        for segundo in segundos:
+            fecha = datetime.combine(dia, hora(segundo // 3600, segundo // 60 % 60, segundo % 60), tzinfo=zona)
+            elegidos = {}
+            for producto in rng.choices(range(len(productos)), cum_weights=pesos_productos,
+                                        k=rng.choices(range(1, 7), weights=ITEMS_POR_VENTA)[0]):
+                elegidos.setdefault(producto, rng.choices(*CANTIDADES)[0])
+            total = 0
+            for producto, unidades in elegidos.items():
+                total += unidades * precios[producto]
+                items.append((len(ventas), productos[producto], unidades, _monto(precios[producto])))
+
+            vendedor = rng.choices(range(len(vendedores)), cum_weights=pesos_vendedores)[0]
+            cliente = rng.choice(clientes) if clientes and rng.random() < PROPORCION_CON_CLIENTE else None
+            if rng.random() < PROPORCION_TARJETA:
+                metodo, recibido, vuelto = 'Tarjeta', None, 0
+            else:
+                # Se paga con el siguiente múltiplo de 10
+                recibido = -(-total // 1000) * 1000
+                metodo, vuelto = 'Efectivo', recibido - total
+            estado = 'Cancelada' if rng.random() < PROPORCION_CANCELADAS else 'Pagada'
+            comision = (total * comisiones[vendedor] + 5000) // 10000
+            ventas.append([
+                None, connection.ops.adapt_datetimefield_value(fecha), metodo,
+                None if recibido is None else _monto(recibido), _monto(vuelto),
+                f"{tarea['prefijo_factura']}{numero:04d}", cliente, vendedores[vendedor], estado,
+                _monto(comision), None, '', '', None, _monto(total), len(elegidos),
+            ])
+            numero += 1
+
+    with transaction.atomic():
+        for venta, pk in zip(ventas, _reservar_ids(len(ventas))):
+            venta[0] = pk
+        items = [(ventas[i][0], producto, unidades, precio) for i, producto, unidades, precio in items]
+        _escribir(Venta._meta.db_table, COLUMNAS_VENTA, ventas)
+        _escribir(VentaItem._meta.db_table, COLUMNAS_ITEM, items)
+    return len(ventas), len(items)
+
+
+def _reservar_ids(cantidad):
+    tabla = Venta._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute("SELECT nextval(pg_get_serial_sequence(%s, 'id')) FROM generate_series(1, %s)",
+                           [tabla, cantidad])
+            return [fila[0] for fila in cursor.fetchall()]
+        # Un solo proceso escribe: basta con seguir desde el último id
+        cursor.execute(f"SELECT COALESCE(MAX(id), 0) FROM {connection.ops.quote_name(tabla)}")
+        ultimo = cursor.fetchone()[0]
+    return range(ultimo + 1, ultimo + cantidad + 1)
+
+
+def _escribir(tabla, columnas, filas):
+    tabla = connection.ops.quote_name(tabla)
+    lista = ', '.join(connection.ops.quote_name(c) for c in columnas)
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            with cursor.copy(f"COPY {tabla} ({lista}) FROM STDIN") as copia:
+                for fila in filas:
+                    copia.write_row(fila)
+        else:
+            marcas = ', '.join(['%s'] * len(columnas))
+            cursor.executemany(f"INSERT INTO {tabla} ({lista}) VALUES ({marcas})", filas)
+
+
+class Command(BaseCommand):
+    help = ("Genera una tienda sintética (productos, clientes, vendedores y ventas con estacionalidad), "
+            "determinista a partir de una semilla, para pruebas de carga")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--productos', type=int, default=1000, help="Productos a crear (0: usa los existentes)")
+        parser.add_argument('--clientes', type=int, default=5000, help="Clientes a crear (0: usa los existentes)")
+        parser.add_argument('--vendedores', type=int, default=20, help="Vendedores a crear (0: usa los existentes)")
+        parser.add_argument('--ventas', type=int, default=100000, help="Ventas a crear")
+        parser.add_argument('--dias', type=int, default=730, help="Días de historia que cubren las ventas")
+        parser.add_argument('--hasta', type=date.fromisoformat,
+                            help="Último día con ventas, YYYY-MM-DD (por defecto hoy; fíjalo para repetir el resultado)")
+        parser.add_argument('--crecimiento', type=float, default=0.25, help="Crecimiento anual de las ventas (0.25 = 25 %%)")
+        parser.add_argument('--semilla', type=int, default=1)
+        parser.add_argument('--lote', type=int, default=50000, help="Ventas por transacción")
+        parser.add_argument('--procesos', type=int, help="Procesos escribiendo a la vez (por defecto, uno por núcleo)")
+        parser.add_argument('--sin-resumenes', action='store_true',
+                            help="No recalcula los resúmenes diarios (hay que correr recalcular_resumenes después)")
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['semilla'])
+        self.prefijo = f"demo{options['semilla']}"
+        inicio = time.monotonic()
+
+        with transaction.atomic():
+            vendedores = self.vendedores(rng, options['vendedores'])
+            productos = self.productos(rng, options['productos'], options['semilla'])
+            clientes = self.clientes(rng, options['clientes'], [v.pk for v in vendedores])
+        if not vendedores or not productos:
+            raise CommandError("Hacen falta vendedores y productos para generar ventas.")
+        self.stdout.write(f"{len(productos)} productos, {len(clientes)} clientes y {len(vendedores)} vendedores "
+                          f"({time.monotonic() - inicio:.1f} s)")
+
+        hasta = options['hasta'] or timezone.localdate()
+        desde = hasta - timedelta(days=options['dias'] - 1)
+        if options['ventas'] > 0:
+            tareas = self.tareas(rng, options, desde, productos, vendedores, clientes)
+            self.escribir(tareas, options['procesos'], options['ventas'])
+
+        if options['productos']:
+            codigos.invalidar(*(p.codigo_barras for p in productos))
+            tablero.subir('productos')
+        if options['vendedores']:
+            tablero.subir('vendedores')
+        tablero.ventas_cambiadas(*(v.pk for v in vendedores))
+
+        if options['ventas'] > 0 and not options['sin_resumenes']:
+            call_command('recalcular_resumenes', desde=desde, hasta=hasta, stdout=self.stdout)
+        self.stdout.write(self.style.SUCCESS(f"Datos generados en {time.monotonic() - inicio:.1f} s."))
+
+    # ----------------------------
+    # Maestros
+    # ----------------------------
+    def vendedores(self, rng, cantidad):
+        if not cantidad:
+            return list(Vendedor.objects.filter(is_active=True).order_by('pk'))
+        if Vendedor.objects.filter(username__startswith=f'{self.prefijo}_').exists():
+            raise CommandError(f"Ya hay datos generados con la semilla (usuarios {self.prefijo}_*); usa otra --semilla.")
+        clave = make_password(self.prefijo)   # una sola vez: el hash es lo más caro de crear un usuario
+        nuevos = []
+        for i in range(cantidad):
+            nombre, apellido = rng.choice(NOMBRES), rng.choice(APELLIDOS)
+            nuevos.append(Vendedor(
+                username=f'{self.prefijo}_{i:03d}', first_name=nombre, last_name=apellido, password=clave,
+                email=f'{normalizar(nombre)}.{normalizar(apellido)}{i}@ejemplo.com'.replace(' ', ''),
+                comision_porcentaje=Decimal(rng.choice(('0', '2.50', '3.00', '5.00', '7.50', '10.00'))),
+                meta_mensual=Decimal(rng.choice(('2000', '5000', '10000', '20000'))),
+            ))
+        return Vendedor.objects.bulk_create(nuevos)
+
+    def productos(self, rng, cantidad, semilla):
+        if not cantidad:
+            return list(Producto.objects.order_by('pk'))
+        # Prefijo 2 (uso interno de la tienda), 3 dígitos de la semilla y 8 del número de producto
+        barras = [_ean13(f"2{semilla % 1000:03d}{i:08d}") for i in range(cantidad)]
+        if Producto.objects.filter(codigo_barras__in=barras[:1]).exists():
+            raise CommandError(f"El código {barras[0]} ya existe; usa otra --semilla.")
+        ultima = reservar_version(cantidad)
+        nuevos = []
+        for i, codigo in enumerate(barras):
+            tipo = rng.choice(tuple(TIPOS))
+            animal, marca = rng.choice(ANIMALES), rng.choice(MARCAS)
+            nuevos.append(Producto(
+                codigo_barras=codigo, nombre=f"{tipo} {marca} {animal} {rng.choice(PRESENTACIONES)}",
+                descripcion=f"{tipo} para {animal} de la marca {marca}.",
+                precio=Decimal(_monto(rng.randint(*TIPOS[tipo]) // 100 * 100 + 90)),
+                stock=rng.randint(0, 200), version=ultima - cantidad + 1 + i,
+            ))
+        return Producto.objects.bulk_create(nuevos, batch_size=5000)
+
+    def clientes(self, rng, cantidad, vendedores):
+        if not cantidad:
+            return list(Cliente.objects.order_by('pk').values_list('pk', flat=True))
+        nuevos = []
+        for i in range(cantidad):
+            nombre, apellido = rng.choice(NOMBRES), rng.choice(APELLIDOS)
+            nuevos.append(Cliente(
+                nombre=f"{nombre} {apellido}",
+                correo=f'{normalizar(nombre)}.{normalizar(apellido)}.{self.prefijo}.{i}@ejemplo.com',
+                telefono=f"9{rng.randrange(10 ** 8):08d}",
+                direccion=f"{rng.choice(CALLES)} {rng.randint(1, 2500)}",
+                vendedor_id=rng.choice(vendedores),
+            ))
+        return [c.pk for c in Cliente.objects.bulk_create(nuevos, batch_size=5000)]
+
+    # ----------------------------
+    # Ventas
+    # ----------------------------
+    def tareas(self, rng, options, desde, productos, vendedores, clientes):
+        """Reparte las ventas en días según la estacionalidad y los días en lotes"""
+        dias = [desde + timedelta(days=n) for n in range(options['dias'])]
+        pesos = [
+            MESES[d.month - 1] * DIAS_SEMANA[d.weekday()] * (1 + options['crecimiento']) ** (n / 365)
+            * rng.lognormvariate(0, 0.15)
+            for n, d in enumerate(dias)
+        ]
+        # Reparto por restos mayores: la suma da exactamente --ventas
+        total, suma = options['ventas'], sum(pesos)
+        exactas = [total * p / suma for p in pesos]
+        por_dia = [int(x) for x in exactas]
+        for n in sorted(range(len(dias)), key=lambda n: por_dia[n] - exactas[n])[:total - sum(por_dia)]:
+            por_dia[n] += 1
+
+        # Popularidad: unos pocos productos y vendedores concentran las ventas
+        orden = list(range(len(productos)))
+        rng.shuffle(orden)
+        popularidad = [0.0] * len(productos)
+        for puesto, n in enumerate(orden):
+            popularidad[n] = 1 / (puesto + 1) ** 0.9
+        catalogo = (
+            [p.pk for p in productos],
+            [round(p.precio * 100) for p in productos],
+            list(accumulate(popularidad)),
+        )
+        equipo = (
+            [v.pk for v in vendedores],
+            [round(v.comision_porcentaje * 100) for v in vendedores],
+            list(accumulate(rng.uniform(0.5, 2) for _ in vendedores)),
+        )
+
+        primer_numero = reservar(asignador.nombre, total) - total + 1
+        tareas, lote = [], None
+        for dia, cantidad in zip(dias, por_dia):
+            if lote is None or sum(n for _, n in lote['dias']) >= options['lote']:
+                lote = {
+                    'indice': len(tareas), 'semilla': options['semilla'], 'dias': [], 'primer_numero': primer_numero,
+                    'prefijo_factura': asignador.prefijo, 'productos': catalogo, 'vendedores': equipo,
+                    'clientes': clientes,
+                }
+                tareas.append(lote)
+            lote['dias'].append((dia.toordinal(), cantidad))
+            primer_numero += cantidad
+        return tareas
+
+    def escribir(self, tareas, procesos, total):
+        procesos = min(procesos or os.cpu_count() or 1, len(tareas))
+        hechas = items = 0
+        inicio = time.monotonic()
+
+        def avance(resultado):
+            nonlocal hechas, items
+            hechas += resultado[0]
+            items += resultado[1]
+            transcurrido = time.monotonic() - inicio
+            self.stdout.write(f"{hechas}/{total} ventas, {items} items ({hechas / transcurrido:.0f} ventas/s)")
+
+        if connection.vendor != 'postgresql' or procesos < 2:
+            for tarea in tareas:
+                avance(_generar_lote(tarea))
+            return
+
+        # Cada hijo abre su propia conexión; el entorno (DJANGO_SETTINGS_MODULE) se hereda
+        contexto = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=procesos, mp_context=contexto, initializer=django.setup) as pool:
+            for futuro in as_completed([pool.submit(_generar_lote, tarea) for tarea in tareas]):
+                avance(futuro.result())
@@ -0,0 +1,98 @@
+import multiprocessing
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from django.apps import apps
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+
+from tienda import imagenes
+
+
+class Command(BaseCommand):
+    help = "Genera las miniaturas WebP/JPEG de las imágenes que aún no las tienen, en paralelo"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--todas', action='store_true',
+                            help="Revisa también las imágenes que ya tienen miniaturas (p. ej. tras cambiar IMAGENES_ANCHOS)")
+        parser.add_argument('--procesos', type=int, help="Procesos de conversión (por defecto, uno por núcleo)")
+        parser.add_argument('--limpiar', action='store_true',
+                            help="Borra las miniaturas que ya no usa ninguna imagen")
+
+    def pendientes(self, todas):
+        """(modelo, pk, campo, nombre, clave_actual) de cada imagen a procesar"""
+        for etiqueta, campo in imagenes.CAMPOS.items():
+            modelo = apps.get_model(etiqueta)
+            filas = modelo.objects.exclude(**{f'{campo}__isnull': True}).exclude(**{campo: ''})
+            if not todas:
+                filas = filas.filter(**{imagenes.campo_clave(campo): ''})
+            for pk, nombre, clave in filas.values_list('pk', campo, imagenes.campo_clave(campo)).iterator():
+                yield modelo, pk, campo, nombre, clave
+
+    def handle(self, *args, **options):
+        procesos = options['procesos'] or os.cpu_count() or 1
+        anchos, calidad = imagenes.anchos(), imagenes.calidad()
+        hechas = errores = 0
+        inicio = ultimo_reporte = time.monotonic()
+
+        def terminar(tarea, futuro):
+            nonlocal hechas, errores
+            modelo, pk, campo, nombre, clave_actual = tarea
+            try:
+                clave, archivos = futuro.result()
+            except Exception as e:
+                errores += 1
+                self.stderr.write(f"{nombre}: {e}")
+                return
+            imagenes.guardar(archivos)
+            if clave != clave_actual:
+                imagenes.asignar_clave(modelo, pk, campo, nombre, clave)
+            hechas += 1
+
+        # La lectura y escritura de archivos queda en este proceso; los hijos sólo convierten bytes
+        contexto = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=procesos, mp_context=contexto) as pool:
+            en_vuelo = deque()
+            for tarea in self.pendientes(options['todas']):
+                nombre = tarea[3]
+                try:
+                    with default_storage.open(nombre, 'rb') as archivo:
+                        contenido = archivo.read()
+                except OSError as e:
+                    errores += 1
+                    self.stderr.write(f"{nombre}: {e}")
+                    continue
+                en_vuelo.append((tarea, pool.submit(imagenes.generar, contenido, anchos, calidad)))
+
+                while len(en_vuelo) >= procesos * 2 or (en_vuelo and en_vuelo[0][1].done()):
+                    terminar(*en_vuelo.popleft())
+                if time.monotonic() - ultimo_reporte >= 1:
+                    ultimo_reporte = time.monotonic()
+                    self.stdout.write(f"{hechas} imágenes procesadas...")
+            while en_vuelo:
+                terminar(*en_vuelo.popleft())
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{hechas} imágenes procesadas en {time.monotonic() - inicio:.1f} s ({errores} con error)."
+        ))
+        if options['limpiar']:
+            self.limpiar()
+
+    def limpiar(self):
+        en_uso = set()
+        for etiqueta, campo in imagenes.CAMPOS.items():
+            en_uso.update(apps.get_model(etiqueta).objects.exclude(**{imagenes.campo_clave(campo): ''})
+                          .values_list(imagenes.campo_clave(campo), flat=True))
+        if not default_storage.exists(imagenes.CARPETA):
+            return
+        borradas = 0
+        for clave in default_storage.listdir(imagenes.CARPETA)[0]:
+            if clave in en_uso:
+                continue
+            carpeta = f'{imagenes.CARPETA}/{clave}'
+            for nombre in default_storage.listdir(carpeta)[1]:
+                default_storage.delete(f'{carpeta}/{nombre}')
+            borradas += 1
+        self.stdout.write(f"{borradas} carpetas de miniaturas sin uso borradas.")
@@ -0,0 +1,41 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from tienda import importacion
+
+ERRORES_MOSTRADOS = 20
+
+
+class Command(BaseCommand):
+    help = "Importa o actualiza productos (por código de barras) desde un CSV o XLSX; ver tienda/importacion.py"
+
+    def add_arguments(self, parser):
+        parser.add_argument('archivo', help="Archivo .csv o .xlsx con encabezado: codigo_barras, nombre, precio[, stock, descripcion]")
+        parser.add_argument('--lote', type=int, default=importacion.TAMANO_LOTE, help="Filas por transacción")
+
+    def handle(self, *args, **options):
+        ultimo_reporte = 0
+        inicio = time.monotonic()
+
+        def progreso(resultado):
+            nonlocal ultimo_reporte
+            # Como mucho una línea por segundo
+            if time.monotonic() - ultimo_reporte < 1:
+                return
+            ultimo_reporte = time.monotonic()
+            self.stdout.write(f"{resultado} ({resultado.filas / (ultimo_reporte - inicio):.0f} filas/s)")
+
+        try:
+            with open(options['archivo'], 'rb') as archivo:
+                resultado = importacion.importar(archivo, options['archivo'], options['lote'], progreso)
+        except OSError as e:
+            raise CommandError(f"No se pudo leer {options['archivo']}: {e.strerror}")
+        except importacion.ImportacionError as e:
+            raise CommandError(e.mensaje)
+
+        for fila, mensaje in resultado.errores[:ERRORES_MOSTRADOS]:
+            self.stderr.write(f"Fila {fila}: {mensaje}")
+        if len(resultado.errores) > ERRORES_MOSTRADOS:
+            self.stderr.write(f"... y {len(resultado.errores) - ERRORES_MOSTRADOS} filas más con errores")
+        self.stdout.write(self.style.SUCCESS(f"{resultado}, en {time.monotonic() - inicio:.1f} s."))
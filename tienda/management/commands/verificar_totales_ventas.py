@@ -0,0 +1,71 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import connections, transaction
+from django.db.models import Count, F, Sum
+
+from tienda.models import Venta, VentaItem
+
+
+class Command(BaseCommand):
+    help = "Verifica (y repara) el total y la cantidad de items guardados en cada Venta"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=2000, help="Ventas por lote")
+        parser.add_argument('--workers', type=int, default=4, help="Lotes procesados en paralelo")
+        parser.add_argument('--solo-verificar', action='store_true', help="Informa diferencias sin corregirlas")
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        reparar = not options['solo_verificar']
+
+        ids = list(Venta.objects.order_by('pk').values_list('pk', flat=True))
+        lotes = [ids[i:i + batch_size] for i in range(0, len(ids), batch_size)]
+
+        revisadas = corregidas = 0
+        with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+            futuros = [pool.submit(self._procesar_lote, lote, reparar) for lote in lotes]
+            for futuro in as_completed(futuros):
+                cantidad, diferencias = futuro.result()
+                revisadas += cantidad
+                corregidas += len(diferencias)
+                for venta in diferencias:
+                    self.stdout.write(
+                        f"Venta {venta.pk} ({venta.factura_num}): total {venta.total}, items {venta.cantidad_items}"
+                    )
+
+        accion = "corregidas" if reparar else "con diferencias"
+        self.stdout.write(self.style.SUCCESS(f"{revisadas} ventas revisadas, {corregidas} {accion}."))
+
+    def _procesar_lote(self, ids, reparar):
+        # Cada hilo usa su propia conexión, la cerramos al terminar el lote
+        try:
+            with transaction.atomic():
+                ventas = Venta.objects.filter(pk__in=ids).only('pk', 'factura_num', 'total', 'cantidad_items')
+                if reparar:
+                    ventas = ventas.select_for_update()
+                resumen = {
+                    fila['venta']: fila
+                    for fila in (
+                        VentaItem.objects.filter(venta_id__in=ids)
+                        .values('venta')
+                        .annotate(total=Sum(F('cantidad') * F('precio_unitario')), cantidad_items=Count('id'))
+                        .order_by()
+                    )
+                }
+
+                diferencias = []
+                for venta in ventas:
+                    fila = resumen.get(venta.pk, {})
+                    total = fila.get('total') or Decimal('0.00')
+                    cantidad_items = fila.get('cantidad_items', 0)
+                    if venta.total != total or venta.cantidad_items != cantidad_items:
+                        venta.total, venta.cantidad_items = total, cantidad_items
+                        diferencias.append(venta)
+
+                if reparar and diferencias:
+                    Venta.objects.bulk_update(diferencias, ['total', 'cantidad_items'])
+            return len(ids), diferencias
+        finally:
+            connections.close_all()
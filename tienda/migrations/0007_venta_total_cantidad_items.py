@@ -0,0 +1,46 @@
+# Generated by Django 4.2.15 on 2026-10-16 22:52
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import Count, DecimalField, F, IntegerField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def calcular_totales(apps, schema_editor):
+    Venta = apps.get_model('tienda', 'Venta')
+    VentaItem = apps.get_model('tienda', 'VentaItem')
+    items = VentaItem.objects.filter(venta=OuterRef('pk')).order_by().values('venta')
+    Venta.objects.update(
+        total=Coalesce(
+            Subquery(items.annotate(s=Sum(F('cantidad') * F('precio_unitario'))).values('s')),
+            Value(Decimal('0.00')),
+            output_field=DecimalField(max_digits=12, decimal_places=2),
+        ),
+        cantidad_items=Coalesce(
+            Subquery(items.annotate(c=Count('id')).values('c')),
+            Value(0),
+            output_field=IntegerField(),
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tienda', '0006_cliente_vendedor_vendedor_comision_porcentaje_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='venta',
+            name='cantidad_items',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='venta',
+            name='total',
+            field=models.DecimalField(db_index=True, decimal_places=2, default=0.0, max_digits=12),
+        ),
+        migrations.RunPython(calcular_totales, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,49 @@
+# Índices para la búsqueda de productos con pg_trgm (ver tienda/busqueda.py)
+
+from django.db import migrations
+
+SQL_CREAR = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE EXTENSION IF NOT EXISTS unaccent",
+    # unaccent() no es IMMUTABLE; la versión con diccionario explícito sí puede indexarse
+    """
+    CREATE OR REPLACE FUNCTION tienda_unaccent(text) RETURNS text AS
+    $$ SELECT public.unaccent('public.unaccent'::regdictionary, $1) $$
+    LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT
+    """,
+    "CREATE INDEX IF NOT EXISTS tienda_producto_nombre_trgm ON tienda_producto USING gin (tienda_unaccent(lower(nombre)) gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS tienda_producto_descripcion_trgm ON tienda_producto USING gin (tienda_unaccent(lower(descripcion)) gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS tienda_producto_codigo_patron ON tienda_producto (lower(codigo_barras) text_pattern_ops)",
+]
+
+SQL_BORRAR = [
+    "DROP INDEX IF EXISTS tienda_producto_codigo_patron",
+    "DROP INDEX IF EXISTS tienda_producto_descripcion_trgm",
+    "DROP INDEX IF EXISTS tienda_producto_nombre_trgm",
+    "DROP FUNCTION IF EXISTS tienda_unaccent(text)",
+]
+
+
+def ejecutar(sentencias):
+    def operacion(apps, schema_editor):
+        # Sólo aplica en PostgreSQL con pg_trgm y unaccent disponibles; si no, se usa el índice en memoria
+        if schema_editor.connection.vendor != 'postgresql':
+            return
+        with schema_editor.connection.cursor() as cursor:
+            cursor.execute("SELECT count(*) FROM pg_available_extensions WHERE name IN ('pg_trgm', 'unaccent')")
+            if cursor.fetchone()[0] < 2:
+                return
+        for sql in sentencias:
+            schema_editor.execute(sql)
+    return operacion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tienda', '0007_venta_total_cantidad_items'),
+    ]
+
+    operations = [
+        migrations.RunPython(ejecutar(SQL_CREAR), ejecutar(SQL_BORRAR)),
+    ]
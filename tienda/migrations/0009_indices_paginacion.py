@@ -0,0 +1,33 @@
+# Generated by Django 4.2.15 on 2026-10-16 23:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tienda', '0008_producto_busqueda_trigramas'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='cliente',
+            index=models.Index(fields=['nombre', 'id'], name='tienda_cliente_nombre_id'),
+        ),
+        migrations.AddIndex(
+            model_name='cliente',
+            index=models.Index(fields=['vendedor', 'nombre', 'id'], name='tienda_cliente_vend_nombre'),
+        ),
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(fields=['nombre', 'id'], name='tienda_producto_nombre_id'),
+        ),
+        migrations.AddIndex(
+            model_name='venta',
+            index=models.Index(fields=['fecha', 'id'], name='tienda_venta_fecha_id'),
+        ),
+        migrations.AddIndex(
+            model_name='venta',
+            index=models.Index(fields=['vendedor', 'fecha', 'id'], name='tienda_venta_vend_fecha_id'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.2.15 on 2026-10-16 23:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tienda', '0009_indices_paginacion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='producto',
+            name='imagen_clave',
+            field=models.CharField(blank=True, default='', editable=False, max_length=32),
+        ),
+        migrations.AddField(
+            model_name='vendedor',
+            name='foto_perfil_clave',
+            field=models.CharField(blank=True, default='', editable=False, max_length=32),
+        ),
+        migrations.AddField(
+            model_name='venta',
+            name='comprobante_pago_clave',
+            field=models.CharField(blank=True, default='', editable=False, max_length=32),
+        ),
+    ]
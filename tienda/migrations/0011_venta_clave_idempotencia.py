@@ -0,0 +1,18 @@
+# Generated by Django 4.2.15 on 2026-10-16 23:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tienda', '0010_imagenes_derivadas'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='venta',
+            name='clave_idempotencia',
+            field=models.UUIDField(blank=True, editable=False, null=True, unique=True),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 4.2.15 on 2026-10-16 23:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tienda', '0011_venta_clave_idempotencia'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductoEliminado',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('producto_id', models.BigIntegerField(unique=True)),
+                ('version', models.PositiveBigIntegerField(db_index=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='producto',
+            name='version',
+            field=models.PositiveBigIntegerField(db_index=True, default=0, editable=False),
+        ),
+    ]
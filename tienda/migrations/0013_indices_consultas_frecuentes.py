@@ -0,0 +1,34 @@
+# Generated by Django 4.2.15 on 2026-10-17 00:04
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.db.models.expressions
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tienda', '0012_catalogo_versionado'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='cliente',
+            name='vendedor',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='clientes', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='venta',
+            name='vendedor',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(condition=models.Q(('stock__lte', 5)), fields=['stock'], name='tienda_producto_stock_bajo'),
+        ),
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(django.db.models.expressions.CombinedExpression(models.F('precio'), '*', models.F('stock')), name='tienda_producto_valor_inv'),
+        ),
+    ]
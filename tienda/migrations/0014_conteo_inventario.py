@@ -0,0 +1,60 @@
+# Generated by Django 4.2.15 on 2026-10-17 00:22
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tienda', '0013_indices_consultas_frecuentes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ConteoInventario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nombre', models.CharField(max_length=100)),
+                ('estado', models.CharField(choices=[('Abierto', 'Abierto'), ('Cerrado', 'Cerrado'), ('Cancelado', 'Cancelado')], default='Abierto', max_length=20)),
+                ('abierto', models.DateTimeField(auto_now_add=True)),
+                ('cerrado', models.DateTimeField(blank=True, null=True)),
+                ('productos_contados', models.PositiveIntegerField(default=0)),
+                ('productos_ajustados', models.PositiveIntegerField(default=0)),
+                ('unidades_faltantes', models.PositiveIntegerField(default=0)),
+                ('unidades_sobrantes', models.PositiveIntegerField(default=0)),
+                ('valor_faltante', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('abierto_por', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='conteos', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ConteoLinea',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('contado', models.PositiveIntegerField(default=0)),
+                ('stock_sistema', models.PositiveIntegerField()),
+                ('actualizado', models.DateTimeField()),
+                ('conteo', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lineas', to='tienda.conteoinventario')),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='tienda.producto')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='AjusteInventario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateTimeField(db_index=True)),
+                ('stock_sistema', models.PositiveIntegerField()),
+                ('contado', models.PositiveIntegerField()),
+                ('diferencia', models.IntegerField()),
+                ('stock_resultante', models.PositiveIntegerField()),
+                ('precio_unitario', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('conteo', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ajustes', to='tienda.conteoinventario')),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ajustes', to='tienda.producto')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='conteolinea',
+            constraint=models.UniqueConstraint(fields=('conteo', 'producto'), name='tienda_conteo_linea_unica'),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 4.2.15 on 2026-10-17 00:49
+
+from django.db import migrations, models
+
+
+def mover_contador(apps, schema_editor):
+    """La versión del catálogo sigue desde donde quedó en ContadorFactura: los terminales no vuelven a empezar"""
+    ContadorFactura = apps.get_model('ventas', 'ContadorFactura')
+    ContadorCatalogo = apps.get_model('tienda', 'ContadorCatalogo')
+    anterior = ContadorFactura.objects.filter(nombre='catalogo').first()
+    ContadorCatalogo.objects.create(pk=1, ultima_version=anterior.ultimo_numero if anterior else 0)
+    if anterior:
+        anterior.delete()
+
+
+def devolver_contador(apps, schema_editor):
+    ContadorFactura = apps.get_model('ventas', 'ContadorFactura')
+    ContadorCatalogo = apps.get_model('tienda', 'ContadorCatalogo')
+    actual = ContadorCatalogo.objects.filter(pk=1).first()
+    if actual:
+        ContadorFactura.objects.update_or_create(nombre='catalogo', defaults={'ultimo_numero': actual.ultima_version})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tienda', '0014_conteo_inventario'),
+        ('ventas', '0003_indice_resumen_vendedor_fecha'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ContadorCatalogo',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ultima_version', models.PositiveBigIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(mover_contador, devolver_contador),
+    ]
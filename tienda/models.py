@@ -1,12 +1,23 @@
-from django.db import models
+from django.db import connection, models, transaction
+from django.db.models import Count, F, Q, Sum
 from django.contrib.auth.models import AbstractUser
 from django.conf import settings
 from decimal import Decimal
 
+from ventas.facturacion import siguiente_factura
+
+
+# Stock desde el que un producto cuenta como bajo (tablero, listados, reportes)
+STOCK_BAJO = 5
+
 
 # ----------------------------
 # Producto
 # ----------------------------
+# Campos de Producto que los terminales del POS tienen en su catálogo (catalogo.CAMPOS, sin el id)
+CAMPOS_CATALOGO = ('codigo_barras', 'nombre', 'precio')
+
+
 class Producto(models.Model):
     codigo_barras = models.CharField(max_length=50, unique=True, blank=True, null=True)
     nombre = models.CharField(max_length=100)
@@ -14,10 +25,97 @@ class Producto(models.Model):
     precio = models.DecimalField(max_digits=10, decimal_places=2)
     stock = models.PositiveIntegerField(default=0)
     imagen = models.ImageField(upload_to='productos/', blank=True, null=True)
+    # Miniaturas generadas en segundo plano (ver imagenes.py); vacío mientras no existan
+    imagen_clave = models.CharField(max_length=32, blank=True, default='', editable=False)
+    # Versión del catálogo en que cambió por última vez (ver catalogo.py)
+    version = models.PositiveBigIntegerField(default=0, db_index=True, editable=False)
+
+    class Meta:
+        indexes = [
+            # Orden del listado paginado por cursor (ver paginacion.py)
+            models.Index(fields=['nombre', 'id'], name='tienda_producto_nombre_id'),
+            # Parcial: sólo los productos con stock bajo; la consulta debe filtrar stock__lte=STOCK_BAJO
+            models.Index(fields=['stock'], condition=Q(stock__lte=STOCK_BAJO), name='tienda_producto_stock_bajo'),
+            # Expresión: productos con más valor en inventario (ORDER BY precio * stock DESC)
+            models.Index(F('precio') * F('stock'), name='tienda_producto_valor_inv'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Código cargado, para invalidar también el anterior si se cambia
+        instance._codigo_guardado = instance.__dict__.get('codigo_barras')
+        instance._catalogo_guardado = instance._campos_catalogo()
+        return instance
+
+    def _campos_catalogo(self):
+        return {campo: self.__dict__[campo] for campo in CAMPOS_CATALOGO if campo in self.__dict__}
+
+    def cambia_catalogo(self, update_fields=None):
+        """True si guardar cambia algún campo del catálogo del POS respecto de lo cargado"""
+        guardado = getattr(self, '_catalogo_guardado', None)
+        if self._state.adding or guardado is None:
+            return True
+        campos = CAMPOS_CATALOGO if update_fields is None else [c for c in CAMPOS_CATALOGO if c in update_fields]
+        return any(c in self.__dict__ and (c not in guardado or self.__dict__[c] != guardado[c]) for c in campos)
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if self.cambia_catalogo(update_fields):
+            # El contador queda bloqueado hasta confirmar: las versiones se confirman en orden
+            with transaction.atomic():
+                self.version = reservar_version()
+                if update_fields is not None:
+                    kwargs['update_fields'] = {*update_fields, 'version'}
+                super().save(*args, **kwargs)
+        else:
+            # Stock, descripción, imagen: no toma versión ni espera el contador. Tampoco escribe la
+            # versión ni los campos del catálogo cargados, que pisarían un cambio confirmado mientras tanto
+            if update_fields is None:
+                excluidos = {'version', *CAMPOS_CATALOGO, *self.get_deferred_fields()}
+                kwargs['update_fields'] = [f.name for f in self._meta.concrete_fields
+                                           if not f.primary_key and f.attname not in excluidos]
+            super().save(*args, **kwargs)
+        self._catalogo_guardado = self._campos_catalogo()
 
     def __str__(self):
         return self.nombre
 
+
+class ContadorCatalogo(models.Model):
+    """Última versión del catálogo del POS (una sola fila, ver catalogo.py)"""
+    ultima_version = models.PositiveBigIntegerField(default=0)
+
+    def __str__(self):
+        return f"catálogo v{self.ultima_version}"
+
+
+def reservar_version(cantidad=1):
+    """
+    Avanza la versión del catálogo en `cantidad` y devuelve la última
+    reservada. La fila queda bloqueada hasta el fin de la transacción que llama.
+    """
+    tabla = connection.ops.quote_name(ContadorCatalogo._meta.db_table)
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            f"UPDATE {tabla} SET ultima_version = ultima_version + %s WHERE id = 1 RETURNING ultima_version",
+            [cantidad],
+        )
+        fila = cursor.fetchone()
+        if fila is None:
+            ContadorCatalogo.objects.get_or_create(pk=1)
+            return reservar_version(cantidad)
+    return fila[0]
+
+
+class ProductoEliminado(models.Model):
+    """Productos borrados, para que los terminales del POS los quiten de su catálogo"""
+    producto_id = models.BigIntegerField(unique=True)
+    version = models.PositiveBigIntegerField(db_index=True)
+
+    def __str__(self):
+        return f"{self.producto_id} (v{self.version})"
+
 # ----------------------------
 # Cliente
 # ----------------------------
@@ -26,7 +124,15 @@ class Cliente(models.Model):
     correo = models.EmailField()
     telefono = models.CharField(max_length=20, blank=True)
     direccion = models.CharField(max_length=200, blank=True)
-    vendedor = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name='clientes')
+    # Sin índice propio: lo cubre tienda_cliente_vend_nombre, que empieza por vendedor
+    vendedor = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True,
+                                 related_name='clientes', db_index=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['nombre', 'id'], name='tienda_cliente_nombre_id'),
+            models.Index(fields=['vendedor', 'nombre', 'id'], name='tienda_cliente_vend_nombre'),
+        ]
 
     def __str__(self):
         return self.nombre
@@ -38,6 +144,7 @@ class Vendedor(AbstractUser):
     telefono = models.CharField(max_length=20, blank=True)
     direccion = models.CharField(max_length=255, blank=True)
     foto_perfil = models.ImageField(upload_to='perfiles/', blank=True, null=True)
+    foto_perfil_clave = models.CharField(max_length=32, blank=True, default='', editable=False)
     
     # Nuevos campos para gestión de vendedores
     comision_porcentaje = models.DecimalField(max_digits=5, decimal_places=2, default=0.00, help_text="Porcentaje de comisión (0-100)")
@@ -66,7 +173,8 @@ class Venta(models.Model):
         settings.AUTH_USER_MODEL,
         on_delete=models.SET_NULL,
         null=True,
-        blank=True
+        blank=True,
+        db_index=False,     # lo cubre tienda_venta_vend_fecha_id, que empieza por vendedor
     )
     
     # Nuevos campos
@@ -74,24 +182,52 @@ class Venta(models.Model):
     comision_monto = models.DecimalField(max_digits=10, decimal_places=2, default=0.00)
     notas = models.TextField(blank=True, null=True)
     comprobante_pago = models.ImageField(upload_to='comprobantes/', blank=True, null=True)
-    
-    def total(self):
-        return sum([item.subtotal() for item in self.items.all()])
+    comprobante_pago_clave = models.CharField(max_length=32, blank=True, default='', editable=False)
+
+    # Clave generada por el POS al cobrar: si la misma venta se reenvía (cola offline), no se duplica
+    clave_idempotencia = models.UUIDField(unique=True, null=True, blank=True, editable=False)
+
+    # Totales persistidos, mantenidos por las señales de VentaItem (ver signals.py)
+    total = models.DecimalField(max_digits=12, decimal_places=2, default=0.00, db_index=True)
+    cantidad_items = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        # Orden de los listados paginados por cursor (ver paginacion.py)
+        indexes = [
+            models.Index(fields=['fecha', 'id'], name='tienda_venta_fecha_id'),
+            models.Index(fields=['vendedor', 'fecha', 'id'], name='tienda_venta_vend_fecha_id'),
+        ]
+
+    def calcular_totales(self):
+        """Calcula (total, cantidad_items) desde los items, sin usar los campos guardados"""
+        resumen = self.items.aggregate(
+            total=Sum(F('cantidad') * F('precio_unitario')),
+            cantidad_items=Count('id'),
+        )
+        return resumen['total'] or Decimal('0.00'), resumen['cantidad_items']
+
+    def recalcular_totales(self):
+        """Recalcula y guarda total y cantidad_items desde cero"""
+        self.total, self.cantidad_items = self.calcular_totales()
+        Venta.objects.filter(pk=self.pk).update(total=self.total, cantidad_items=self.cantidad_items)
 
     def save(self, *args, **kwargs):
         if not self.factura_num:
-            last = Venta.objects.all().order_by('id').last()
-            last_num = int(last.factura_num.replace('FAC','')) if last and last.factura_num else 0
-            self.factura_num = f"FAC{last_num+1:04d}"
-        
+            # El número y la venta se confirman juntos: si el INSERT falla el número se libera
+            with transaction.atomic():
+                self.factura_num = siguiente_factura()
+                super().save(*args, **kwargs)
+            return
+
         super().save(*args, **kwargs)
 
     def actualizar_comision(self):
         """Método helper para recalcular comisión después de agregar items"""
         if self.vendedor and self.vendedor.comision_porcentaje > 0:
-            total_venta = self.total()
-            self.comision_monto = (total_venta * self.vendedor.comision_porcentaje) / 100
-            self.save()
+            # Los items actualizan el total directamente en la BD, leemos el valor vigente
+            self.refresh_from_db(fields=['total', 'cantidad_items'])
+            self.comision_monto = (self.total * self.vendedor.comision_porcentaje) / 100
+            self.save(update_fields=['comision_monto'])
 
 # ----------------------------
 # VentaItem: Productos de una venta
@@ -102,9 +238,19 @@ class VentaItem(models.Model):
     cantidad = models.PositiveIntegerField(default=1)
     precio_unitario = models.DecimalField(max_digits=10, decimal_places=2, default=0.0)
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Guardamos los valores cargados para que las señales ajusten el total por diferencia
+        instance._valores_guardados = instance.valores_para_total()
+        return instance
+
     def subtotal(self):
         return self.cantidad * self.precio_unitario
 
+    def valores_para_total(self):
+        return (self.venta_id, self.cantidad, self.precio_unitario)
+
     def save(self, *args, **kwargs):
         if not self.pk:
             self.precio_unitario = self.producto.precio
@@ -115,4 +261,56 @@ class VentaItem(models.Model):
         super().save(*args, **kwargs)
         
         # Actualizar comisión de la venta padre
-        self.venta.actualizar_comision()
\ No newline at end of file
+        self.venta.actualizar_comision()
+# ----------------------------
+# Conteo de inventario (ver inventario.py)
+# ----------------------------
+class ConteoInventario(models.Model):
+    ABIERTO, CERRADO, CANCELADO = 'Abierto', 'Cerrado', 'Cancelado'
+    ESTADOS = [(ABIERTO, 'Abierto'), (CERRADO, 'Cerrado'), (CANCELADO, 'Cancelado')]
+
+    nombre = models.CharField(max_length=100)
+    estado = models.CharField(max_length=20, choices=ESTADOS, default=ABIERTO)
+    abierto_por = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True,
+                                    related_name='conteos')
+    abierto = models.DateTimeField(auto_now_add=True)
+    cerrado = models.DateTimeField(null=True, blank=True)
+
+    # Resumen calculado al cerrar
+    productos_contados = models.PositiveIntegerField(default=0)
+    productos_ajustados = models.PositiveIntegerField(default=0)
+    unidades_faltantes = models.PositiveIntegerField(default=0)
+    unidades_sobrantes = models.PositiveIntegerField(default=0)
+    valor_faltante = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    def __str__(self):
+        return self.nombre
+
+
+class ConteoLinea(models.Model):
+    """Unidades contadas de un producto en un conteo, y su stock al contarlo"""
+    conteo = models.ForeignKey(ConteoInventario, related_name='lineas', on_delete=models.CASCADE)
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE)
+    contado = models.PositiveIntegerField(default=0)
+    stock_sistema = models.PositiveIntegerField()
+    actualizado = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['conteo', 'producto'], name='tienda_conteo_linea_unica'),
+        ]
+
+
+class AjusteInventario(models.Model):
+    """Libro de ajustes de stock: una fila por producto con diferencia al cerrar un conteo"""
+    producto = models.ForeignKey(Producto, related_name='ajustes', on_delete=models.CASCADE)
+    conteo = models.ForeignKey(ConteoInventario, related_name='ajustes', on_delete=models.CASCADE)
+    fecha = models.DateTimeField(db_index=True)
+    stock_sistema = models.PositiveIntegerField()
+    contado = models.PositiveIntegerField()
+    diferencia = models.IntegerField()          # contado - stock_sistema; negativa es merma
+    stock_resultante = models.PositiveIntegerField()
+    precio_unitario = models.DecimalField(max_digits=10, decimal_places=2)
+
+    def __str__(self):
+        return f"{self.producto_id}: {self.diferencia:+d}"
@@ -0,0 +1,184 @@
+"""
+Paginación por cursor (keyset) para los listados.
+
+En vez de OFFSET, cada página continúa desde los valores de orden de la última
+fila mostrada: WHERE (fecha, id) < (:fecha, :id) ORDER BY fecha DESC, id DESC
+LIMIT n. Con un índice sobre las columnas de orden el costo de cada página no
+depende de cuántas filas haya antes, y el orden es estable aunque se inserten
+ventas nuevas mientras se navega (el id desempata).
+
+El cursor viaja en el parámetro GET `cursor` y el botón "Cargar más" lo pide
+con htmx; la vista responde sólo con las filas nuevas (ver partials/cargar_mas.html).
+"""
+import base64
+import json
+from datetime import date, datetime
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import connections
+from django.db.backends.base.operations import BaseDatabaseOperations
+from django.db.models import IntegerField, Q
+
+PARAMETRO = 'cursor'
+
+
+def _codificar(valores):
+    texto = json.dumps([v.isoformat() if isinstance(v, (date, datetime)) else
+                        str(v) if isinstance(v, Decimal) else v for v in valores])
+    return base64.urlsafe_b64encode(texto.encode()).decode().rstrip('=')
+
+
+def _decodificar(cursor, cantidad):
+    try:
+        relleno = '=' * (-len(cursor) % 4)
+        valores = json.loads(base64.urlsafe_b64decode(cursor + relleno))
+    except (ValueError, TypeError):
+        return None
+    if not isinstance(valores, list) or len(valores) != cantidad:
+        return None
+    return valores
+
+
+def _convertir(modelo, orden, valores):
+    """
+    Valores del cursor con el tipo de cada campo de orden. Un cursor alterado
+    puede traer cualquier cosa: ValidationError si algún valor no sirve o se
+    sale del rango del campo en la base.
+    """
+    convertidos = []
+    for campo, valor in zip(orden, valores):
+        campo = modelo._meta.get_field(campo.lstrip('-'))
+        valor = campo.to_python(valor)
+        if valor is None or (isinstance(valor, str) and '\x00' in valor):
+            raise ValidationError('Cursor inválido')
+        if isinstance(campo, IntegerField):
+            # Los rangos estándar: SQLite no informa los suyos y falla al convertir un entero grande
+            minimo, maximo = BaseDatabaseOperations.integer_field_ranges[campo.get_internal_type()]
+            if not minimo <= valor <= maximo:
+                raise ValidationError('Cursor inválido')
+        convertidos.append(valor)
+    return convertidos
+
+
+def _despues_de(orden, valores):
+    """
+    Q equivalente a (c1, c2, ...) > (v1, v2, ...) respetando el sentido de cada
+    columna: c1 > v1 OR (c1 = v1 AND c2 > v2) OR ...
+    """
+    condicion = Q()
+    iguales = {}
+    for campo, valor in zip(orden, valores):
+        nombre = campo.lstrip('-')
+        operador = 'lt' if campo.startswith('-') else 'gt'
+        condicion |= Q(**iguales, **{f'{nombre}__{operador}': valor})
+        iguales[nombre] = valor
+    return condicion
+
+
+def total_aproximado(queryset, tope=None):
+    """
+    Cantidad de filas del queryset sin recorrer toda la tabla.
+
+    Devuelve (total, exacto). En PostgreSQL se usa la estimación del
+    planificador y sólo se cuenta de verdad si es menor que `tope`; en otras
+    bases se cuenta hasta `tope` + 1 filas.
+    """
+    tope = tope or getattr(settings, 'PAGINACION_CONTEO_EXACTO_HASTA', 10000)
+    queryset = queryset.order_by().values('pk')
+    conexion = connections[queryset.db]
+
+    if conexion.vendor == 'postgresql':
+        sql, params = queryset.query.sql_with_params()
+        with conexion.cursor() as cursor:
+            cursor.execute('EXPLAIN (FORMAT JSON) ' + sql, params)
+            plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        estimado = int(plan[0]['Plan']['Plan Rows'])
+        if estimado > tope:
+            return estimado, False
+
+    contadas = queryset[:tope + 1].count()
+    if contadas > tope:
+        return tope, False
+    return contadas, True
+
+
+class PaginaKeyset:
+    """
+    Una página de `queryset` ordenada por `orden` (el último campo debe ser
+    único, normalmente 'id' o '-id').
+
+    Atributos: objetos, hay_mas, cursor_siguiente, url_siguiente, total, total_exacto.
+    """
+
+    def __init__(self, request, queryset, orden, tamano=None, total=None):
+        self.request = request
+        self.orden = tuple(orden)
+        self.tamano = tamano or getattr(settings, 'PAGINACION_TAMANO', 50)
+        self.es_continuacion = False
+
+        queryset = queryset.order_by(*self.orden)
+        cursor = request.GET.get(PARAMETRO)
+        valores = _decodificar(cursor, len(self.orden)) if cursor else None
+        if valores is not None:
+            try:
+                valores = _convertir(queryset.model, self.orden, valores)
+                queryset = queryset.filter(_despues_de(self.orden, valores))
+                self.es_continuacion = True
+            except (ValidationError, ValueError, TypeError, OverflowError):
+                pass
+
+        filas = list(queryset[:self.tamano + 1])
+        self.hay_mas = len(filas) > self.tamano
+        self.objetos = filas[:self.tamano]
+
+        if total is None:
+            self._queryset_total = queryset if not self.es_continuacion else None
+        self._total = total
+
+    def __iter__(self):
+        return iter(self.objetos)
+
+    def __len__(self):
+        return len(self.objetos)
+
+    @property
+    def cursor_siguiente(self):
+        if not self.hay_mas:
+            return None
+        ultimo = self.objetos[-1]
+        return _codificar([getattr(ultimo, campo.lstrip('-')) for campo in self.orden])
+
+    @property
+    def url_siguiente(self):
+        if not self.hay_mas:
+            return None
+        parametros = self.request.GET.copy()
+        parametros[PARAMETRO] = self.cursor_siguiente
+        return f'{self.request.path}?{parametros.urlencode()}'
+
+    def _calcular_total(self):
+        if self._total is None:
+            if self._queryset_total is None:
+                self._total = (None, False)
+            else:
+                self._total = total_aproximado(self._queryset_total)
+        elif not isinstance(self._total, tuple):
+            self._total = (self._total, True)
+        return self._total
+
+    @property
+    def total(self):
+        return self._calcular_total()[0]
+
+    @property
+    def total_exacto(self):
+        return self._calcular_total()[1]
+
+
+def es_parcial(request):
+    """True si la petición es un "Cargar más" de htmx (sólo hay que devolver las filas)"""
+    return bool(request.headers.get('HX-Request')) and PARAMETRO in request.GET
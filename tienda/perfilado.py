@@ -0,0 +1,346 @@
+"""
+Perfilado por muestreo de peticiones, bajo demanda.
+
+- Con PERFILADO_ACTIVO apagado, perfilado_middleware sale de la cadena
+  (MiddlewareNotUsed): no cuesta nada.
+- Encendido, se perfila una petición si la pide un usuario staff (cabecera
+  X-Perfilar: 1 o ?perfilar=1) o al azar, con probabilidad
+  PERFILADO_MUESTREO. Las demás sólo pagan mirar la cabecera y un random().
+- Mientras dura la petición, un hilo aparte toma la pila de sus hilos cada
+  PERFILADO_INTERVALO_MS (sys._current_frames()). La vista no se instrumenta:
+  el costo es el del hilo muestreador.
+- Cada muestra va a una fase según lo más profundo de su pila: 'orm' si pasa
+  por django.db, 'plantillas' si pasa por django.template y 'vista' si no.
+  Una consulta perezosa que se ejecuta al renderizar cuenta como ORM.
+
+Hilos: en WSGI la petición corre en uno. En ASGI se muestrean el event loop
+(el código async de la vista) y el hilo sync de la petición (ORM y render,
+ver asincrono.py); los hilos de en_paralelo se suman con unir_hilo(). Las
+muestras de hilos esperando trabajo (sin Django ni código del proyecto en la
+pila) se descartan. Con peticiones concurrentes, las del event loop pueden
+incluir corrutinas de otras peticiones. En las respuestas en streaming se
+muestrea hasta que la vista devuelve la respuesta, no mientras se envía.
+
+Cada perfil se guarda en PERFILADO_DIR/<fecha>-<vista>-<id>/: pilas colapsadas
+(todo.folded y una por fase, el formato de flamegraph.pl y speedscope) y
+resumen.json, con los tiempos que mide la instrumentación (consultas, SQL,
+plantillas) y las funciones con más muestras. Se conservan los últimos
+PERFILADO_MAXIMO. /perfiles/ los lista y dibuja (staff).
+"""
+import asyncio
+import functools
+import json
+import logging
+import os
+import random
+import re
+import shutil
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextvars import ContextVar
+from datetime import datetime
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.utils.decorators import sync_and_async_middleware
+
+from . import asincrono, instrumentacion
+
+logger = logging.getLogger(__name__)
+
+_actual = ContextVar('perfil', default=None)
+
+FASES = ('vista', 'orm', 'plantillas')
+ALTO_FILA = 1.2    # em, en perfiles_detalle.html
+NOMBRE = re.compile(r'^[\w.-]+$')
+
+
+def activo():
+    return getattr(settings, 'PERFILADO_ACTIVO', False)
+
+
+def directorio():
+    return getattr(settings, 'PERFILADO_DIR', os.path.join(settings.BASE_DIR, 'cache', 'perfiles'))
+
+
+# ----------------------------
+# Muestreo
+# ----------------------------
+@functools.lru_cache(maxsize=None)
+def _raices():
+    import django
+    return os.path.dirname(django.__file__), str(settings.BASE_DIR)
+
+
+def _pila(frame):
+    """(marcos de la raíz a la hoja como 'modulo.funcion', fase, ¿es trabajo de la petición?)"""
+    django_dir, proyecto = _raices()
+    marcos, fase, trabajo = [], None, False
+    while frame is not None:
+        codigo = frame.f_code
+        modulo = frame.f_globals.get('__name__', '?')
+        marcos.append(f"{modulo}.{getattr(codigo, 'co_qualname', codigo.co_name)}")
+        if fase is None:
+            if modulo.startswith('django.db'):
+                fase = 'orm'
+            elif modulo.startswith('django.template'):
+                fase = 'plantillas'
+        archivo = codigo.co_filename
+        if archivo.startswith(django_dir) or (archivo.startswith(proyecto) and 'site-packages' not in archivo):
+            trabajo = True
+        frame = frame.f_back
+    marcos.reverse()
+    return ';'.join(marcos), fase or 'vista', trabajo
+
+
+class Perfil:
+    """Muestras de los hilos de una petición, tomadas desde un hilo aparte"""
+
+    def __init__(self, motivo, intervalo=None):
+        self.motivo = motivo
+        self.intervalo = (intervalo or getattr(settings, 'PERFILADO_INTERVALO_MS', 5)) / 1000
+        self.hilos = {threading.get_ident()}
+        self.muestras = Counter()       # (fase, pila) -> muestras
+        self.rondas = 0
+        self.datos = {}
+        self.ruta = None                # directorio del perfil, una vez escrito
+        self._parar = threading.Event()
+        self._hilo = threading.Thread(target=self._muestrear, name='perfilado', daemon=True)
+
+    def empezar(self):
+        self.inicio = time.perf_counter()
+        self._hilo.start()
+
+    def terminar(self, **datos):
+        """Detiene el muestreo; el hilo muestreador escribe el perfil"""
+        self.datos = {**datos, 'duracion_ms': round((time.perf_counter() - self.inicio) * 1000, 1)}
+        self._parar.set()
+
+    def esperar(self, timeout=None):
+        self._hilo.join(timeout)
+
+    def _muestrear(self):
+        while not self._parar.wait(self.intervalo):
+            self.rondas += 1
+            marcos = sys._current_frames()
+            for ident in tuple(self.hilos):
+                if ident in marcos:
+                    pila, fase, trabajo = _pila(marcos[ident])
+                    if trabajo:
+                        self.muestras[fase, pila] += 1
+        try:
+            self.ruta = escribir(self)
+        except OSError:
+            logger.exception('No se pudo guardar el perfil de %s', self.datos.get('ruta'))
+
+
+def unir_hilo():
+    """Suma el hilo actual al perfil de la petición en curso, si se está perfilando"""
+    perfil = _actual.get()
+    if perfil is not None:
+        perfil.hilos.add(threading.get_ident())
+
+
+# ----------------------------
+# Resultados
+# ----------------------------
+def _funciones(muestras, limite=30):
+    propias, acumuladas = Counter(), Counter()
+    for (_, pila), n in muestras.items():
+        marcos = pila.split(';')
+        propias[marcos[-1]] += n
+        for marco in set(marcos):
+            acumuladas[marco] += n
+    return [{'funcion': f, 'propias': n, 'acumuladas': acumuladas[f]} for f, n in propias.most_common(limite)]
+
+
+def escribir(perfil):
+    """Guarda pilas colapsadas y resumen.json; devuelve el directorio"""
+    base = directorio()
+    vista = re.sub(r'[^\w.-]', '_', perfil.datos.get('vista') or 'sin_ruta')
+    ruta = os.path.join(base, f"{datetime.now():%Y%m%d-%H%M%S}-{vista}-{uuid.uuid4().hex[:6]}")
+    os.makedirs(ruta)
+
+    # Cada ronda tarda algo más que el intervalo: los ms por muestra salen de la duración real
+    duracion = perfil.datos.get('duracion_ms')
+    ms = duracion / perfil.rondas if duracion and perfil.rondas else perfil.intervalo * 1000
+    por_fase = Counter()
+    for nombre in ('todo',) + FASES:
+        pilas = Counter()
+        for (fase, pila), n in perfil.muestras.items():
+            if nombre in ('todo', fase):
+                pilas[pila] += n
+        por_fase[nombre] = sum(pilas.values())
+        with open(os.path.join(ruta, f'{nombre}.folded'), 'w', encoding='utf-8') as archivo:
+            archivo.writelines(f'{pila} {n}\n' for pila, n in pilas.most_common())
+
+    resumen = {
+        **perfil.datos,
+        'motivo': perfil.motivo,
+        'intervalo_ms': round(ms, 2),
+        'muestras': por_fase['todo'],
+        'fases': {fase: {'muestras': por_fase[fase], 'ms_estimados': round(por_fase[fase] * ms, 1)}
+                  for fase in FASES},
+        'funciones': _funciones(perfil.muestras),
+    }
+    with open(os.path.join(ruta, 'resumen.json'), 'w', encoding='utf-8') as archivo:
+        json.dump(resumen, archivo, ensure_ascii=False, indent=2)
+
+    viejos = sorted(listar_nombres())[:-getattr(settings, 'PERFILADO_MAXIMO', 200)]
+    for nombre in viejos:
+        shutil.rmtree(os.path.join(base, nombre), ignore_errors=True)
+    return ruta
+
+
+def listar_nombres():
+    try:
+        return [n for n in os.listdir(directorio()) if NOMBRE.match(n)]
+    except FileNotFoundError:
+        return []
+
+
+def leer_resumen(nombre):
+    """resumen.json del perfil, o None si el nombre no es válido o no existe"""
+    if not NOMBRE.match(nombre):
+        return None
+    try:
+        with open(os.path.join(directorio(), nombre, 'resumen.json'), encoding='utf-8') as archivo:
+            return {**json.load(archivo), 'nombre': nombre}
+    except (OSError, ValueError):
+        return None
+
+
+def ruta_pilas(nombre, fase):
+    if not NOMBRE.match(nombre) or fase not in ('todo',) + FASES:
+        return None
+    ruta = os.path.join(directorio(), nombre, f'{fase}.folded')
+    return ruta if os.path.exists(ruta) else None
+
+
+def flamegraph(ruta, minimo=0.002):
+    """Filas de un flamegraph (raíz arriba) a partir de pilas colapsadas: [[celda, ...], ...]
+
+    Cada celda: nombre, muestras, porcentaje y el estilo con su posición; se
+    omiten las que ocupan menos de `minimo` del total.
+    """
+    raiz = {'muestras': 0, 'hijos': {}}
+    with open(ruta, encoding='utf-8') as archivo:
+        for linea in archivo:
+            pila, _, n = linea.rstrip('\n').rpartition(' ')
+            n = int(n)
+            nodo = raiz
+            nodo['muestras'] += n
+            for marco in pila.split(';'):
+                nodo = nodo['hijos'].setdefault(marco, {'muestras': 0, 'hijos': {}})
+                nodo['muestras'] += n
+    total = raiz['muestras']
+    filas = []
+
+    def recorrer(nodo, nivel, inicio):
+        for nombre, hijo in sorted(nodo['hijos'].items(), key=lambda par: -par[1]['muestras']):
+            ancho = hijo['muestras'] / total
+            if ancho >= minimo:
+                if len(filas) <= nivel:
+                    filas.append([])
+                filas[nivel].append({
+                    'nombre': nombre,
+                    'muestras': hijo['muestras'],
+                    'porcentaje': f'{ancho * 100:.1f}',
+                    'tipo': _tipo(nombre),
+                    'estilo': f'top:{nivel * ALTO_FILA:.1f}em;left:{inicio * 100:.3f}%;width:{ancho * 100:.3f}%',
+                })
+                recorrer(hijo, nivel + 1, inicio)
+            inicio += ancho
+
+    if total:
+        recorrer(raiz, 0, 0.0)
+    return filas
+
+
+def _tipo(marco):
+    if marco.startswith('django.db'):
+        return 'orm'
+    if marco.startswith('django.template'):
+        return 'plantillas'
+    if marco.startswith(('tienda.', 'ventas.')):
+        return 'proyecto'
+    return 'otro'
+
+
+# ----------------------------
+# Middleware
+# ----------------------------
+def _pedido(request):
+    return request.headers.get('X-Perfilar') == '1' or request.GET.get('perfilar') == '1'
+
+
+def _al_azar():
+    tasa = getattr(settings, 'PERFILADO_MUESTREO', 0.0)
+    return tasa > 0 and random.random() < tasa
+
+
+def _datos(request, respuesta, medicion):
+    match = getattr(request, 'resolver_match', None)
+    datos = {
+        'vista': match.view_name if match else 'sin_ruta',
+        'metodo': request.method,
+        'ruta': request.get_full_path(),
+        'estado': getattr(respuesta, 'status_code', None),
+        'fecha': datetime.now().isoformat(timespec='seconds'),
+    }
+    if instrumentacion.activa():
+        datos.update(consultas=medicion.consultas, sql_ms=round(medicion.sql * 1000, 1),
+                     plantillas_ms=round(medicion.plantillas * 1000, 1))
+    return datos
+
+
+@sync_and_async_middleware
+def perfilado_middleware(get_response):
+    """Va después de AuthenticationMiddleware (mira request.user.is_staff)"""
+    if not activo():
+        raise MiddlewareNotUsed
+
+    if asyncio.iscoroutinefunction(get_response):
+        async def middleware(request):
+            if _pedido(request) and (await asincrono.usuario(request)).is_staff:
+                motivo = 'pedido'
+            elif _al_azar():
+                motivo = 'muestreo'
+            else:
+                return await get_response(request)
+            perfil = Perfil(motivo)
+            token = _actual.set(perfil)
+            perfil.hilos.add(await sync_to_async(threading.get_ident)())
+            perfil.empezar()
+            respuesta = None
+            try:
+                with instrumentacion.medir() as medicion:
+                    respuesta = await get_response(request)
+                return respuesta
+            finally:
+                _actual.reset(token)
+                perfil.terminar(**_datos(request, respuesta, medicion))
+    else:
+        def middleware(request):
+            if _pedido(request) and request.user.is_staff:
+                motivo = 'pedido'
+            elif _al_azar():
+                motivo = 'muestreo'
+            else:
+                return get_response(request)
+            perfil = Perfil(motivo)
+            token = _actual.set(perfil)
+            perfil.empezar()
+            respuesta = None
+            try:
+                with instrumentacion.medir() as medicion:
+                    respuesta = get_response(request)
+                return respuesta
+            finally:
+                _actual.reset(token)
+                perfil.terminar(**_datos(request, respuesta, medicion))
+    return middleware
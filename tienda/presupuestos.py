@@ -0,0 +1,86 @@
+"""
+Presupuesto de consultas SQL por vista, por nombre de URL de tienda/urls.py.
+
+Es un máximo fijo: no puede depender de cuántas filas haya en la base. Una
+vista que recorre ventas, items o productos y consulta por cada uno (un
+{% for item in venta.items.all %} sin prefetch, un sum() sobre un método
+que consulta) lo rompe en cuanto crecen los datos.
+
+- PresupuestoConsultasTest (tienda/tests.py) pide cada URL con 10 y con
+  1.000 filas de cada modelo: falla si la cantidad de consultas cambia o
+  supera el presupuesto, y muestra las SQL responsables. Una URL nueva sin
+  presupuesto también lo hace fallar.
+- En producción la instrumentación usa estos valores como presupuesto de
+  consultas de cada vista (INSTRUMENTACION_PRESUPUESTOS puede ajustarlos).
+
+Los valores cuentan la sesión y el usuario (2 consultas en las vistas con
+login) y el camino sin caché; subirlos debe ser una decisión explícita.
+"""
+
+CONSULTAS = {
+    # Inicio y autenticación
+    'inicio': 8,
+    'login': 1,
+    'logout': 4,
+    'registrar_vendedor': 0,
+
+    # Productos
+    'productos_list': 7,
+    'productos_create': 2,
+    'productos_update': 3,
+    'productos_delete': 17,     # + borrado en cascada de sus líneas de conteo y ajustes de inventario
+
+    # Clientes
+    'clientes_list': 5,
+    'clientes_create': 2,
+    'clientes_update': 4,
+    'clientes_delete': 6,
+    'cliente_add_ajax': 3,
+
+    # Vendedores
+    'vendedores_list': 5,
+    'vendedores_create': 2,
+    'vendedores_update': 3,
+    'vendedores_delete': 12,    # + sus conteos de inventario quedan sin abierto_por
+
+    # Ventas
+    'ventas_list': 6,
+    'ventas_create': 3,
+    'ventas_create_producto': 4,
+    'ventas_delete': 14,
+    'ventas_factura_pdf_rl': 4,
+    'ventas_recibo': 4,
+    'ventas_historial': 5,
+    'ventas_historial_exportar': 3,
+    'ventas_detalle': 4,
+
+    # Punto de venta (POS)
+    'ventas_pos': 3,
+    'ventas_pos_register': 15,
+    'ventas_pos_producto_codigo': 1,
+    'ventas_pos_productos_codigos': 3,
+    'ventas_pos_sincronizar': 56,     # lote de 3 ventas: crece con el lote (un savepoint por venta), no con la base
+    'ventas_pos_catalogo': 4,
+
+    # Páginas estáticas
+    'contacto': 0,
+    'acerca': 0,
+    'salud': 1,
+    'metrics': 0,
+    'buscar_productos_htmx': 3,
+    'perfil': 3,
+    'configuracion': 2,
+    'notificaciones': 2,
+    'graficos': 9,
+
+    # Conteo de inventario
+    'inventario_conteos': 3,
+    'inventario_conteo': 10,      # cierre: constante con 10 o 1.000 productos contados
+    'inventario_lecturas': 7,
+    'inventario_merma': 5,
+
+    # Perfiles de rendimiento
+    'perfiles': 2,
+    'perfiles_detalle': 2,
+    'perfiles_pilas': 2,
+}
@@ -0,0 +1,146 @@
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models import F
+from django.apps import apps
+from django.db.models.signals import post_save, post_delete, pre_save
+from django.dispatch import receiver
+
+from . import busqueda, catalogo, codigos, imagenes, instrumentacion, tablero
+from .models import Producto, Vendedor, Venta, VentaItem
+
+
+def _ajustar_totales(venta_id, monto, items):
+    """Suma (o resta) un delta al total guardado de la venta con un UPDATE atómico"""
+    if venta_id is None or (not monto and not items):
+        return
+    Venta.objects.filter(pk=venta_id).update(
+        total=F('total') + monto,
+        cantidad_items=F('cantidad_items') + items,
+    )
+
+
+@receiver(post_save, sender=VentaItem)
+def venta_item_guardado(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+
+    anterior = getattr(instance, '_valores_guardados', None)
+    if created:
+        _ajustar_totales(instance.venta_id, instance.subtotal(), 1)
+    elif anterior is None:
+        # Item editado sin valores previos conocidos: recalculamos la venta completa
+        instance.venta.recalcular_totales()
+    else:
+        venta_anterior, cantidad_anterior, precio_anterior = anterior
+        subtotal_anterior = cantidad_anterior * precio_anterior
+        if venta_anterior != instance.venta_id:
+            _ajustar_totales(venta_anterior, -subtotal_anterior, -1)
+            _ajustar_totales(instance.venta_id, instance.subtotal(), 1)
+        else:
+            _ajustar_totales(instance.venta_id, instance.subtotal() - subtotal_anterior, 0)
+
+    instance._valores_guardados = instance.valores_para_total()
+
+
+@receiver(post_delete, sender=VentaItem)
+def venta_item_eliminado(sender, instance, **kwargs):
+    venta_id, cantidad, precio_unitario = getattr(instance, '_valores_guardados', None) or instance.valores_para_total()
+    _ajustar_totales(venta_id, -(cantidad * precio_unitario), -1)
+
+
+@receiver(post_save, sender=Producto)
+def producto_guardado(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    # Sólo actualizamos el índice de búsqueda y la caché de códigos si el cambio queda confirmado
+    codigo_anterior = getattr(instance, '_codigo_guardado', None)
+    codigo_actual = instance.codigo_barras
+    instance._codigo_guardado = codigo_actual
+
+    def actualizar():
+        busqueda.backend().actualizar(instance)
+        codigos.invalidar(codigo_anterior, codigo_actual)
+        tablero.subir('productos')
+    transaction.on_commit(actualizar)
+
+
+@receiver(post_delete, sender=Producto)
+def producto_eliminado(sender, instance, **kwargs):
+    producto_id = instance.pk
+    codigos_producto = (getattr(instance, '_codigo_guardado', None), instance.codigo_barras)
+    # Dentro de la transacción del borrado, como la versión de Producto.save()
+    catalogo.registrar_eliminado(producto_id)
+
+    def quitar():
+        busqueda.backend().quitar(producto_id)
+        codigos.invalidar(*codigos_producto)
+        tablero.subir('productos')
+    transaction.on_commit(quitar)
+
+
+# ----------------------------
+# Tablero de inicio (fragmentos versionados, ver tablero.py)
+# ----------------------------
+@receiver(post_save, sender=Venta)
+@receiver(post_delete, sender=Venta)
+def venta_cambiada_tablero(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    vendedor_id = instance.vendedor_id
+    transaction.on_commit(lambda: tablero.ventas_cambiadas(vendedor_id))
+
+
+@receiver(post_save, sender=VentaItem)
+@receiver(post_delete, sender=VentaItem)
+def venta_item_cambiado_tablero(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    venta_id = instance.venta_id
+
+    def subir():
+        tablero.ventas_cambiadas(Venta.objects.filter(pk=venta_id).values_list('vendedor_id', flat=True).first())
+    transaction.on_commit(subir)
+
+
+@receiver(post_save, sender=Vendedor)
+@receiver(post_delete, sender=Vendedor)
+def vendedor_cambiado_tablero(sender, instance, raw=False, update_fields=None, **kwargs):
+    # Cada login guarda last_login: no cambia nada del tablero
+    if raw or update_fields == frozenset({'last_login'}):
+        return
+    ambitos = ('vendedores', f'vendedor:{instance.pk}')
+    transaction.on_commit(lambda: tablero.subir(*ambitos))
+
+
+def imagen_por_guardar(sender, instance, raw=False, **kwargs):
+    """Si se subió o quitó la imagen, sus miniaturas ya no sirven"""
+    if raw:
+        return
+    campo = imagenes.CAMPOS[sender._meta.label]
+    archivo = getattr(instance, campo)
+    if not archivo or not archivo._committed:
+        setattr(instance, imagenes.campo_clave(campo), '')
+        instance._imagen_nueva = bool(archivo)
+
+
+def imagen_guardada(sender, instance, raw=False, **kwargs):
+    if raw or not getattr(instance, '_imagen_nueva', False):
+        return
+    instance._imagen_nueva = False
+    campo = imagenes.CAMPOS[sender._meta.label]
+    transaction.on_commit(lambda: imagenes.encolar(instance, campo))
+
+
+for _etiqueta in imagenes.CAMPOS:
+    _modelo = apps.get_model(_etiqueta)
+    pre_save.connect(imagen_por_guardar, sender=_modelo, dispatch_uid=f'imagen_por_guardar_{_etiqueta}')
+    post_save.connect(imagen_guardada, sender=_modelo, dispatch_uid=f'imagen_guardada_{_etiqueta}')
+
+
+# ----------------------------
+# Instrumentación de consultas (ver instrumentacion.py)
+# ----------------------------
+@receiver(connection_created)
+def conexion_creada(sender, connection, **kwargs):
+    if instrumentacion.activa():
+        instrumentacion.instrumentar_conexion(connection)
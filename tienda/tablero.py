@@ -0,0 +1,182 @@
+"""
+Métricas del tablero de inicio, con caché de fragmentos versionada.
+
+Cada bloque de index.html va dentro de {% cache %} y varía según las versiones
+de los datos de los que depende:
+
+- 'ventas'          cualquier venta (bloques del admin)
+- 'ventas:<id>'     ventas del vendedor <id>
+- 'vendedor:<id>'   datos del vendedor (comisión, meta)
+- 'vendedores'      alta, baja o activación de vendedores
+- 'productos'       cambios en productos
+
+Las señales de tienda/signals.py suben la versión al confirmar la
+transacción; el fragmento viejo deja de usarse y expira solo. Así una venta
+sólo invalida los bloques de su vendedor y los globales, y editar un producto
+sólo los bloques de productos.
+
+Las métricas se calculan al leerlas (cached_property): con los fragmentos en
+caché la vista no hace consultas. La vista async, antes de renderizar,
+calcula a la vez (asincrono.en_paralelo) las métricas de los fragmentos que
+faltan; FRAGMENTOS de cada clase repite el nombre y las variables de cada
+{% cache %} de index.html y debe coincidir con la plantilla. Con varios workers, la caché 'default' debe
+ser compartida (Redis, Memcached); con LocMemCache cada proceso ve sus propias
+versiones y TABLERO_CACHE_TTL acota el tiempo en que un bloque puede quedar viejo.
+"""
+import time
+from functools import partial
+
+from django.conf import settings
+from django.core.cache import InvalidCacheBackendError, cache, caches
+from django.core.cache.utils import make_template_fragment_key
+from django.db.models import Sum
+from django.utils.functional import cached_property
+
+from ventas import resumenes
+from ventas.models import ResumenVentasDia
+from .asincrono import en_paralelo
+from .models import STOCK_BAJO, Producto, Vendedor, Venta
+
+PREFIJO = 'tablero:v:'
+
+
+def ttl():
+    return getattr(settings, 'TABLERO_CACHE_TTL', 600)
+
+
+def versiones(*ambitos):
+    """
+    Versión de cada ámbito, en orden, con una sola lectura de la caché. Una
+    versión que no está (nueva o desalojada) arranca en la hora actual en ns,
+    nunca en un valor que pueda coincidir con fragmentos viejos.
+    """
+    claves = [PREFIJO + ambito for ambito in ambitos]
+    valores = cache.get_many(claves)
+    for clave in claves:
+        if clave not in valores:
+            cache.add(clave, time.time_ns(), None)
+            valores[clave] = cache.get(clave)
+    return [valores[clave] for clave in claves]
+
+
+def subir(*ambitos):
+    for ambito in ambitos:
+        try:
+            cache.incr(PREFIJO + ambito)
+        except ValueError:
+            cache.set(PREFIJO + ambito, time.time_ns(), None)
+
+
+def ventas_cambiadas(*vendedores_ids):
+    subir('ventas', *(f'ventas:{pk}' for pk in vendedores_ids if pk is not None))
+
+
+def _cache_fragmentos():
+    # La misma que usa {% cache %}
+    try:
+        return caches['template_fragments']
+    except InvalidCacheBackendError:
+        return caches['default']
+
+
+class Metricas:
+    # (fragmento, variables de {% cache %} en orden, métricas que usa)
+    FRAGMENTOS = ()
+
+    def pendientes(self, variables):
+        """
+        Métricas de los fragmentos que no están en caché. `variables` tiene el
+        valor de cada variable de FRAGMENTOS.
+        """
+        claves = {
+            nombre: make_template_fragment_key(nombre, [variables[v] for v in vary_on])
+            for nombre, vary_on, _ in self.FRAGMENTOS
+        }
+        en_cache = _cache_fragmentos().get_many(list(claves.values()))
+        return [
+            metrica
+            for nombre, _, metricas in self.FRAGMENTOS if claves[nombre] not in en_cache
+            for metrica in metricas
+        ]
+
+    async def calcular(self, metricas):
+        """Calcula a la vez las métricas indicadas (cada una en su hilo y su conexión)"""
+        if metricas:
+            await en_paralelo(*(partial(getattr, self, metrica) for metrica in metricas))
+
+
+class MetricasAdmin(Metricas):
+    FRAGMENTOS = (
+        ('tablero_admin_hoy', ('hoy', 'ventas'), ('resumen_hoy',)),
+        ('tablero_admin_vendedores', ('vendedores',), ('vendedores_activos',)),
+        # Con 'hoy' la ventana de reportes avanza sola al cambiar el mes
+        ('tablero_admin_comisiones', ('hoy', 'ventas', 'vendedores'), ('comision_total_pagada',)),
+        ('tablero_admin_productos', ('hoy', 'productos', 'ventas'), ('top_producto', 'stock_bajo')),
+    )
+
+    def __init__(self, hoy):
+        self.hoy = hoy
+        # Comisiones y producto más vendido: los últimos REPORTES_MESES meses, como los gráficos
+        self.desde = resumenes.inicio_reportes(hoy)
+        self.meses_reportes = resumenes.meses_reportes()
+
+    @cached_property
+    def resumen_hoy(self):
+        resumen = ResumenVentasDia.objects.filter(fecha=self.hoy).aggregate(ventas=Sum('ventas'), ingresos=Sum('ingresos'))
+        return {'ventas': resumen['ventas'] or 0, 'ingresos': resumen['ingresos'] or 0}
+
+    @cached_property
+    def vendedores_activos(self):
+        return Vendedor.objects.filter(is_active=True).count()
+
+    @cached_property
+    def comision_total_pagada(self):
+        return ResumenVentasDia.objects.filter(fecha__gte=self.desde).aggregate(Sum('comisiones'))['comisiones__sum'] or 0
+
+    @cached_property
+    def top_producto(self):
+        """(producto, unidades) del producto más vendido en la ventana de reportes"""
+        top = resumenes.top_productos(self.desde, 1)
+        if not top:
+            return None, 0
+        return Producto.objects.filter(pk=top[0]['producto_id']).first(), top[0]['total_vendido']
+
+    @cached_property
+    def stock_bajo(self):
+        return Producto.objects.filter(stock__lte=STOCK_BAJO).count()
+
+
+class MetricasVendedor(Metricas):
+    FRAGMENTOS = (
+        ('tablero_vendedor_hoy', ('usuario', 'hoy', 'ventas'), ('resumen_hoy',)),
+        ('tablero_vendedor_mes', ('usuario', 'hoy', 'ventas', 'vendedor'), ('comision_mes',)),
+        ('tablero_vendedor_ultimas', ('usuario', 'ventas'), ('ultimas_ventas',)),
+    )
+
+    def __init__(self, vendedor, hoy):
+        self.vendedor = vendedor
+        self.hoy = hoy
+
+    @cached_property
+    def resumen_hoy(self):
+        resumen = ResumenVentasDia.objects.filter(vendedor=self.vendedor, fecha=self.hoy).aggregate(
+            ventas=Sum('ventas'), ingresos=Sum('ingresos')
+        )
+        return {'ventas': resumen['ventas'] or 0, 'ingresos': resumen['ingresos'] or 0}
+
+    @cached_property
+    def comision_mes(self):
+        inicio_mes = self.hoy.replace(day=1)
+        return ResumenVentasDia.objects.filter(vendedor=self.vendedor, fecha__gte=inicio_mes).aggregate(
+            Sum('comisiones')
+        )['comisiones__sum'] or 0
+
+    @cached_property
+    def progreso_meta(self):
+        # Entero para evitar filtros complejos en la plantilla
+        meta = self.vendedor.meta_mensual
+        return min(int(self.comision_mes / meta * 100), 100) if meta > 0 else 0
+
+    @cached_property
+    def ultimas_ventas(self):
+        return list(Venta.objects.filter(vendedor=self.vendedor).select_related('cliente').order_by('-fecha')[:5])
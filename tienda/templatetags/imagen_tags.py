@@ -0,0 +1,11 @@
+from django import template
+
+from tienda import imagenes
+
+register = template.Library()
+
+
+@register.simple_tag
+def imagen(archivo, clave, alt='', sizes='100vw', clase='', estilo=''):
+    """Uso: {% imagen producto.imagen producto.imagen_clave alt=producto.nombre sizes="200px" %}"""
+    return imagenes.etiqueta_img(archivo, clave, alt=alt, sizes=sizes, clase=clase, estilo=estilo)
@@ -1,3 +1,1768 @@
-from django.test import TestCase
+import asyncio
+import io
+import json
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import unittest
+import uuid
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.contrib.auth.hashers import make_password
+from django.core.cache import caches
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import OperationalError, connection, connections, transaction
+from django.db.models import F
+from django.db.utils import load_backend
+from django.template import Context, Template
+from django.test.utils import CaptureQueriesContext
+from django.test import AsyncClient, Client, RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.urls import URLPattern, resolve, reverse
+from django.utils import timezone
+from PIL import Image
+from prometheus_client import REGISTRY
+
+from ventas import resumenes
+from ventas.checkout import CheckoutError, eliminar_venta, registrar_venta
+from ventas.models import ResumenProductoDia, ResumenVentasDia
+from . import (asincrono, busqueda, catalogo, codigos, imagenes, importacion, instrumentacion, inventario, paginacion,
+               perfilado, presupuestos, tablero, urls, views)
+from .models import (STOCK_BAJO, AjusteInventario, Cliente, ConteoInventario, ConteoLinea, ContadorCatalogo, Producto,
+                     Vendedor, Venta, VentaItem)
+from .views import _filtrar_historial
+
+
+# ----------------------------
+# Presupuesto de consultas por vista (ver presupuestos.py)
+# ----------------------------
+def _nuevo_producto(prueba):
+    return Producto.objects.create(nombre='Producto a borrar', precio=1)
+
+
+def _nuevo_cliente(prueba):
+    return Cliente.objects.create(nombre='Cliente a borrar', correo='borrar@ejemplo.com', vendedor=prueba.vendedor)
+
+
+def _nuevo_vendedor(prueba):
+    return Vendedor.objects.create(username=f'borrar{uuid.uuid4().hex[:8]}')
+
+
+def _nueva_venta(prueba):
+    venta = Venta.objects.create(vendedor=prueba.vendedor)
+    for producto in Producto.objects.order_by('pk')[:2]:
+        VentaItem.objects.create(venta=venta, producto=producto, cantidad=1)
+    return venta
+
+
+def _perfil_guardado(prueba):
+    perfil = perfilado.Perfil('pedido')
+    perfil.muestras.update({('vista', 'tienda.views.graficos'): 3, ('orm', 'tienda.views.graficos;django.db.x'): 2})
+    perfil.datos = {'vista': 'graficos', 'fecha': timezone.now().isoformat(), 'duracion_ms': 25.0}
+    return os.path.basename(perfilado.escribir(perfil))
+
+
+def _conteo_abierto(prueba):
+    """Conteo con una línea por producto (10 o 1.000), la mitad con una unidad faltante"""
+    conteo = ConteoInventario.objects.create(nombre='Conteo de prueba', abierto_por=prueba.admin)
+    ahora = timezone.now()
+    ConteoLinea.objects.bulk_create(
+        ConteoLinea(conteo=conteo, producto_id=pk, contado=stock - i % 2, stock_sistema=stock, actualizado=ahora)
+        for i, (pk, stock) in enumerate(Producto.objects.order_by('pk').values_list('pk', 'stock'))
+    )
+    return conteo
+
+
+def _carrito(prueba):
+    return [{'id': Producto.objects.order_by('-stock', 'pk').first().pk, 'cantidad': 1}]
+
+
+# URL: (rol, método, función que devuelve (args, datos, opciones del cliente)); None si no se puede pedir
+ESCENARIOS = {
+    'inicio': ('admin', 'get', lambda p: ([], None, {})),
+    'login': (None, 'get', lambda p: ([], None, {})),
+    'logout': ('vendedor', 'get', lambda p: ([], None, {})),
+    'registrar_vendedor': (None, 'get', lambda p: ([], None, {})),
+
+    'productos_list': ('admin', 'get', lambda p: ([], None, {})),
+    'productos_create': ('admin', 'get', lambda p: ([], None, {})),
+    'productos_update': ('admin', 'get', lambda p: ([p.producto.pk], None, {})),
+    'productos_delete': ('admin', 'post', lambda p: ([_nuevo_producto(p).pk], None, {})),
+
+    'clientes_list': ('vendedor', 'get', lambda p: ([], None, {})),
+    'clientes_create': ('vendedor', 'get', lambda p: ([], None, {})),
+    'clientes_update': ('vendedor', 'get', lambda p: ([p.cliente.pk], None, {})),
+    'clientes_delete': ('vendedor', 'post', lambda p: ([_nuevo_cliente(p).pk], None, {})),
+    'cliente_add_ajax': ('vendedor', 'post', lambda p: ([], {'nombre': 'Nuevo', 'correo': 'nuevo@ejemplo.com'}, {})),
+
+    'vendedores_list': ('admin', 'get', lambda p: ([], None, {})),
+    'vendedores_create': ('admin', 'get', lambda p: ([], None, {})),
+    'vendedores_update': ('admin', 'get', lambda p: ([p.vendedor.pk], None, {})),
+    'vendedores_delete': ('admin', 'post', lambda p: ([_nuevo_vendedor(p).pk], None, {})),
+
+    'ventas_list': ('admin', 'get', lambda p: ([], None, {})),
+    'ventas_create': ('vendedor', 'get', lambda p: ([], None, {})),
+    'ventas_create_producto': ('vendedor', 'get', lambda p: ([p.producto.pk], None, {})),
+    'ventas_delete': ('admin', 'post', lambda p: ([_nueva_venta(p).pk], None, {})),
+    'ventas_factura_pdf_rl': ('admin', 'get', lambda p: ([p.venta.pk], None, {})),
+    'ventas_recibo': ('admin', 'get', lambda p: ([p.venta.pk], None, {})),
+    'ventas_historial': ('admin', 'get', lambda p: ([], None, {})),
+    'ventas_historial_exportar': ('admin', 'get', lambda p: (['csv'], {
+        'fecha_inicio': timezone.localdate().isoformat(), 'fecha_fin': timezone.localdate().isoformat(),
+    }, {})),
+    'ventas_detalle': ('admin', 'get', lambda p: ([p.venta.pk], None, {})),
+
+    'ventas_pos': None,     # su plantilla (tienda/ventas_pos.html) no existe; el POS es ventas_create
+    'ventas_pos_register': ('vendedor', 'post', lambda p: ([], {'carrito': json.dumps(_carrito(p))}, {})),
+    'ventas_pos_producto_codigo': ('vendedor', 'post', lambda p: ([], {'codigo': p.producto.codigo_barras}, {})),
+    'ventas_pos_productos_codigos': ('vendedor', 'post', lambda p: ([], json.dumps({
+        'codigos': list(Producto.objects.order_by('pk').values_list('codigo_barras', flat=True)[:20]),
+    }), {'content_type': 'application/json'})),
+    'ventas_pos_sincronizar': ('vendedor', 'post', lambda p: ([], json.dumps({'ventas': [
+        {'clave': str(uuid.uuid4()), 'carrito': _carrito(p), 'metodo_pago': 'Tarjeta'} for _ in range(3)
+    ]}), {'content_type': 'application/json'})),
+    'ventas_pos_catalogo': ('vendedor', 'get', lambda p: ([], {'desde': 0}, {})),
+
+    'contacto': (None, 'get', lambda p: ([], None, {})),
+    'acerca': (None, 'get', lambda p: ([], None, {})),
+    'salud': (None, 'get', lambda p: ([], None, {})),
+    'metrics': (None, 'get', lambda p: ([], None, {})),
+    'buscar_productos_htmx': ('vendedor', 'get', lambda p: ([], {'buscar': 'produ'}, {})),
+    'perfil': ('vendedor', 'get', lambda p: ([], None, {})),
+    'configuracion': ('admin', 'get', lambda p: ([], None, {})),
+    'notificaciones': ('vendedor', 'get', lambda p: ([], None, {})),
+    'graficos': ('admin', 'get', lambda p: ([], None, {})),
+
+    'inventario_conteos': ('admin', 'get', lambda p: ([], None, {})),
+    'inventario_conteo': ('admin', 'post', lambda p: ([_conteo_abierto(p).pk], {'accion': 'cerrar'}, {})),
+    'inventario_lecturas': ('vendedor', 'post', lambda p: ([_conteo_abierto(p).pk], json.dumps({
+        'lecturas': list(Producto.objects.order_by('pk').values_list('codigo_barras', flat=True)[:20]),
+    }), {'content_type': 'application/json'})),
+    'inventario_merma': ('admin', 'get', lambda p: ([], None, {})),
+
+    'perfiles': ('admin', 'get', lambda p: ([], None, {})),
+    'perfiles_detalle': ('admin', 'get', lambda p: ([_perfil_guardado(p)], None, {})),
+    'perfiles_pilas': ('admin', 'get', lambda p: ([_perfil_guardado(p), 'todo'], None, {})),
+}
+
+
+@unittest.skipUnless(instrumentacion.activa(), "Cuenta las consultas con la instrumentación (INSTRUMENTACION_ACTIVA)")
+@override_settings(CONSULTAS_PARALELAS=0)   # los hilos de en_paralelo no verían la transacción del test
+class PresupuestoConsultasTest(TestCase):
+    """Cada URL de tienda/urls.py hace las mismas consultas con 10 que con 1.000 filas, dentro de su presupuesto"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = Vendedor.objects.create_superuser('admin_presupuesto', 'admin@ejemplo.com', 'clave')
+        cls.vendedor = Vendedor.objects.create_user('vendedor_presupuesto', 'vendedor@ejemplo.com', 'clave',
+                                                    comision_porcentaje=Decimal('5'))
+
+    def setUp(self):
+        directorio = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directorio, ignore_errors=True)
+        ajustes = self.settings(PERFILADO_DIR=directorio)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+
+        self.clientes_http = {None: Client()}
+        for rol, usuario in (('admin', self.admin), ('vendedor', self.vendedor)):
+            self.clientes_http[rol] = Client()
+            self.clientes_http[rol].force_login(usuario)
+
+    def sembrar(self, filas):
+        """Completa hasta `filas` productos, clientes, vendedores y ventas (con 2 items cada una)"""
+        inicial = Producto.objects.count()
+        Producto.objects.bulk_create(
+            Producto(codigo_barras=f'77{i:08d}', nombre=f'Producto {i}', precio=Decimal('10.50'), stock=1000)
+            for i in range(inicial, filas)
+        )
+        Cliente.objects.bulk_create(
+            Cliente(nombre=f'Cliente {i}', correo=f'cliente{i}@ejemplo.com', vendedor=self.vendedor)
+            for i in range(Cliente.objects.count(), filas)
+        )
+        clave = make_password(None)
+        Vendedor.objects.bulk_create(
+            Vendedor(username=f'vendedor{i}', password=clave) for i in range(Vendedor.objects.count(), filas)
+        )
+        productos = list(Producto.objects.order_by('pk').values_list('pk', flat=True))
+        inicial = Venta.objects.count()
+        ventas = Venta.objects.bulk_create(
+            Venta(factura_num=f'PRE{i:06d}', vendedor=self.vendedor if i % 2 else self.admin,
+                  total=Decimal('21.00'), cantidad_items=2)
+            for i in range(inicial, filas)
+        )
+        VentaItem.objects.bulk_create(
+            VentaItem(venta=venta, producto_id=productos[(n + i) % len(productos)], cantidad=1,
+                      precio_unitario=Decimal('10.50'))
+            for n, venta in enumerate(ventas) for i in range(2)
+        )
+        hoy = timezone.localdate()
+        resumenes.recalcular_rango(hoy - timedelta(days=1), hoy)
+
+        self.producto = Producto.objects.order_by('pk').first()
+        self.cliente = Cliente.objects.filter(vendedor=self.vendedor).order_by('pk').first()
+        self.venta = Venta.objects.order_by('pk').first()
+
+    def medir(self, nombre):
+        """(consultas, {sql: veces}, código de estado) de una petición a la URL, sin cachés"""
+        rol, metodo, preparar = ESCENARIOS[nombre]
+        args, datos, opciones = preparar(self)
+        for alias in settings.CACHES:
+            caches[alias].clear()
+        codigos.local.clear()
+        if isinstance(busqueda.backend(), busqueda.IndiceMemoria):
+            # Como al arrancar un proceso: el índice ya está cargado y ve las filas sembradas
+            busqueda.backend().cargar()
+        if rol is not None:
+            # logout cierra la sesión: se vuelve a entrar antes de cada medición
+            self.clientes_http[rol].force_login(self.admin if rol == 'admin' else self.vendedor)
+
+        with instrumentacion.medir() as medicion:
+            respuesta = getattr(self.clientes_http[rol], metodo)(reverse(nombre, args=args), datos, **opciones)
+            if respuesta.streaming:
+                b''.join(respuesta.streaming_content)
+        return medicion.consultas, dict(medicion.por_sql), respuesta.status_code
+
+    def medir_todas(self):
+        return {nombre: self.medir(nombre) for nombre, escenario in ESCENARIOS.items() if escenario is not None}
+
+    def test_todas_las_urls_tienen_presupuesto(self):
+        nombres = {patron.name for patron in urls.urlpatterns if isinstance(patron, URLPattern) and patron.name}
+        self.assertEqual(set(presupuestos.CONSULTAS), nombres, "presupuestos.CONSULTAS debe cubrir tienda/urls.py")
+        self.assertEqual(set(ESCENARIOS), nombres, "ESCENARIOS debe pedir cada URL de tienda/urls.py")
+
+    def test_consultas_no_crecen_con_los_datos(self):
+        self.sembrar(10)
+        pocas = self.medir_todas()
+        self.sembrar(1000)
+        muchas = self.medir_todas()
+
+        errores = []
+        for nombre, (consultas, por_sql, estado) in muchas.items():
+            antes, por_sql_antes, _ = pocas[nombre]
+            presupuesto = presupuestos.CONSULTAS[nombre]
+            if estado >= 400:
+                errores.append(f"{nombre}: respondió {estado}")
+            if consultas != antes:
+                crecen = {sql: n for sql, n in por_sql.items() if n > por_sql_antes.get(sql, 0)}
+                errores.append(f"{nombre}: {antes} consultas con 10 filas, {consultas} con 1000. Crecen:"
+                               + ''.join(f"\n  {por_sql_antes.get(sql, 0)} -> {n} x {sql}" for sql, n in crecen.items()))
+            if consultas > presupuesto:
+                errores.append(f"{nombre}: {consultas} consultas, presupuesto {presupuesto}:"
+                               + ''.join(f"\n  {n} x {sql}" for sql, n in por_sql.items()))
+        if errores:
+            self.fail('\n\n'.join(errores))
+
+
+# ----------------------------
+# Perfilado (ver perfilado.py)
+# ----------------------------
+def _esperar_perfiles():
+    for hilo in threading.enumerate():
+        if hilo.name == 'perfilado':
+            hilo.join(5)
+
+
+@override_settings(PERFILADO_ACTIVO=True, PERFILADO_INTERVALO_MS=1, PERFILADO_MUESTREO=0.0, CONSULTAS_PARALELAS=0)
+class PerfiladoTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = Vendedor.objects.create_superuser('admin_perfil', 'admin@ejemplo.com', 'clave')
+        cls.vendedor = Vendedor.objects.create_user('vendedor_perfil', 'vendedor@ejemplo.com', 'clave')
+
+    def setUp(self):
+        self.directorio = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directorio, ignore_errors=True)
+        ajustes = self.settings(PERFILADO_DIR=self.directorio)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+        self.client.force_login(self.admin)
+
+    def perfiles(self):
+        _esperar_perfiles()
+        return [perfilado.leer_resumen(nombre) for nombre in perfilado.listar_nombres()]
+
+    @override_settings(PERFILADO_ACTIVO=False)
+    def test_apagado_no_entra_en_la_cadena(self):
+        with self.assertRaises(MiddlewareNotUsed):
+            perfilado.perfilado_middleware(lambda request: None)
+
+    def test_staff_pide_un_perfil(self):
+        respuesta = self.client.get(reverse('graficos'), {'perfilar': '1'})
+        self.assertEqual(respuesta.status_code, 200)
+
+        [resumen] = self.perfiles()
+        self.assertEqual(resumen['vista'], 'graficos')
+        self.assertEqual(resumen['motivo'], 'pedido')
+        self.assertEqual(set(resumen['fases']), set(perfilado.FASES))
+        self.assertGreater(resumen['consultas'], 0)
+        self.assertEqual(resumen['muestras'], sum(f['muestras'] for f in resumen['fases'].values()))
+        for fase in ('todo',) + perfilado.FASES:
+            self.assertIsNotNone(perfilado.ruta_pilas(resumen['nombre'], fase))
+
+    def test_cabecera(self):
+        self.client.get(reverse('perfil'), HTTP_X_PERFILAR='1')
+        self.assertEqual([r['vista'] for r in self.perfiles()], ['perfil'])
+
+    def test_sin_pedido_o_sin_staff_no_se_perfila(self):
+        self.client.get(reverse('perfil'))
+        self.client.force_login(self.vendedor)
+        self.client.get(reverse('perfil'), {'perfilar': '1'})
+        self.assertEqual(self.perfiles(), [])
+
+    @override_settings(PERFILADO_MUESTREO=1.0)
+    def test_muestreo_al_azar(self):
+        Client().get(reverse('login'))
+        [resumen] = self.perfiles()
+        self.assertEqual((resumen['vista'], resumen['motivo']), ('login', 'muestreo'))
+
+    async def test_vista_async(self):
+        cliente = AsyncClient()
+        await sync_to_async(cliente.force_login)(self.admin)
+        respuesta = await cliente.get(reverse('inicio'), {'perfilar': '1'})
+        self.assertEqual(respuesta.status_code, 200)
+        [resumen] = await sync_to_async(self.perfiles)()
+        self.assertEqual(resumen['vista'], 'inicio')
+
+    def test_fases_por_pila(self):
+        pila, fase, trabajo = perfilado._pila(sys._getframe())
+        self.assertTrue(pila.endswith('tienda.tests.PerfiladoTest.test_fases_por_pila'))
+        self.assertEqual((fase, trabajo), ('vista', True))
+
+    def test_paginas(self):
+        nombre = _perfil_guardado(self)
+        respuesta = self.client.get(reverse('perfiles'))
+        self.assertContains(respuesta, reverse('perfiles_detalle', args=[nombre]))
+
+        respuesta = self.client.get(reverse('perfiles_detalle', args=[nombre]), {'fase': 'orm'})
+        self.assertContains(respuesta, 'django.db.x')
+        self.assertNotContains(respuesta, 'flamegraph-celda flamegraph-otro')
+
+        respuesta = self.client.get(reverse('perfiles_pilas', args=[nombre, 'todo']))
+        self.assertEqual(b''.join(respuesta.streaming_content).decode().splitlines(),
+                         ['tienda.views.graficos 3', 'tienda.views.graficos;django.db.x 2'])
+
+        self.assertEqual(self.client.get(reverse('perfiles_detalle', args=['..'])).status_code, 404)
+        self.client.force_login(self.vendedor)
+        self.assertRedirects(self.client.get(reverse('perfiles')), reverse('inicio'), fetch_redirect_response=False)
+
+
+@unittest.skipUnless(instrumentacion.activa(), "Cuenta las consultas con la instrumentación (INSTRUMENTACION_ACTIVA)")
+@override_settings(CONSULTAS_PARALELAS=0)
+class BenchmarkVistasTest(TestCase):
+    """benchmark_vistas guarda el JSON y falla contra una base mejor que el umbral"""
+
+    ESCENARIOS = ('inicio[admin]', 'productos_list')
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = Vendedor.objects.create_superuser('admin_benchmark', 'admin@ejemplo.com', 'clave')
+        vendedor = Vendedor.objects.create_user('vendedor_benchmark', 'vendedor@ejemplo.com', 'clave')
+        producto = Producto.objects.create(codigo_barras='7750000000011', nombre='Croquetas', precio=Decimal('12.50'),
+                                           stock=50)
+        venta = Venta.objects.create(vendedor=vendedor)
+        VentaItem.objects.create(venta=venta, producto=producto, cantidad=1)
+
+    def setUp(self):
+        directorio = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directorio, ignore_errors=True)
+        self.salida = os.path.join(directorio, 'actual.json')
+        self.base = os.path.join(directorio, 'base.json')
+
+    def benchmark(self, *args):
+        salida = io.StringIO()
+        call_command('benchmark_vistas', '--solo', *self.ESCENARIOS, '--repeticiones', '3', '--calentamiento', '1',
+                     '--salida', self.salida, *args, stdout=salida)
+        with open(self.salida, encoding='utf-8') as archivo:
+            return json.load(archivo), salida.getvalue()
+
+    def guardar_base(self, resultados, factor):
+        """La base con las latencias y la memoria multiplicadas por `factor` (menos de 1: la base es mejor)"""
+        for r in resultados['escenarios'].values():
+            for clave in ('p50', 'p95', 'memoria_kb'):
+                r[clave] *= factor
+        with open(self.base, 'w', encoding='utf-8') as archivo:
+            json.dump(resultados, archivo)
+
+    def test_guarda_los_resultados(self):
+        resultados, _ = self.benchmark()
+        self.assertEqual(list(resultados['escenarios']), list(self.ESCENARIOS))
+        for r in resultados['escenarios'].values():
+            self.assertEqual(r['estados'], [200])
+            self.assertGreater(r['consultas'], 0)
+            self.assertLessEqual(r['p50'], r['p95'])
+        self.assertFalse(logging.getLogger(instrumentacion.__name__).disabled)
+
+    def test_compara_con_la_base(self):
+        resultados, _ = self.benchmark()
+        self.guardar_base(resultados, 10)
+        _, salida = self.benchmark('--base', self.base, '--umbral', '0.2')
+        self.assertIn('Sin regresiones', salida)
+
+        # Una base 200 veces más rápida y liviana: bastante más que el umbral del 20 %
+        self.guardar_base(resultados, 1 / 200)
+        with self.assertRaisesMessage(CommandError, f'2 regresiones respecto de {self.base}'):
+            self.benchmark('--base', self.base, '--umbral', '0.2', '--margen-ms', '0')
+
+    def test_mas_consultas_es_regresion(self):
+        resultados, _ = self.benchmark()
+        for r in resultados['escenarios'].values():
+            r['consultas'] -= 1
+        self.guardar_base(resultados, 10)
+        with self.assertRaisesMessage(CommandError, '2 regresiones'):
+            self.benchmark('--base', self.base)
+
+
+# ----------------------------
+# Planes de las consultas frecuentes (índices de models.py)
+# ----------------------------
+@unittest.skipUnless(connection.vendor == 'postgresql', "Los planes se comprueban en PostgreSQL")
+class PlanesConsultasTest(TestCase):
+    """Las consultas frecuentes de las vistas usan su índice, no un Seq Scan, con una tienda sembrada"""
+
+    HASTA = date(2026, 6, 30)
+
+    @classmethod
+    def setUpTestData(cls):
+        call_command('generar_datos', productos=3000, clientes=3000, vendedores=20, ventas=30000, dias=365,
+                     hasta=cls.HASTA, semilla=23, procesos=1, stdout=io.StringIO())
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        cls.admin = Vendedor.objects.create_superuser('admin_planes', 'admin@ejemplo.com', 'clave')
+        cls.vendedor = Vendedor.objects.filter(username__startswith='demo23_').order_by('pk').first()
+
+    def assertUsaIndice(self, queryset, indice, condicion=True):
+        """El plan no tiene Seq Scan y lee `indice`; con `condicion`, todo el filtro va en su Index Cond"""
+        texto = queryset.explain()
+
+        def nodos(nodo):
+            yield nodo
+            for hijo in nodo.get('Plans', ()):
+                yield from nodos(hijo)
+
+        plan = list(nodos(json.loads(queryset.explain(format='json'))[0]['Plan']))
+        self.assertNotIn('Seq Scan', [n['Node Type'] for n in plan], texto)
+        usan = [n for n in plan if n.get('Index Name') == indice]
+        self.assertTrue(usan, f"No usa {indice}:\n{texto}")
+        if condicion:
+            self.assertTrue(any('Index Cond' in n for n in usan), f"{indice} sin Index Cond:\n{texto}")
+            # Un Filter es un predicado que el índice no resuelve (p. ej. fecha::date): recorre filas de más
+            self.assertFalse([n['Filter'] for n in plan if 'Filter' in n], texto)
+
+    def historial(self, usuario, **filtros):
+        request = RequestFactory().get('/ventas/historial/', filtros)
+        request.user = usuario
+        ventas, resumenes_ventas, _ = _filtrar_historial(request)
+        return ventas.order_by('-fecha', '-id')[:51], resumenes_ventas
+
+    def test_historial_por_fechas(self):
+        ventas, _ = self.historial(self.admin, fecha_inicio='2026-06-01', fecha_fin='2026-06-07')
+        self.assertUsaIndice(ventas, 'tienda_venta_fecha_id')
+
+    def test_historial_de_un_vendedor(self):
+        ventas, resumenes_ventas = self.historial(self.vendedor, fecha_inicio='2026-06-01', fecha_fin='2026-06-30')
+        self.assertUsaIndice(ventas, 'tienda_venta_vend_fecha_id')
+        self.assertUsaIndice(resumenes_ventas, 'resumen_ventas_vend_fecha')
+
+    def test_ultimas_ventas_del_vendedor(self):
+        self.assertUsaIndice(Venta.objects.filter(vendedor=self.vendedor).order_by('-fecha')[:5],
+                             'tienda_venta_vend_fecha_id')
+
+    def test_resumen_del_vendedor(self):
+        inicio_mes = self.HASTA.replace(day=1)
+        self.assertUsaIndice(ResumenVentasDia.objects.filter(vendedor=self.vendedor, fecha__gte=inicio_mes),
+                             'resumen_ventas_vend_fecha')
+        self.assertUsaIndice(ResumenVentasDia.objects.filter(vendedor=self.vendedor), 'resumen_ventas_vend_fecha')
+
+    def test_clientes_del_vendedor(self):
+        self.assertUsaIndice(Cliente.objects.filter(vendedor=self.vendedor).order_by('nombre', 'id')[:51],
+                             'tienda_cliente_vend_nombre')
+
+    def test_stock_bajo(self):
+        # Índice parcial: su condición es el filtro, no hace falta Index Cond
+        self.assertUsaIndice(Producto.objects.filter(stock__lte=STOCK_BAJO), 'tienda_producto_stock_bajo',
+                             condicion=False)
+
+    def test_mayor_valor_en_inventario(self):
+        productos = Producto.objects.annotate(valor_inventario=F('precio') * F('stock')).order_by('-valor_inventario')
+        self.assertUsaIndice(productos[:5], 'tienda_producto_valor_inv', condicion=False)
+
+
+class GenerarDatosTest(TestCase):
+    """La misma semilla da las mismas filas y los totales guardados cuadran con sus items (corre en SQLite)"""
+
+    def generar(self):
+        """Siembra una tienda pequeña, lee lo generado y la deshace para repetir con la misma semilla"""
+        with transaction.atomic():
+            call_command('generar_datos', productos=30, clientes=20, vendedores=3, ventas=200, dias=20,
+                         hasta=date(2026, 6, 30), semilla=7, lote=50, procesos=1, stdout=io.StringIO())
+            filas = {
+                'productos': list(Producto.objects.order_by('codigo_barras').values_list(
+                    'codigo_barras', 'nombre', 'precio', 'stock')),
+                'clientes': list(Cliente.objects.order_by('correo').values_list(
+                    'correo', 'nombre', 'telefono', 'direccion', 'vendedor__username')),
+                'ventas': list(Venta.objects.order_by('factura_num').values_list(
+                    'factura_num', 'fecha', 'metodo_pago', 'efectivo_recibido', 'vuelto', 'cliente__correo',
+                    'vendedor__username', 'estado', 'comision_monto', 'total', 'cantidad_items')),
+                'items': list(VentaItem.objects.order_by('venta__factura_num', 'producto__codigo_barras').values_list(
+                    'venta__factura_num', 'producto__codigo_barras', 'cantidad', 'precio_unitario')),
+            }
+            transaction.set_rollback(True)
+        return filas
+
+    def test_misma_semilla_mismas_filas(self):
+        primera = self.generar()
+        self.assertEqual(len(primera['ventas']), 200)
+        self.assertEqual(len({f[0] for f in primera['ventas']}), 200)
+        segunda = self.generar()
+        for tabla in primera:
+            self.assertEqual(segunda[tabla], primera[tabla], tabla)
+
+    def test_totales_cuadran_con_los_items(self):
+        filas = self.generar()
+        # Se suma en Python: SQLite suma los DecimalField como float
+        calculados = {}
+        for factura, _, cantidad, precio in filas['items']:
+            total, lineas = calculados.get(factura, (Decimal('0'), 0))
+            calculados[factura] = (total + cantidad * precio, lineas + 1)
+        self.assertEqual({v[0]: (v[9], v[10]) for v in filas['ventas']}, calculados)
+
+
+# ----------------------------
+# Importación masiva de productos (ver importacion.py)
+# ----------------------------
+def _xlsx(filas):
+    """Libro mínimo como lo guarda Excel: textos en sharedStrings, números en <v>, celdas y filas vacías omitidas"""
+    compartidos, hoja = [], []
+    for numero, fila in enumerate(filas, start=1):
+        celdas = []
+        for indice, valor in enumerate(fila):
+            ref = f'{chr(65 + indice)}{numero}'
+            if valor is None:
+                continue
+            if isinstance(valor, str):
+                compartidos.append(valor)
+                celdas.append(f'<c r="{ref}" t="s"><v>{len(compartidos) - 1}</v></c>')
+            else:
+                celdas.append(f'<c r="{ref}"><v>{valor}</v></c>')
+        if celdas:
+            hoja.append(f'<row r="{numero}">{"".join(celdas)}</row>')
+    ns = 'xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"'
+    salida = io.BytesIO()
+    with zipfile.ZipFile(salida, 'w') as libro:
+        libro.writestr('xl/workbook.xml', f'<workbook {ns} xmlns:r="http://schemas.openxmlformats.org/officeDocument/'
+                                          f'2006/relationships"><sheets><sheet name="Hoja1" sheetId="1" r:id="rId1"/>'
+                                          f'</sheets></workbook>')
+        libro.writestr('xl/_rels/workbook.xml.rels', '<Relationships xmlns="http://schemas.openxmlformats.org/package/'
+                                                     '2006/relationships"><Relationship Id="rId1" Target="worksheets/'
+                                                     'hoja1.xml"/></Relationships>')
+        libro.writestr('xl/sharedStrings.xml', f'<sst {ns}>{"".join(f"<si><t>{t}</t></si>" for t in compartidos)}</sst>')
+        libro.writestr('xl/worksheets/hoja1.xml', f'<worksheet {ns}><sheetData>{"".join(hoja)}</sheetData></worksheet>')
+    salida.seek(0)
+    return salida
+
+
+class ImportacionProductosTest(TestCase):
+
+    def setUp(self):
+        self.existente = Producto.objects.create(codigo_barras='7790001', nombre='Collar viejo', precio=10, stock=4)
+
+    def importar(self, contenido, nombre='catalogo.csv', **opciones):
+        archivo = io.BytesIO(contenido.encode()) if isinstance(contenido, str) else contenido
+        with self.captureOnCommitCallbacks(execute=True):
+            return importacion.importar(archivo, nombre, **opciones)
+
+    def test_csv_crea_y_actualiza_por_codigo(self):
+        resultado = self.importar(
+            "Código de barras;Nombre;Precio;Stock\n"
+            "7790001;Collar rojo;12,50;8\n"
+            "7790002;Correa;1.234,00;3\n"
+        )
+        self.assertEqual((resultado.filas, resultado.creados, resultado.actualizados, resultado.errores), (2, 1, 1, []))
+        self.existente.refresh_from_db()
+        self.assertEqual((self.existente.nombre, self.existente.precio, self.existente.stock),
+                         ('Collar rojo', Decimal('12.50'), 8))
+        self.assertEqual(Producto.objects.get(codigo_barras='7790002').precio, Decimal('1234.00'))
+
+    def test_sin_columna_stock_conserva_el_stock(self):
+        self.importar("codigo_barras,nombre,precio\n7790001,Collar rojo,11\n")
+        self.existente.refresh_from_db()
+        self.assertEqual((self.existente.precio, self.existente.stock), (Decimal('11.00'), 4))
+
+    def test_filas_con_errores_no_detienen_la_importacion(self):
+        resultado = self.importar(
+            "codigo_barras,nombre,precio,stock\n"
+            "7790010,Juguete,5,1\n"
+            ",Sin código,5,1\n"
+            "7790011,Precio malo,cinco,1\n"
+            "7790012,Stock negativo,5,-2\n"
+            "\n"
+            "7790013,Repetido,5,1\n"
+            "7790013,Repetido bis,6,1\n"
+            "7790014,Snack,2.5,10\n",
+            tamano_lote=3,
+        )
+        self.assertEqual([fila for fila, _ in resultado.errores], [3, 4, 5, 7])
+        self.assertIn('código repetido', resultado.errores[-1][1])
+        self.assertEqual(resultado.creados, 3)
+        self.assertEqual(Producto.objects.get(codigo_barras='7790013').nombre, 'Repetido bis')
+
+    def test_versiones_cache_e_indice(self):
+        codigos.buscar_codigo('7790001')     # queda en la caché con el nombre viejo
+        if isinstance(busqueda.backend(), busqueda.IndiceMemoria):
+            busqueda.backend().cargar()
+        version_anterior = self.existente.version
+        self.importar("codigo_barras,nombre,precio\n7790001,Bebedero,3\n7790020,Rascador,40\n")
+
+        versiones = list(Producto.objects.order_by('version').values_list('version', flat=True))
+        self.assertGreater(versiones[0], version_anterior)
+        self.assertEqual(len(set(versiones)), 2)
+        self.assertEqual(codigos.buscar_codigo('7790001')['nombre'], 'Bebedero')
+        self.assertEqual([p.codigo_barras for p in busqueda.buscar_productos('bebedero')], ['7790001'])
+
+    def test_xlsx(self):
+        resultado = self.importar(_xlsx([
+            ['EAN', 'Producto', None, 'Precio', 'Cantidad'],
+            [7.790001e6, 'Collar XL', None, 15.5, 2],
+            ['7790030', 'Cama', 'columna ignorada', 80, None],
+            [None] * 5,
+            ['7790031', None, None, 80, 1],
+        ]), 'catalogo.xlsx')
+        self.assertEqual((resultado.creados, resultado.actualizados), (1, 1))
+        self.assertEqual(resultado.errores, [(5, 'falta el nombre')])
+        self.existente.refresh_from_db()
+        self.assertEqual((self.existente.nombre, self.existente.precio, self.existente.stock),
+                         ('Collar XL', Decimal('15.50'), 2))
+        self.assertEqual(Producto.objects.get(codigo_barras='7790030').stock, 0)
+
+    def test_csv_de_excel_en_cp1252(self):
+        resultado = self.importar(io.BytesIO("Código;Nombre;Precio\n7790060;Cañería térmica;5\n".encode('cp1252')))
+        self.assertEqual((resultado.creados, resultado.errores), (1, []))
+        self.assertEqual(Producto.objects.get(codigo_barras='7790060').nombre, 'Cañería térmica')
+
+    def test_byte_invalido_anula_solo_su_fila(self):
+        contenido = b"codigo_barras,nombre,precio\n7790061,Pelota,5\n" + b"x" * 70000 + b"\n7790062,Ca\xf1a,5\n"
+        resultado = self.importar(io.BytesIO(contenido))
+        self.assertEqual([fila for fila, _ in resultado.errores], [3, 4])
+        self.assertIn('UTF-8', resultado.errores[1][1])
+        self.assertTrue(Producto.objects.filter(codigo_barras='7790061').exists())
+
+    def test_archivo_cortado_conserva_los_lotes_anteriores(self):
+        codigos.buscar_codigo('7790001')     # queda en la caché con el nombre viejo
+        resultado = self.importar(
+            "codigo_barras,nombre,precio\n7790001,Collar nuevo,3\n7790070,Hueso,2\n"
+            f"7790071,{'x' * 200000},2\n7790072,Nunca,2\n",
+            tamano_lote=2,
+        )
+        self.assertEqual((resultado.creados, resultado.actualizados), (1, 1))
+        self.assertEqual(resultado.errores[0][0], 4)
+        self.assertIn('no se pudo seguir leyendo', resultado.errores[0][1])
+        self.assertFalse(Producto.objects.filter(codigo_barras='7790072').exists())
+        # El lote confirmado actualizó la caché aunque la importación no terminó
+        self.assertEqual(codigos.buscar_codigo('7790001')['nombre'], 'Collar nuevo')
+
+    def test_archivo_invalido(self):
+        with self.assertRaisesMessage(importacion.ImportacionError, 'Faltan columnas obligatorias: precio'):
+            self.importar("codigo_barras,nombre\n1,a\n")
+        with self.assertRaisesMessage(importacion.ImportacionError, 'no es un XLSX válido'):
+            self.importar("codigo_barras,nombre,precio\n", 'catalogo.xlsx')
+        with self.assertRaisesMessage(importacion.ImportacionError, '.csv o .xlsx'):
+            self.importar("", 'catalogo.txt')
+
+    def test_comando(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as archivo:
+            archivo.write("codigo_barras,nombre,precio\n7790040,Pipeta,9\n7790041,,9\n")
+        self.addCleanup(os.remove, archivo.name)
+        salida, errores = io.StringIO(), io.StringIO()
+        call_command('importar_productos', archivo.name, stdout=salida, stderr=errores)
+        self.assertIn('1 productos creados', salida.getvalue())
+        self.assertIn('Fila 3: falta el nombre', errores.getvalue())
+
+    def test_admin(self):
+        self.client.force_login(Vendedor.objects.create_superuser('admin_importar', 'admin@ejemplo.com', 'clave'))
+        url = reverse('admin:tienda_producto_importar')
+        self.assertContains(self.client.get(reverse('admin:tienda_producto_changelist')), url)
+        archivo = io.BytesIO("codigo_barras,nombre,precio\n7790050,Comedero,7\n".encode())
+        archivo.name = 'catalogo.csv'
+        with self.captureOnCommitCallbacks(execute=True):
+            respuesta = self.client.post(url, {'archivo': archivo}, follow=True)
+        self.assertContains(respuesta, '1 productos creados')
+        self.assertTrue(Producto.objects.filter(codigo_barras='7790050').exists())
+
+    def test_admin_sin_permiso(self):
+        self.client.force_login(Vendedor.objects.create_user('staff_importar', is_staff=True))
+        self.assertEqual(self.client.get(reverse('admin:tienda_producto_importar')).status_code, 403)
+
+
+# ----------------------------
+# Conteo de inventario (ver inventario.py)
+# ----------------------------
+class InventarioTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = Vendedor.objects.create_superuser('admin_inventario', 'admin@ejemplo.com', 'clave')
+        cls.vendedor = Vendedor.objects.create_user('vendedor_inventario', 'vendedor@ejemplo.com', 'clave')
+        cls.croquetas = Producto.objects.create(codigo_barras='7791', nombre='Croquetas', precio=Decimal('12.50'), stock=10)
+        cls.collar = Producto.objects.create(codigo_barras='7792', nombre='Collar', precio=Decimal('4.00'), stock=4)
+        cls.arena = Producto.objects.create(codigo_barras='7793', nombre='Arena', precio=Decimal('6.00'), stock=7)
+
+    def setUp(self):
+        self.conteo = ConteoInventario.objects.create(nombre='Góndola 1', abierto_por=self.admin)
+
+    def cerrar(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            return inventario.cerrar(self.conteo.pk)
+
+    def test_lecturas_se_suman_y_el_recuento_reemplaza(self):
+        inventario.registrar_lecturas(self.conteo.pk, ['7791', '7791', {'codigo': '7792', 'cantidad': 3}])
+        productos, no_encontrados = inventario.registrar_lecturas(self.conteo.pk, ['7791', ' 0000 '])
+        self.assertEqual(productos['7791']['contado'], 3)
+        self.assertEqual(no_encontrados, ['0000'])
+
+        productos, _ = inventario.registrar_lecturas(self.conteo.pk, [{'codigo': '7792', 'cantidad': 1}], reemplazar=True)
+        self.assertEqual(productos['7792']['contado'], 1)
+        self.assertEqual(ConteoLinea.objects.get(conteo=self.conteo, producto=self.croquetas).stock_sistema, 10)
+
+    def test_cerrar_ajusta_por_diferencia_y_respeta_las_ventas_posteriores(self):
+        inventario.registrar_lecturas(self.conteo.pk, [
+            {'codigo': '7791', 'cantidad': 8}, {'codigo': '7792', 'cantidad': 6}, {'codigo': '7793', 'cantidad': 7},
+        ])
+        # Se venden 3 croquetas después de contarlas: el cierre no las devuelve
+        registrar_venta(self.vendedor, [{'id': self.croquetas.pk, 'cantidad': 3}])
+
+        conteo = self.cerrar()
+        stocks = dict(Producto.objects.values_list('codigo_barras', 'stock'))
+        self.assertEqual(stocks, {'7791': 5, '7792': 6, '7793': 7})
+        self.assertEqual(
+            (conteo.estado, conteo.productos_contados, conteo.productos_ajustados, conteo.unidades_faltantes,
+             conteo.unidades_sobrantes, conteo.valor_faltante),
+            (ConteoInventario.CERRADO, 3, 2, 2, 2, Decimal('25.00')),
+        )
+        self.assertEqual(
+            sorted(AjusteInventario.objects.values_list('producto__codigo_barras', 'stock_sistema', 'contado',
+                                                        'diferencia', 'stock_resultante')),
+            [('7791', 10, 8, -2, 5), ('7792', 4, 6, 2, 6)],
+        )
+
+    def test_el_stock_no_queda_negativo(self):
+        inventario.registrar_lecturas(self.conteo.pk, [{'codigo': '7792', 'cantidad': 0}])
+        registrar_venta(self.vendedor, [{'id': self.collar.pk, 'cantidad': 3}])
+        self.cerrar()
+        self.collar.refresh_from_db()
+        self.assertEqual(self.collar.stock, 0)
+
+    def test_un_conteo_cerrado_no_recibe_lecturas_ni_se_cierra_otra_vez(self):
+        self.cerrar()
+        with self.assertRaisesMessage(inventario.InventarioError, 'cerrado'):
+            inventario.registrar_lecturas(self.conteo.pk, ['7791'])
+        with self.assertRaisesMessage(inventario.InventarioError, 'cerrado'):
+            inventario.cerrar(self.conteo.pk)
+
+    def test_cerrar_hace_las_mismas_consultas_con_mas_productos(self):
+        def consultas(productos):
+            conteo = ConteoInventario.objects.create(nombre='Conteo')
+            ConteoLinea.objects.bulk_create(
+                ConteoLinea(conteo=conteo, producto=p, contado=p.stock + 1, stock_sistema=p.stock,
+                            actualizado=timezone.now())
+                for p in productos
+            )
+            with CaptureQueriesContext(connection) as capturadas:
+                inventario.cerrar(conteo.pk)
+            return len(capturadas)
+
+        pocos = consultas(Producto.objects.all())
+        Producto.objects.bulk_create(
+            Producto(codigo_barras=f'88{i:06d}', nombre=f'Producto {i}', precio=1, stock=i) for i in range(300)
+        )
+        self.assertEqual(consultas(Producto.objects.all()), pocos)
+
+    def test_reporte_de_merma(self):
+        inventario.registrar_lecturas(self.conteo.pk, [{'codigo': '7791', 'cantidad': 7}, {'codigo': '7793', 'cantidad': 9}])
+        self.cerrar()
+        otro = ConteoInventario.objects.create(nombre='Góndola 2')
+        inventario.registrar_lecturas(otro.pk, [{'codigo': '7791', 'cantidad': 6}])
+        inventario.cerrar(otro.pk)
+
+        ahora = timezone.now()
+        reporte = inventario.reporte_merma(ahora - timedelta(days=1), ahora + timedelta(days=1))
+        self.assertEqual(reporte['totales']['unidades_faltantes'], 4)
+        self.assertEqual(reporte['totales']['valor_faltante'], Decimal('50.00'))
+        self.assertEqual(reporte['totales']['unidades_sobrantes'], 2)
+        self.assertEqual(reporte['totales']['conteos'], 2)
+        [croquetas] = reporte['productos']
+        self.assertEqual((croquetas['producto__nombre'], croquetas['unidades'], croquetas['veces']), ('Croquetas', 4, 2))
+
+    def test_vistas(self):
+        self.client.force_login(self.vendedor)
+        url_lecturas = reverse('inventario_lecturas', args=[self.conteo.pk])
+        respuesta = self.client.post(url_lecturas, json.dumps({'lecturas': ['7791', '9999']}),
+                                     content_type='application/json')
+        self.assertEqual(respuesta.json(), {
+            'ok': True, 'productos': {'7791': {'id': self.croquetas.pk, 'nombre': 'Croquetas', 'contado': 1}},
+            'no_encontrados': ['9999'],
+        })
+        self.assertContains(self.client.get(reverse('inventario_conteo', args=[self.conteo.pk])), 'Croquetas')
+        # Un vendedor escanea, pero no cierra
+        self.client.post(reverse('inventario_conteo', args=[self.conteo.pk]), {'accion': 'cerrar'})
+        self.conteo.refresh_from_db()
+        self.assertEqual(self.conteo.estado, ConteoInventario.ABIERTO)
+
+        self.client.force_login(self.admin)
+        respuesta = self.client.post(reverse('inventario_conteo', args=[self.conteo.pk]), {'accion': 'cerrar'}, follow=True)
+        self.assertContains(respuesta, '1 de 1 productos contados ajustados')
+        self.assertContains(self.client.get(reverse('inventario_merma')), 'Croquetas')
+        respuesta = self.client.post(url_lecturas, json.dumps({'lecturas': ['7791']}), content_type='application/json')
+        self.assertEqual(respuesta.status_code, 409)
+
+
+# ----------------------------
+# Cola offline del POS (ver checkout.registrar_lote)
+# ----------------------------
+class ColaOfflineTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.vendedor = Vendedor.objects.create_user('vendedor_cola', 'cola@ejemplo.com', 'clave')
+        cls.croquetas = Producto.objects.create(nombre='Croquetas', precio=Decimal('12.50'), stock=10)
+        cls.collar = Producto.objects.create(nombre='Collar', precio=Decimal('4.00'), stock=1)
+
+    def venta(self, carrito, **datos):
+        return dict({'clave': str(uuid.uuid4()), 'carrito': carrito, 'metodo_pago': 'Tarjeta'}, **datos)
+
+    def sincronizar(self, ventas):
+        self.client.force_login(self.vendedor)
+        respuesta = self.client.post(reverse('ventas_pos_sincronizar'), json.dumps({'ventas': ventas}),
+                                     content_type='application/json')
+        self.assertEqual(respuesta.status_code, 200)
+        return [(r['estado'], r['mensaje']) for r in respuesta.json()['resultados']]
+
+    def test_reenvio_no_duplica(self):
+        venta = self.venta([{'id': self.croquetas.pk, 'cantidad': 2}])
+        self.assertEqual(self.sincronizar([venta]), [('registrada', '')])
+        self.assertEqual(self.sincronizar([venta, venta]), [('repetida', ''), ('repetida', '')])
+
+        self.assertEqual(Venta.objects.filter(clave_idempotencia=venta['clave']).count(), 1)
+        self.croquetas.refresh_from_db()
+        self.assertEqual(self.croquetas.stock, 8)
+
+    def test_lote_mixto_registra_las_validas(self):
+        resultados = self.sincronizar([
+            self.venta([{'id': self.croquetas.pk, 'cantidad': 1}]),
+            self.venta([{'id': self.collar.pk, 'cantidad': 5}]),
+            self.venta([{'id': 999999, 'cantidad': 1}]),
+            self.venta([{'id': self.collar.pk, 'cantidad': 1}]),
+        ])
+        self.assertEqual([estado for estado, _ in resultados], ['registrada', 'rechazada', 'rechazada', 'registrada'])
+        self.assertIn('Stock insuficiente', resultados[1][1])
+        self.assertEqual(Venta.objects.count(), 2)
+        self.assertEqual(dict(Producto.objects.values_list('nombre', 'stock')), {'Croquetas': 9, 'Collar': 0})
+
+    def test_ventas_mal_formadas_se_rechazan_sin_frenar_el_lote(self):
+        hace_una_semana = (timezone.now() - timedelta(days=7)).isoformat()
+        en_un_dia = (timezone.now() + timedelta(days=1)).isoformat()
+        resultados = self.sincronizar([
+            self.venta([5]),
+            self.venta({'id': self.croquetas.pk}),
+            self.venta(None),
+            'no es una venta',
+            self.venta([{'id': self.croquetas.pk}], efectivo_recibido='Infinity', metodo_pago='Efectivo'),
+            self.venta([{'id': self.croquetas.pk}], fecha='ayer'),
+            self.venta([{'id': self.croquetas.pk}], fecha=hace_una_semana),
+            self.venta([{'id': self.croquetas.pk}], fecha=en_un_dia),
+            {'carrito': [{'id': self.croquetas.pk}]},
+            self.venta([{'id': self.croquetas.pk, 'cantidad': 3}]),
+        ])
+        self.assertEqual([estado for estado, _ in resultados], ['rechazada'] * 9 + ['registrada'])
+        self.assertEqual(Venta.objects.count(), 1)
+
+    def test_fecha_de_cobro_dentro_de_la_ventana(self):
+        cobro = timezone.now() - timedelta(hours=5)
+        venta = self.venta([{'id': self.croquetas.pk}], fecha=cobro.isoformat())
+        self.assertEqual(self.sincronizar([venta]), [('registrada', '')])
+        self.assertEqual(Venta.objects.get(clave_idempotencia=venta['clave']).fecha, cobro)
+
+
+# ----------------------------
+# Resúmenes diarios y reportes (ver ventas/resumenes.py)
+# ----------------------------
+class ResumenesTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = Vendedor.objects.create_superuser('admin_resumenes', 'admin@ejemplo.com', 'clave')
+        cls.vendedor = Vendedor.objects.create_user('vendedor_resumenes', 'resumenes@ejemplo.com', 'clave',
+                                                    comision_porcentaje=10)
+        cls.croquetas = Producto.objects.create(nombre='Croquetas', precio=Decimal('12.50'), stock=50)
+        cls.collar = Producto.objects.create(nombre='Collar', precio=Decimal('4.00'), stock=50)
+
+    def resumen_dia(self):
+        return ResumenVentasDia.objects.values_list('ventas', 'ingresos', 'comisiones').get(
+            vendedor=self.vendedor, fecha=timezone.localdate(), metodo_pago='Efectivo')
+
+    def unidades(self):
+        return dict(ResumenProductoDia.objects.filter(vendedor=self.vendedor).values_list('producto_id', 'unidades'))
+
+    def test_cada_venta_se_suma_al_dia(self):
+        registrar_venta(self.vendedor, [{'id': self.croquetas.pk, 'cantidad': 2}, {'id': self.collar.pk}])
+        registrar_venta(self.vendedor, [{'id': self.croquetas.pk, 'cantidad': 1}])
+
+        self.assertEqual(self.resumen_dia(), (2, Decimal('41.50'), Decimal('4.15')))
+        self.assertEqual(self.unidades(), {self.croquetas.pk: 3, self.collar.pk: 1})
+
+    def test_eliminar_una_venta_la_resta_y_borra_las_filas_en_cero(self):
+        primera = registrar_venta(self.vendedor, [{'id': self.croquetas.pk, 'cantidad': 2}, {'id': self.collar.pk}])
+        segunda = registrar_venta(self.vendedor, [{'id': self.croquetas.pk, 'cantidad': 1}])
+
+        eliminar_venta(primera)
+        self.assertEqual(self.resumen_dia(), (1, Decimal('12.50'), Decimal('1.25')))
+        self.assertEqual(self.unidades(), {self.croquetas.pk: 1})
+
+        eliminar_venta(segunda)
+        self.assertFalse(ResumenVentasDia.objects.exists())
+        self.assertFalse(ResumenProductoDia.objects.exists())
+        self.assertEqual(dict(Producto.objects.values_list('nombre', 'stock')), {'Croquetas': 50, 'Collar': 50})
+
+    def test_la_resta_coincide_con_recalcular_el_dia(self):
+        ventas = [registrar_venta(self.vendedor, [{'id': self.croquetas.pk, 'cantidad': n}, {'id': self.collar.pk}])
+                  for n in (1, 2, 3)]
+        eliminar_venta(ventas[1])
+        incremental = (self.resumen_dia(), self.unidades())
+
+        resumenes.recalcular_dia(timezone.localdate(), self.vendedor.pk)
+        self.assertEqual((self.resumen_dia(), self.unidades()), incremental)
+
+    def test_graficos_agrupa_por_producto_y_mira_la_ventana(self):
+        otro_collar = Producto.objects.create(nombre='Collar', precio=Decimal('5.00'), stock=50)
+        registrar_venta(self.vendedor, [{'id': self.collar.pk, 'cantidad': 3}, {'id': otro_collar.pk, 'cantidad': 2},
+                                        {'id': self.croquetas.pk, 'cantidad': 1}])
+        # Historia fuera de la ventana: no cuenta
+        hace_dos_anos = timezone.localdate() - timedelta(days=730)
+        ResumenProductoDia.objects.create(fecha=hace_dos_anos, vendedor=self.vendedor, producto=self.croquetas,
+                                          metodo_pago='Efectivo', unidades=1000, ingresos=12500)
+        ResumenVentasDia.objects.create(fecha=hace_dos_anos, vendedor=self.vendedor, metodo_pago='Tarjeta',
+                                        ventas=1, ingresos=12500)
+
+        self.client.force_login(self.admin)
+        contexto = self.client.get(reverse('graficos')).context
+        self.assertEqual(json.loads(contexto['labels_prod']), ['Collar', 'Collar', 'Croquetas'])
+        self.assertEqual(json.loads(contexto['data_prod']), [3, 2, 1])
+        self.assertEqual(json.loads(contexto['labels_pago']), ['Efectivo'])
+        self.assertEqual(len(json.loads(contexto['labels_mes'])), 1)
+
+    def test_tablero_admin_usa_la_ventana(self):
+        registrar_venta(self.vendedor, [{'id': self.collar.pk, 'cantidad': 3}, {'id': self.croquetas.pk, 'cantidad': 2}])
+        hace_dos_anos = timezone.localdate() - timedelta(days=730)
+        ResumenProductoDia.objects.create(fecha=hace_dos_anos, vendedor=self.vendedor, producto=self.croquetas,
+                                          metodo_pago='Efectivo', unidades=1000, ingresos=12500)
+        ResumenVentasDia.objects.create(fecha=hace_dos_anos, vendedor=self.vendedor, metodo_pago='Efectivo',
+                                        ventas=1, ingresos=12500, comisiones=1250)
+
+        metricas = tablero.MetricasAdmin(timezone.localdate())
+        self.assertEqual(metricas.top_producto, (self.collar, 3))
+        self.assertEqual(metricas.comision_total_pagada, Decimal('3.70'))
+
+
+# ----------------------------
+# Catálogo del POS (ver catalogo.py)
+# ----------------------------
+class CatalogoTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.producto = Producto.objects.create(codigo_barras='7795', nombre='Croquetas', precio=Decimal('12.50'), stock=10)
+
+    def test_cambios_de_stock_no_toman_version(self):
+        producto = Producto.objects.get(pk=self.producto.pk)
+        version = catalogo.version_actual()
+        producto.stock -= 1
+        producto.descripcion = 'Bolsa de 3 kg'
+        with CaptureQueriesContext(connection) as capturadas:
+            producto.save()
+        self.assertFalse([q for q in capturadas if ContadorCatalogo._meta.db_table in q['sql']])
+        self.assertEqual(catalogo.version_actual(), version)
+        self.assertEqual(catalogo.cambios(version)['productos'], [])
+
+        producto.precio = Decimal('13.00')
+        producto.save(update_fields=['precio', 'stock'])
+        self.assertEqual(catalogo.version_actual(), version + 1)
+        self.assertEqual(catalogo.cambios(version)['productos'], [[producto.pk, '7795', 'Croquetas', '13.00']])
+        producto.refresh_from_db()
+        self.assertEqual((producto.version, producto.stock), (version + 1, 9))
+
+    def test_un_cambio_de_stock_no_pisa_un_cambio_de_catalogo(self):
+        cajero = Producto.objects.get(pk=self.producto.pk)
+        admin = Producto.objects.get(pk=self.producto.pk)
+        admin.nombre = 'Croquetas premium'
+        admin.save()
+        cajero.stock -= 2
+        cajero.save()
+
+        producto = Producto.objects.get(pk=self.producto.pk)
+        self.assertEqual((producto.nombre, producto.stock, producto.version), ('Croquetas premium', 8, admin.version))
+
+    def test_borrar_toma_version(self):
+        version = catalogo.version_actual()
+        producto_id = self.producto.pk
+        self.producto.delete()
+        self.assertEqual(catalogo.cambios(version)['eliminados'], [producto_id])
+
+
+# ----------------------------
+# Exportación del historial (ver ventas/exportacion.py)
+# ----------------------------
+class ExportacionHistorialTest(TestCase):
+
+    def setUp(self):
+        self.client.force_login(Vendedor.objects.create_superuser('admin_exportar', 'admin@ejemplo.com', 'clave'))
+
+    def test_formato_desconocido_es_404(self):
+        self.assertEqual(self.client.get(reverse('ventas_historial_exportar', args=['pdf'])).status_code, 404)
+
+    def test_nombre_del_archivo_sale_de_las_fechas_interpretadas(self):
+        url = reverse('ventas_historial_exportar', args=['csv'])
+        respuesta = self.client.get(url, {'fecha_inicio': '2026-01-05', 'fecha_fin': 'a\nb'})
+        self.assertEqual(respuesta['Content-Disposition'],
+                         f'attachment; filename="ventas_2026-01-05_{timezone.localdate().isoformat()}.csv"')
+        respuesta = self.client.get(reverse('ventas_historial_exportar', args=['xlsx']), {'fecha_inicio': 'a\nb'})
+        self.assertIn('filename="ventas_inicio_', respuesta['Content-Disposition'])
+
+    def test_vendedor_invalido_se_ignora(self):
+        vendedor = Vendedor.objects.create_user('vendedor_exportar', 'vendedor@ejemplo.com', 'clave')
+        Venta.objects.create(vendedor=vendedor, factura_num='EXP0001')
+        for valor in ('abc', '1.5', '-1', '99999999999999999999', ''):
+            for url in (reverse('ventas_historial'), reverse('ventas_historial_exportar', args=['csv'])):
+                respuesta = self.client.get(url, {'vendedor': valor})
+                self.assertEqual(respuesta.status_code, 200, (url, valor))
+                self.assertIn(b'EXP0001', b''.join(respuesta) if respuesta.streaming else respuesta.content)
+        respuesta = self.client.get(reverse('ventas_historial_exportar', args=['csv']), {'vendedor': vendedor.pk + 1})
+        self.assertNotIn(b'EXP0001', b''.join(respuesta) if respuesta.streaming else respuesta.content)
+
+
+# ----------------------------
+# Checkout (ver ventas/checkout.py)
+# ----------------------------
+class CheckoutTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.vendedor = Vendedor.objects.create_user('vendedor_checkout', 'checkout@ejemplo.com', 'clave',
+                                                    comision_porcentaje=5)
+        cls.croquetas = Producto.objects.create(nombre='Croquetas', precio=Decimal('12.50'), stock=10)
+        cls.collar = Producto.objects.create(nombre='Collar', precio=Decimal('4.00'), stock=2)
+
+    def stocks(self):
+        return dict(Producto.objects.values_list('nombre', 'stock'))
+
+    def test_descuenta_stock_y_guarda_totales(self):
+        venta = registrar_venta(
+            self.vendedor,
+            [{'id': self.croquetas.pk, 'cantidad': 2}, {'id': str(self.collar.pk)}, {'id': self.croquetas.pk}],
+            efectivo_recibido=Decimal('50.00'),
+        )
+        self.assertEqual(self.stocks(), {'Croquetas': 7, 'Collar': 1})
+        venta.refresh_from_db()
+        self.assertEqual(
+            (venta.total, venta.cantidad_items, venta.vuelto, venta.comision_monto),
+            (Decimal('41.50'), 2, Decimal('8.50'), Decimal('2.08')),
+        )
+        self.assertEqual(
+            sorted(venta.items.values_list('producto__nombre', 'cantidad', 'precio_unitario')),
+            [('Collar', 1, Decimal('4.00')), ('Croquetas', 3, Decimal('12.50'))],
+        )
+        self.assertIsNotNone(venta.factura_num)
+
+    def test_sin_stock_no_registra_nada(self):
+        with self.assertRaisesMessage(CheckoutError, 'Stock insuficiente para Collar'):
+            registrar_venta(self.vendedor, [{'id': self.croquetas.pk, 'cantidad': 1}, {'id': self.collar.pk, 'cantidad': 3}])
+        self.assertEqual(self.stocks(), {'Croquetas': 10, 'Collar': 2})
+        self.assertFalse(Venta.objects.exists())
+        self.assertFalse(ResumenVentasDia.objects.exists())
+
+        # El último par de unidades sí se puede vender, y después ya no queda
+        registrar_venta(self.vendedor, [{'id': self.collar.pk, 'cantidad': 2}])
+        with self.assertRaisesMessage(CheckoutError, 'Stock insuficiente'):
+            registrar_venta(self.vendedor, [{'id': self.collar.pk}])
+        self.assertEqual(self.stocks()['Collar'], 0)
+
+    def test_rechazos(self):
+        with self.assertRaises(CheckoutError) as error:
+            registrar_venta(self.vendedor, [{'id': 999999}])
+        self.assertEqual(error.exception.status, 404)
+        with self.assertRaisesMessage(CheckoutError, 'menor al total'):
+            registrar_venta(self.vendedor, [{'id': self.croquetas.pk}], efectivo_recibido=Decimal('10.00'))
+        for carrito in ([], [{'id': self.croquetas.pk, 'cantidad': 0}], [{'cantidad': 1}], [5], 'carrito'):
+            with self.assertRaises(CheckoutError):
+                registrar_venta(self.vendedor, carrito)
+        self.assertEqual(self.stocks(), {'Croquetas': 10, 'Collar': 2})
+
+    def test_misma_clave_devuelve_la_misma_venta(self):
+        clave = str(uuid.uuid4())
+        primera = registrar_venta(self.vendedor, [{'id': self.croquetas.pk}], clave_idempotencia=clave)
+        segunda = registrar_venta(self.vendedor, [{'id': self.croquetas.pk}], clave_idempotencia=clave)
+        self.assertEqual(segunda.pk, primera.pk)
+        self.assertTrue(segunda.repetida)
+        self.assertEqual(self.stocks()['Croquetas'], 9)
+
+    def test_consultas_no_dependen_del_largo_del_carrito(self):
+        def consultas(productos):
+            with CaptureQueriesContext(connection) as capturadas:
+                registrar_venta(self.vendedor, [{'id': p.pk} for p in productos])
+            return len(capturadas)
+
+        otros = Producto.objects.bulk_create(Producto(nombre=f'Producto {i}', precio=1, stock=5) for i in range(30))
+        self.assertEqual(consultas(otros[:2]), consultas(otros[2:]))
+
+    def test_eliminar_hace_las_mismas_consultas_con_mas_items(self):
+        def consultas(productos):
+            venta = registrar_venta(self.vendedor, [{'id': p.pk} for p in productos])
+            with CaptureQueriesContext(connection) as capturadas, self.captureOnCommitCallbacks(execute=True):
+                eliminar_venta(venta)
+            self.assertFalse(VentaItem.objects.filter(venta_id=venta.pk).exists())
+            return len(capturadas)
+
+        otros = Producto.objects.bulk_create(Producto(nombre=f'Producto {i}', precio=1, stock=5) for i in range(32))
+        self.assertEqual(consultas(otros[:2]), consultas(otros[2:]))
+        self.assertEqual(set(Producto.objects.filter(pk__in=[p.pk for p in otros]).values_list('stock', flat=True)), {5})
+
+
+# ----------------------------
+# Totales guardados de Venta (ver signals.py)
+# ----------------------------
+class TotalesVentaTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.croquetas = Producto.objects.create(nombre='Croquetas', precio=Decimal('12.50'), stock=50)
+        cls.collar = Producto.objects.create(nombre='Collar', precio=Decimal('4.00'), stock=50)
+
+    def setUp(self):
+        self.venta = Venta.objects.create()
+
+    def totales(self, venta):
+        """(total, cantidad_items) guardados, comprobando que coinciden con los items"""
+        venta.refresh_from_db(fields=['total', 'cantidad_items'])
+        self.assertEqual((venta.total, venta.cantidad_items), venta.calcular_totales())
+        return venta.total, venta.cantidad_items
+
+    def test_crear_y_editar_items(self):
+        item = VentaItem.objects.create(venta=self.venta, producto=self.croquetas, cantidad=2)
+        VentaItem.objects.create(venta=self.venta, producto=self.collar)
+        self.assertEqual(self.totales(self.venta), (Decimal('29.00'), 2))
+
+        item.cantidad = 3
+        item.save()
+        self.assertEqual(self.totales(self.venta), (Decimal('41.50'), 2))
+
+        item = VentaItem.objects.get(pk=item.pk)
+        item.precio_unitario = Decimal('10.00')
+        item.save()
+        self.assertEqual(self.totales(self.venta), (Decimal('34.00'), 2))
+
+    def test_mover_un_item_a_otra_venta(self):
+        item = VentaItem.objects.create(venta=self.venta, producto=self.croquetas, cantidad=2)
+        VentaItem.objects.create(venta=self.venta, producto=self.collar)
+        otra = Venta.objects.create()
+
+        item.venta = otra
+        item.cantidad = 1
+        item.save()
+        self.assertEqual(self.totales(self.venta), (Decimal('4.00'), 1))
+        self.assertEqual(self.totales(otra), (Decimal('12.50'), 1))
+
+    def test_sin_valores_previos_recalcula_la_venta(self):
+        item = VentaItem.objects.create(venta=self.venta, producto=self.croquetas, cantidad=2)
+        # Una instancia armada a mano no pasó por from_db: no sabe qué había guardado
+        copia = VentaItem(pk=item.pk, venta=self.venta, producto=self.croquetas, cantidad=5,
+                          precio_unitario=Decimal('12.50'))
+        copia.save()
+        self.assertEqual(self.totales(self.venta), (Decimal('62.50'), 1))
+
+    def test_eliminar_items(self):
+        item = VentaItem.objects.create(venta=self.venta, producto=self.croquetas, cantidad=2)
+        VentaItem.objects.create(venta=self.venta, producto=self.collar, cantidad=3)
+        item.delete()
+        self.assertEqual(self.totales(self.venta), (Decimal('12.00'), 1))
+
+        VentaItem.objects.filter(venta=self.venta).delete()
+        self.assertEqual(self.totales(self.venta), (Decimal('0.00'), 0))
+
+
+class VerificarTotalesTest(TransactionTestCase):
+    """El comando lee cada lote desde otra conexión: necesita los datos confirmados"""
+
+    def setUp(self):
+        producto = Producto.objects.create(nombre='Croquetas', precio=Decimal('12.50'), stock=50)
+        self.ventas = [Venta.objects.create() for _ in range(5)]
+        for venta in self.ventas:
+            VentaItem.objects.create(venta=venta, producto=producto, cantidad=2)
+        Venta.objects.filter(pk=self.ventas[1].pk).update(total=Decimal('999.00'))
+        Venta.objects.filter(pk=self.ventas[3].pk).update(cantidad_items=7)
+
+    def verificar(self, *args):
+        # Un solo hilo: en la base de pruebas de SQLite (memoria compartida) dos escrituras a la vez chocan
+        salida = io.StringIO()
+        call_command('verificar_totales_ventas', '--batch-size', '2', '--workers', '1', *args, stdout=salida)
+        return salida.getvalue()
+
+    def guardados(self):
+        return list(Venta.objects.order_by('pk').values_list('total', 'cantidad_items'))
+
+    def test_solo_verificar_informa_sin_corregir(self):
+        antes = self.guardados()
+        salida = self.verificar('--solo-verificar')
+        self.assertIn('5 ventas revisadas, 2 con diferencias', salida)
+        self.assertIn(f'Venta {self.ventas[1].pk} ', salida)
+        self.assertEqual(self.guardados(), antes)
+
+    def test_repara_las_ventas_desfasadas(self):
+        self.assertIn('5 ventas revisadas, 2 corregidas', self.verificar())
+        self.assertEqual(self.guardados(), [(Decimal('25.00'), 1)] * 5)
+        self.assertIn('0 corregidas', self.verificar())
+
+
+# ----------------------------
+# Códigos de barras del POS (ver codigos.py)
+# ----------------------------
+@override_settings(CODIGOS_CACHE_COMPARTIDO='default')
+class CodigosTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.vendedor = Vendedor.objects.create_user('vendedor_codigos', 'codigos@ejemplo.com', 'clave')
+        cls.producto = Producto.objects.create(codigo_barras='7796', nombre='Croquetas', precio=Decimal('12.50'))
+
+    def setUp(self):
+        codigos.local.clear()
+        caches['default'].clear()
+
+    def guardar(self, producto):
+        with self.captureOnCommitCallbacks(execute=True):
+            producto.save()
+
+    def test_lru_y_cache_compartida(self):
+        self.assertEqual(codigos.buscar_codigo(' 7796 '), {'id': self.producto.pk, 'nombre': 'Croquetas', 'precio': '12.50'})
+        with self.assertNumQueries(0):
+            self.assertEqual(codigos.buscar_codigo('7796')['nombre'], 'Croquetas')
+        # Otro worker (LRU vacío) lo encuentra en la caché compartida
+        codigos.local.clear()
+        with self.assertNumQueries(0):
+            self.assertEqual(codigos.buscar_codigo('7796')['nombre'], 'Croquetas')
+        # Los códigos inexistentes también quedan guardados
+        self.assertIsNone(codigos.buscar_codigo('0000'))
+        with self.assertNumQueries(0):
+            self.assertIsNone(codigos.buscar_codigo('0000'))
+
+    def test_cambiar_el_codigo_invalida_el_viejo_y_el_nuevo(self):
+        codigos.buscar_codigos(['7796', '7797'])     # el nuevo queda guardado como inexistente
+        self.producto.codigo_barras = '7797'
+        self.guardar(self.producto)
+        self.assertEqual(codigos.buscar_codigos(['7796', '7797']), {
+            '7796': None, '7797': {'id': self.producto.pk, 'nombre': 'Croquetas', 'precio': '12.50'},
+        })
+
+    def test_cambiar_el_precio_invalida(self):
+        codigos.buscar_codigo('7796')
+        self.producto.precio = Decimal('13.00')
+        self.guardar(self.producto)
+        self.assertEqual(codigos.buscar_codigo('7796')['precio'], '13.00')
+
+    def test_eliminar_invalida(self):
+        codigos.buscar_codigo('7796')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.producto.delete()
+        self.assertIsNone(codigos.buscar_codigo('7796'))
+        codigos.local.clear()
+        self.assertIsNone(codigos.buscar_codigo('7796'))
+
+    def test_lote_hace_las_mismas_consultas_con_mas_codigos(self):
+        Producto.objects.bulk_create(
+            Producto(codigo_barras=f'66{i:04d}', nombre=f'Producto {i}', precio=1) for i in range(150)
+        )
+        self.client.force_login(self.vendedor)
+
+        def pedir(lista):
+            codigos.local.clear()
+            caches['default'].clear()
+            with CaptureQueriesContext(connection) as capturadas:
+                respuesta = self.client.post(reverse('ventas_pos_productos_codigos'), json.dumps({'codigos': lista}),
+                                             content_type='application/json')
+            return respuesta.json(), len(capturadas)
+
+        datos, pocas = pedir(['660000', '999999'])
+        self.assertEqual((list(datos['productos']), datos['no_encontrados']), (['660000'], ['999999']))
+        datos, muchas = pedir([f'66{i:04d}' for i in range(150)] + ['999999'])
+        self.assertEqual((len(datos['productos']), pocas), (150, muchas))
+        self.assertLessEqual(muchas, presupuestos.CONSULTAS['ventas_pos_productos_codigos'])
+
+        respuesta = self.client.post(reverse('ventas_pos_productos_codigos'),
+                                     json.dumps({'codigos': ['0'] * (codigos.MAX_LOTE + 1)}),
+                                     content_type='application/json')
+        self.assertEqual(respuesta.status_code, 400)
+
+
+# ----------------------------
+# Búsqueda de productos (ver busqueda.py)
+# ----------------------------
+class BusquedaPruebas:
+    """Las mismas pruebas para cada backend de busqueda.py"""
+
+    backend_clase = None
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.vendedor = Vendedor.objects.create_user('vendedor_busqueda', 'busqueda@ejemplo.com', 'clave')
+        cls.collar = Producto.objects.create(codigo_barras='7790100', nombre='Collar Pequeño', precio=5)
+        cls.cama = Producto.objects.create(nombre='Cama con collar', precio=30)
+        cls.cola = Producto.objects.create(nombre='Cola de caballo sintética', precio=2)
+        cls.croquetas = Producto.objects.create(nombre='Croquetas', descripcion='Sabor pollo', precio=12)
+
+    def setUp(self):
+        anterior = busqueda._backend
+        busqueda._backend = self.backend_clase()
+        self.addCleanup(setattr, busqueda, '_backend', anterior)
+
+    def buscar(self, query, limite=None):
+        return [p.nombre for p in busqueda.buscar_productos(query, limite)]
+
+    def guardar(self, producto):
+        with self.captureOnCommitCallbacks(execute=True):
+            producto.save()
+        return producto
+
+    def test_ignora_mayusculas_y_tildes(self):
+        for query in ('pequeño', 'PEQUENO', 'Pequeno'):
+            self.assertEqual(self.buscar(query), ['Collar Pequeño'])
+        self.assertEqual(self.buscar('sintetica'), ['Cola de caballo sintética'])
+
+    def test_prefijo_antes_que_trigramas(self):
+        self.assertEqual(self.buscar('colla'), ['Collar Pequeño', 'Cama con collar', 'Cola de caballo sintética'])
+        self.assertEqual(self.buscar('7790100'), ['Collar Pequeño'])
+
+    def test_limite(self):
+        Producto.objects.bulk_create(Producto(nombre=f'Collar {i:02d}', precio=1) for i in range(20))
+        busqueda._backend = self.backend_clase()
+        self.assertEqual(len(self.buscar('collar', 5)), 5)
+        with self.settings(BUSQUEDA_PRODUCTOS_LIMITE=8):
+            self.assertEqual(len(self.buscar('collar')), 8)
+
+    def test_sigue_los_cambios_de_productos(self):
+        self.assertEqual(self.buscar('bebedero'), [])     # carga el índice
+        bebedero = self.guardar(Producto(nombre='Bebedero automático', precio=20))
+        self.assertEqual(self.buscar('bebedero'), ['Bebedero automático'])
+
+        bebedero.nombre = 'Fuente de agua'
+        self.guardar(bebedero)
+        self.assertEqual(self.buscar('bebedero'), [])
+        self.assertEqual(self.buscar('fuente'), ['Fuente de agua'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            bebedero.delete()
+        self.assertEqual(self.buscar('fuente'), [])
+
+    def test_vista_htmx(self):
+        self.client.force_login(self.vendedor)
+        respuesta = self.client.get(reverse('buscar_productos_htmx'), {'buscar': 'PEQUEÑO'})
+        self.assertContains(respuesta, 'Collar Pequeño')
+        self.assertNotContains(respuesta, 'Croquetas')
+        # Sin búsqueda, la primera página del catálogo
+        self.assertContains(self.client.get(reverse('buscar_productos_htmx'), {'buscar': ' '}), 'Croquetas')
+
+
+class BusquedaMemoriaTest(BusquedaPruebas, TestCase):
+    backend_clase = busqueda.IndiceMemoria
+
+
+@unittest.skipUnless(connection.vendor == 'postgresql', "pg_trgm requiere PostgreSQL")
+class BusquedaPostgresTest(BusquedaPruebas, TestCase):
+    backend_clase = busqueda.BusquedaPostgres
+
+    @classmethod
+    def setUpClass(cls):
+        # La migración 0008 no crea nada si el servidor no tiene pg_trgm y unaccent
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT to_regprocedure('tienda_unaccent(text)') IS NOT NULL")
+            if not cursor.fetchone()[0]:
+                raise unittest.SkipTest("El servidor no tiene pg_trgm y unaccent")
+        super().setUpClass()
+
+
+# ----------------------------
+# Paginación por cursor (ver paginacion.py)
+# ----------------------------
+@override_settings(PAGINACION_TAMANO=4)
+class PaginacionTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = Vendedor.objects.create_superuser('admin_paginas', 'admin@ejemplo.com', 'clave')
+        ventas = Venta.objects.bulk_create(Venta(factura_num=f'PAG{i:03d}') for i in range(11))
+        # Empates en la columna de orden: sólo el id las distingue
+        mismo_momento = timezone.now() - timedelta(hours=1)
+        Venta.objects.filter(pk__in=[v.pk for v in ventas[:7]]).update(fecha=mismo_momento)
+        Producto.objects.bulk_create(Producto(nombre=f'Producto {i % 3}', precio=1) for i in range(10))
+
+    def pagina(self, queryset, orden, cursor=None):
+        request = RequestFactory().get('/', {'cursor': cursor} if cursor else {})
+        return paginacion.PaginaKeyset(request, queryset, orden)
+
+    def recorrer(self, queryset, orden):
+        vistos, cursor = [], None
+        while True:
+            pagina = self.pagina(queryset, orden, cursor)
+            vistos += [objeto.pk for objeto in pagina]
+            if not pagina.hay_mas:
+                return vistos
+            cursor = pagina.cursor_siguiente
+
+    def test_recorre_todo_sin_repetir_ni_saltear_con_empates(self):
+        for queryset, orden in ((Venta.objects.all(), ('-fecha', '-id')), (Producto.objects.all(), ('nombre', 'id'))):
+            esperado = list(queryset.order_by(*orden).values_list('pk', flat=True))
+            self.assertEqual(self.recorrer(queryset, orden), esperado)
+
+    def test_una_venta_nueva_no_corre_el_cursor(self):
+        orden = ('-fecha', '-id')
+        primera = self.pagina(Venta.objects.all(), orden)
+        restantes = list(Venta.objects.order_by(*orden).values_list('pk', flat=True))[4:8]
+        Venta.objects.create()
+        segunda = self.pagina(Venta.objects.all(), orden, primera.cursor_siguiente)
+        self.assertEqual([v.pk for v in segunda], restantes)
+        self.assertTrue(segunda.es_continuacion)
+
+    def test_cursor_alterado_vuelve_a_la_primera_pagina(self):
+        primera = [v.pk for v in self.pagina(Venta.objects.all(), ('-fecha', '-id'))]
+        alterados = ['%%%', 'bm8gZXMganNvbg', paginacion._codificar([1]), paginacion._codificar(['ayer', 'x']),
+                     paginacion._codificar([None, None]), paginacion._codificar([{'a': 1}, [2]]),
+                     paginacion._codificar([timezone.now().isoformat(), 10 ** 30]),
+                     paginacion._codificar([timezone.now().isoformat(), float('inf')]),
+                     paginacion._codificar(['nul\x00', 1])]
+        for cursor in alterados:
+            pagina = self.pagina(Venta.objects.all(), ('-fecha', '-id'), cursor)
+            self.assertEqual(([v.pk for v in pagina], pagina.es_continuacion), (primera, False), cursor)
+
+        self.client.force_login(self.admin)
+        for nombre in ('ventas_list', 'ventas_historial', 'productos_list', 'clientes_list', 'vendedores_list'):
+            for cursor in alterados:
+                respuesta = self.client.get(reverse(nombre), {'cursor': cursor}, HTTP_HX_REQUEST='true')
+                self.assertEqual(respuesta.status_code, 200, f'{nombre} {cursor}')
+
+
+# ----------------------------
+# Miniaturas de imágenes (ver imagenes.py)
+# ----------------------------
+def _png(ancho, alto):
+    salida = io.BytesIO()
+    Image.new('RGB', (ancho, alto), (200, 120, 40)).save(salida, 'PNG')
+    return salida.getvalue()
+
+
+@override_settings(IMAGENES_ANCHOS=(160, 320, 640))
+class ImagenesTest(TestCase):
+
+    def setUp(self):
+        directorio = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directorio, ignore_errors=True)
+        ajustes = self.settings(MEDIA_ROOT=directorio, MEDIA_URL='/media/')
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+
+    def producto(self, nombre, contenido):
+        # Sin captureOnCommitCallbacks: la señal no encola nada, las genera el comando
+        return Producto.objects.create(nombre=nombre, precio=1, imagen=SimpleUploadedFile(f'{nombre}.png', contenido))
+
+    def etiqueta(self, producto):
+        plantilla = Template('{% load imagen_tags %}{% imagen p.imagen p.imagen_clave alt=p.nombre sizes="300px" %}')
+        return plantilla.render(Context({'p': producto}))
+
+    def test_comando_y_etiqueta(self):
+        angosta = self.producto('angosta', _png(200, 100))
+        ancha = self.producto('ancha', _png(1000, 500))
+        self.assertIn(f'<img src="{angosta.imagen.url}"', self.etiqueta(angosta))
+
+        salida = io.StringIO()
+        call_command('imagenes_derivadas', '--procesos', '1', stdout=salida)
+        self.assertIn('2 imágenes procesadas', salida.getvalue())
+        angosta.refresh_from_db()
+        ancha.refresh_from_db()
+
+        # La angosta no se agranda: sólo 160 y su propio ancho, 200
+        self.assertTrue(angosta.imagen_clave.endswith('w200'))
+        carpeta = os.path.join(settings.MEDIA_ROOT, imagenes.CARPETA, angosta.imagen_clave)
+        self.assertEqual(sorted(os.listdir(carpeta)), ['160.jpg', '160.webp', '200.jpg', '200.webp'])
+        with Image.open(os.path.join(carpeta, '200.webp')) as miniatura:
+            self.assertEqual(miniatura.size, (200, 100))
+        html = self.etiqueta(angosta)
+        self.assertIn(f'/media/derivados/{angosta.imagen_clave}/200.webp 200w', html)
+        self.assertNotIn('320w', html)
+        self.assertNotIn('640w', html)
+
+        html = self.etiqueta(ancha)
+        for ancho in (160, 320, 640):
+            self.assertIn(f'/media/derivados/{ancha.imagen_clave}/{ancho}.jpg {ancho}w', html)
+        self.assertIn(f'src="/media/derivados/{ancha.imagen_clave}/320.jpg"', html)
+
+        # Sin cambios no hay nada pendiente
+        salida = io.StringIO()
+        call_command('imagenes_derivadas', '--procesos', '1', stdout=salida)
+        self.assertIn('0 imágenes procesadas', salida.getvalue())
+
+    def test_clave_anterior_sin_tope(self):
+        self.assertEqual(imagenes.anchos_generados('0123456789abcdef0123'), (160, 320, 640))
+        self.assertEqual(imagenes.anchos_generados('0123456789abcdef0123w500'), (160, 320, 500))
+
+
+# ----------------------------
+# Vistas async y sus gemelas *_sync (ver asincrono.py)
+# ----------------------------
+@override_settings(CONSULTAS_PARALELAS=0)   # los hilos de en_paralelo no verían la transacción del test
+class VistasAsyncTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = Vendedor.objects.create_superuser('admin_async', 'admin@ejemplo.com', 'clave')
+        cls.vendedor = Vendedor.objects.create_user('vendedor_async', 'async@ejemplo.com', 'clave')
+        cls.producto = Producto.objects.create(codigo_barras='7797', nombre='Croquetas', precio=Decimal('12.50'), stock=5)
+
+    def setUp(self):
+        codigos.local.clear()
+
+    async def cliente(self, usuario=None):
+        cliente = AsyncClient()
+        if usuario is not None:
+            await sync_to_async(cliente.force_login)(usuario)
+        return cliente
+
+    def sync(self, nombre, datos):
+        """Respuesta JSON de la gemela *_sync de la vista"""
+        request = RequestFactory().post('/', datos)
+        request.user = self.vendedor
+        respuesta = getattr(views, f'{nombre}_sync')(request)
+        return respuesta.status_code, json.loads(respuesta.content)
+
+    async def test_sin_sesion_redirige_al_login(self):
+        cliente = await self.cliente()
+        # La búsqueda de un código no pide sesión (como su gemela sync)
+        for nombre in ('inicio', 'cliente_add_ajax', 'ventas_pos_register', 'ventas_pos_productos_codigos'):
+            respuesta = await cliente.post(reverse(nombre), {})
+            self.assertEqual(respuesta.status_code, 302, nombre)
+            self.assertTrue(respuesta.url.startswith(f"{reverse('login')}?next="), nombre)
+
+    async def test_codigo_de_barras(self):
+        cliente = await self.cliente(self.vendedor)
+        esperado = {'ok': True, 'producto': {'id': self.producto.pk, 'nombre': 'Croquetas', 'precio': 12.5}}
+        respuesta = await cliente.post(reverse('ventas_pos_producto_codigo'), {'codigo': ' 7797 '})
+        self.assertEqual(respuesta.json(), esperado)
+        respuesta = await cliente.post(reverse('ventas_pos_producto_codigo'), {'codigo': '0000'})
+        self.assertEqual(respuesta.json(), {'ok': False, 'error': 'Producto no encontrado'})
+
+        respuesta = await cliente.post(reverse('ventas_pos_productos_codigos'), {'codigos': ['7797', '0000']})
+        lote = respuesta.json()
+        self.assertEqual((lote['productos'], lote['no_encontrados']), ({'7797': esperado['producto']}, ['0000']))
+
+        await sync_to_async(codigos.local.clear)()
+        self.assertEqual(await sync_to_async(self.sync)('ventas_pos_producto_codigo', {'codigo': '7797'}), (200, esperado))
+        self.assertEqual(await sync_to_async(self.sync)('ventas_pos_productos_codigos', {'codigos': ['7797', '0000']}),
+                         (200, lote))
+
+    async def test_registrar_venta(self):
+        cliente = await self.cliente(self.vendedor)
+        carrito = json.dumps([{'id': self.producto.pk, 'cantidad': 2}])
+        clave = str(uuid.uuid4())
+        respuesta = await cliente.post(reverse('ventas_pos_register'), {'carrito': carrito, 'clave': clave})
+        datos = respuesta.json()
+        self.assertEqual((datos['ok'], datos['mensaje']), (True, 'Venta registrada correctamente'))
+        respuesta = await cliente.post(reverse('ventas_pos_register'), {'carrito': carrito, 'clave': clave})
+        self.assertEqual((respuesta.json()['venta_id'], respuesta.json()['mensaje']),
+                         (datos['venta_id'], 'La venta ya estaba registrada'))
+
+        sin_stock = json.dumps([{'id': self.producto.pk, 'cantidad': 9}])
+        respuesta = await cliente.post(reverse('ventas_pos_register'), {'carrito': sin_stock})
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertIn('Stock insuficiente', respuesta.json()['error'])
+        status, datos_sync = await sync_to_async(self.sync)('ventas_pos_register', {'carrito': carrito})
+        self.assertEqual((status, datos_sync['ok']), (200, True))
+
+        producto = await Producto.objects.aget(pk=self.producto.pk)
+        self.assertEqual(producto.stock, 1)
+
+    async def test_agregar_cliente(self):
+        cliente = await self.cliente(self.vendedor)
+        respuesta = await cliente.post(reverse('cliente_add_ajax'), {'nombre': 'Ana', 'correo': 'ana@ejemplo.com'})
+        self.assertEqual(respuesta.json()['nombre'], 'Ana')
+        self.assertEqual((await cliente.post(reverse('cliente_add_ajax'), {})).status_code, 400)
+        status, _ = await sync_to_async(self.sync)('cliente_add_ajax', {'nombre': 'Luis'})
+        self.assertEqual(status, 200)
+        self.assertEqual(await Cliente.objects.filter(vendedor=self.vendedor).acount(), 2)
+
+    async def test_inicio(self):
+        for usuario in (self.admin, self.vendedor):
+            cliente = await self.cliente(usuario)
+            respuesta = await cliente.get(reverse('inicio'))
+            self.assertEqual(respuesta.status_code, 200)
+
+    def test_un_solo_pool_aunque_lleguen_juntas(self):
+        anterior = asincrono._ejecutor
+        self.addCleanup(setattr, asincrono, '_ejecutor', anterior)
+        asincrono._ejecutor = None
+        barrera = threading.Barrier(8)
+
+        def peticion():
+            barrera.wait()
+            return asyncio.run(asincrono.en_paralelo(lambda: threading.current_thread().name))
+
+        with self.settings(CONSULTAS_PARALELAS=2), \
+                mock.patch.object(asincrono, 'ThreadPoolExecutor', wraps=ThreadPoolExecutor) as creados:
+            with ThreadPoolExecutor(max_workers=8) as peticiones:
+                nombres = [n for r in peticiones.map(lambda _: peticion(), range(8)) for n in r]
+        self.assertEqual(creados.call_count, 1)
+        self.assertTrue(all(n.startswith('consultas') for n in nombres))
+        asincrono._ejecutor.shutdown()
+
+
+# ----------------------------
+# Salud y pool de conexiones (ver salud y tienda_mascotas/postgresql_pool)
+# ----------------------------
+class SaludTest(TestCase):
+
+    def salud(self):
+        respuesta = self.client.get(reverse('salud'))
+        return respuesta.status_code, respuesta.json()
+
+    def test_base_responde(self):
+        estado, datos = self.salud()
+        self.assertEqual((estado, datos['ok']), (200, True))
+        self.assertIsInstance(datos['db_ms'], float)
+        self.assertGreaterEqual(datos['db_ms'], 0)
+
+    @override_settings(SALUD_DB_MAX_MS=-1)
+    def test_base_lenta(self):
+        estado, datos = self.salud()
+        self.assertEqual((estado, datos['ok']), (503, False))
+        self.assertIn('db_ms', datos)
+
+    def test_base_caida(self):
+        with mock.patch.object(connections['default'], 'cursor', side_effect=OperationalError('sin conexión')):
+            estado, datos = self.salud()
+        self.assertEqual((estado, datos), (503, {'ok': False, 'error': 'OperationalError'}))
+
+    def test_estado_del_pool(self):
+        pool = mock.Mock(**{'get_stats.return_value': {'pool_size': 4, 'pool_available': 3, 'pool_max': 10}})
+        with mock.patch.object(connections['default'], 'pool', pool, create=True):
+            estado, datos = self.salud()
+        self.assertEqual((estado, datos['pool']), (200, {'pool_size': 4, 'pool_available': 3, 'requests_waiting': 0}))
+
+
+@unittest.skipUnless(connection.vendor == 'postgresql', "El pool es del backend de PostgreSQL")
+class PoolConexionesTest(TransactionTestCase):
+
+    def setUp(self):
+        ajustes = dict(connection.settings_dict, ENGINE='tienda_mascotas.postgresql_pool', CONN_HEALTH_CHECKS=True,
+                       OPTIONS={'pool': {'min_size': 1, 'max_size': 1, 'timeout': 5}})
+        backend = load_backend(ajustes['ENGINE'])     # importa psycopg_pool: sólo con PostgreSQL
+        self.conexion = backend.DatabaseWrapper(ajustes, 'prueba_pool')
+        self.addCleanup(backend.cerrar_pool, 'prueba_pool', ajustes['NAME'])
+        self.addCleanup(self.conexion.close)
+
+    def consultar(self):
+        with self.conexion.cursor() as cursor:
+            cursor.execute('SELECT pg_backend_pid()')
+            return cursor.fetchone()[0]
+
+    def test_la_conexion_vuelve_al_pool(self):
+        pid = self.consultar()
+        pool = self.conexion.pool
+        self.assertEqual(pool.get_stats()['pool_available'], pool.get_stats()['pool_size'] - 1)
+        self.conexion.close()
+        self.assertIsNone(self.conexion.connection)
+        self.assertEqual(pool.get_stats()['pool_available'], pool.get_stats()['pool_size'])
+        # La siguiente petición reutiliza la misma conexión de PostgreSQL
+        self.assertEqual(self.consultar(), pid)
+
+
+# ----------------------------
+# Instrumentación y /metrics (ver instrumentacion.py)
+# ----------------------------
+@unittest.skipUnless(instrumentacion.activa(), "Requiere INSTRUMENTACION_ACTIVA")
+@override_settings(CONSULTAS_PARALELAS=0)
+class InstrumentacionTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.vendedor = Vendedor.objects.create_user('vendedor_metricas', 'metricas@ejemplo.com', 'clave')
+
+    def setUp(self):
+        self.client.force_login(self.vendedor)
+
+    def contador(self, nombre, **etiquetas):
+        return REGISTRY.get_sample_value(nombre, etiquetas) or 0
+
+    @override_settings(INSTRUMENTACION_PRESUPUESTOS={'clientes_list': {'consultas': 1}})
+    def test_vista_fuera_de_presupuesto(self):
+        antes = self.contador('tienda_fuera_de_presupuesto_total', vista='clientes_list', motivo='consultas')
+        with self.assertLogs('tienda.instrumentacion', 'WARNING') as registro:
+            self.client.get(reverse('clientes_list'))
+        [mensaje] = registro.output
+        self.assertIn('GET /clientes/ (clientes_list) fuera de presupuesto', mensaje)
+        self.assertIn('(máx. 1)', mensaje)
+        self.assertEqual(self.contador('tienda_fuera_de_presupuesto_total', vista='clientes_list', motivo='consultas'),
+                         antes + 1)
+
+    def test_dentro_del_presupuesto_no_registra(self):
+        antes = self.contador('tienda_consultas_count', vista='clientes_list')
+        with self.assertNoLogs('tienda.instrumentacion', 'WARNING'):
+            self.client.get(reverse('clientes_list'))
+        self.assertEqual(self.contador('tienda_consultas_count', vista='clientes_list'), antes + 1)
+
+    def test_repetidas_y_duplicadas(self):
+        request = RequestFactory().get(reverse('perfil'))
+        request.resolver_match = resolve(reverse('perfil'))
+        medicion = instrumentacion.Medicion()
+        for pk in (1, 2, 3, 4, 5, 5):
+            medicion.registrar('SELECT * FROM tienda_cliente WHERE id = %s', (pk,), 0.001)
+        medicion.registrar('SELECT 1', (), 0.001)
+        self.assertEqual(medicion.repetidas(5), [(6, 'SELECT * FROM tienda_cliente WHERE id = %s')])
+        self.assertEqual(medicion.duplicadas, 1)
+
+        antes = (self.contador('tienda_consultas_repetidas_total', vista='perfil'),
+                 self.contador('tienda_consultas_duplicadas_total', vista='perfil'))
+        with self.settings(INSTRUMENTACION_PRESUPUESTOS={'perfil': {'consultas': 5}}), \
+                self.assertLogs('tienda.instrumentacion', 'WARNING') as registro:
+            instrumentacion._terminar(request, medicion, 0.01)
+        self.assertIn('\n  6 x SELECT * FROM tienda_cliente WHERE id = %s', registro.output[0])
+        self.assertEqual((self.contador('tienda_consultas_repetidas_total', vista='perfil'),
+                          self.contador('tienda_consultas_duplicadas_total', vista='perfil')),
+                         (antes[0] + 6, antes[1] + 1))
+
+    def test_mediciones_anidadas(self):
+        with instrumentacion.medir() as afuera:
+            self.client.get(reverse('perfil'))
+            with instrumentacion.medir() as adentro:
+                Cliente.objects.count()
+        self.assertEqual(adentro.consultas, 1)
+        self.assertGreater(afuera.consultas, adentro.consultas)
+
+    def test_metrics_sin_token(self):
+        self.client.get(reverse('clientes_list'))
+        respuesta = Client().get(reverse('metrics'))
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertIn(b'tienda_peticion_segundos_count{vista="clientes_list"}', respuesta.content)
+
+    @override_settings(METRICAS_TOKEN='secreto')
+    def test_metrics_con_token(self):
+        cliente = Client()
+        self.assertEqual(cliente.get(reverse('metrics')).status_code, 403)
+        self.assertEqual(cliente.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer otro').status_code, 403)
+        respuesta = cliente.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer secreto')
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertIn(b'tienda_consultas_bucket', respuesta.content)
@@ -1,11 +1,22 @@
+from django.conf import settings
 from django.urls import path
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.views import LogoutView, LoginView
-from . import views
+from . import instrumentacion, views
+
+# Vistas con versión async (ASGI) y sync (WSGI); ver views.py
+ASYNC = ('inicio', 'cliente_add_ajax', 'ventas_pos_register', 'ventas_pos_producto_codigo', 'ventas_pos_productos_codigos')
+
+
+def vista(nombre, usar_async=None):
+    if usar_async is None:
+        usar_async = getattr(settings, 'VISTAS_ASYNC', True)
+    return getattr(views, nombre if usar_async else f'{nombre}_sync')
+
 
 urlpatterns = [
     # Inicio y autenticación
-    path('', login_required(views.inicio), name='inicio'),
+    path('', vista('inicio'), name='inicio'),
     path('login/', views.login_view, name='login'),
     path('logout/', views.logout_view, name='logout'),
     path('registrar-vendedor/', views.registrar_vendedor, name='registrar_vendedor'),
@@ -21,7 +32,7 @@ urlpatterns = [
     path('clientes/crear/', views.clientes_create, name='clientes_create'),
     path('clientes/<int:pk>/editar/', views.clientes_update, name='clientes_update'),
     path('clientes/<int:pk>/eliminar/', views.clientes_delete, name='clientes_delete'),
-    path('cliente/add/ajax/', views.cliente_add_ajax, name='cliente_add_ajax'),
+    path('cliente/add/ajax/', vista('cliente_add_ajax'), name='cliente_add_ajax'),
 
     # Vendedores
     path('vendedores/', views.vendedores_list, name='vendedores_list'),
@@ -35,22 +46,40 @@ urlpatterns = [
     path('ventas/crear/<int:producto_id>/', views.ventas_create, name='ventas_create_producto'),
     path('ventas/<int:pk>/eliminar/', views.ventas_delete, name='ventas_delete'),
     path('ventas/<int:pk>/factura/', views.ventas_factura_pdf_rl, name='ventas_factura_pdf_rl'),
+    path('ventas/<int:pk>/recibo/', views.ventas_recibo, name='ventas_recibo'),
     path('ventas/historial/', views.ventas_historial, name='ventas_historial'),
+    path('ventas/historial/exportar/<str:formato>/', views.ventas_historial_exportar, name='ventas_historial_exportar'),
     path('ventas/<int:pk>/detalle/', views.ventas_detalle, name='ventas_detalle'),
 
     # Punto de venta (POS)
     path('ventas/pos/', views.ventas_pos, name='ventas_pos'),
-    path('ventas/pos/register/', views.ventas_pos_register, name='ventas_pos_register'),
-    path('ventas/pos/codigo/', views.ventas_pos_producto_codigo, name='ventas_pos_producto_codigo'),
-    path('ventas/producto/codigo/', views.ventas_pos_producto_codigo, name='ventas_pos_producto_codigo'),
+    path('ventas/pos/register/', vista('ventas_pos_register'), name='ventas_pos_register'),
+    path('ventas/pos/codigo/', vista('ventas_pos_producto_codigo'), name='ventas_pos_producto_codigo'),
+    path('ventas/producto/codigo/', vista('ventas_pos_producto_codigo'), name='ventas_pos_producto_codigo'),
+    path('ventas/pos/codigos/', vista('ventas_pos_productos_codigos'), name='ventas_pos_productos_codigos'),
+    path('ventas/pos/sincronizar/', views.ventas_pos_sincronizar, name='ventas_pos_sincronizar'),
+    path('ventas/pos/catalogo/', views.ventas_pos_catalogo, name='ventas_pos_catalogo'),
 
     # Páginas estáticas
     path('contacto/', views.contacto, name='contacto'),
     path('acerca/', views.acerca, name='acerca'),
+    path('salud/', views.salud, name='salud'),
+    path('metrics', instrumentacion.metrics, name='metrics'),
     path('productos/buscar-htmx/', views.buscar_productos_htmx, name='buscar_productos_htmx'),
     path('perfil/', views.perfil, name='perfil'),
     path('configuracion/', views.configuracion, name='configuracion'),
     path('notificaciones/', views.notificaciones, name='notificaciones'),
     path('graficos/', views.graficos, name='graficos'),
 
+    # Conteo de inventario (ver inventario.py)
+    path('inventario/conteos/', views.inventario_conteos, name='inventario_conteos'),
+    path('inventario/conteos/<int:pk>/', views.inventario_conteo, name='inventario_conteo'),
+    path('inventario/conteos/<int:pk>/lecturas/', views.inventario_lecturas, name='inventario_lecturas'),
+    path('inventario/merma/', views.inventario_merma, name='inventario_merma'),
+
+    # Perfiles de rendimiento (ver perfilado.py)
+    path('perfiles/', views.perfiles, name='perfiles'),
+    path('perfiles/<str:nombre>/', views.perfiles_detalle, name='perfiles_detalle'),
+    path('perfiles/<str:nombre>/<str:fase>.folded', views.perfiles_pilas, name='perfiles_pilas'),
+
 ]
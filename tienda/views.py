@@ -1,99 +1,70 @@
 from django.shortcuts import render, redirect, get_object_or_404
-from django.http import HttpResponse, JsonResponse
+from django.http import FileResponse, Http404, HttpResponse, JsonResponse, StreamingHttpResponse
 from django.contrib import messages
 from django.utils import timezone
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth import authenticate, login, logout
+from django.views.decorators.cache import never_cache
 from django.views.decorators.csrf import csrf_exempt
 from decimal import Decimal, InvalidOperation
-from io import BytesIO
+import base64
 import json
+import time
+from django.conf import settings
+from django.db import DatabaseError, connection
 from django.db.models import Sum, Count, F, Q
 from django.db.models.functions import TruncMonth
 from django.contrib.auth import get_user_model
-from reportlab.lib import colors
-from reportlab.lib.pagesizes import A4
-from reportlab.platypus import Table, TableStyle, SimpleDocTemplate, Paragraph, Spacer
-from reportlab.lib.styles import getSampleStyleSheet
-from reportlab.lib.units import mm
 
-from .models import Producto, Cliente, Venta, VentaItem, Vendedor
+from .models import STOCK_BAJO, ConteoInventario, Producto, Cliente, Venta, VentaItem, Vendedor
+from . import catalogo, codigos, inventario, perfilado, tablero
+from .busqueda import buscar_productos
+from .paginacion import PaginaKeyset, es_parcial, total_aproximado
 from .forms import ProductoForm, ClienteForm, VentaForm, VendedorForm, VendedorRegistroForm
+from ventas.checkout import CheckoutError, eliminar_venta, registrar_lote, registrar_venta
+from ventas import exportacion, factura_pdf, recibo, resumenes
+from ventas.models import ResumenVentasDia
 from django.template.loader import render_to_string
-from datetime import datetime
+from django.utils.cache import get_conditional_response
+from django.utils.dateparse import parse_date
+from datetime import datetime, timedelta
+from asgiref.sync import sync_to_async
+from .asincrono import login_requerido, sin_csrf
+
+# Las vistas async del POS y del tablero tienen su versión *_sync, que usa
+# urls.py con VISTAS_ASYNC = False (p. ej. servidas por WSGI)
 
 # ---------------------------
 # VISTA PRINCIPAL / DASHBOARD
 # ---------------------------
-@login_required
-def inicio(request):
-    today = timezone.now().date()
-    
-    if request.user.is_superuser:
-        # --- DASHBOARD ADMIN ---
-        productos = Producto.objects.all()
-        clientes_total = Cliente.objects.count()
-        ventas_hoy = VentaItem.objects.filter(venta__fecha__date=today).count()
-        productos_stock_bajo = Producto.objects.filter(stock__lte=5)
-        
-        # Top producto
-        top_producto = (
-            Producto.objects
-            .annotate(total_vendido=Sum('ventaitem__cantidad'))
-            .order_by('-total_vendido')
-            .first()
-        )
-        total_vendido_top = top_producto.total_vendido if top_producto else 0
-        
-        # Nuevas métricas Admin
-        ingresos_hoy = sum(v.total() for v in Venta.objects.filter(fecha__date=today))
-        
-        vendedores_activos = Vendedor.objects.filter(is_active=True).count()
-        comision_total_pagada = Venta.objects.aggregate(Sum('comision_monto'))['comision_monto__sum'] or 0
-
-        context = {
-            'role': 'admin',
-            'productos': productos,
-            'clientes_total': clientes_total,
-            'ventas_hoy': ventas_hoy,
-            'ingresos_hoy': ingresos_hoy,
-            'productos_stock_bajo': productos_stock_bajo,
-            'top_producto': top_producto,
-            'total_vendido_top': total_vendido_top,
-            'vendedores_activos': vendedores_activos,
-            'comision_total_pagada': comision_total_pagada,
-        }
+def _contexto_inicio(usuario, con_pendientes=False):
+    """(contexto de index.html, métricas de los fragmentos que faltan en caché si se piden)"""
+    today = timezone.localdate()
+    if usuario.is_superuser:
+        role, metricas = 'admin', tablero.MetricasAdmin(today)
+        ambitos = {'ventas': 'ventas', 'vendedores': 'vendedores', 'productos': 'productos'}
     else:
-        # --- DASHBOARD VENDEDOR ---
-        usuario = request.user
-        
-        # Ventas de hoy del vendedor
-        ventas_hoy_qs = Venta.objects.filter(vendedor=usuario, fecha__date=today)
-        ventas_hoy_count = ventas_hoy_qs.count()
-        total_vendido_hoy = sum(v.total() for v in ventas_hoy_qs)
-        
-        # Comisión del mes
-        inicio_mes = today.replace(day=1)
-        comision_mes = Venta.objects.filter(vendedor=usuario, fecha__date__gte=inicio_mes).aggregate(Sum('comision_monto'))['comision_monto__sum'] or 0
-        
-        # Meta personal
-        meta = usuario.meta_mensual
-        # Calculamos progreso como entero para evitar uso de filtros complejos en template
-        progreso_meta = int((comision_mes / meta * 100)) if meta > 0 else 0
-        
-        # Últimas ventas
-        ultimas_ventas = Venta.objects.filter(vendedor=usuario).order_by('-fecha')[:5]
-
-        context = {
-            'role': 'vendedor',
-            'ventas_hoy_count': ventas_hoy_count,
-            'total_vendido_hoy': total_vendido_hoy,
-            'comision_mes': comision_mes,
-            'meta': meta,
-            'progreso_meta': min(progreso_meta, 100),
-            'ultimas_ventas': ultimas_ventas,
-        }
+        role, metricas = 'vendedor', tablero.MetricasVendedor(usuario, today)
+        ambitos = {'ventas': f'ventas:{usuario.pk}', 'vendedor': f'vendedor:{usuario.pk}'}
+    v = dict(zip(ambitos, tablero.versiones(*ambitos.values())))
+    context = {'role': role, 'metricas': metricas, 'v': v, 'hoy': today.isoformat(), 'tablero_ttl': tablero.ttl()}
+    pendientes = metricas.pendientes({**v, 'hoy': context['hoy'], 'usuario': usuario.pk}) if con_pendientes else []
+    return context, pendientes
+
 
+@login_requerido
+async def inicio(request):
+    # Los bloques se cachean como fragmentos versionados (ver tablero.py); las
+    # métricas de los fragmentos que faltan se calculan en paralelo antes de renderizar
+    context, pendientes = await sync_to_async(_contexto_inicio)(request.user, con_pendientes=True)
+    await context['metricas'].calcular(pendientes)
+    return await sync_to_async(render)(request, 'tienda/index.html', context)
+
+
+@login_required
+def inicio_sync(request):
+    # Las métricas se consultan una por una al renderizar, sólo si falta su fragmento
+    context, _ = _contexto_inicio(request.user)
     return render(request, 'tienda/index.html', context)
 
 
@@ -103,17 +74,24 @@ def inicio(request):
 @login_required
 def productos_list(request):
     query = request.GET.get('q', '')
-    productos = Producto.objects.filter(nombre__icontains=query) if query else Producto.objects.all()
+    if query:
+        productos, pagina = buscar_productos(query), None
+    else:
+        productos = pagina = PaginaKeyset(request, Producto.objects.all(), ('nombre', 'id'))
+    if es_parcial(request):
+        return render(request, 'tienda/partials/productos_cards.html', {'productos': productos, 'pagina': pagina})
 
     # Stats for Dashboard
-    total_productos = Producto.objects.count()
-    low_stock_count = Producto.objects.filter(stock__lte=5).count()
-    total_valor_inventario = sum(p.precio * p.stock for p in Producto.objects.all())
+    total_productos, total_productos_exacto = total_aproximado(Producto.objects.all())
+    low_stock_count = Producto.objects.filter(stock__lte=STOCK_BAJO).count()
+    total_valor_inventario = Producto.objects.aggregate(valor=Sum(F('precio') * F('stock')))['valor'] or 0
 
     context = {
         'productos': productos,
+        'pagina': pagina,
         'query': query,
         'total_productos': total_productos,
+        'total_productos_exacto': total_productos_exacto,
         'low_stock_count': low_stock_count,
         'total_valor_inventario': total_valor_inventario,
     }
@@ -173,8 +151,10 @@ def clientes_list(request):
         clientes = Cliente.objects.all()
     else:
         clientes = Cliente.objects.filter(vendedor=request.user)
-        
-    return render(request, 'tienda/clientes_list.html', {'clientes': clientes})
+
+    pagina = PaginaKeyset(request, clientes, ('nombre', 'id'))
+    plantilla = 'tienda/partials/clientes_filas.html' if es_parcial(request) else 'tienda/clientes_list.html'
+    return render(request, plantilla, {'clientes': pagina, 'pagina': pagina})
 
 @login_required
 def clientes_create(request):
@@ -225,21 +205,33 @@ def clientes_delete(request, pk):
 @login_required
 def ventas_list(request):
     # Filtrar ventas según rol
-    if request.user.is_superuser:
-        ventas = Venta.objects.prefetch_related('items__producto').select_related('cliente', 'vendedor').order_by('-fecha')
-    else:
-        ventas = Venta.objects.filter(vendedor=request.user).prefetch_related('items__producto').select_related('cliente', 'vendedor').order_by('-fecha')
-    
-    # Cálculos para el dashboard de ventas (basado en el queryset filtrado)
-    total_ventas_count = ventas.count()
-    total_ingresos = sum(v.total() for v in ventas)
-    
-    today = timezone.now().date()
-    ventas_hoy_count = ventas.filter(fecha__date=today).count()
-    ingresos_hoy = sum(v.total() for v in ventas if v.fecha.date() == today)
+    ventas = Venta.objects.prefetch_related('items__producto').select_related('cliente', 'vendedor')
+    resumenes_ventas = ResumenVentasDia.objects.all()
+    if not request.user.is_superuser:
+        ventas = ventas.filter(vendedor=request.user)
+        resumenes_ventas = resumenes_ventas.filter(vendedor=request.user)
+
+    # Sólo se traen (y se prefetchean los items de) las ventas de esta página
+    pagina = PaginaKeyset(request, ventas, ('-fecha', '-id'))
+    if es_parcial(request):
+        return render(request, 'tienda/partials/ventas_filas.html', {'ventas': pagina, 'pagina': pagina})
+
+    # Cálculos para el dashboard de ventas desde los resúmenes diarios
+    today = timezone.localdate()
+    resumen = resumenes_ventas.aggregate(
+        total_ventas_count=Sum('ventas'),
+        total_ingresos=Sum('ingresos'),
+        ventas_hoy_count=Sum('ventas', filter=Q(fecha=today)),
+        ingresos_hoy=Sum('ingresos', filter=Q(fecha=today)),
+    )
+    total_ventas_count = resumen['total_ventas_count'] or 0
+    total_ingresos = resumen['total_ingresos'] or 0
+    ventas_hoy_count = resumen['ventas_hoy_count'] or 0
+    ingresos_hoy = resumen['ingresos_hoy'] or 0
 
     context = {
-        'ventas': ventas,
+        'ventas': pagina,
+        'pagina': pagina,
         'total_ventas_count': total_ventas_count,
         'total_ingresos': total_ingresos,
         'ventas_hoy_count': ventas_hoy_count,
@@ -272,14 +264,6 @@ def ventas_create(request, producto_id=None):
             
             carrito = json.loads(carrito_data)
 
-            # Calculamos total de la venta como Decimal
-            total_venta = Decimal('0.00')
-            for item in carrito:
-                producto = get_object_or_404(Producto, id=item['id'])
-                cantidad = int(item['cantidad'])
-                subtotal = Decimal(producto.precio) * cantidad
-                total_venta += subtotal
-
             # Validación efectivo
             if metodo_pago == 'Efectivo':
                 try:
@@ -287,43 +271,26 @@ def ventas_create(request, producto_id=None):
                 except InvalidOperation:
                     messages.error(request, 'Debes ingresar un monto válido de efectivo recibido.')
                     return redirect('ventas_create')
-
-                if efectivo_recibido < total_venta:
-                    messages.error(request, f'El efectivo recibido (${efectivo_recibido:.2f}) es menor al total (${total_venta:.2f}).')
-                    return redirect('ventas_create')
             else:
                 efectivo_recibido = None  # Para métodos distintos a efectivo
 
-            # Crear la venta
-            vuelto = (efectivo_recibido - total_venta) if efectivo_recibido is not None else Decimal('0.00')
-            venta = Venta.objects.create(
+            # Crear la venta, sus items y descontar stock en una sola transacción
+            registrar_venta(
+                request.user,
+                carrito,
                 cliente=cliente,
-                vendedor=request.user,
                 metodo_pago=metodo_pago,
                 efectivo_recibido=efectivo_recibido,
-                vuelto=vuelto,
                 notas=notas,
                 estado='Pagada' # Por defecto pagada en POS
             )
 
-            # Crear los items de la venta y actualizar stock
-            for item in carrito:
-                producto = get_object_or_404(Producto, id=item['id'])
-                cantidad = int(item['cantidad'])
-
-                VentaItem.objects.create(
-                    venta=venta,
-                    producto=producto,
-                    cantidad=cantidad,
-                    precio_unitario=producto.precio
-                )
-
-                producto.stock -= cantidad
-                producto.save()
-
             messages.success(request, 'Venta registrada correctamente.')
             return redirect('ventas_list')
 
+        except CheckoutError as e:
+            messages.error(request, e.mensaje)
+            return redirect('ventas_create')
         except Exception as e:
             messages.error(request, f'Error al registrar la venta: {e}')
             return redirect('ventas_create')
@@ -335,7 +302,7 @@ def ventas_create(request, producto_id=None):
     else:
         clientes = Cliente.objects.filter(vendedor=request.user)
         
-    productos = Producto.objects.all() # Productos los ven todos
+    # Los productos no se envían en la página: el POS mantiene su catálogo local (ventas_pos_catalogo)
     producto_preseleccionado = None
     if producto_id:
         producto_preseleccionado = get_object_or_404(Producto, pk=producto_id)
@@ -345,7 +312,6 @@ def ventas_create(request, producto_id=None):
         'tienda/ventas_form.html',
         {
             'clientes': clientes,
-            'productos': productos,
             'producto_preseleccionado': producto_preseleccionado,
             "user": request.user
         }
@@ -362,10 +328,7 @@ def ventas_delete(request, pk):
         messages.error(request, "No tienes permisos para eliminar ventas.")
         return redirect('ventas_list')
 
-    for item in venta.items.all():
-        item.producto.stock += item.cantidad
-        item.producto.save()
-    venta.delete()
+    eliminar_venta(venta)
     messages.success(request, "La venta se eliminó correctamente y el stock fue restaurado.")
     return redirect('ventas_list')
 
@@ -375,66 +338,25 @@ def ventas_delete(request, pk):
 # ---------------------------
 @login_required
 def ventas_factura_pdf_rl(request, pk):
-    venta = get_object_or_404(Venta, pk=pk)
+    venta = get_object_or_404(Venta.objects.select_related('cliente'), pk=pk)
     # Verificar acceso
-    if not request.user.is_superuser and venta.vendedor != request.user:
+    if not request.user.is_superuser and venta.vendedor_id != request.user.id:
         return HttpResponse("No tienes permiso para ver esta factura.", status=403)
         
-    buffer = BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=A4, rightMargin=20*mm, leftMargin=20*mm, topMargin=20*mm, bottomMargin=20*mm)
-    styles = getSampleStyleSheet()
-    elementos = []
-
-    # Encabezado
-    elementos.append(Paragraph("<b>TIENDA PARA MASCOTAS</b>", styles["Title"]))
-    elementos.append(Spacer(1, 12))
-    elementos.append(Paragraph(f"<b>Factura N°:</b> {venta.factura_num}", styles["Normal"]))
-    elementos.append(Paragraph(f"<b>Fecha:</b> {venta.fecha.strftime('%d/%m/%Y %H:%M')}", styles["Normal"]))
-    elementos.append(Spacer(1, 12))
-
-    # Cliente
-    if venta.cliente:
-        elementos.append(Paragraph("<b>Datos del Cliente</b>", styles["Heading2"]))
-        elementos.append(Paragraph(f"<b>Nombre:</b> {venta.cliente.nombre}", styles["Normal"]))
-        elementos.append(Paragraph(f"<b>Correo:</b> {venta.cliente.correo}", styles["Normal"]))
-    else:
-        elementos.append(Paragraph("<b>Cliente General</b>", styles["Heading2"]))
-        
-    elementos.append(Spacer(1, 12))
-
-    # Tabla de productos
-    data = [["Producto", "Cantidad", "Precio Unitario", "Subtotal"]]
-    for item in venta.items.all():
-        data.append([item.producto.nombre, str(item.cantidad), f"${item.precio_unitario:.2f}", f"${item.subtotal():.2f}"])
-    table = Table(data, colWidths=[80*mm, 30*mm, 40*mm, 40*mm])
-    table.setStyle(TableStyle([
-        ("BACKGROUND", (0,0), (-1,0), colors.lightgrey),
-        ("TEXTCOLOR", (0,0), (-1,0), colors.black),
-        ("ALIGN", (1,1), (-1,-1), "CENTER"),
-        ("GRID", (0,0), (-1,-1), 0.5, colors.grey),
-        ("FONTNAME", (0,0), (-1,0), "Helvetica-Bold"),
-        ("BOTTOMPADDING", (0,0), (-1,0), 8),
-    ]))
-    elementos.append(table)
-    elementos.append(Spacer(1, 12))
-
-    # Total
-    elementos.append(Paragraph(f"<b>Método de pago:</b> {venta.metodo_pago}", styles["Normal"]))
-    elementos.append(Paragraph(f"<b>Total a pagar:</b> ${venta.total():.2f}", styles["Heading2"]))
-    if venta.metodo_pago == "Efectivo" and venta.efectivo_recibido:
-        elementos.append(Paragraph(f"<b>Efectivo recibido:</b> ${venta.efectivo_recibido:.2f}", styles["Normal"]))
-        elementos.append(Paragraph(f"<b>Vuelto:</b> ${venta.vuelto:.2f}", styles["Normal"]))
-
-    elementos.append(Spacer(1, 20))
-    elementos.append(Paragraph("¡Gracias por su compra!", styles["Normal"]))
-
-    doc.build(elementos)
-    pdf = buffer.getvalue()
-    buffer.close()
-
-    response = HttpResponse(content_type='application/pdf')
-    response['Content-Disposition'] = f'inline; filename="Factura_{venta.factura_num}.pdf"'
-    response.write(pdf)
+    # El PDF se genera una vez por contenido y luego se sirve desde el disco
+    ruta, clave = factura_pdf.obtener_pdf(venta)
+    etag = f'"{clave}"'
+    no_modificado = get_conditional_response(request, etag=etag)
+    if no_modificado is not None:
+        # El 304 repite el ETag y el Cache-Control del 200
+        no_modificado['ETag'] = etag
+        no_modificado['Cache-Control'] = 'private, no-cache'
+        return no_modificado
+
+    response = FileResponse(open(ruta, 'rb'), content_type='application/pdf', filename=f'Factura_{venta.factura_num}.pdf')
+    response['ETag'] = etag
+    # Depende de los permisos del usuario: sólo el navegador puede guardarla, revalidando cada vez
+    response['Cache-Control'] = 'private, no-cache'
     return response
 
 
@@ -454,53 +376,151 @@ def acerca(request):
     return render(request, 'tienda/acerca.html')
 
 
+# ---------------------------
+# Readiness para el balanceador / orquestador
+# ---------------------------
+@never_cache
+def salud(request):
+    """200 si la base responde un SELECT 1 en menos de SALUD_DB_MAX_MS; si no, 503"""
+    inicio = time.perf_counter()
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT 1')
+    except DatabaseError as e:
+        return JsonResponse({'ok': False, 'error': type(e).__name__}, status=503)
+    db_ms = (time.perf_counter() - inicio) * 1000
+
+    datos = {'ok': db_ms <= settings.SALUD_DB_MAX_MS, 'db_ms': round(db_ms, 2)}
+    pool = getattr(connection, 'pool', None)
+    if pool is not None:
+        estadisticas = pool.get_stats()
+        datos['pool'] = {clave: estadisticas.get(clave, 0) for clave in ('pool_size', 'pool_available', 'requests_waiting')}
+    return JsonResponse(datos, status=200 if datos['ok'] else 503)
+
+
 # ---------------------------
 # Historial y detalle de ventas
 # ---------------------------
 User = get_user_model()
 
-@login_required
-def ventas_historial(request):
-    # Obtener filtros desde el GET
-    fecha_inicio = request.GET.get('fecha_inicio')
-    fecha_fin = request.GET.get('fecha_fin')
-    vendedor_id = request.GET.get('vendedor')
+def _fecha_filtro(valor):
+    try:
+        return parse_date(valor or '')
+    except ValueError:
+        return None
 
-    # Base de datos inicial
-    if request.user.is_superuser:
-        ventas = Venta.objects.all().order_by('-fecha')
-    else:
-        ventas = Venta.objects.filter(vendedor=request.user).order_by('-fecha')
 
-    # Filtrar por fecha inicial
-    if fecha_inicio:
-        ventas = ventas.filter(fecha__date__gte=fecha_inicio)
+def _vendedor_filtro(valor):
+    """Id de vendedor del GET, o None si no es un entero positivo que quepa en la columna"""
+    try:
+        vendedor_id = int(valor or '')
+    except ValueError:
+        return None
+    return vendedor_id if 0 < vendedor_id < 2 ** 63 else None
+
+
+def _filtrar_historial(request):
+    """Ventas y resúmenes diarios con los filtros del historial (compartido con la exportación)"""
+    # Obtener filtros desde el GET (una fecha o un vendedor inválidos se ignoran)
+    fecha_inicio = request.GET.get('fecha_inicio')
+    fecha_fin = request.GET.get('fecha_fin')
+    vendedor = request.GET.get('vendedor')
+    desde, hasta = _fecha_filtro(fecha_inicio), _fecha_filtro(fecha_fin)
+    vendedor_id = _vendedor_filtro(vendedor)
 
-    # Filtrar por fecha final
-    if fecha_fin:
-        ventas = ventas.filter(fecha__date__lte=fecha_fin)
+    # Base de datos inicial (los resúmenes diarios se filtran igual para los totales)
+    ventas = Venta.objects.all()
+    resumenes_ventas = ResumenVentasDia.objects.all()
+    if not request.user.is_superuser:
+        ventas = ventas.filter(vendedor=request.user)
+        resumenes_ventas = resumenes_ventas.filter(vendedor=request.user)
+
+    # Filtrar por fecha inicial y final, como rango sobre la columna (no fecha::date):
+    # así se usan los índices (fecha, id) y (vendedor, fecha, id)
+    if desde:
+        ventas = ventas.filter(fecha__gte=resumenes.rango_dia(desde)[0])
+        resumenes_ventas = resumenes_ventas.filter(fecha__gte=desde)
+    if hasta:
+        ventas = ventas.filter(fecha__lt=resumenes.rango_dia(hasta)[1])
+        resumenes_ventas = resumenes_ventas.filter(fecha__lte=hasta)
 
     # Filtrar por vendedor (Solo Admin puede filtrar por otros vendedores)
     if request.user.is_superuser and vendedor_id:
         ventas = ventas.filter(vendedor_id=vendedor_id)
+        resumenes_ventas = resumenes_ventas.filter(vendedor_id=vendedor_id)
+
+    filtros = {'f_fecha_inicio': fecha_inicio, 'f_fecha_fin': fecha_fin, 'f_vendedor': vendedor}
+    return ventas, resumenes_ventas, filtros
+
+
+@login_required
+def ventas_historial(request):
+    ventas, resumenes_ventas, filtros = _filtrar_historial(request)
+    ventas = ventas.select_related('cliente', 'vendedor')
 
-    # Total ventas
-    total_ventas = sum(v.total() for v in ventas)
+    # Totales (cantidad y monto) sin recorrer las ventas
+    resumen = resumenes_ventas.aggregate(cantidad=Sum('ventas'), total=Sum('ingresos'))
+    total_ventas = resumen['total'] or 0
+
+    pagina = PaginaKeyset(request, ventas, ('-fecha', '-id'), total=resumen['cantidad'] or 0)
+    if es_parcial(request):
+        return render(request, 'tienda/partials/historial_filas.html', {'ventas': pagina, 'pagina': pagina})
 
     # Pasamos todos los vendedores al template solo si es admin
     vendedores = User.objects.all() if request.user.is_superuser else []
 
     return render(request, 'tienda/ventas_historial.html', {
-        'ventas': ventas,
+        'ventas': pagina,
+        'pagina': pagina,
         'vendedores': vendedores,
         'total_ventas': total_ventas,
 
         # ❗ Datos para mantener filtros en pantalla
-        'f_fecha_inicio': fecha_inicio,
-        'f_fecha_fin': fecha_fin,
-        'f_vendedor': vendedor_id,
+        **filtros,
     })
 
+
+@login_required
+def ventas_historial_exportar(request, formato):
+    """Descarga el historial filtrado (CSV o XLSX) en streaming, una fila por item vendido"""
+    if formato not in ('csv', 'xlsx'):
+        raise Http404("Formato de exportación desconocido")
+    ventas, _, _ = _filtrar_historial(request)
+    filas = exportacion.filas_ventas(ventas)
+
+    # El nombre sale de las fechas ya interpretadas, nunca del texto crudo del GET
+    desde = _fecha_filtro(request.GET.get('fecha_inicio'))
+    hasta = _fecha_filtro(request.GET.get('fecha_fin')) or timezone.localdate()
+    nombre = f"ventas_{desde.isoformat() if desde else 'inicio'}_{hasta.isoformat()}"
+    if formato == 'xlsx':
+        response = StreamingHttpResponse(
+            exportacion.generar_xlsx(filas),
+            content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+        )
+    else:
+        response = StreamingHttpResponse(exportacion.generar_csv(filas), content_type='text/csv; charset=utf-8')
+    response['Content-Disposition'] = f'attachment; filename="{nombre}.{formato}"'
+    return response
+
+@login_required
+def ventas_recibo(request, pk):
+    """Recibo para impresora térmica: ?formato=html (por defecto), texto o escpos"""
+    venta = get_object_or_404(Venta.objects.select_related('cliente'), pk=pk)
+    if not request.user.is_superuser and venta.vendedor_id != request.user.id:
+        return HttpResponse("No tienes permiso para ver este recibo.", status=403)
+
+    formato = request.GET.get('formato', 'html')
+    if formato not in recibo.FORMATOS:
+        return HttpResponse("Formato no válido.", status=400)
+
+    contenido = recibo.generar(venta, formato)
+    if formato == 'escpos':
+        response = HttpResponse(contenido, content_type='application/octet-stream')
+        response['Content-Disposition'] = f'attachment; filename="recibo_{venta.factura_num}.bin"'
+        return response
+    content_type = 'text/plain; charset=utf-8' if formato == 'texto' else 'text/html; charset=utf-8'
+    return HttpResponse(contenido, content_type=content_type)
+
 @login_required
 def ventas_detalle(request, pk):
     venta = get_object_or_404(Venta, pk=pk)
@@ -522,8 +542,9 @@ def vendedores_list(request):
         messages.error(request, "Acceso denegado.")
         return redirect('inicio')
         
-    vendedores = Vendedor.objects.all()
-    return render(request, 'tienda/vendedores_list.html', {'vendedores': vendedores})
+    pagina = PaginaKeyset(request, Vendedor.objects.all(), ('username', 'id'))
+    plantilla = 'tienda/partials/vendedores_cards.html' if es_parcial(request) else 'tienda/vendedores_list.html'
+    return render(request, plantilla, {'vendedores': pagina, 'pagina': pagina})
 
 @login_required
 def vendedores_create(request):
@@ -607,13 +628,29 @@ def logout_view(request):
 # ---------------------------
 # AJAX: agregar cliente desde venta
 # ---------------------------
-@csrf_exempt
-def cliente_add_ajax(request):
+def _datos_cliente(request):
+    return request.POST.get('nombre'), request.POST.get('correo', ''), request.POST.get('telefono', '')
+
+
+@sin_csrf
+@login_requerido
+async def cliente_add_ajax(request):
     if request.method == 'POST':
-        nombre = request.POST.get('nombre')
-        correo = request.POST.get('correo', '')
-        telefono = request.POST.get('telefono', '')
+        nombre, correo, telefono = _datos_cliente(request)
+        if not nombre:
+            return JsonResponse({'error': 'El nombre es obligatorio'}, status=400)
+
+        cliente = await Cliente.objects.acreate(nombre=nombre, correo=correo, telefono=telefono, vendedor=request.user)
+        return JsonResponse({'id': cliente.id, 'nombre': cliente.nombre})
+
+    return JsonResponse({'error': 'Método no permitido'}, status=405)
+
 
+@csrf_exempt
+@login_required
+def cliente_add_ajax_sync(request):
+    if request.method == 'POST':
+        nombre, correo, telefono = _datos_cliente(request)
         if not nombre:
             return JsonResponse({'error': 'El nombre es obligatorio'}, status=400)
 
@@ -631,77 +668,177 @@ def ventas_pos(request):
     productos = Producto.objects.filter(stock__gt=0)
     return render(request, 'tienda/ventas_pos.html', {'productos': productos})
 
-@csrf_exempt
-def ventas_pos_register(request):
-    if request.method == "POST":
-        try:
-            data = json.loads(request.POST.get('carrito', '[]'))
-            if not data:
-                return JsonResponse({'error': 'El carrito está vacío'}, status=400)
+def _registrar_pos(vendedor, carrito, clave, formato):
+    """Registra la venta del POS y arma la respuesta, con el recibo térmico si se pidió"""
+    venta = registrar_venta(vendedor, carrito, metodo_pago="Efectivo", clave_idempotencia=clave)
+    respuesta = {'ok': True, 'mensaje': 'Venta registrada correctamente', 'venta_id': venta.pk, 'factura_num': venta.factura_num}
+    if getattr(venta, 'repetida', False):
+        respuesta['mensaje'] = 'La venta ya estaba registrada'
 
-            total = 0
-            venta = Venta.objects.create(cliente=None, vendedor=request.user, metodo_pago="Efectivo")
+    # Recibo térmico opcional en la misma respuesta (?recibo=html|texto|escpos; escpos va en base64)
+    if formato in recibo.FORMATOS:
+        contenido = recibo.generar(venta, formato)
+        respuesta['recibo'] = base64.b64encode(contenido).decode() if formato == 'escpos' else contenido
+    return respuesta
 
-            for item in data:
-                prod_id = item.get('id')
-                if not prod_id:
-                    return JsonResponse({'error': 'Falta el ID del producto'}, status=400)
 
-                try:
-                    prod = Producto.objects.get(pk=prod_id)
-                except Producto.DoesNotExist:
-                    venta.delete()
-                    return JsonResponse({'error': f'El producto con ID {prod_id} no existe'}, status=404)
+@sin_csrf
+@login_requerido
+async def ventas_pos_register(request):
+    if request.method == "POST":
+        try:
+            data = json.loads(request.POST.get('carrito', '[]'))
+            # El checkout usa transacciones y bloqueos de fila: corre entero en el hilo sync
+            respuesta = await sync_to_async(_registrar_pos)(
+                request.user, data, request.POST.get('clave'), request.POST.get('recibo'),
+            )
+            return JsonResponse(respuesta)
 
-                cantidad = int(item.get('cantidad', 1))
-                if cantidad > prod.stock:
-                    venta.delete()
-                    return JsonResponse({'error': f'Stock insuficiente para {prod.nombre}'}, status=400)
+        except CheckoutError as e:
+            return JsonResponse({'error': e.mensaje}, status=e.status)
+        except Exception as e:
+            return JsonResponse({'error': str(e)}, status=500)
 
-                subtotal = prod.precio * cantidad
-                total += subtotal
+    return JsonResponse({'error': 'Método no permitido'}, status=405)
 
-                VentaItem.objects.create(venta=venta, producto=prod, cantidad=cantidad, precio_unitario=prod.precio)
-                prod.stock -= cantidad
-                prod.save()
 
-            venta.total = total
-            venta.save()
-            return JsonResponse({'ok': True, 'mensaje': 'Venta registrada correctamente'})
+@csrf_exempt
+@login_required
+def ventas_pos_register_sync(request):
+    if request.method == "POST":
+        try:
+            data = json.loads(request.POST.get('carrito', '[]'))
+            return JsonResponse(_registrar_pos(request.user, data, request.POST.get('clave'), request.POST.get('recibo')))
 
+        except CheckoutError as e:
+            return JsonResponse({'error': e.mensaje}, status=e.status)
         except Exception as e:
             return JsonResponse({'error': str(e)}, status=500)
 
     return JsonResponse({'error': 'Método no permitido'}, status=405)
+
+
+def _respuesta_codigo(producto):
+    if producto is None:
+        return JsonResponse({'ok': False, 'error': 'Producto no encontrado'})
+    return JsonResponse({
+        'ok': True,
+        'producto': {
+            'id': producto['id'],
+            'nombre': producto['nombre'],
+            'precio': float(producto['precio'])
+        }
+    })
+
+
+@sin_csrf
+async def ventas_pos_producto_codigo(request):
+    if request.method == 'POST':
+        return _respuesta_codigo(await codigos.abuscar_codigo(request.POST.get('codigo')))
+    return JsonResponse({'ok': False, 'error': 'Método no permitido'})
+
+
 @csrf_exempt
-def ventas_pos_producto_codigo(request):
+def ventas_pos_producto_codigo_sync(request):
     if request.method == 'POST':
-        codigo = request.POST.get('codigo')
-        try:
-            producto = Producto.objects.get(codigo_barras=codigo)
-            return JsonResponse({
-                'ok': True,
-                'producto': {
-                    'id': producto.id,
-                    'nombre': producto.nombre,
-                    'precio': float(producto.precio)
-                }
-            })
-        except Producto.DoesNotExist:
-            return JsonResponse({'ok': False, 'error': 'Producto no encontrado'})
+        return _respuesta_codigo(codigos.buscar_codigo(request.POST.get('codigo')))
     return JsonResponse({'ok': False, 'error': 'Método no permitido'})
 
 
+def _lista_codigos(request):
+    """(códigos del cuerpo de la petición, respuesta de error o None)"""
+    if request.method != 'POST':
+        return None, JsonResponse({'ok': False, 'error': 'Método no permitido'}, status=405)
+
+    if request.content_type == 'application/json':
+        try:
+            lista = json.loads(request.body or b'{}').get('codigos', [])
+        except (ValueError, AttributeError):
+            return None, JsonResponse({'ok': False, 'error': 'JSON inválido'}, status=400)
+    else:
+        lista = request.POST.getlist('codigos')
+    if not isinstance(lista, list) or len(lista) > codigos.MAX_LOTE:
+        return None, JsonResponse({'ok': False, 'error': f'Máximo {codigos.MAX_LOTE} códigos por petición'}, status=400)
+    return [str(c) for c in lista], None
+
+
+def _respuesta_codigos(resultado):
+    productos = {
+        codigo: {'id': p['id'], 'nombre': p['nombre'], 'precio': float(p['precio'])}
+        for codigo, p in resultado.items() if p is not None
+    }
+    no_encontrados = [codigo for codigo, p in resultado.items() if p is None]
+    return JsonResponse({'ok': True, 'productos': productos, 'no_encontrados': no_encontrados})
+
+
+@login_requerido
+async def ventas_pos_productos_codigos(request):
+    """Resuelve una ráfaga de códigos del escáner en una sola petición"""
+    lista, error = _lista_codigos(request)
+    if error is not None:
+        return error
+    return _respuesta_codigos(await codigos.abuscar_codigos(lista))
+
+
+@login_required
+def ventas_pos_productos_codigos_sync(request):
+    lista, error = _lista_codigos(request)
+    if error is not None:
+        return error
+    return _respuesta_codigos(codigos.buscar_codigos(lista))
+
+
+@login_required
+def ventas_pos_catalogo(request):
+    """Productos cambiados y eliminados desde ?desde=<versión> (ver catalogo.py)"""
+    try:
+        desde = max(0, int(request.GET.get('desde') or 0))
+    except ValueError:
+        return JsonResponse({'error': 'Versión inválida'}, status=400)
+
+    # La URL lleva `desde`: con la versión actual alcanza para el ETag
+    version = catalogo.version_actual()
+    etag = f'"catalogo-{version}"'
+    no_modificado = get_conditional_response(request, etag=etag)
+    if no_modificado is not None:
+        return no_modificado
+
+    response = JsonResponse(catalogo.cambios(desde, version), json_dumps_params={'separators': (',', ':')})
+    response['ETag'] = etag
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+@login_required
+def ventas_pos_sincronizar(request):
+    """
+    Recibe ventas de la cola offline del POS: {"ventas": [{clave, carrito, cliente,
+    metodo_pago, efectivo_recibido, notas, fecha}, ...]}. Los reenvíos no se duplican.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'ok': False, 'error': 'Método no permitido'}, status=405)
+    try:
+        ventas = json.loads(request.body or b'{}').get('ventas', [])
+    except (ValueError, AttributeError):
+        return JsonResponse({'ok': False, 'error': 'JSON inválido'}, status=400)
+    if not isinstance(ventas, list):
+        return JsonResponse({'ok': False, 'error': 'Formato inválido'}, status=400)
+
+    try:
+        resultados = registrar_lote(request.user, ventas)
+    except CheckoutError as e:
+        return JsonResponse({'ok': False, 'error': e.mensaje}, status=e.status)
+    return JsonResponse({'ok': True, 'resultados': resultados})
 
 
 @login_required
 def buscar_productos_htmx(request):
     query = request.GET.get('buscar', '')  # ❗ debe ser 'buscar', igual que en el input
-    if query:
-        productos = Producto.objects.filter(Q(nombre__icontains=query) | Q(codigo_barras__icontains=query))
+    if query.strip():
+        productos, pagina = buscar_productos(query), None
     else:
-        productos = Producto.objects.all()
-    return render(request, 'tienda/partials/productos_cards.html', {'productos': productos})
+        productos = pagina = PaginaKeyset(request, Producto.objects.all(), ('nombre', 'id'))
+    return render(request, 'tienda/partials/productos_cards.html', {'productos': productos, 'pagina': pagina})
 
 @login_required
 def graficos(request):
@@ -711,38 +848,36 @@ def graficos(request):
 
     from django.db.models import F
     
-    # --- DATOS DE VENTAS ---
+    # --- DATOS DE VENTAS (desde los resúmenes diarios de los últimos REPORTES_MESES meses) ---
+    desde = resumenes.inicio_reportes(timezone.localdate())
+    resumenes_ventas = ResumenVentasDia.objects.filter(fecha__gte=desde)
+
     # 1. Ventas por Método de Pago
-    metodos_pago = Venta.objects.values('metodo_pago').annotate(cantidad=Count('id'), total=Sum(F('items__cantidad') * F('items__precio_unitario')))
+    metodos_pago = resumenes_ventas.values('metodo_pago').annotate(cantidad=Sum('ventas'), total=Sum('ingresos')).order_by('metodo_pago')
     
     # 2. Top 5 Productos Más Vendidos
-    top_productos = (
-        VentaItem.objects
-        .values('producto__nombre')
-        .annotate(total_vendido=Sum('cantidad'))
-        .order_by('-total_vendido')[:5]
-    )
+    top_productos = resumenes.top_productos(desde, 5)
     
     # 3. Ventas por Mes
     ventas_mes = (
-        Venta.objects
+        resumenes_ventas
         .annotate(mes=TruncMonth('fecha'))
         .values('mes')
-        .annotate(total=Sum(F('items__cantidad') * F('items__precio_unitario')))
+        .annotate(total=Sum('ingresos'))
         .order_by('mes')
     )
 
     # --- DATOS DE INVENTARIO (NUEVO) ---
-    total_inventario_valor = sum(p.precio * p.stock for p in Producto.objects.all())
+    total_inventario_valor = Producto.objects.aggregate(valor=Sum(F('precio') * F('stock')))['valor'] or 0
     total_productos_count = Producto.objects.count()
-    productos_bajo_stock_count = Producto.objects.filter(stock__lte=5).count()
+    productos_bajo_stock_count = Producto.objects.filter(stock__lte=STOCK_BAJO).count()
     
     # Top 5 Productos con mayor valor en inventario
-    top_valor_inventario = sorted(
-        Producto.objects.all(), 
-        key=lambda p: p.precio * p.stock, 
-        reverse=True
-    )[:5]
+    top_valor_inventario = (
+        Producto.objects
+        .annotate(valor_inventario=F('precio') * F('stock'))
+        .order_by('-valor_inventario')[:5]
+    )
 
     # Preparar datos para Chart.js
     labels_mes = [v['mes'].strftime('%B %Y') for v in ventas_mes] if ventas_mes else []
@@ -756,7 +891,7 @@ def graficos(request):
     
     # Datos para gráfico de valor de inventario
     labels_inv = [p.nombre for p in top_valor_inventario]
-    data_inv = [float(p.precio * p.stock) for p in top_valor_inventario]
+    data_inv = [float(p.valor_inventario) for p in top_valor_inventario]
 
     context = {
         # Ventas
@@ -774,6 +909,7 @@ def graficos(request):
         'labels_inv': json.dumps(labels_inv),
         'data_inv': json.dumps(data_inv),
         
+        'meses_reportes': resumenes.meses_reportes(),
         'has_data': bool(ventas_mes or top_productos or metodos_pago or total_productos_count),
     }
 
@@ -781,27 +917,21 @@ def graficos(request):
 
 @login_required
 def perfil(request):
-    from datetime import datetime
-    from django.db.models import F
-    
     usuario = request.user
     
-    # Estadísticas de ventas del usuario
-    ventas_usuario = Venta.objects.filter(vendedor=usuario)
-    total_ventas = ventas_usuario.count()
-    
-    # Ventas del mes actual
-    hoy = datetime.now()
-    inicio_mes = hoy.replace(day=1)
-    ventas_mes = ventas_usuario.filter(fecha__gte=inicio_mes).count()
-    
-    # Total vendido (suma de todos los items)
-    total_vendido = VentaItem.objects.filter(venta__vendedor=usuario).aggregate(
-        total=Sum(F('cantidad') * F('precio_unitario'))
-    )['total'] or 0
+    # Estadísticas de ventas del usuario (desde los resúmenes diarios)
+    inicio_mes = timezone.localdate().replace(day=1)
+    resumen = ResumenVentasDia.objects.filter(vendedor=usuario).aggregate(
+        total_ventas=Sum('ventas'),
+        ventas_mes=Sum('ventas', filter=Q(fecha__gte=inicio_mes)),
+        total_vendido=Sum('ingresos'),
+    )
+    total_ventas = resumen['total_ventas'] or 0
+    ventas_mes = resumen['ventas_mes'] or 0
+    total_vendido = resumen['total_vendido'] or 0
     
     # Últimas 5 ventas
-    ultimas_ventas = ventas_usuario.order_by('-fecha')[:5]
+    ultimas_ventas = Venta.objects.filter(vendedor=usuario).order_by('-fecha')[:5]
     
     # Manejo del formulario de actualización de perfil
     if request.method == 'POST':
@@ -838,3 +968,155 @@ def configuracion(request):
 @login_required
 def notificaciones(request):
     return render(request, 'tienda/notificaciones.html')
+
+
+# ---------------------------
+# PERFILES DE RENDIMIENTO (ver perfilado.py)
+# ---------------------------
+@login_required
+def perfiles(request):
+    if not request.user.is_staff:
+        messages.error(request, "Acceso denegado.")
+        return redirect('inicio')
+
+    # Los nombres empiezan con la fecha: del más reciente al más viejo
+    vista = request.GET.get('vista', '')
+    guardados = map(perfilado.leer_resumen, sorted(perfilado.listar_nombres(), reverse=True))
+    return render(request, 'tienda/perfiles.html', {
+        'perfiles': [p for p in guardados if p and (not vista or p.get('vista') == vista)],
+        'vista': vista,
+        'activo': perfilado.activo(),
+        'muestreo': getattr(settings, 'PERFILADO_MUESTREO', 0.0),
+    })
+
+
+@login_required
+def perfiles_detalle(request, nombre):
+    if not request.user.is_staff:
+        messages.error(request, "Acceso denegado.")
+        return redirect('inicio')
+
+    resumen = perfilado.leer_resumen(nombre)
+    fase = request.GET.get('fase', 'todo')
+    ruta = perfilado.ruta_pilas(nombre, fase)
+    if resumen is None or ruta is None:
+        return HttpResponse("Perfil no encontrado.", status=404)
+    filas = perfilado.flamegraph(ruta)
+    fases = [{'nombre': 'todo', 'muestras': resumen['muestras']}]
+    fases += [{'nombre': nombre, **datos} for nombre, datos in resumen['fases'].items()]
+    return render(request, 'tienda/perfiles_detalle.html', {
+        'perfil': resumen,
+        'fase': fase,
+        'fases': fases,
+        'filas': filas,
+        'alto': f'{len(filas) * perfilado.ALTO_FILA:.1f}em',
+    })
+
+
+@login_required
+def perfiles_pilas(request, nombre, fase):
+    """Pilas colapsadas del perfil (para flamegraph.pl o speedscope)"""
+    if not request.user.is_staff:
+        messages.error(request, "Acceso denegado.")
+        return redirect('inicio')
+
+    ruta = perfilado.ruta_pilas(nombre, fase)
+    if ruta is None:
+        return HttpResponse("Perfil no encontrado.", status=404)
+    return FileResponse(open(ruta, 'rb'), as_attachment=True, filename=f'{nombre}-{fase}.folded',
+                        content_type='text/plain; charset=utf-8')
+
+
+# ---------------------------
+# CONTEO DE INVENTARIO (ver inventario.py)
+# ---------------------------
+@login_required
+def inventario_conteos(request):
+    if not request.user.is_superuser:
+        messages.error(request, "Acceso denegado.")
+        return redirect('inicio')
+
+    if request.method == 'POST':
+        nombre = request.POST.get('nombre', '').strip()[:100] or f"Conteo {timezone.localdate():%d/%m/%Y}"
+        conteo = ConteoInventario.objects.create(nombre=nombre, abierto_por=request.user)
+        messages.success(request, f"Conteo '{conteo.nombre}' abierto. Ya se puede escanear.")
+        return redirect('inventario_conteo', pk=conteo.pk)
+
+    conteos = ConteoInventario.objects.select_related('abierto_por').annotate(lecturas=Count('lineas'))
+    return render(request, 'tienda/inventario_conteos.html', {'conteos': conteos.order_by('-abierto')[:50]})
+
+
+@login_required
+def inventario_conteo(request, pk):
+    """Pantalla del conteo: escaneo mientras está abierto; cierre y ajustes para el admin"""
+    if request.method == 'POST':
+        if not request.user.is_superuser:
+            messages.error(request, "Sólo un administrador puede cerrar o cancelar un conteo.")
+            return redirect('inventario_conteo', pk=pk)
+        try:
+            if request.POST.get('accion') == 'cancelar':
+                inventario.cancelar(pk)
+                messages.success(request, "Conteo cancelado: el stock no cambió.")
+            else:
+                conteo = inventario.cerrar(pk)
+                messages.success(request, f"Conteo cerrado: {conteo.productos_ajustados} de "
+                                          f"{conteo.productos_contados} productos contados ajustados.")
+        except inventario.InventarioError as e:
+            messages.error(request, e.mensaje)
+        return redirect('inventario_conteo', pk=pk)
+
+    conteo = get_object_or_404(ConteoInventario, pk=pk)
+    if conteo.estado == ConteoInventario.ABIERTO:
+        lineas = conteo.lineas.select_related('producto').order_by('-actualizado', '-id')[:50]
+        return render(request, 'tienda/inventario_conteo.html', {
+            'conteo': conteo,
+            'lineas': lineas,
+            'contados': conteo.lineas.count(),
+            'max_lecturas': inventario.MAX_LECTURAS,
+        })
+    # Cerrado: las mayores diferencias, faltantes primero
+    ajustes = conteo.ajustes.select_related('producto').order_by('diferencia', 'id')[:100]
+    return render(request, 'tienda/inventario_conteo.html', {'conteo': conteo, 'ajustes': ajustes})
+
+
+@login_required
+def inventario_lecturas(request, pk):
+    """
+    Ráfaga de lecturas de un escáner: {"lecturas": [{"codigo": "779...", "cantidad": 1}, ...],
+    "reemplazar": false}. Con reemplazar, la cantidad es el total recontado del producto.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'ok': False, 'error': 'Método no permitido'}, status=405)
+    try:
+        datos = json.loads(request.body or b'{}')
+        lecturas, reemplazar = datos.get('lecturas', []), bool(datos.get('reemplazar'))
+    except (ValueError, AttributeError):
+        return JsonResponse({'ok': False, 'error': 'JSON inválido'}, status=400)
+
+    try:
+        productos, no_encontrados = inventario.registrar_lecturas(pk, lecturas, reemplazar)
+    except inventario.InventarioError as e:
+        return JsonResponse({'ok': False, 'error': e.mensaje}, status=e.status)
+    return JsonResponse({'ok': True, 'productos': productos, 'no_encontrados': no_encontrados})
+
+
+@login_required
+def inventario_merma(request):
+    if not request.user.is_superuser:
+        messages.error(request, "Acceso denegado.")
+        return redirect('inicio')
+
+    # Por defecto, los últimos 30 días
+    hasta = _fecha_filtro(request.GET.get('fecha_fin')) or timezone.localdate()
+    desde = _fecha_filtro(request.GET.get('fecha_inicio')) or hasta - timedelta(days=29)
+    reporte = inventario.reporte_merma(resumenes.rango_dia(desde)[0], resumenes.rango_dia(hasta)[1])
+    conteos = ConteoInventario.objects.filter(
+        estado=ConteoInventario.CERRADO,
+        cerrado__gte=resumenes.rango_dia(desde)[0], cerrado__lt=resumenes.rango_dia(hasta)[1],
+    ).order_by('-cerrado')[:50]
+    return render(request, 'tienda/inventario_merma.html', {
+        **reporte,
+        'conteos': conteos,
+        'f_fecha_inicio': desde.isoformat(),
+        'f_fecha_fin': hasta.isoformat(),
+    })
@@ -5,12 +5,25 @@ It exposes the ASGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.1/howto/deployment/asgi/
+
+Servidor:
+
+    uvicorn tienda_mascotas.asgi:application --host 0.0.0.0 --port 8000
+
+Las vistas async del POS y del tablero (tienda/asincrono.py) atienden muchas
+peticiones concurrentes en un solo proceso; el resto corre en hilos como con WSGI.
 """
 
 import os
 
+from django.conf import settings
+from django.contrib.staticfiles.handlers import ASGIStaticFilesHandler
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'tienda_mascotas.settings')
 
 application = get_asgi_application()
+
+# uvicorn no sirve /static/ como runserver: en desarrollo lo hace Django
+if settings.DEBUG:
+    application = ASGIStaticFilesHandler(application)
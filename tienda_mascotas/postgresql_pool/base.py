@@ -0,0 +1,100 @@
+"""
+Backend de PostgreSQL con pool de conexiones de psycopg (psycopg_pool).
+
+Django 4.2 no trae pool propio: con CONN_MAX_AGE = 0 cada petición abre y
+cierra una conexión, y bajo ASGI cada petición corre en un hilo nuevo, así
+que las conexiones persistentes (CONN_MAX_AGE > 0) no se reutilizan. Este
+backend toma la conexión de un pool del proceso al conectar y la devuelve al
+cerrar, así que al terminar la petición vuelve al pool en lugar de cerrarse.
+
+    'ENGINE': 'tienda_mascotas.postgresql_pool',
+    'CONN_MAX_AGE': 0,            # devolver al pool al terminar cada petición
+    'CONN_HEALTH_CHECKS': True,   # el pool prueba la conexión antes de entregarla
+    'OPTIONS': {'pool': {'min_size': 2, 'max_size': 10, 'timeout': 10}},
+
+Las opciones de 'pool' van tal cual a psycopg_pool.ConnectionPool. Sin
+'pool' en OPTIONS se comporta como el backend normal.
+"""
+import threading
+
+from django.db.backends.base.base import NO_DB_ALIAS
+from django.db.backends.postgresql import base, creation
+from psycopg_pool import ConnectionPool
+
+_pools = {}
+_lock = threading.Lock()
+
+
+def cerrar_pool(alias, nombre):
+    pool = _pools.pop((alias, nombre), None)
+    if pool is not None:
+        pool.close()
+
+
+class DatabaseCreation(creation.DatabaseCreation):
+    def _destroy_test_db(self, test_database_name, verbosity):
+        # Las conexiones del pool a la base de tests impedirían borrarla
+        cerrar_pool(self.connection.alias, test_database_name)
+        super()._destroy_test_db(test_database_name, verbosity)
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    creation_class = DatabaseCreation
+
+    @property
+    def opciones_pool(self):
+        if self.alias == NO_DB_ALIAS:
+            return None
+        return self.settings_dict['OPTIONS'].get('pool')
+
+    @property
+    def pool(self):
+        """Pool del proceso para esta base (None si no se configuró)"""
+        opciones = self.opciones_pool
+        if opciones is None:
+            return None
+        # La clave lleva el nombre de la base: los tests cambian NAME a test_*
+        clave = (self.alias, self.settings_dict['NAME'])
+        pool = _pools.get(clave)
+        if pool is None:
+            with _lock:
+                pool = _pools.get(clave)
+                if pool is None:
+                    parametros = self.get_connection_params()
+                    parametros['autocommit'] = True
+                    pool = ConnectionPool(
+                        kwargs=parametros,
+                        check=ConnectionPool.check_connection if self.settings_dict['CONN_HEALTH_CHECKS'] else None,
+                        open=False,
+                        name=f'django-{self.alias}',
+                        **opciones,
+                    )
+                    pool.open()
+                    _pools[clave] = pool
+        return pool
+
+    def get_connection_params(self):
+        parametros = super().get_connection_params()
+        parametros.pop('pool', None)
+        return parametros
+
+    def get_new_connection(self, conn_params):
+        pool = self.pool
+        if pool is None:
+            return super().get_new_connection(conn_params)
+        conexion = pool.getconn()
+        # Lo mismo que hace el backend al conectar (nivel de aislamiento de OPTIONS)
+        isolation_level = self.settings_dict['OPTIONS'].get('isolation_level')
+        self.isolation_level = base.IsolationLevel(isolation_level) if isolation_level is not None \
+            else base.IsolationLevel.READ_COMMITTED
+        if isolation_level is not None:
+            conexion.isolation_level = self.isolation_level
+        return conexion
+
+    def _close(self):
+        if self.connection is None or self.pool is None:
+            return super()._close()
+        with self.wrap_database_errors:
+            # El pool hace rollback si quedó una transacción abierta
+            self.pool.putconn(self.connection)
+            self.connection = None
@@ -41,15 +41,18 @@ INSTALLED_APPS = [
     'django.contrib.humanize',
     'widget_tweaks',
     'tienda',
+    'ventas',
     "django_extensions"
 ]
 
 MIDDLEWARE = [
+    'tienda.instrumentacion.instrumentacion_middleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'tienda.perfilado.perfilado_middleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -58,7 +61,7 @@ ROOT_URLCONF = 'tienda_mascotas.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'tienda.instrumentacion.DjangoTemplatesMedidas',
         'DIRS': [],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -143,4 +146,70 @@ LOGIN_URL = '/login/'
 LOGIN_REDIRECT_URL = '/'  # opcional, a donde va después de loguear
 LOGOUT_REDIRECT_URL = '/login/'
 AUTH_USER_MODEL = 'tienda.Vendedor'
+
+# Numeración de facturas: 'correlativo' (sin huecos) o 'bloques' (cada proceso reserva FACTURA_BLOQUE números)
+FACTURA_NUMERACION = os.getenv('FACTURA_NUMERACION', 'correlativo')
+FACTURA_BLOQUE = int(os.getenv('FACTURA_BLOQUE', '50'))
+
+# Búsqueda de productos: 'memoria' (índice por proceso) o 'postgres' (pg_trgm, varios workers)
+BUSQUEDA_PRODUCTOS_BACKEND = os.getenv('BUSQUEDA_PRODUCTOS_BACKEND', 'memoria')
+BUSQUEDA_PRODUCTOS_LIMITE = 50
+
+# Caché de códigos de barras del POS: LRU por proceso + alias opcional de CACHES compartido entre workers
+CODIGOS_CACHE_TAMANO = 4096
+CODIGOS_CACHE_TTL_LOCAL = 60
+CODIGOS_CACHE_COMPARTIDO = os.getenv('CODIGOS_CACHE_COMPARTIDO') or None
+CODIGOS_CACHE_TTL_COMPARTIDO = 3600
+
+# Listados paginados por cursor: filas por página y hasta cuántas filas se cuenta exacto
+PAGINACION_TAMANO = 50
+PAGINACION_CONTEO_EXACTO_HASTA = 10000
+
+# Cola offline del POS: horas que puede tener una venta cobrada sin conexión para aceptarla al subirla
+POS_VENTANA_OFFLINE_HORAS = int(os.getenv('POS_VENTANA_OFFLINE_HORAS', '72'))
+
+# PDFs de facturas ya generados (fuera de MEDIA_ROOT: se sirven sólo a través de la vista con permisos)
+FACTURAS_CACHE_DIR = os.getenv('FACTURAS_CACHE_DIR', os.path.join(BASE_DIR, 'cache', 'facturas'))
+FACTURAS_PRECALENTAR = True
+# Procesos para el ZIP de facturas pedido desde el admin; 0 renderiza dentro del worker web, sin pool
+FACTURAS_ZIP_PROCESOS_WEB = 0
+
+# Reportes globales (gráficos, tablero del admin): meses que abarcan, el actual incluido
+REPORTES_MESES = 12
+
+# Tablero de inicio: segundos que vive un fragmento (las señales lo invalidan antes al cambiar los datos)
+TABLERO_CACHE_TTL = 600
+
+# Vistas del POS y del tablero: async (servidor ASGI, ver asgi.py) o su versión sync (WSGI)
+VISTAS_ASYNC = os.getenv('VISTAS_ASYNC', '1') == '1'
+# Hilos (y conexiones a la base) para las consultas independientes que las vistas async hacen en paralelo;
+# con 0 se hacen una tras otra en el hilo de la petición
+CONSULTAS_PARALELAS = 4
+
+# Readiness (/salud/): latencia máxima de un SELECT 1, en ms, antes de responder 503
+SALUD_DB_MAX_MS = int(os.getenv('SALUD_DB_MAX_MS', '250'))
+
+# Instrumentación por petición (tienda/instrumentacion.py, /metrics): presupuestos por defecto
+# (las consultas de cada vista salen de tienda/presupuestos.py), ajustes
+# por vista en INSTRUMENTACION_PRESUPUESTOS = {'graficos': {'consultas': 20, 'ms': 2000}}, y
+# veces que una misma SQL debe repetirse en una petición para contarla como N+1
+INSTRUMENTACION_ACTIVA = os.getenv('INSTRUMENTACION_ACTIVA', '1') == '1'
+INSTRUMENTACION_MAX_CONSULTAS = 50
+INSTRUMENTACION_MAX_MS = 1000
+INSTRUMENTACION_PRESUPUESTOS = {}
+INSTRUMENTACION_REPETIDAS = 5
+METRICAS_TOKEN = os.getenv('METRICAS_TOKEN') or None
+
+# Perfilado por muestreo (tienda/perfilado.py, /perfiles/): apagado no está en la cadena de middleware.
+# Encendido, staff pide un perfil con ?perfilar=1 o 'X-Perfilar: 1'; PERFILADO_MUESTREO perfila
+# además esa fracción de las peticiones al azar. Se guardan los últimos PERFILADO_MAXIMO
+PERFILADO_ACTIVO = os.getenv('PERFILADO_ACTIVO', '0') == '1'
+PERFILADO_MUESTREO = float(os.getenv('PERFILADO_MUESTREO', '0'))
+PERFILADO_INTERVALO_MS = 5
+PERFILADO_DIR = os.getenv('PERFILADO_DIR', os.path.join(BASE_DIR, 'cache', 'perfiles'))
+PERFILADO_MAXIMO = 200
+
+# Miniaturas de imágenes subidas (MEDIA_ROOT/derivados/, nombres por hash del contenido: caché permanente)
+IMAGENES_ANCHOS = (160, 320, 640)
+IMAGENES_CALIDAD = 80
 STATIC_ROOT = os.path.join(BASE_DIR, 'static')
@@ -0,0 +1,73 @@
+"""
+Perfil de producción.
+
+Se elige por entorno: DJANGO_SETTINGS_MODULE=tienda_mascotas.settings_produccion
+(el Dockerfile lo deja fijado; docker-compose vuelve a settings.py para
+desarrollo). Parte de settings.py y cambia:
+
+- DEBUG apagado, SECRET_KEY y ALLOWED_HOSTS desde el entorno.
+- Conexiones a PostgreSQL desde un pool por proceso (postgresql_pool), con
+  prueba de salud al entregarlas: ninguna petición paga el connect.
+- Plantillas compiladas una vez por proceso (cached.Loader).
+- Caché compartida entre workers en Redis: versiones del tablero, códigos
+  de barras del POS y catálogo los ven todos los procesos por igual.
+- Búsqueda de productos en PostgreSQL (pg_trgm) en lugar del índice en
+  memoria de cada proceso, que no ve lo que cambian los demás workers ni
+  importar_productos.
+
+Variables: DJANGO_SECRET_KEY (obligatoria), DJANGO_ALLOWED_HOSTS,
+DJANGO_CSRF_TRUSTED_ORIGINS, POSTGRES_HOST/PORT, DB_POOL_MIN, DB_POOL_MAX,
+DB_POOL_TIMEOUT, REDIS_URL. El número de workers lo toma uvicorn de WEB_CONCURRENCY.
+
+Los estáticos (collectstatic en STATIC_ROOT) y MEDIA_ROOT los sirve el
+proxy de delante; con DEBUG apagado Django no los sirve.
+"""
+from .settings import *  # noqa: F401,F403
+from .settings import DATABASES, TEMPLATES, os
+
+DEBUG = False
+
+SECRET_KEY = os.environ['DJANGO_SECRET_KEY']
+ALLOWED_HOSTS = [h.strip() for h in os.getenv('DJANGO_ALLOWED_HOSTS', 'localhost').split(',') if h.strip()]
+CSRF_TRUSTED_ORIGINS = [o.strip() for o in os.getenv('DJANGO_CSRF_TRUSTED_ORIGINS', '').split(',') if o.strip()]
+
+# Detrás del proxy: uvicorn --proxy-headers ya corrige esquema e IP del cliente
+SECURE_PROXY_SSL_HEADER = ('HTTP_X_FORWARDED_PROTO', 'https')
+
+# Un pool por worker: hasta WEB_CONCURRENCY * DB_POOL_MAX conexiones en total.
+# Las consultas en paralelo del tablero (tienda/asincrono.py) usan el mismo pool
+DATABASES['default'].update({
+    'ENGINE': 'tienda_mascotas.postgresql_pool',
+    'HOST': os.getenv('POSTGRES_HOST', 'db'),
+    'PORT': os.getenv('POSTGRES_PORT', '5432'),
+    'CONN_MAX_AGE': 0,              # al terminar la petición la conexión vuelve al pool
+    'CONN_HEALTH_CHECKS': True,     # el pool la prueba antes de entregarla
+    'OPTIONS': {
+        'pool': {
+            'min_size': int(os.getenv('DB_POOL_MIN', '2')),
+            'max_size': int(os.getenv('DB_POOL_MAX', '10')),
+            'timeout': float(os.getenv('DB_POOL_TIMEOUT', '10')),
+        },
+    },
+})
+
+TEMPLATES[0]['APP_DIRS'] = False
+TEMPLATES[0]['OPTIONS']['loaders'] = [
+    ('django.template.loaders.cached.Loader', [
+        'django.template.loaders.filesystem.Loader',
+        'django.template.loaders.app_directories.Loader',
+    ]),
+]
+
+# Con WEB_CONCURRENCY workers la caché tiene que ser una sola: con LocMemCache cada
+# proceso tendría sus propias versiones del tablero y sus propios códigos de barras
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.getenv('REDIS_URL', 'redis://redis:6379/0'),
+        'KEY_PREFIX': 'tienda',
+    },
+}
+CODIGOS_CACHE_COMPARTIDO = 'default'
+
+BUSQUEDA_PRODUCTOS_BACKEND = 'postgres'
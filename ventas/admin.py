@@ -1,3 +1,6 @@
 from django.contrib import admin
+from .models import ContadorFactura
 
-# Register your models here.
+@admin.register(ContadorFactura)
+class ContadorFacturaAdmin(admin.ModelAdmin):
+    list_display = ('nombre', 'ultimo_numero')
@@ -0,0 +1,316 @@
+import logging
+import uuid
+from collections import OrderedDict
+from decimal import Decimal, InvalidOperation
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from tienda.models import Cliente, Producto, Venta, VentaItem
+from . import factura_pdf, resumenes
+
+logger = logging.getLogger(__name__)
+
+# Ventas por petición en la sincronización de la cola offline del POS
+MAX_VENTAS_LOTE = 100
+# Desfase de reloj que se le tolera al terminal en la fecha de cobro
+TOLERANCIA_RELOJ = timedelta(minutes=5)
+
+
+class CheckoutError(Exception):
+    """Error de negocio al registrar una venta; lleva el status HTTP sugerido"""
+
+    def __init__(self, mensaje, status=400):
+        super().__init__(mensaje)
+        self.mensaje = mensaje
+        self.status = status
+
+
+def normalizar_carrito(carrito):
+    """Convierte el carrito del POS ([{id, cantidad}, ...]) en {producto_id: cantidad}"""
+    if not isinstance(carrito, list):
+        raise CheckoutError('El carrito debe ser una lista')
+    lineas = OrderedDict()
+    for item in carrito:
+        if not isinstance(item, dict):
+            raise CheckoutError('Línea de carrito inválida')
+        prod_id = item.get('id')
+        if not prod_id:
+            raise CheckoutError('Falta el ID del producto')
+        try:
+            prod_id = int(prod_id)
+            cantidad = int(item.get('cantidad', 1))
+        except (TypeError, ValueError):
+            raise CheckoutError(f'Línea inválida para el producto {prod_id}')
+        if cantidad < 1:
+            raise CheckoutError(f'Cantidad inválida para el producto {prod_id}')
+        lineas[prod_id] = lineas.get(prod_id, 0) + cantidad
+
+    if not lineas:
+        raise CheckoutError('El carrito está vacío')
+    return lineas
+
+
+def normalizar_clave(clave):
+    """UUID de idempotencia enviado por el POS, o None si no viene"""
+    if not clave:
+        return None
+    try:
+        return uuid.UUID(str(clave))
+    except ValueError:
+        raise CheckoutError('Clave de idempotencia inválida')
+
+
+def _venta_repetida(clave):
+    venta = Venta.objects.filter(clave_idempotencia=clave).first()
+    if venta is not None:
+        venta.repetida = True
+    return venta
+
+
+def registrar_venta(vendedor, carrito, cliente=None, metodo_pago='Efectivo', efectivo_recibido=None,
+                    notas='', estado='Pagada', clave_idempotencia=None, fecha=None):
+    """
+    Registra una venta completa en una sola transacción.
+
+    Carga y bloquea todos los productos del carrito en una consulta, valida stock
+    de todas las líneas, descuenta stock con un único UPDATE, crea los items con
+    bulk_create y suma la venta a los resúmenes diarios. El número de consultas
+    no depende del largo del carrito.
+
+    Si viene `clave_idempotencia` y ya hay una venta con esa clave, se devuelve
+    esa venta (con `repetida = True`) sin registrar nada. `fecha` es el momento
+    del cobro para ventas hechas sin conexión.
+    """
+    lineas = normalizar_carrito(carrito)
+    clave_idempotencia = normalizar_clave(clave_idempotencia)
+    if clave_idempotencia:
+        repetida = _venta_repetida(clave_idempotencia)
+        if repetida is not None:
+            return repetida
+
+    try:
+        return _registrar(vendedor, lineas, cliente, metodo_pago, efectivo_recibido, notas, estado,
+                          clave_idempotencia, fecha)
+    except IntegrityError:
+        # Otro envío con la misma clave se confirmó mientras registrábamos este
+        repetida = _venta_repetida(clave_idempotencia) if clave_idempotencia else None
+        if repetida is None:
+            raise
+        return repetida
+
+
+def _registrar(vendedor, lineas, cliente, metodo_pago, efectivo_recibido, notas, estado, clave_idempotencia, fecha):
+    with transaction.atomic(), resumenes.pausar():
+        productos = Producto.objects.select_for_update().order_by('pk').in_bulk(list(lineas))
+
+        faltantes = [str(prod_id) for prod_id in lineas if prod_id not in productos]
+        if faltantes:
+            raise CheckoutError(f'El producto con ID {", ".join(faltantes)} no existe', status=404)
+
+        sin_stock = [productos[prod_id].nombre for prod_id, cantidad in lineas.items() if cantidad > productos[prod_id].stock]
+        if sin_stock:
+            raise CheckoutError(f'Stock insuficiente para {", ".join(sin_stock)}')
+
+        total_venta = sum(
+            (productos[prod_id].precio * cantidad for prod_id, cantidad in lineas.items()),
+            Decimal('0.00'),
+        )
+
+        if metodo_pago != 'Efectivo':
+            efectivo_recibido = None  # Para métodos distintos a efectivo
+
+        vuelto = Decimal('0.00')
+        if efectivo_recibido is not None:
+            if efectivo_recibido < total_venta:
+                raise CheckoutError(
+                    f'El efectivo recibido (${efectivo_recibido:.2f}) es menor al total (${total_venta:.2f}).'
+                )
+            vuelto = efectivo_recibido - total_venta
+
+        comision = Decimal('0.00')
+        if vendedor and vendedor.comision_porcentaje > 0:
+            comision = (total_venta * vendedor.comision_porcentaje) / 100
+
+        venta = Venta.objects.create(
+            cliente=cliente,
+            vendedor=vendedor,
+            metodo_pago=metodo_pago,
+            efectivo_recibido=efectivo_recibido,
+            vuelto=vuelto,
+            notas=notas,
+            estado=estado,
+            total=total_venta,
+            cantidad_items=len(lineas),
+            comision_monto=comision,
+            clave_idempotencia=clave_idempotencia,
+        )
+        if fecha is not None:
+            # auto_now_add no deja fijar la fecha al crear
+            Venta.objects.filter(pk=venta.pk).update(fecha=fecha)
+            venta.fecha = fecha
+
+        Producto.objects.filter(pk__in=list(lineas)).update(
+            stock=F('stock') - Case(
+                *[When(pk=prod_id, then=Value(cantidad)) for prod_id, cantidad in lineas.items()],
+                output_field=IntegerField(),
+            )
+        )
+
+        # bulk_create no dispara las señales de VentaItem: los totales ya quedaron en la venta
+        VentaItem.objects.bulk_create([
+            VentaItem(venta=venta, producto=productos[prod_id], cantidad=cantidad, precio_unitario=productos[prod_id].precio)
+            for prod_id, cantidad in lineas.items()
+        ])
+
+        resumenes.sumar_venta(
+            venta,
+            [(prod_id, cantidad, productos[prod_id].precio) for prod_id, cantidad in lineas.items()],
+        )
+
+        # La factura se suele imprimir enseguida: la dejamos generada al confirmar
+        transaction.on_commit(lambda: factura_pdf.calentar(venta.pk))
+
+    return venta
+
+
+def eliminar_venta(venta):
+    """
+    Elimina la venta y devuelve su stock con una cantidad fija de consultas:
+    un UPDATE para el stock de todos sus productos, la resta en los
+    resúmenes (resumenes.restar_venta), sin recalcular el día del vendedor,
+    y un DELETE para todos sus items. Los items se borran sin sus señales
+    (cada una ajustaría los totales de una venta que va a desaparecer); las
+    de Venta suben el tablero e invalidan la factura una sola vez.
+    """
+    with transaction.atomic(), resumenes.pausar():
+        lineas = list(venta.items.values_list('producto_id', 'cantidad', 'precio_unitario'))
+        devolver = {}
+        for prod_id, cantidad, _ in lineas:
+            devolver[prod_id] = devolver.get(prod_id, 0) + cantidad
+        if devolver:
+            Producto.objects.filter(pk__in=list(devolver)).update(
+                stock=F('stock') + Case(
+                    *[When(pk=prod_id, then=Value(cantidad)) for prod_id, cantidad in devolver.items()],
+                    output_field=IntegerField(),
+                )
+            )
+        resumenes.restar_venta(venta, lineas)
+        items = venta.items.all()
+        items._raw_delete(items.db)
+        venta.delete()
+
+
+# ----------------------------
+# Cola offline del POS
+# ----------------------------
+def _fecha_cobro(valor):
+    """
+    Fecha del cobro enviada por el POS (ahora si no viene). Se rechaza si cae
+    fuera de la ventana offline: más vieja que POS_VENTANA_OFFLINE_HORAS o en
+    el futuro más allá de un pequeño desfase de reloj.
+    """
+    ahora = timezone.now()
+    if valor in (None, ''):
+        return ahora
+    fecha = parse_datetime(valor) if isinstance(valor, str) else None
+    if fecha is None:
+        raise CheckoutError('Fecha de cobro inválida')
+    if timezone.is_naive(fecha):
+        fecha = timezone.make_aware(fecha)
+    if fecha > ahora + TOLERANCIA_RELOJ:
+        raise CheckoutError('La fecha de cobro está en el futuro: revisar el reloj del terminal')
+    horas = getattr(settings, 'POS_VENTANA_OFFLINE_HORAS', 72)
+    if fecha < ahora - timedelta(hours=horas):
+        raise CheckoutError(f'La venta se cobró hace más de {horas} horas: registrarla a mano')
+    return min(fecha, ahora)
+
+
+def _registrar_de_cola(vendedor, datos, clientes):
+    metodo_pago = datos.get('metodo_pago') or 'Efectivo'
+    if metodo_pago not in ('Efectivo', 'Tarjeta'):
+        raise CheckoutError(f'Método de pago inválido: {metodo_pago}')
+    efectivo_recibido = None
+    if metodo_pago == 'Efectivo' and datos.get('efectivo_recibido') not in (None, ''):
+        try:
+            efectivo_recibido = Decimal(str(datos['efectivo_recibido']))
+        except InvalidOperation:
+            raise CheckoutError('Efectivo recibido inválido')
+        if not efectivo_recibido.is_finite() or efectivo_recibido < 0:
+            raise CheckoutError('Efectivo recibido inválido')
+
+    return registrar_venta(
+        vendedor,
+        datos.get('carrito'),
+        cliente=clientes.get(str(datos.get('cliente') or '')),
+        metodo_pago=metodo_pago,
+        efectivo_recibido=efectivo_recibido,
+        notas=str(datos.get('notas') or ''),
+        clave_idempotencia=datos.get('clave'),
+        fecha=_fecha_cobro(datos.get('fecha')),
+    )
+
+
+def registrar_lote(vendedor, ventas):
+    """
+    Registra las ventas encoladas por el POS sin conexión.
+
+    Cada venta trae su `clave` (UUID generado en el navegador); las que ya
+    estaban registradas (reenvíos) se informan como 'repetida' sin tocar nada.
+    Todo el lote va en una transacción, con un savepoint por venta: una venta
+    rechazada (sin stock, producto borrado, datos mal formados...) no impide
+    registrar las demás ni hace fallar el envío.
+
+    Devuelve una lista de dicts {clave, estado, venta_id, factura_num, mensaje}
+    en el mismo orden, con estado 'registrada', 'repetida' o 'rechazada'.
+    """
+    if len(ventas) > MAX_VENTAS_LOTE:
+        raise CheckoutError(f'Máximo {MAX_VENTAS_LOTE} ventas por envío')
+
+    # Una sola consulta para las claves ya conocidas y otra para los clientes
+    ventas = [datos if isinstance(datos, dict) else {} for datos in ventas]
+    claves = {}
+    for datos in ventas:
+        try:
+            clave = normalizar_clave(datos.get('clave'))
+        except CheckoutError:
+            clave = None
+        if clave:
+            claves[str(datos['clave'])] = clave
+    existentes = {
+        venta.clave_idempotencia: venta
+        for venta in Venta.objects.filter(clave_idempotencia__in=list(claves.values()))
+    }
+    ids_clientes = {str(datos['cliente']) for datos in ventas if str(datos.get('cliente') or '').isdigit()}
+    clientes = {str(cliente.pk): cliente for cliente in Cliente.objects.filter(pk__in=ids_clientes)}
+
+    resultados = []
+    with transaction.atomic():
+        for datos in ventas:
+            clave = claves.get(str(datos.get('clave')))
+            resultado = {'clave': datos.get('clave'), 'venta_id': None, 'factura_num': None, 'mensaje': ''}
+            if clave is None:
+                resultado.update(estado='rechazada', mensaje='Falta la clave de idempotencia o es inválida')
+            elif clave in existentes:
+                venta = existentes[clave]
+                resultado.update(estado='repetida', venta_id=venta.pk, factura_num=venta.factura_num)
+            else:
+                try:
+                    with transaction.atomic():
+                        venta = _registrar_de_cola(vendedor, datos, clientes)
+                except CheckoutError as e:
+                    resultado.update(estado='rechazada', mensaje=e.mensaje)
+                except Exception:
+                    logger.exception('No se pudo registrar la venta encolada %s', clave)
+                    resultado.update(estado='rechazada', mensaje='Error al registrar la venta')
+                else:
+                    existentes[clave] = venta
+                    estado = 'repetida' if getattr(venta, 'repetida', False) else 'registrada'
+                    resultado.update(estado=estado, venta_id=venta.pk, factura_num=venta.factura_num)
+            resultados.append(resultado)
+    return resultados
@@ -0,0 +1,255 @@
+"""
+Exportación del historial de ventas en CSV y XLSX, en streaming.
+
+Las filas salen de un único SELECT (ventas LEFT JOIN items) recorrido con
+iterator(chunk_size=...), que en PostgreSQL usa un cursor del lado del
+servidor: la memoria queda acotada al tamaño del lote y los primeros bytes
+se envían antes de terminar de leer la consulta.
+
+El XLSX se arma a mano (es un ZIP con XML) escribiendo el ZIP sobre un buffer
+que se vacía después de cada lote, para no depender de una librería que
+necesite el archivo completo antes de guardarlo. Cada hoja admite
+LIMITE_FILAS_XLSX filas; si hay más se continúa en otra hoja.
+"""
+import csv
+import re
+import zipfile
+from datetime import datetime
+from decimal import Decimal
+from xml.sax.saxutils import escape
+
+from django.utils import timezone
+
+TAMANO_LOTE = 2000
+LIMITE_FILAS_XLSX = 1048575  # 1.048.576 filas de Excel menos el encabezado
+
+ENCABEZADOS = [
+    'Factura', 'Fecha', 'Cliente', 'Vendedor', 'Método de pago', 'Estado', 'Total venta',
+    'Producto', 'Código de barras', 'Cantidad', 'Precio unitario', 'Subtotal',
+]
+CAMPOS = [
+    'factura_num', 'fecha', 'cliente__nombre', 'vendedor__username', 'metodo_pago', 'estado', 'total',
+    'items__producto__nombre', 'items__producto__codigo_barras', 'items__cantidad', 'items__precio_unitario',
+]
+
+
+def filas_ventas(ventas, tamano_lote=TAMANO_LOTE):
+    """Una fila por item vendido (o una fila sin producto si la venta no tiene items)"""
+    consulta = ventas.order_by('fecha', 'id', 'items__id').values_list(*CAMPOS)
+    for fila in consulta.iterator(chunk_size=tamano_lote):
+        fecha = timezone.localtime(fila[1]) if timezone.is_aware(fila[1]) else fila[1]
+        cantidad, precio = fila[9], fila[10]
+        subtotal = cantidad * precio if cantidad is not None and precio is not None else None
+        yield (*fila[:1], fecha, *fila[2:], subtotal)
+
+
+def _agrupar(partes, tamano=64 * 1024):
+    """Junta trozos pequeños para no enviar un chunk HTTP por fila"""
+    buffer, largo = [], 0
+    for parte in partes:
+        buffer.append(parte)
+        largo += len(parte)
+        if largo >= tamano:
+            yield b''.join(buffer)
+            buffer, largo = [], 0
+    if buffer:
+        yield b''.join(buffer)
+
+
+# ----------------------------
+# CSV
+# ----------------------------
+class _Eco:
+    """Pseudo-archivo para csv.writer: devuelve lo escrito en vez de guardarlo"""
+
+    def write(self, valor):
+        return valor
+
+
+def _texto_csv(valor):
+    if valor is None:
+        return ''
+    if isinstance(valor, datetime):
+        return valor.strftime('%Y-%m-%d %H:%M:%S')
+    return valor
+
+
+def generar_csv(filas):
+    escritor = csv.writer(_Eco())
+
+    def partes():
+        # BOM para que Excel reconozca el UTF-8 (tildes y ñ)
+        yield '\ufeff'.encode()
+        yield escritor.writerow(ENCABEZADOS).encode()
+        for fila in filas:
+            yield escritor.writerow([_texto_csv(v) for v in fila]).encode()
+
+    return _agrupar(partes())
+
+
+# ----------------------------
+# XLSX
+# ----------------------------
+class SalidaStreaming:
+    """Destino del ZIP sin seek: acumula lo escrito hasta que el generador lo vacía"""
+
+    def __init__(self):
+        self._partes = []
+
+    def write(self, datos):
+        self._partes.append(bytes(datos))
+        return len(datos)
+
+    def flush(self):
+        pass
+
+    def vaciar(self):
+        datos = b''.join(self._partes)
+        self._partes.clear()
+        return datos
+
+
+_NO_XML = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+_EPOCA_EXCEL = datetime(1899, 12, 30)
+
+
+def _columna(indice):
+    letras = ''
+    indice += 1
+    while indice:
+        indice, resto = divmod(indice - 1, 26)
+        letras = chr(65 + resto) + letras
+    return letras
+
+
+_COLUMNAS = [_columna(i) for i in range(len(ENCABEZADOS))]
+
+
+def _celda(columna, numero, valor):
+    ref = f'{columna}{numero}'
+    if valor is None:
+        return ''
+    if isinstance(valor, datetime):
+        serial = (valor.replace(tzinfo=None) - _EPOCA_EXCEL).total_seconds() / 86400
+        return f'<c r="{ref}" s="1"><v>{serial:.6f}</v></c>'
+    if isinstance(valor, (int, float, Decimal)) and not isinstance(valor, bool):
+        return f'<c r="{ref}"><v>{valor}</v></c>'
+    texto = escape(_NO_XML.sub('', str(valor)))
+    return f'<c r="{ref}" t="inlineStr"><is><t xml:space="preserve">{texto}</t></is></c>'
+
+
+def _fila_xml(numero, valores):
+    celdas = ''.join(_celda(col, numero, v) for col, v in zip(_COLUMNAS, valores))
+    return f'<row r="{numero}">{celdas}</row>'.encode()
+
+
+_CABECERA_HOJA = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+    '<cols><col min="2" max="2" width="18" customWidth="1"/></cols><sheetData>'
+).encode()
+_PIE_HOJA = b'</sheetData></worksheet>'
+
+_ESTILOS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+    '<numFmts count="1"><numFmt numFmtId="164" formatCode="dd/mm/yyyy hh:mm"/></numFmts>'
+    '<fonts count="1"><font><sz val="11"/><name val="Calibri"/></font></fonts>'
+    '<fills count="2"><fill><patternFill patternType="none"/></fill><fill><patternFill patternType="gray125"/></fill></fills>'
+    '<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>'
+    '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+    '<cellXfs count="2"><xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'
+    '<xf numFmtId="164" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/></cellXfs>'
+    '<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>'
+    '</styleSheet>'
+)
+
+
+def _archivos_libro(hojas):
+    tipos = ''.join(
+        f'<Override PartName="/xl/worksheets/sheet{n}.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        for n in range(1, hojas + 1)
+    )
+    relaciones = ''.join(
+        f'<Relationship Id="rId{n}" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+        f'Target="worksheets/sheet{n}.xml"/>'
+        for n in range(1, hojas + 1)
+    )
+    lista_hojas = ''.join(
+        f'<sheet name="Ventas{"" if n == 1 else f" {n}"}" sheetId="{n}" r:id="rId{n}"/>'
+        for n in range(1, hojas + 1)
+    )
+    return {
+        '[Content_Types].xml': (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+            '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+            '<Default Extension="xml" ContentType="application/xml"/>'
+            '<Override PartName="/xl/workbook.xml" '
+            'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+            '<Override PartName="/xl/styles.xml" '
+            'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+            f'{tipos}</Types>'
+        ),
+        '_rels/.rels': (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+            '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+            'Target="xl/workbook.xml"/></Relationships>'
+        ),
+        'xl/workbook.xml': (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+            'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+            f'<sheets>{lista_hojas}</sheets></workbook>'
+        ),
+        'xl/_rels/workbook.xml.rels': (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+            f'{relaciones}'
+            f'<Relationship Id="rId{hojas + 1}" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" '
+            'Target="styles.xml"/></Relationships>'
+        ),
+        'xl/styles.xml': _ESTILOS,
+    }
+
+
+def generar_xlsx(filas, limite_filas=LIMITE_FILAS_XLSX):
+    salida = SalidaStreaming()
+    libro = zipfile.ZipFile(salida, 'w', compression=zipfile.ZIP_DEFLATED)
+    hojas = 0
+    filas = iter(filas)
+    pendiente = next(filas, None)
+
+    # Siempre hay al menos una hoja (con el encabezado) aunque no haya ventas
+    while hojas == 0 or pendiente is not None:
+        hojas += 1
+        with libro.open(f'xl/worksheets/sheet{hojas}.xml', 'w') as hoja:
+            hoja.write(_CABECERA_HOJA)
+            hoja.write(_fila_xml(1, ENCABEZADOS))
+            for bloque in _agrupar(_filas_hoja(filas, pendiente, limite_filas)):
+                hoja.write(bloque)
+                # El compresor puede no haber emitido nada todavía
+                datos = salida.vaciar()
+                if datos:
+                    yield datos
+            hoja.write(_PIE_HOJA)
+        pendiente = next(filas, None)
+
+    for nombre, contenido in _archivos_libro(hojas).items():
+        libro.writestr(nombre, contenido)
+    libro.close()
+    yield salida.vaciar()
+
+
+def _filas_hoja(filas, primera, limite_filas):
+    """Filas XML de una hoja: `primera` y luego hasta completar `limite_filas`"""
+    if primera is None:
+        return
+    yield _fila_xml(2, primera)
+    for numero in range(3, limite_filas + 2):
+        fila = next(filas, None)
+        if fila is None:
+            return
+        yield _fila_xml(numero, fila)
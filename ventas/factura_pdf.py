@@ -0,0 +1,196 @@
+"""
+Facturas en PDF (ReportLab) con caché en disco.
+
+Cada PDF se guarda en FACTURAS_CACHE_DIR/<venta_id>/<clave>.pdf, donde la
+clave es un hash del contenido de la factura (datos de la venta, items y
+VERSION). Si algo de lo que se imprime cambia, cambia la clave y el PDF se
+vuelve a generar; la misma clave sirve de ETag para los GET condicionales.
+
+Las señales de ventas/signals.py borran la carpeta de la venta cuando se
+edita, anula o elimina, y el checkout la precalienta en segundo plano.
+"""
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.lib.units import mm
+from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+
+logger = logging.getLogger(__name__)
+
+# Súbela al cambiar el diseño: invalida todos los PDF guardados
+VERSION = 1
+
+ESTILOS = getSampleStyleSheet()
+ESTILO_TABLA = TableStyle([
+    ("BACKGROUND", (0, 0), (-1, 0), colors.lightgrey),
+    ("TEXTCOLOR", (0, 0), (-1, 0), colors.black),
+    ("ALIGN", (1, 1), (-1, -1), "CENTER"),
+    ("GRID", (0, 0), (-1, -1), 0.5, colors.grey),
+    ("FONTNAME", (0, 0), (-1, 0), "Helvetica-Bold"),
+    ("BOTTOMPADDING", (0, 0), (-1, 0), 8),
+])
+
+
+def _monto(valor):
+    return None if valor is None else f"{valor:.2f}"
+
+
+def datos_factura(venta, items=None):
+    """
+    Todo lo que se imprime en la factura, como datos simples (se puede
+    serializar y enviar a otro proceso). `items` son tuplas
+    (nombre, cantidad, precio_unitario); si no se pasan se consultan.
+    """
+    if items is None:
+        items = venta.items.order_by('id').values_list('producto__nombre', 'cantidad', 'precio_unitario')
+    return {
+        'version': VERSION,
+        'factura_num': venta.factura_num,
+        'fecha': timezone.localtime(venta.fecha).strftime('%d/%m/%Y %H:%M'),
+        'estado': venta.estado,
+        'cliente': [venta.cliente.nombre, venta.cliente.correo] if venta.cliente else None,
+        'items': [[nombre, cantidad, _monto(precio), _monto(cantidad * precio)] for nombre, cantidad, precio in items],
+        'metodo_pago': venta.metodo_pago,
+        'total': _monto(venta.total),
+        'efectivo_recibido': _monto(venta.efectivo_recibido),
+        'vuelto': _monto(venta.vuelto),
+    }
+
+
+def clave_contenido(datos):
+    texto = json.dumps(datos, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(texto.encode()).hexdigest()[:32]
+
+
+def renderizar(datos):
+    """Genera el PDF de la factura y devuelve los bytes"""
+    buffer = BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=A4, rightMargin=20*mm, leftMargin=20*mm, topMargin=20*mm, bottomMargin=20*mm)
+    elementos = []
+
+    # Encabezado
+    elementos.append(Paragraph("<b>TIENDA PARA MASCOTAS</b>", ESTILOS["Title"]))
+    if datos['estado'] == 'Cancelada':
+        elementos.append(Paragraph('<font color="red"><b>FACTURA ANULADA</b></font>', ESTILOS["Heading2"]))
+    elementos.append(Spacer(1, 12))
+    elementos.append(Paragraph(f"<b>Factura N°:</b> {datos['factura_num']}", ESTILOS["Normal"]))
+    elementos.append(Paragraph(f"<b>Fecha:</b> {datos['fecha']}", ESTILOS["Normal"]))
+    elementos.append(Spacer(1, 12))
+
+    # Cliente
+    if datos['cliente']:
+        nombre, correo = datos['cliente']
+        elementos.append(Paragraph("<b>Datos del Cliente</b>", ESTILOS["Heading2"]))
+        elementos.append(Paragraph(f"<b>Nombre:</b> {nombre}", ESTILOS["Normal"]))
+        elementos.append(Paragraph(f"<b>Correo:</b> {correo}", ESTILOS["Normal"]))
+    else:
+        elementos.append(Paragraph("<b>Cliente General</b>", ESTILOS["Heading2"]))
+
+    elementos.append(Spacer(1, 12))
+
+    # Tabla de productos
+    data = [["Producto", "Cantidad", "Precio Unitario", "Subtotal"]]
+    for nombre, cantidad, precio, subtotal in datos['items']:
+        data.append([nombre, str(cantidad), f"${precio}", f"${subtotal}"])
+    table = Table(data, colWidths=[80*mm, 30*mm, 40*mm, 40*mm])
+    table.setStyle(ESTILO_TABLA)
+    elementos.append(table)
+    elementos.append(Spacer(1, 12))
+
+    # Total
+    elementos.append(Paragraph(f"<b>Método de pago:</b> {datos['metodo_pago']}", ESTILOS["Normal"]))
+    elementos.append(Paragraph(f"<b>Total a pagar:</b> ${datos['total']}", ESTILOS["Heading2"]))
+    if datos['metodo_pago'] == "Efectivo" and datos['efectivo_recibido']:
+        elementos.append(Paragraph(f"<b>Efectivo recibido:</b> ${datos['efectivo_recibido']}", ESTILOS["Normal"]))
+        elementos.append(Paragraph(f"<b>Vuelto:</b> ${datos['vuelto']}", ESTILOS["Normal"]))
+
+    elementos.append(Spacer(1, 20))
+    elementos.append(Paragraph("¡Gracias por su compra!", ESTILOS["Normal"]))
+
+    doc.build(elementos)
+    return buffer.getbuffer().tobytes()
+
+
+def renderizar_varios(lista_datos):
+    """Tarea del pool de procesos de facturas_lote: varios PDF por viaje"""
+    return [renderizar(datos) for datos in lista_datos]
+
+
+# ----------------------------
+# Caché en disco
+# ----------------------------
+def _carpeta(venta_id):
+    return Path(settings.FACTURAS_CACHE_DIR) / str(venta_id)
+
+
+def _guardar(ruta, pdf):
+    """Escritura atómica; deja sólo la versión recién generada en la carpeta de la venta"""
+    ruta.parent.mkdir(parents=True, exist_ok=True)
+    with tempfile.NamedTemporaryFile(dir=ruta.parent, suffix='.tmp', delete=False) as tmp:
+        tmp.write(pdf)
+    os.replace(tmp.name, ruta)
+    for otra in ruta.parent.glob('*.pdf'):
+        if otra != ruta:
+            otra.unlink(missing_ok=True)
+
+
+def ruta_pdf(venta_id, clave):
+    return _carpeta(venta_id) / f'{clave}.pdf'
+
+
+def obtener_pdf(venta):
+    """Devuelve (ruta, clave) del PDF de la venta, generándolo si no está en caché"""
+    datos = datos_factura(venta)
+    clave = clave_contenido(datos)
+    ruta = ruta_pdf(venta.pk, clave)
+    if not ruta.exists():
+        _guardar(ruta, renderizar(datos))
+    return ruta, clave
+
+
+def invalidar(venta_id):
+    shutil.rmtree(_carpeta(venta_id), ignore_errors=True)
+
+
+_ejecutor = None
+_ejecutor_lock = threading.Lock()
+
+
+def _calentar(venta_id):
+    # Import local: renderizar() debe poder cargarse en procesos hijos sin configurar Django
+    from tienda.models import Venta
+
+    try:
+        venta = Venta.objects.select_related('cliente').filter(pk=venta_id).first()
+        if venta is not None:
+            obtener_pdf(venta)
+    except Exception:
+        logger.exception('No se pudo precalentar la factura de la venta %s', venta_id)
+    finally:
+        # La conexión es de este hilo; no la dejamos abierta
+        connection.close()
+
+
+def calentar(venta_id):
+    """Genera el PDF en un hilo aparte (llamar dentro de transaction.on_commit)"""
+    global _ejecutor
+    if not getattr(settings, 'FACTURAS_PRECALENTAR', True):
+        return
+    with _ejecutor_lock:
+        if _ejecutor is None:
+            _ejecutor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='facturas')
+    _ejecutor.submit(_calentar, venta_id)
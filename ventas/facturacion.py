@@ -0,0 +1,94 @@
+import threading
+
+from django.conf import settings
+from django.db import connection, transaction
+
+from .models import ContadorFactura
+
+MODO_CORRELATIVO = 'correlativo'
+MODO_BLOQUES = 'bloques'
+
+
+class AsignadorFacturas:
+    """
+    Entrega números de factura desde una fila contador (ContadorFactura).
+
+    - correlativo: cada número se toma con un UPDATE ... RETURNING dentro de la
+      transacción de la venta; si la venta se revierte el número vuelve al
+      contador, por lo que la numeración no tiene huecos.
+    - bloques: cada proceso reserva bloques de números y los entrega desde
+      memoria, sin ir a la BD en cada venta. Los números de un bloque que se
+      pierde (reinicio del proceso) quedan como huecos.
+    """
+
+    def __init__(self, nombre='factura', modo=None, tamano_bloque=None, prefijo='FAC'):
+        self.nombre = nombre
+        self.modo = modo or getattr(settings, 'FACTURA_NUMERACION', MODO_CORRELATIVO)
+        self.tamano_bloque = tamano_bloque or getattr(settings, 'FACTURA_BLOQUE', 50)
+        self.prefijo = prefijo
+        if self.modo not in (MODO_CORRELATIVO, MODO_BLOQUES):
+            raise ValueError(f"Modo de numeración desconocido: {self.modo}")
+        self._lock = threading.Lock()
+        self._bloques = []  # rangos [siguiente, limite] ya confirmados en la BD
+
+    def siguiente_factura(self):
+        return f"{self.prefijo}{self.siguiente_numero():04d}"
+
+    def siguiente_numero(self):
+        if self.modo == MODO_CORRELATIVO:
+            return self._reservar(1)
+
+        with self._lock:
+            while self._bloques:
+                bloque = self._bloques[0]
+                if bloque[0] <= bloque[1]:
+                    numero = bloque[0]
+                    bloque[0] += 1
+                    return numero
+                self._bloques.pop(0)
+
+        # No retenemos el lock durante la consulta para no bloquear a otros hilos
+        limite = self._reservar(self.tamano_bloque)
+        numero = limite - self.tamano_bloque + 1
+        if numero < limite:
+            # El resto del bloque sólo se usa si la reserva queda confirmada;
+            # si la transacción se revierte el contador vuelve atrás y lo descartamos
+            transaction.on_commit(lambda: self._agregar_bloque(numero + 1, limite))
+        return numero
+
+    def reiniciar(self):
+        """Descarta los bloques reservados en memoria (tests, cambio de modo)"""
+        with self._lock:
+            self._bloques = []
+
+    def _agregar_bloque(self, siguiente, limite):
+        with self._lock:
+            self._bloques.append([siguiente, limite])
+
+    def _reservar(self, cantidad):
+        return reservar(self.nombre, cantidad)
+
+
+def reservar(nombre, cantidad=1):
+    """
+    Incrementa el contador `nombre` en `cantidad` y devuelve el último número
+    reservado. La fila queda bloqueada hasta el fin de la transacción que llama.
+    """
+    tabla = connection.ops.quote_name(ContadorFactura._meta.db_table)
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            f"UPDATE {tabla} SET ultimo_numero = ultimo_numero + %s WHERE nombre = %s RETURNING ultimo_numero",
+            [cantidad, nombre],
+        )
+        fila = cursor.fetchone()
+        if fila is None:
+            ContadorFactura.objects.get_or_create(nombre=nombre)
+            return reservar(nombre, cantidad)
+    return fila[0]
+
+
+asignador = AsignadorFacturas()
+
+
+def siguiente_factura():
+    return asignador.siguiente_factura()
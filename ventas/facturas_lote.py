@@ -0,0 +1,134 @@
+"""
+Generación masiva de facturas en PDF dentro de un ZIP.
+
+Las ventas se leen por lotes con sus items y clientes precargados; los PDF
+que ya están en la caché de factura_pdf se leen del disco y el resto se
+reparte en tareas de varias facturas entre un pool de procesos (ReportLab
+usa CPU y no libera el GIL). El ZIP se va escribiendo a medida que llegan los
+resultados y se entrega en trozos, así que sirve tanto para un archivo como
+para una respuesta en streaming.
+
+Los procesos se crean con 'spawn' para que no hereden las conexiones a la
+base de datos del proceso principal; no tocan la base ni Django, sólo
+reciben datos simples de datos_factura() y devuelven bytes. Dentro de un
+worker web (la acción del admin) no se crea el pool: cada clic levantaría un
+intérprete por núcleo. Ahí se usa settings.FACTURAS_ZIP_PROCESOS_WEB, que por
+defecto es 0 (renderizar en el mismo proceso).
+"""
+import logging
+import multiprocessing
+import os
+import time
+import zipfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from django.db.models import Prefetch
+
+from tienda.models import VentaItem
+from . import factura_pdf
+from .exportacion import SalidaStreaming
+
+logger = logging.getLogger(__name__)
+
+TAMANO_LOTE = 500     # ventas leídas por consulta
+TAMANO_TAREA = 16     # facturas por tarea enviada a un proceso
+
+
+def _nombre_archivo(venta):
+    return f'Factura_{venta.factura_num or venta.pk}.pdf'
+
+
+def _facturas(ventas):
+    """(nombre, datos, pdf_en_cache_o_None) para cada venta del queryset"""
+    ventas = (
+        ventas.select_related('cliente')
+        .prefetch_related(Prefetch('items', queryset=VentaItem.objects.select_related('producto').order_by('id')))
+        .order_by('fecha', 'id')
+    )
+    for venta in ventas.iterator(chunk_size=TAMANO_LOTE):
+        items = [(item.producto.nombre, item.cantidad, item.precio_unitario) for item in venta.items.all()]
+        datos = factura_pdf.datos_factura(venta, items)
+        ruta = factura_pdf.ruta_pdf(venta.pk, factura_pdf.clave_contenido(datos))
+        try:
+            pdf = ruta.read_bytes()
+        except OSError:
+            pdf = None
+        yield _nombre_archivo(venta), datos, pdf
+
+
+def _en_proceso(facturas):
+    """(nombres, pdfs) de a una factura, renderizando en este mismo proceso"""
+    for nombre, datos, pdf in facturas:
+        yield [nombre], [pdf if pdf is not None else factura_pdf.renderizar(datos)]
+
+
+def _en_pool(facturas, procesos, tamano_tarea):
+    """(nombres, pdfs) a medida que terminan; lo que no está en caché se reparte en un pool de procesos"""
+    contexto = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=procesos, mp_context=contexto) as pool:
+        # Pocas tareas en vuelo: la memoria no crece con el tamaño del rango
+        en_vuelo = deque()
+        nombres, pendientes = [], []
+
+        def enviar():
+            en_vuelo.append((list(nombres), pool.submit(factura_pdf.renderizar_varios, list(pendientes))))
+            nombres.clear()
+            pendientes.clear()
+
+        for nombre, datos, pdf in facturas:
+            if pdf is not None:
+                yield [nombre], [pdf]
+            else:
+                nombres.append(nombre)
+                pendientes.append(datos)
+                if len(pendientes) >= tamano_tarea:
+                    enviar()
+
+            while len(en_vuelo) >= procesos * 2 or (en_vuelo and en_vuelo[0][1].done()):
+                lote, futuro = en_vuelo.popleft()
+                yield lote, futuro.result()
+
+        if pendientes:
+            enviar()
+        while en_vuelo:
+            lote, futuro = en_vuelo.popleft()
+            yield lote, futuro.result()
+
+
+def generar_zip(ventas, procesos=None, progreso=None, tamano_tarea=TAMANO_TAREA):
+    """
+    Genera el ZIP con la factura de cada venta de `ventas`, en trozos de bytes.
+
+    `procesos` es el tamaño del pool (None: uno por núcleo); con 0 las
+    facturas se renderizan en el proceso que llama, sin crear otros.
+    `progreso(hechas, total, segundos)` se llama cada vez que se agregan
+    facturas al ZIP.
+    """
+    if procesos is None:
+        procesos = os.cpu_count() or 1
+    total = ventas.count()
+    salida = SalidaStreaming()
+    archivo = zipfile.ZipFile(salida, 'w', compression=zipfile.ZIP_STORED)  # los PDF ya vienen comprimidos
+    hechas = 0
+    inicio = time.monotonic()
+
+    if procesos > 0:
+        renderizadas = _en_pool(_facturas(ventas), procesos, tamano_tarea)
+    else:
+        renderizadas = _en_proceso(_facturas(ventas))
+    for nombres, pdfs in renderizadas:
+        for nombre, pdf in zip(nombres, pdfs):
+            archivo.writestr(nombre, pdf)
+        hechas += len(nombres)
+        if progreso:
+            progreso(hechas, total, time.monotonic() - inicio)
+        datos_zip = salida.vaciar()
+        if datos_zip:
+            yield datos_zip
+
+    archivo.close()
+    segundos = time.monotonic() - inicio
+    logger.info('ZIP de facturas: %s en %.1f s (%.1f/s, %s procesos)',
+                hechas, segundos, hechas / segundos if segundos else 0, procesos)
+    yield salida.vaciar()
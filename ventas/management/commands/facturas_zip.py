@@ -0,0 +1,58 @@
+import time
+from datetime import date, datetime, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from tienda.models import Venta, Vendedor
+from ventas import facturas_lote
+
+
+class Command(BaseCommand):
+    help = "Genera un ZIP con las facturas en PDF de un rango de fechas y/o vendedor, en paralelo"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--desde', type=date.fromisoformat, help="Fecha inicial YYYY-MM-DD")
+        parser.add_argument('--hasta', type=date.fromisoformat, help="Fecha final YYYY-MM-DD (inclusive)")
+        parser.add_argument('--vendedor', help="ID o nombre de usuario del vendedor")
+        parser.add_argument('--salida', help="Archivo ZIP a crear (por defecto facturas_<desde>_<hasta>.zip)")
+        parser.add_argument('--procesos', type=int, help="Procesos de renderizado (por defecto, uno por núcleo; 0 renderiza sin pool)")
+
+    def handle(self, *args, **options):
+        desde, hasta = options['desde'], options['hasta']
+        if desde and hasta and desde > hasta:
+            raise CommandError("--desde debe ser anterior a --hasta")
+
+        ventas = Venta.objects.all()
+        if desde:
+            ventas = ventas.filter(fecha__gte=timezone.make_aware(datetime.combine(desde, datetime.min.time())))
+        if hasta:
+            ventas = ventas.filter(fecha__lt=timezone.make_aware(datetime.combine(hasta + timedelta(days=1), datetime.min.time())))
+        if options['vendedor']:
+            valor = options['vendedor']
+            filtro = {'pk': valor} if valor.isdigit() else {'username': valor}
+            vendedor = Vendedor.objects.filter(**filtro).first()
+            if vendedor is None:
+                raise CommandError(f"No existe el vendedor '{valor}'")
+            ventas = ventas.filter(vendedor=vendedor)
+
+        salida = options['salida'] or f"facturas_{desde or 'inicio'}_{hasta or timezone.localdate()}.zip"
+        ultimo_reporte = 0
+
+        def progreso(hechas, total, segundos):
+            nonlocal ultimo_reporte
+            # Como mucho una línea por segundo, más la final
+            if hechas < total and time.monotonic() - ultimo_reporte < 1:
+                return
+            ultimo_reporte = time.monotonic()
+            ritmo = hechas / segundos if segundos else 0
+            self.stdout.write(f"{hechas}/{total} facturas ({ritmo:.1f}/s)")
+
+        inicio = time.monotonic()
+        with open(salida, 'wb') as archivo:
+            for trozo in facturas_lote.generar_zip(ventas, procesos=options['procesos'], progreso=progreso):
+                archivo.write(trozo)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Facturas guardadas en {salida} en {time.monotonic() - inicio:.1f} s."
+        ))
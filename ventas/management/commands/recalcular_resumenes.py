@@ -0,0 +1,42 @@
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Max, Min
+from django.utils import timezone
+
+from tienda.models import Venta
+from ventas import resumenes
+
+
+class Command(BaseCommand):
+    help = "Recalcula los resúmenes diarios de ventas (ejecutar tras migrar o ante diferencias)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--desde', type=date.fromisoformat, help="Fecha inicial YYYY-MM-DD (por defecto la primera venta)")
+        parser.add_argument('--hasta', type=date.fromisoformat, help="Fecha final YYYY-MM-DD (por defecto hoy)")
+        parser.add_argument('--dias-por-lote', type=int, default=31, help="Días recalculados por transacción")
+
+    def handle(self, *args, **options):
+        rango = Venta.objects.aggregate(primera=Min('fecha'), ultima=Max('fecha'))
+        if rango['primera'] is None and not options['desde']:
+            self.stdout.write("No hay ventas registradas.")
+            return
+
+        desde = options['desde'] or timezone.localdate(rango['primera'])
+        hasta = options['hasta'] or max(timezone.localdate(), timezone.localdate(rango['ultima']))
+        if desde > hasta:
+            raise CommandError("--desde debe ser anterior a --hasta")
+
+        total_ventas = total_productos = 0
+        inicio = desde
+        while inicio <= hasta:
+            fin = min(inicio + timedelta(days=options['dias_por_lote'] - 1), hasta)
+            filas_ventas, filas_productos = resumenes.recalcular_rango(inicio, fin)
+            total_ventas += filas_ventas
+            total_productos += filas_productos
+            self.stdout.write(f"{inicio} → {fin}: {filas_ventas} filas de ventas, {filas_productos} de productos")
+            inicio = fin + timedelta(days=1)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Resúmenes recalculados: {total_ventas} filas de ventas, {total_productos} de productos."
+        ))
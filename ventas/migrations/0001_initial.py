@@ -0,0 +1,36 @@
+# Generated by Django 4.2.15 on 2026-10-16 22:54
+
+from django.db import migrations, models
+
+
+def inicializar_contador(apps, schema_editor):
+    """Arranca el contador en el mayor número de factura ya emitido"""
+    Venta = apps.get_model('tienda', 'Venta')
+    ContadorFactura = apps.get_model('ventas', 'ContadorFactura')
+    ultimo = 0
+    for factura_num in Venta.objects.exclude(factura_num__isnull=True).values_list('factura_num', flat=True).iterator():
+        numero = factura_num.replace('FAC', '')
+        if numero.isdigit():
+            ultimo = max(ultimo, int(numero))
+    ContadorFactura.objects.update_or_create(nombre='factura', defaults={'ultimo_numero': ultimo})
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('tienda', '0007_venta_total_cantidad_items'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ContadorFactura',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nombre', models.CharField(max_length=50, unique=True)),
+                ('ultimo_numero', models.PositiveBigIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(inicializar_contador, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 4.2.15 on 2026-10-16 22:56
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('tienda', '0007_venta_total_cantidad_items'),
+        ('ventas', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumenVentasDia',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('metodo_pago', models.CharField(max_length=20)),
+                ('ventas', models.PositiveIntegerField(default=0)),
+                ('ingresos', models.DecimalField(decimal_places=2, default=0.0, max_digits=14)),
+                ('comisiones', models.DecimalField(decimal_places=2, default=0.0, max_digits=14)),
+                ('vendedor', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ResumenProductoDia',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('metodo_pago', models.CharField(max_length=20)),
+                ('unidades', models.PositiveIntegerField(default=0)),
+                ('ingresos', models.DecimalField(decimal_places=2, default=0.0, max_digits=14)),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='tienda.producto')),
+                ('vendedor', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='resumenventasdia',
+            constraint=models.UniqueConstraint(fields=('fecha', 'vendedor', 'metodo_pago'), name='resumen_ventas_dia_unico'),
+        ),
+        migrations.AddConstraint(
+            model_name='resumenproductodia',
+            constraint=models.UniqueConstraint(fields=('fecha', 'vendedor', 'producto', 'metodo_pago'), name='resumen_producto_dia_unico'),
+        ),
+    ]
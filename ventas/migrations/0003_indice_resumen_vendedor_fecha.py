@@ -0,0 +1,25 @@
+# Generated by Django 4.2.15 on 2026-10-17 00:04
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('ventas', '0002_resumenes_diarios'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='resumenventasdia',
+            name='vendedor',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='resumenventasdia',
+            index=models.Index(fields=['vendedor', 'fecha'], name='resumen_ventas_vend_fecha'),
+        ),
+    ]
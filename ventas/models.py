@@ -1,3 +1,53 @@
+from django.conf import settings
 from django.db import models
 
-# Create your models here.
+
+class ContadorFactura(models.Model):
+    """Contador dedicado para numerar facturas sin leer la tabla de ventas"""
+    nombre = models.CharField(max_length=50, unique=True)
+    ultimo_numero = models.PositiveBigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.nombre}: {self.ultimo_numero}"
+
+
+class ResumenVentasDia(models.Model):
+    """Ventas, ingresos y comisiones por día, vendedor y método de pago"""
+    fecha = models.DateField()
+    # Sin índice propio: lo cubre resumen_ventas_vend_fecha
+    vendedor = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True,
+                                 related_name='+', db_index=False)
+    metodo_pago = models.CharField(max_length=20)
+    ventas = models.PositiveIntegerField(default=0)
+    ingresos = models.DecimalField(max_digits=14, decimal_places=2, default=0.00)
+    comisiones = models.DecimalField(max_digits=14, decimal_places=2, default=0.00)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['fecha', 'vendedor', 'metodo_pago'], name='resumen_ventas_dia_unico'),
+        ]
+        indexes = [
+            # Resúmenes de un vendedor en un rango de fechas (perfil, tablero, historial)
+            models.Index(fields=['vendedor', 'fecha'], name='resumen_ventas_vend_fecha'),
+        ]
+
+    def __str__(self):
+        return f"{self.fecha} {self.vendedor_id} {self.metodo_pago}: {self.ingresos}"
+
+
+class ResumenProductoDia(models.Model):
+    """Unidades e ingresos por día, vendedor, producto y método de pago"""
+    fecha = models.DateField()
+    vendedor = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    producto = models.ForeignKey('tienda.Producto', on_delete=models.CASCADE, related_name='+')
+    metodo_pago = models.CharField(max_length=20)
+    unidades = models.PositiveIntegerField(default=0)
+    ingresos = models.DecimalField(max_digits=14, decimal_places=2, default=0.00)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['fecha', 'vendedor', 'producto', 'metodo_pago'], name='resumen_producto_dia_unico'),
+        ]
+
+    def __str__(self):
+        return f"{self.fecha} {self.producto_id}: {self.unidades}"
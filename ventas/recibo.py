@@ -0,0 +1,121 @@
+"""
+Recibo para impresora térmica de 80 mm.
+
+Tres salidas desde los mismos datos que la factura (factura_pdf.datos_factura):
+
+- texto plano de ANCHO columnas,
+- bytes ESC/POS (el mismo texto con alineación, negrita, tamaño y corte),
+- un ticket HTML compacto para mostrar o imprimir desde el navegador.
+
+Los formatos y plantillas se arman una sola vez al importar el módulo; generar
+un recibo es sólo formatear cadenas (muy por debajo de 1 ms por venta).
+"""
+import textwrap
+from html import escape
+from string import Template
+
+from . import factura_pdf
+
+ANCHO = 48                 # columnas de la fuente A en papel de 80 mm
+CODIFICACION = 'cp858'     # página de códigos PC858 (latín + €), tabla 19 en ESC/POS
+
+# Estilos de línea
+NORMAL, CENTRO, TITULO, NEGRITA, SEPARADOR = range(5)
+
+# Comandos ESC/POS
+INICIAR = b'\x1b@' + b'\x1bt\x13'          # reinicia e indica la página de códigos 19 (PC858)
+ALINEAR_IZQ, ALINEAR_CENTRO = b'\x1ba\x00', b'\x1ba\x01'
+NEGRITA_SI, NEGRITA_NO = b'\x1bE\x01', b'\x1bE\x00'
+DOBLE_SI, DOBLE_NO = b'\x1d!\x11', b'\x1d!\x00'
+CORTAR = b'\x1dVB\x03'                     # avanza 3 líneas y hace corte parcial
+
+_COMANDOS = {
+    NORMAL: (b'', b''),
+    CENTRO: (ALINEAR_CENTRO, ALINEAR_IZQ),
+    TITULO: (ALINEAR_CENTRO + DOBLE_SI + NEGRITA_SI, NEGRITA_NO + DOBLE_NO + ALINEAR_IZQ),
+    NEGRITA: (NEGRITA_SI, NEGRITA_NO),
+    SEPARADOR: (b'', b''),
+}
+
+_LINEA_SEPARADORA = '-' * ANCHO
+_FORMATO_CANTIDAD = '  {cantidad} x ${precio}'
+
+
+def _dos_columnas(izquierda, derecha, ancho=ANCHO):
+    espacio = ancho - len(derecha) - 1
+    return f'{izquierda[:espacio]:<{espacio}} {derecha}'
+
+
+def lineas(datos):
+    """Lista de (estilo, texto) del recibo; cada texto cabe en ANCHO columnas"""
+    salida = [(TITULO, 'TIENDA MASCOTAS')]
+    if datos['estado'] == 'Cancelada':
+        salida.append((CENTRO, '*** ANULADA ***'))
+    salida += [
+        (NORMAL, f"Factura: {datos['factura_num']}"),
+        (NORMAL, f"Fecha: {datos['fecha']}"),
+        (NORMAL, f"Cliente: {datos['cliente'][0] if datos['cliente'] else 'General'}"[:ANCHO]),
+        (SEPARADOR, _LINEA_SEPARADORA),
+    ]
+    for nombre, cantidad, precio, subtotal in datos['items']:
+        for parte in textwrap.wrap(nombre, ANCHO) or ['']:
+            salida.append((NORMAL, parte))
+        salida.append((NORMAL, _dos_columnas(_FORMATO_CANTIDAD.format(cantidad=cantidad, precio=precio), f'${subtotal}')))
+    salida += [
+        (SEPARADOR, _LINEA_SEPARADORA),
+        (NEGRITA, _dos_columnas('TOTAL', f"${datos['total']}")),
+        (NORMAL, f"Pago: {datos['metodo_pago']}"),
+    ]
+    if datos['metodo_pago'] == 'Efectivo' and datos['efectivo_recibido']:
+        salida.append((NORMAL, _dos_columnas('Recibido', f"${datos['efectivo_recibido']}")))
+        salida.append((NORMAL, _dos_columnas('Vuelto', f"${datos['vuelto']}")))
+    salida.append((CENTRO, '¡Gracias por su compra!'))
+    return salida
+
+
+def texto(datos):
+    """Recibo en texto plano (títulos y textos centrados ya alineados con espacios)"""
+    return '\n'.join(
+        t.center(ANCHO).rstrip() if estilo in (TITULO, CENTRO) else t
+        for estilo, t in lineas(datos)
+    ) + '\n'
+
+
+def escpos(datos):
+    """Bytes listos para enviar a la impresora"""
+    partes = [INICIAR]
+    for estilo, t in lineas(datos):
+        antes, despues = _COMANDOS[estilo]
+        partes += [antes, t.encode(CODIFICACION, 'replace'), b'\n', despues]
+    partes.append(CORTAR)
+    return b''.join(partes)
+
+
+# ----------------------------
+# HTML
+# ----------------------------
+_HTML = Template(
+    '<div class="ticket" style="width:72mm;font:12px/1.35 monospace;white-space:pre-wrap">'
+    '$filas</div>'
+)
+_HTML_FILAS = {
+    NORMAL: Template('<div>$t</div>'),
+    CENTRO: Template('<div style="text-align:center">$t</div>'),
+    TITULO: Template('<div style="text-align:center;font-weight:bold;font-size:1.5em">$t</div>'),
+    NEGRITA: Template('<div style="font-weight:bold">$t</div>'),
+    SEPARADOR: Template('<hr style="border:0;border-top:1px dashed #000;margin:4px 0">'),
+}
+
+
+def html(datos):
+    filas = ''.join(_HTML_FILAS[estilo].substitute(t=escape(t)) for estilo, t in lineas(datos))
+    return _HTML.substitute(filas=filas)
+
+
+def generar(venta, formato='html'):
+    """Recibo de la venta en 'texto', 'escpos' o 'html'"""
+    return _GENERADORES[formato](factura_pdf.datos_factura(venta))
+
+
+_GENERADORES = {'texto': texto, 'escpos': escpos, 'html': html}
+FORMATOS = tuple(_GENERADORES)
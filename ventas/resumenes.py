@@ -0,0 +1,268 @@
+"""
+Resúmenes diarios de ventas (ResumenVentasDia / ResumenProductoDia).
+
+El checkout suma cada venta a los resúmenes en su misma transacción con un
+upsert incremental, y eliminar una venta desde la vista la resta. Cualquier
+otro cambio (edición en el admin, eliminación de items) vuelve a calcular el
+día afectado del vendedor desde las tablas de ventas mediante las señales de
+ventas/signals.py.
+
+Los reportes globales (gráficos, tablero del admin) leen sólo los últimos
+REPORTES_MESES meses: su costo depende del tamaño de esa ventana, no de
+cuánta historia haya acumulado la tienda.
+"""
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Case, Count, DecimalField, F, IntegerField, Sum, Value, When
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from tienda.models import Venta, VentaItem
+from .models import ResumenProductoDia, ResumenVentasDia
+
+_estado = threading.local()
+
+
+def rango_dia(fecha):
+    """(inicio, fin) del día en la zona local, para filtrar fecha >= inicio y fecha < fin"""
+    inicio = timezone.make_aware(datetime.combine(fecha, time.min))
+    return inicio, inicio + timedelta(days=1)
+
+
+def clave_venta(venta):
+    return timezone.localdate(venta.fecha), venta.vendedor_id
+
+
+# ----------------------------
+# Control de las señales
+# ----------------------------
+@contextmanager
+def pausar():
+    """Las señales no tocan los resúmenes (el código llamador los actualiza por su cuenta)"""
+    anterior = getattr(_estado, 'modo', None)
+    _estado.modo = 'pausado'
+    try:
+        yield
+    finally:
+        _estado.modo = anterior
+
+
+@contextmanager
+def agrupar():
+    """Acumula los días afectados y los recalcula una sola vez al salir del bloque"""
+    anterior = getattr(_estado, 'modo', None)
+    pendientes = set()
+    _estado.modo = pendientes
+    try:
+        yield
+    finally:
+        _estado.modo = anterior
+    # Sólo se llega aquí si el bloque terminó sin excepción
+    for fecha, vendedor_id in pendientes:
+        marcar_dia(fecha, vendedor_id)
+
+
+def marcar_dia(fecha, vendedor_id):
+    """Llamado por las señales cuando cambia una venta de ese día y vendedor"""
+    modo = getattr(_estado, 'modo', None)
+    if modo == 'pausado':
+        return
+    if isinstance(modo, set):
+        modo.add((fecha, vendedor_id))
+        return
+    recalcular_dia(fecha, vendedor_id)
+
+
+# ----------------------------
+# Actualización incremental
+# ----------------------------
+def _upsert(modelo, claves, sumas, filas):
+    """INSERT ... ON CONFLICT DO UPDATE sumando las columnas de `sumas` (PostgreSQL y SQLite)"""
+    if not filas:
+        return
+    qn = connection.ops.quote_name
+    tabla = qn(modelo._meta.db_table)
+    columnas = [modelo._meta.get_field(nombre).column for nombre in claves + sumas]
+    conflicto = ', '.join(qn(modelo._meta.get_field(nombre).column) for nombre in claves)
+    asignaciones = ', '.join(
+        f"{qn(col)} = {tabla}.{qn(col)} + EXCLUDED.{qn(col)}"
+        for col in columnas[len(claves):]
+    )
+    marcadores = ', '.join(['(' + ', '.join(['%s'] * len(columnas)) + ')'] * len(filas))
+    sql = (
+        f"INSERT INTO {tabla} ({', '.join(qn(c) for c in columnas)}) VALUES {marcadores} "
+        f"ON CONFLICT ({conflicto}) DO UPDATE SET {asignaciones}"
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [valor for fila in filas for valor in fila])
+
+
+def _por_producto(lineas):
+    por_producto = defaultdict(lambda: [0, Decimal('0.00')])
+    for producto_id, cantidad, precio_unitario in lineas:
+        por_producto[producto_id][0] += cantidad
+        por_producto[producto_id][1] += cantidad * precio_unitario
+    return por_producto
+
+
+def sumar_venta(venta, lineas):
+    """
+    Suma una venta a los resúmenes (para quitarla, restar_venta).
+
+    `lineas` es una lista de (producto_id, cantidad, precio_unitario).
+    """
+    fecha, vendedor_id = clave_venta(venta)
+    if vendedor_id is None:
+        # Sin vendedor la clave tiene NULL y ON CONFLICT no la reconoce: recalculamos el día
+        recalcular_dia(fecha, None)
+        return
+
+    por_producto = _por_producto(lineas)
+    _upsert(
+        ResumenVentasDia,
+        ['fecha', 'vendedor', 'metodo_pago'],
+        ['ventas', 'ingresos', 'comisiones'],
+        [(fecha, vendedor_id, venta.metodo_pago, 1, venta.total, venta.comision_monto)],
+    )
+    _upsert(
+        ResumenProductoDia,
+        ['fecha', 'vendedor', 'producto', 'metodo_pago'],
+        ['unidades', 'ingresos'],
+        [
+            (fecha, vendedor_id, producto_id, venta.metodo_pago, unidades, ingresos)
+            for producto_id, (unidades, ingresos) in por_producto.items()
+        ],
+    )
+
+
+def restar_venta(venta, lineas):
+    """
+    Quita una venta de los resúmenes (al eliminarla) con UPDATE sobre las filas
+    existentes; las que quedan en cero se borran, como si se recalculara el día.
+    """
+    fecha, vendedor_id = clave_venta(venta)
+    if vendedor_id is None:
+        recalcular_dia(fecha, None)
+        return
+
+    dia = {'fecha': fecha, 'vendedor_id': vendedor_id, 'metodo_pago': venta.metodo_pago}
+    ResumenVentasDia.objects.filter(**dia).update(
+        ventas=F('ventas') - 1,
+        ingresos=F('ingresos') - venta.total,
+        comisiones=F('comisiones') - venta.comision_monto,
+    )
+    ResumenVentasDia.objects.filter(**dia, ventas=0).delete()
+
+    por_producto = _por_producto(lineas)
+    if not por_producto:
+        return
+    ResumenProductoDia.objects.filter(**dia, producto_id__in=list(por_producto)).update(
+        unidades=F('unidades') - Case(
+            *[When(producto_id=pk, then=Value(unidades)) for pk, (unidades, _) in por_producto.items()],
+            output_field=IntegerField(),
+        ),
+        ingresos=F('ingresos') - Case(
+            *[When(producto_id=pk, then=Value(ingresos)) for pk, (_, ingresos) in por_producto.items()],
+            output_field=DecimalField(max_digits=14, decimal_places=2),
+        ),
+    )
+    ResumenProductoDia.objects.filter(**dia, producto_id__in=list(por_producto), unidades=0).delete()
+
+
+# ----------------------------
+# Reportes globales
+# ----------------------------
+def meses_reportes():
+    return getattr(settings, 'REPORTES_MESES', 12)
+
+
+def inicio_reportes(hoy):
+    """Primer día de la ventana de los reportes globales: los últimos REPORTES_MESES meses, el actual incluido"""
+    indice = hoy.year * 12 + hoy.month - meses_reportes()
+    return date(indice // 12, indice % 12 + 1, 1)
+
+
+def top_productos(desde, limite=5):
+    """[{producto_id, producto__nombre, total_vendido}] de los más vendidos desde la fecha `desde`"""
+    return list(
+        ResumenProductoDia.objects
+        .filter(fecha__gte=desde)
+        .values('producto_id', 'producto__nombre')
+        .annotate(total_vendido=Sum('unidades'))
+        .order_by('-total_vendido', 'producto_id')[:limite]
+    )
+
+
+# ----------------------------
+# Recalculo desde las ventas
+# ----------------------------
+def _filas_resumen(ventas):
+    """Construye las filas de resumen para un queryset de ventas"""
+    filas_ventas = [
+        ResumenVentasDia(
+            fecha=fila['dia'],
+            vendedor_id=fila['vendedor'],
+            metodo_pago=fila['metodo_pago'],
+            ventas=fila['n'],
+            ingresos=fila['ingresos'] or 0,
+            comisiones=fila['comisiones'] or 0,
+        )
+        for fila in (
+            ventas.annotate(dia=TruncDate('fecha'))
+            .values('dia', 'vendedor', 'metodo_pago')
+            .annotate(n=Count('id'), ingresos=Sum('total'), comisiones=Sum('comision_monto'))
+            .order_by()
+        )
+    ]
+    filas_productos = [
+        ResumenProductoDia(
+            fecha=fila['dia'],
+            vendedor_id=fila['venta__vendedor'],
+            producto_id=fila['producto'],
+            metodo_pago=fila['venta__metodo_pago'],
+            unidades=fila['unidades'] or 0,
+            ingresos=fila['ingresos'] or 0,
+        )
+        for fila in (
+            VentaItem.objects.filter(venta__in=ventas)
+            .annotate(dia=TruncDate('venta__fecha'))
+            .values('dia', 'venta__vendedor', 'producto', 'venta__metodo_pago')
+            .annotate(unidades=Sum('cantidad'), ingresos=Sum(F('cantidad') * F('precio_unitario')))
+            .order_by()
+        )
+    ]
+    return filas_ventas, filas_productos
+
+
+def recalcular_dia(fecha, vendedor_id):
+    """Reemplaza los resúmenes de un día y vendedor por los calculados desde las ventas"""
+    inicio, fin = rango_dia(fecha)
+    ventas = Venta.objects.filter(fecha__gte=inicio, fecha__lt=fin, vendedor_id=vendedor_id)
+
+    with transaction.atomic():
+        ResumenVentasDia.objects.filter(fecha=fecha, vendedor_id=vendedor_id).delete()
+        ResumenProductoDia.objects.filter(fecha=fecha, vendedor_id=vendedor_id).delete()
+        filas_ventas, filas_productos = _filas_resumen(ventas)
+        ResumenVentasDia.objects.bulk_create(filas_ventas)
+        ResumenProductoDia.objects.bulk_create(filas_productos)
+
+
+def recalcular_rango(desde, hasta):
+    """Reemplaza todos los resúmenes entre las fechas `desde` y `hasta` (inclusive)"""
+    inicio, _ = rango_dia(desde)
+    _, fin = rango_dia(hasta)
+    ventas = Venta.objects.filter(fecha__gte=inicio, fecha__lt=fin)
+
+    with transaction.atomic():
+        ResumenVentasDia.objects.filter(fecha__gte=desde, fecha__lte=hasta).delete()
+        ResumenProductoDia.objects.filter(fecha__gte=desde, fecha__lte=hasta).delete()
+        filas_ventas, filas_productos = _filas_resumen(ventas)
+        ResumenVentasDia.objects.bulk_create(filas_ventas, batch_size=1000)
+        ResumenProductoDia.objects.bulk_create(filas_productos, batch_size=1000)
+    return len(filas_ventas), len(filas_productos)
@@ -0,0 +1,48 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from tienda.models import Venta, VentaItem
+from . import factura_pdf, resumenes
+
+
+@receiver(pre_save, sender=Venta)
+def venta_por_guardar(sender, instance, raw=False, **kwargs):
+    # Si cambia el vendedor también hay que recalcular el día del vendedor anterior
+    if raw or instance.pk is None or kwargs.get('update_fields'):
+        return
+    anterior = Venta.objects.filter(pk=instance.pk).values('fecha', 'vendedor_id').first()
+    if anterior and anterior['vendedor_id'] != instance.vendedor_id:
+        instance._clave_resumen_anterior = resumenes.clave_venta(Venta(**anterior))
+
+
+@receiver(post_save, sender=Venta)
+def venta_guardada(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    anterior = getattr(instance, '_clave_resumen_anterior', None)
+    if anterior:
+        resumenes.marcar_dia(*anterior)
+        del instance._clave_resumen_anterior
+    resumenes.marcar_dia(*resumenes.clave_venta(instance))
+    _invalidar_factura(instance.pk)
+
+
+@receiver(post_delete, sender=Venta)
+def venta_eliminada(sender, instance, **kwargs):
+    resumenes.marcar_dia(*resumenes.clave_venta(instance))
+    _invalidar_factura(instance.pk)
+
+
+@receiver(post_save, sender=VentaItem)
+@receiver(post_delete, sender=VentaItem)
+def venta_item_cambiado(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    resumenes.marcar_dia(*resumenes.clave_venta(instance.venta))
+    _invalidar_factura(instance.venta_id)
+
+
+def _invalidar_factura(venta_id):
+    # El PDF guardado deja de valer cuando se edita, anula o elimina la venta
+    transaction.on_commit(lambda: factura_pdf.invalidar(venta_id))
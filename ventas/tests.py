@@ -1,3 +1,247 @@
-from django.test import TestCase
+import io
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+import zipfile
+from decimal import Decimal
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from django.core.management import call_command
+from django.db import connection, connections
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
+from django.urls import reverse
+
+from tienda.models import Producto, Vendedor, Venta, VentaItem
+from . import factura_pdf, facturas_lote, recibo
+from .facturacion import AsignadorFacturas, MODO_BLOQUES, MODO_CORRELATIVO
+from .models import ContadorFactura
+
+
+def en_paralelo(funcion, hilos=16, repeticiones=25):
+    """Ejecuta `funcion` desde varios hilos a la vez y devuelve todos los resultados"""
+    resultados, errores = [], []
+    barrera = threading.Barrier(hilos)
+    lock = threading.Lock()
+
+    def trabajador():
+        try:
+            barrera.wait()
+            propios = [funcion() for _ in range(repeticiones)]
+            with lock:
+                resultados.extend(propios)
+        except Exception as e:
+            errores.append(e)
+        finally:
+            connections.close_all()
+
+    threads = [threading.Thread(target=trabajador) for _ in range(hilos)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    if errores:
+        raise errores[0]
+    return resultados
+
+
+@unittest.skipUnless(connection.vendor == 'postgresql', "La prueba de concurrencia requiere PostgreSQL")
+class AsignadorFacturasConcurrenciaTest(TransactionTestCase):
+
+    def test_correlativo_sin_duplicados_ni_huecos(self):
+        asignador = AsignadorFacturas(nombre='test-correlativo', modo=MODO_CORRELATIVO)
+        numeros = en_paralelo(asignador.siguiente_numero)
+
+        self.assertEqual(sorted(numeros), list(range(1, 16 * 25 + 1)))
+
+    def test_bloques_sin_duplicados(self):
+        asignador = AsignadorFacturas(nombre='test-bloques', modo=MODO_BLOQUES, tamano_bloque=10)
+        numeros = en_paralelo(asignador.siguiente_numero)
+
+        self.assertEqual(len(numeros), len(set(numeros)))
+        # Cada bloque reservado cuesta una sola actualización del contador
+        contador = ContadorFactura.objects.get(nombre='test-bloques')
+        self.assertGreaterEqual(contador.ultimo_numero, max(numeros))
+        self.assertLess(contador.ultimo_numero, len(numeros) + 16 * 10)
+
+    def test_ventas_simultaneas_no_chocan(self):
+        numeros = en_paralelo(lambda: Venta.objects.create().factura_num, hilos=8, repeticiones=10)
+
+        self.assertEqual(len(numeros), len(set(numeros)))
+        self.assertEqual(Venta.objects.count(), 80)
+
+
+# ----------------------------
+# Recibos térmicos
+# ----------------------------
+# Para regenerar los archivos de referencia: ACTUALIZAR_RECIBOS=1 python manage.py test ventas
+CARPETA_RECIBOS = Path(__file__).resolve().parent / 'testdata'
+
+RECIBO_EFECTIVO = {
+    'version': 1,
+    'factura_num': 'FAC1042',
+    'fecha': '15/03/2025 18:07',
+    'estado': 'Completada',
+    'cliente': ['María Fernández', 'maria@example.com'],
+    'items': [
+        ['Croquetas Premium Adulto Razas Medianas y Grandes 15 kg', 1, '54.90', '54.90'],
+        ['Arena sanitaria <aglomerante> & perfumada', 2, '7.25', '14.50'],
+    ],
+    'metodo_pago': 'Efectivo',
+    'total': '69.40',
+    'efectivo_recibido': '100.00',
+    'vuelto': '30.60',
+}
+
+RECIBO_ANULADO = {
+    'version': 1,
+    'factura_num': 'FAC1043',
+    'fecha': '15/03/2025 18:30',
+    'estado': 'Cancelada',
+    'cliente': None,
+    'items': [['Juguete cuerda', 3, '2.50', '7.50']],
+    'metodo_pago': 'Tarjeta',
+    'total': '7.50',
+    'efectivo_recibido': None,
+    'vuelto': None,
+}
+
+
+class ReciboTest(SimpleTestCase):
+
+    def comparar(self, nombre, generado):
+        ruta = CARPETA_RECIBOS / nombre
+        if os.environ.get('ACTUALIZAR_RECIBOS'):
+            ruta.parent.mkdir(exist_ok=True)
+            ruta.write_bytes(generado)
+        self.assertEqual(generado, ruta.read_bytes(), f'El recibo no coincide con {ruta}')
+
+    def test_escpos(self):
+        self.comparar('recibo_efectivo.bin', recibo.escpos(RECIBO_EFECTIVO))
+        self.comparar('recibo_anulado.bin', recibo.escpos(RECIBO_ANULADO))
+
+    def test_html(self):
+        self.comparar('recibo_efectivo.html', recibo.html(RECIBO_EFECTIVO).encode())
+        self.comparar('recibo_anulado.html', recibo.html(RECIBO_ANULADO).encode())
+
+    def test_texto(self):
+        self.comparar('recibo_efectivo.txt', recibo.texto(RECIBO_EFECTIVO).encode())
+
+    def test_lineas_caben_en_el_papel(self):
+        for estilo, linea in recibo.lineas(RECIBO_EFECTIVO):
+            self.assertLessEqual(len(linea), recibo.ANCHO // 2 if estilo == recibo.TITULO else recibo.ANCHO)
+
+
+# ----------------------------
+# Facturas en PDF con caché en disco
+# ----------------------------
+class FacturaPdfTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = Vendedor.objects.create_superuser('admin_factura', 'admin@ejemplo.com', 'clave')
+        producto = Producto.objects.create(nombre='Croquetas', precio=Decimal('12.50'), stock=10)
+        cls.venta = Venta.objects.create(vendedor=cls.admin)
+        VentaItem.objects.create(venta=cls.venta, producto=producto, cantidad=2)
+
+    def setUp(self):
+        directorio = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directorio, ignore_errors=True)
+        ajustes = self.settings(FACTURAS_CACHE_DIR=directorio, FACTURAS_PRECALENTAR=False)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+        self.client.force_login(self.admin)
+        self.url = reverse('ventas_factura_pdf_rl', args=[self.venta.pk])
+
+    def pedir(self, **cabeceras):
+        respuesta = self.client.get(self.url, **cabeceras)
+        if respuesta.streaming:
+            respuesta.pdf = b''.join(respuesta.streaming_content)
+        return respuesta
+
+    def guardados(self):
+        return sorted(p.name for p in factura_pdf._carpeta(self.venta.pk).glob('*.pdf'))
+
+    def test_get_condicional_responde_304(self):
+        respuesta = self.pedir()
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertTrue(respuesta.pdf.startswith(b'%PDF'))
+        etag = respuesta['ETag']
+        self.assertEqual(self.guardados(), [f'{etag.strip(chr(34))}.pdf'])
+
+        respuesta = self.pedir(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual((respuesta.status_code, respuesta['ETag']), (304, etag))
+        self.assertEqual(self.pedir(HTTP_IF_NONE_MATCH='"otra"').status_code, 200)
+
+    def test_editar_un_item_cambia_el_etag_y_regenera(self):
+        etag = self.pedir()['ETag']
+        item = self.venta.items.get()
+        item.cantidad = 3
+        with self.captureOnCommitCallbacks(execute=True):
+            item.save()
+        self.assertEqual(self.guardados(), [])     # _invalidar_factura borró la carpeta
+
+        respuesta = self.pedir(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertNotEqual(respuesta['ETag'], etag)
+        self.assertEqual(self.guardados(), [f'{respuesta["ETag"].strip(chr(34))}.pdf'])
+
+
+# ----------------------------
+# ZIP de facturas (ver facturas_lote.py)
+# ----------------------------
+class FacturasZipTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = Vendedor.objects.create_superuser('admin_zip', 'admin@ejemplo.com', 'clave')
+        otro = Vendedor.objects.create_user('vendedor_zip')
+        producto = Producto.objects.create(nombre='Croquetas', precio=Decimal('12.50'), stock=100)
+        cls.ventas = [Venta.objects.create(vendedor=cls.admin if i % 3 else otro) for i in range(5)]
+        for venta in cls.ventas:
+            VentaItem.objects.create(venta=venta, producto=producto, cantidad=1)
+
+    def setUp(self):
+        self.directorio = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directorio, ignore_errors=True)
+        ajustes = self.settings(FACTURAS_CACHE_DIR=os.path.join(self.directorio, 'cache'), FACTURAS_PRECALENTAR=False)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+        # Una ya está en la caché de disco: se lee en vez de renderizarla
+        factura_pdf.obtener_pdf(self.ventas[0])
+
+    def assertFacturas(self, contenido, ventas):
+        with zipfile.ZipFile(io.BytesIO(contenido)) as archivo:
+            self.assertEqual(sorted(archivo.namelist()), sorted(f'Factura_{v.factura_num}.pdf' for v in ventas))
+            for nombre in archivo.namelist():
+                self.assertTrue(archivo.read(nombre).startswith(b'%PDF'), nombre)
+
+    def test_sin_pool(self):
+        with mock.patch.object(facturas_lote, 'ProcessPoolExecutor', side_effect=AssertionError('sin pool')):
+            contenido = b''.join(facturas_lote.generar_zip(Venta.objects.all(), procesos=0))
+        self.assertFacturas(contenido, self.ventas)
+
+    def test_con_pool(self):
+        contenido = b''.join(facturas_lote.generar_zip(Venta.objects.all(), procesos=2, tamano_tarea=2))
+        self.assertFacturas(contenido, self.ventas)
+
+    def test_comando(self):
+        salida = os.path.join(self.directorio, 'facturas.zip')
+        texto = io.StringIO()
+        call_command('facturas_zip', '--vendedor', 'admin_zip', '--salida', salida, '--procesos', '0', stdout=texto)
+        self.assertIn('3/3 facturas', texto.getvalue())
+        with open(salida, 'rb') as archivo:
+            self.assertFacturas(archivo.read(), [v for v in self.ventas if v.vendedor_id == self.admin.pk])
+
+    def test_accion_del_admin_no_crea_procesos(self):
+        self.client.force_login(self.admin)
+        elegidas = self.ventas[1:4]
+        with mock.patch.object(facturas_lote, 'ProcessPoolExecutor', side_effect=AssertionError('sin pool')):
+            respuesta = self.client.post(reverse('admin:tienda_venta_changelist'), {
+                'action': 'descargar_facturas', '_selected_action': [v.pk for v in elegidas],
+            })
+            contenido = b''.join(respuesta.streaming_content)
+        self.assertEqual(respuesta['Content-Type'], 'application/zip')
+        self.assertFacturas(contenido, elegidas)